@@ -23,6 +23,84 @@ def create_app(config_class=Config):
     bcrypt.init_app(app)
     jwt.init_app(app)
     
+    # Write-behind buffer for append-only rows (equity snapshots)
+    from app.utils.write_buffer import write_buffer
+    from app.services.equity_rollup_service import EquityRollupService
+    write_buffer.init_app(app)
+    write_buffer.add_flush_listener(EquityRollupService.on_rows_written)
+    
+    # Idempotency-Key store for retried submissions
+    from app.utils.idempotency import idempotency_store
+    idempotency_store.init_app(app)
+    
+    # Resting orders are matched against quotes as they are served
+    from app.services.order_service import order_service
+    order_service.init_app(app)
+    
+    # Attached stop-loss / take-profit levels are checked on the same quotes
+    from app.services.protection_service import protection_service
+    protection_service.init_app(app)
+    
+    # Pre-trade what-if simulator (cached portfolio state)
+    from app.services.pretrade_service import pretrade_simulator
+    pretrade_simulator.init_app(app)
+    
+    # Firm-wide exposure is valued at the latest served quotes
+    from app.services.exposure_service import exposure_service
+    exposure_service.init_app(app)
+    
+    # Per-request SQL statement counts (N+1 detection)
+    from app.utils.query_budget import query_budget
+    query_budget.init_app(app)
+    
+    # Event-invalidated cache of public GET responses (leaderboards)
+    from app.utils.response_cache import response_cache
+    response_cache.init_app(app)
+    
+    # In-memory rank index over the materialized leaderboards
+    from app.services.rank_index import leaderboard_ranks
+    leaderboard_ranks.init_app(app)
+    
+    # Shared profit sketches behind the percentile lookups
+    from app.services.percentile_service import percentile_service
+    percentile_service.init_app(app)
+    
+    # Record served quotes so challenges can be replayed
+    from app.services.quote_tape import quote_tape
+    quote_tape.init_app(app)
+    
+    # Daily drawdown rolls over for every active challenge at Casablanca midnight
+    from app.utils.scheduler import scheduler, every
+    from app.tasks.day_rollover import roll_over_daily_equity, next_rollover_at
+    scheduler.add_job('daily-equity-rollover', roll_over_daily_equity, next_rollover_at, run_now=True)
+    
+    # ...and the whole active book is swept for breached limits periodically
+    sweep_interval = app.config.get('RISK_SWEEP_INTERVAL_SECONDS', 0)
+    if sweep_interval > 0:
+        from app.services.book_risk_service import BookRiskService
+        scheduler.add_job('risk-sweep', BookRiskService.sweep, every(sweep_interval))
+    
+    # ...and the exposure aggregate is reconciled against the positions
+    rebuild_interval = app.config.get('EXPOSURE_REBUILD_SECONDS', 0)
+    if rebuild_interval > 0:
+        from app.services.exposure_service import ExposureService
+        scheduler.add_job('exposure-rebuild', ExposureService.rebuild, every(rebuild_interval), run_now=True)
+    
+    # ...and the leaderboards are rebuilt as each month opens, so open-ended
+    # challenges enter the new month's board, and the closed month is archived
+    from app.services.leaderboard_service import LeaderboardService, next_month_start
+    scheduler.add_job('leaderboard-month-open', LeaderboardService().open_month, next_month_start)
+    
+    # ...and the profit sketches are reconciled against the challenges
+    percentile_interval = app.config.get('PERCENTILE_REBUILD_SECONDS', 0)
+    if percentile_interval > 0:
+        scheduler.add_job('percentile-rebuild', percentile_service.rebuild, every(percentile_interval))
+    scheduler.init_app(app)
+    
+    # Maintenance commands (flask prune-snapshots, ...)
+    from app.cli import register_commands
+    register_commands(app)
+    
     # Enable CORS
     CORS(app, resources={r"/api/*": {"origins": "*"}})
 
@@ -39,6 +117,7 @@ def create_app(config_class=Config):
     from app.api.v1.learning_bp import learning_bp
     from app.api.v1.features_bp import news_bp, quant_bp
     from app.api.v1.admin_bp import admin_bp
+    from app.api.v1.dashboard_bp import dashboard_bp
     from app.api.swagger import swagger_bp
     
     from flask import Blueprint
@@ -57,6 +136,7 @@ def create_app(config_class=Config):
     api_v1.register_blueprint(leaderboard_bp) # has /leaderboard
     api_v1.register_blueprint(payment_bp)     # has /payment
     api_v1.register_blueprint(learning_bp)    # has /learning
+    api_v1.register_blueprint(dashboard_bp)   # has /dashboard
     
     # New features - prefixes explicit just in case
     api_v1.register_blueprint(news_bp, url_prefix='/news')
@@ -3,6 +3,13 @@ from flask_jwt_extended import jwt_required
 from app.utils.decorators import require_role
 from app.models.user import User
 from app.models.challenge import Challenge, UserChallenge
+from app.services.equity_snapshot_policy import snapshot_policy
+from app.services.book_risk_service import BookRiskService, evaluate_book
+from app.services.exposure_service import exposure_service, ExposureService
+from app.services.pretrade_service import pretrade_simulator
+from app.services.leaderboard_service import LeaderboardService
+from app.services.percentile_service import percentile_service
+from app.models import LeaderboardEntry, TradingLeaderboardEntry
 from app import db
 import logging
 
@@ -84,8 +91,11 @@ def update_challenge_status(uc_id):
             return jsonify({'error': 'User challenge not found'}), 404
         
         old_status = uc.status
+        ExposureService.on_status_change(uc.id, old_status, new_status)
         uc.status = new_status
         db.session.commit()
+        pretrade_simulator.invalidate(uc.id)
+        LeaderboardService.on_challenge_change(uc.user_id)
         
         logger.info(f"Admin updated UserChallenge {uc_id} status from {old_status} to {new_status}")
         
@@ -151,6 +161,8 @@ def delete_user(user_id):
         if user.role == 'superadmin':
             return jsonify({'error': 'Cannot delete a superadmin'}), 400
             
+        LeaderboardEntry.query.filter_by(user_id=user_id).delete(synchronize_session=False)
+        TradingLeaderboardEntry.query.filter_by(user_id=user_id).delete(synchronize_session=False)
         db.session.delete(user)
         db.session.commit()
         
@@ -197,15 +209,20 @@ def reset_challenge(uc_id):
         if not uc:
             return jsonify({'error': 'Challenge not found'}), 404
             
+        percentile_service.on_equity_change(uc, uc.current_equity, uc.start_balance)
         uc.current_equity = uc.start_balance
         uc.daily_start_equity = uc.start_balance
         uc.max_equity = uc.start_balance
         uc.min_equity = uc.start_balance
         uc.min_equity_all_time = uc.start_balance
         uc.min_equity_today = uc.start_balance
+        ExposureService.on_status_change(uc.id, uc.status, 'IN_PROGRESS')
         uc.status = 'IN_PROGRESS'
         
         db.session.commit()
+        snapshot_policy.forget(uc_id)
+        pretrade_simulator.invalidate(uc_id)
+        LeaderboardService.on_challenge_change(uc.user_id)
         
         logger.info(f"Admin reset UserChallenge {uc_id}")
         return jsonify({
@@ -216,3 +233,79 @@ def reset_challenge(uc_id):
         db.session.rollback()
         logger.error(f"Admin reset_challenge error: {e}")
         return jsonify({'error': 'Failed to reset challenge'}), 500
+
+
+@admin_bp.route('/risk-monitor', methods=['GET'])
+@jwt_required()
+@require_role('admin', 'superadmin')
+def get_risk_monitor():
+    """Risk overview of every active challenge (evaluated as one book)"""
+    try:
+        limit = min(max(int(request.args.get('limit', 50)), 1), 500)
+        challenge_id = request.args.get('challenge_id', type=int)
+
+        book = BookRiskService.load_book(challenge_id=challenge_id)
+        metrics = evaluate_book(book)
+        changes = BookRiskService.status_changes(book, metrics)
+
+        return jsonify({
+            'active_challenges': len(book),
+            'pending_failures': sum(1 for c in changes if c['new_status'] == 'FAILED'),
+            'pending_passes': sum(1 for c in changes if c['new_status'] == 'PASSED'),
+            'status_changes': changes,
+            'at_risk': BookRiskService.at_risk(book, metrics, limit)
+        }), 200
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    except Exception as e:
+        logger.error(f"Admin get_risk_monitor error: {e}")
+        return jsonify({'error': 'Failed to evaluate risk book'}), 500
+
+
+@admin_bp.route('/risk-monitor/sweep', methods=['POST'])
+@jwt_required()
+@require_role('admin', 'superadmin')
+def sweep_risk_book():
+    """Evaluate every active challenge and apply the resulting status changes"""
+    try:
+        changes = BookRiskService.sweep(apply=True)
+        logger.info(f"Admin risk sweep applied {len(changes)} status changes")
+        return jsonify({
+            'message': 'Risk sweep completed',
+            'status_changes': changes
+        }), 200
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Admin sweep_risk_book error: {e}")
+        return jsonify({'error': 'Failed to sweep risk book'}), 500
+
+
+@admin_bp.route('/exposure', methods=['GET'])
+@jwt_required()
+@require_role('admin', 'superadmin')
+def get_exposure():
+    """Firm-wide net/gross exposure per instrument across active challenges"""
+    try:
+        group_by = request.args.get('group_by')
+        if group_by not in (None, 'asset_class', 'currency'):
+            return jsonify({'error': 'group_by must be asset_class or currency'}), 400
+
+        return jsonify(exposure_service.get_exposure(group_by)), 200
+    except Exception as e:
+        logger.error(f"Admin get_exposure error: {e}")
+        return jsonify({'error': 'Failed to fetch exposure'}), 500
+
+
+@admin_bp.route('/exposure/rebuild', methods=['POST'])
+@jwt_required()
+@require_role('admin', 'superadmin')
+def rebuild_exposure():
+    """Recompute the exposure aggregate from open positions"""
+    try:
+        instruments = ExposureService.rebuild()
+        logger.info(f"Admin rebuilt exposure for {instruments} instruments")
+        return jsonify({'message': 'Exposure rebuilt', 'instruments': instruments}), 200
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Admin rebuild_exposure error: {e}")
+        return jsonify({'error': 'Failed to rebuild exposure'}), 500
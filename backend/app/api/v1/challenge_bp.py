@@ -1,7 +1,16 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy.orm import joinedload
 from app.services import ChallengeService
-from app.models import Challenge, UserChallenge, Instrument
+from app.services.order_service import order_service
+from app.services.protection_service import protection_service, UNCHANGED
+from app.services.pretrade_service import pretrade_simulator
+from app.services.rule_engine import rule_engine
+from app.services.leaderboard_service import LeaderboardService
+from app.services.exposure_service import ExposureService
+from app.models import Challenge, UserChallenge, Instrument, Position, ACTIVE_STATUSES
+from app.config import Config
+from app.utils import parse_page_args, idempotent
 from app import db
 
 challenge_bp = Blueprint('challenge', __name__, url_prefix='/challenges')
@@ -9,6 +18,58 @@ challenge_service = ChallengeService()
 
 
 
+def _optional_price(data, key):
+    """Read an optional price field from a JSON body (None when null)."""
+    value = data.get(key)
+    return float(value) if value is not None else None
+
+
+def _fail_quantity_limit(user_challenge, qty, limit):
+    """Fail a challenge whose order exceeded its trade quantity limit."""
+    # 1. Set status to FAILED
+    ExposureService.on_status_change(user_challenge.id, user_challenge.status, 'FAILED')
+    user_challenge.status = 'FAILED'
+    
+    # 2. Add reason to violated_rules
+    current_rules = list(user_challenge.violated_rules) if user_challenge.violated_rules else []
+    if "Trade Quantity Limit Exceeded" not in current_rules:
+        current_rules.append("Trade Quantity Limit Exceeded")
+        user_challenge.violated_rules = current_rules
+    
+    db.session.commit()
+    pretrade_simulator.invalidate(user_challenge.id)
+    LeaderboardService.on_challenge_change(user_challenge.user_id)
+    
+    return jsonify({
+        'error': f'Challenge FAILED: Trade quantity {qty} exceeds limit of {limit}',
+        'user_challenge': user_challenge.to_dict()
+    }), 400
+
+
+def _serialize_user_challenge(user_challenge, challenge_data=None):
+    """User challenge with its challenge template nested (load it with joinedload)."""
+    data = user_challenge.to_dict()
+    if challenge_data is None and user_challenge.challenge:
+        challenge_data = user_challenge.challenge.to_dict()
+    if challenge_data is not None:
+        data['challenge'] = challenge_data
+    return data
+
+
+def _check_order_rules(user_challenge, qty):
+    """
+    Apply the challenge's order rules (max lots, news blackout) to a new order.
+
+    Returns:
+        An error response when the order breaks a rule, otherwise None
+    """
+    for violation in rule_engine.rule_set_for(user_challenge.challenge).check_order(qty):
+        if violation['action'] == 'fail':
+            return _fail_quantity_limit(user_challenge, qty, violation['threshold'])
+        return jsonify({'error': violation['message'], 'rule': violation['rule']}), 422
+    return None
+
+
 @challenge_bp.route('/my', methods=['GET'])
 @jwt_required()
 def get_my_challenges():
@@ -16,30 +77,16 @@ def get_my_challenges():
     try:
         user_id = get_jwt_identity()
         
-        # Get all challenges that are either IN_PROGRESS or ACTIVE
-        # This handles both new logic (IN_PROGRESS) and legacy logic (ACTIVE)
-        user_challenges = UserChallenge.query.filter(
-            UserChallenge.user_id == user_id,
-            UserChallenge.status.in_(['IN_PROGRESS', 'ACTIVE'])
-        ).order_by(UserChallenge.created_at.desc()).all()
-        
-        # Also get other statuses if needed, or just return all
-        all_challenges = UserChallenge.query.filter_by(
-            user_id=user_id
+        # One query for every challenge of the user, templates joined in;
+        # the active subset (IN_PROGRESS, or legacy ACTIVE) is taken from it
+        all_challenges = UserChallenge.query.options(joinedload(UserChallenge.challenge)).filter(
+            UserChallenge.user_id == user_id
         ).order_by(UserChallenge.created_at.desc()).all()
-        
-        # Helper function to include nested challenge
-        def serialize_with_challenge(uc):
-            data = uc.to_dict()
-            # Get the associated challenge
-            challenge = Challenge.query.get(uc.challenge_id)
-            if challenge:
-                data['challenge'] = challenge.to_dict()
-            return data
+        serialized = [_serialize_user_challenge(uc) for uc in all_challenges]
         
         return jsonify({
-            'active_challenges': [serialize_with_challenge(uc) for uc in user_challenges],
-            'all_challenges': [serialize_with_challenge(uc) for uc in all_challenges]
+            'active_challenges': [data for data in serialized if data['status'] in ACTIVE_STATUSES],
+            'all_challenges': serialized
         }), 200
     
     except Exception as e:
@@ -65,6 +112,7 @@ def get_challenges():
 
 @challenge_bp.route('/start', methods=['POST'])
 @jwt_required()
+@idempotent
 def start_challenge():
     """Start a new challenge."""
     try:
@@ -99,8 +147,8 @@ def get_user_challenge(user_challenge_id):
     try:
         user_id = get_jwt_identity()
         
-        # Verify that the user owns this challenge
-        user_challenge = UserChallenge.query.filter_by(
+        # Verify that the user owns this challenge (template loaded with it)
+        user_challenge = UserChallenge.query.options(joinedload(UserChallenge.challenge)).filter_by(
             id=user_challenge_id,
             user_id=user_id
         ).first()
@@ -108,13 +156,13 @@ def get_user_challenge(user_challenge_id):
         if not user_challenge:
             return jsonify({'error': 'Challenge not found or access denied'}), 404
         
+        # Serialized before the evaluation commits and expires the template
+        challenge_data = user_challenge.challenge.to_dict() if user_challenge.challenge else None
+        
         # Evaluate the challenge to get current status
         evaluation = challenge_service.evaluate_challenge(user_challenge)
         
-        # Helper serialization
-        data = user_challenge.to_dict()
-        if user_challenge.challenge:
-             data['challenge'] = user_challenge.challenge.to_dict()
+        data = _serialize_user_challenge(user_challenge, challenge_data)
 
         return jsonify({
             'user_challenge': data,
@@ -127,6 +175,7 @@ def get_user_challenge(user_challenge_id):
 
 @challenge_bp.route('/<int:user_challenge_id>/trade', methods=['POST'])
 @jwt_required()
+@idempotent
 def execute_trade(user_challenge_id):
     """Execute a market order for a user challenge."""
     try:
@@ -158,23 +207,20 @@ def execute_trade(user_challenge_id):
         if qty <= 0:
             return jsonify({'error': 'qty must be positive'}), 400
         
-        # Check trade quantity limit if challenge has one
-        if user_challenge.challenge.max_trade_quantity and qty > user_challenge.challenge.max_trade_quantity:
-            # 1. Set status to FAILED
-            user_challenge.status = 'FAILED'
-            
-            # 2. Add reason to violated_rules
-            current_rules = list(user_challenge.violated_rules) if user_challenge.violated_rules else []
-            if "Trade Quantity Limit Exceeded" not in current_rules:
-                current_rules.append("Trade Quantity Limit Exceeded")
-                user_challenge.violated_rules = current_rules
-            
-            db.session.commit()
-            
-            return jsonify({
-                'error': f'Challenge FAILED: Trade quantity {qty} exceeds limit of {user_challenge.challenge.max_trade_quantity}',
-                'user_challenge': user_challenge.to_dict()
-            }), 400
+        # Check the challenge's order rules (trade quantity limit, news blackout)
+        rejection = _check_order_rules(user_challenge, qty)
+        if rejection:
+            return rejection
+        
+        # Optionally refuse trades that would breach a loss limit, before anything is written
+        if Config.PRETRADE_REJECT_BREACHES:
+            state = pretrade_simulator.get_state(user_challenge_id)
+            what_if = pretrade_simulator.what_if(
+                state, instrument_id, side, qty, challenge_service.market_data_service.peek_quote
+            )
+            breaches = [r for r in what_if['reasons'] if r['rule'] in ('daily_max_loss', 'total_max_loss')]
+            if breaches:
+                return jsonify({'error': breaches[0]['message'], 'what_if': what_if}), 422
         
         # Execute the trade
         trade = challenge_service.execute_trade(
@@ -184,10 +230,246 @@ def execute_trade(user_challenge_id):
             qty
         )
         
-        return jsonify({
+        response = {
             'message': 'Trade executed successfully',
             'trade': trade.to_dict(),
             'user_challenge': user_challenge.to_dict()
+        }
+        
+        # Optionally attach SL/TP to the resulting position
+        if data.get('stop_loss') is not None or data.get('take_profit') is not None:
+            position = Position.query.filter_by(
+                user_challenge_id=user_challenge_id,
+                instrument_id=instrument_id
+            ).first()
+            try:
+                if not position:
+                    raise ValueError('Trade left no open position to protect')
+                position = protection_service.set_protection(
+                    position,
+                    stop_loss=_optional_price(data, 'stop_loss'),
+                    take_profit=_optional_price(data, 'take_profit')
+                )
+                response['position'] = position.to_dict()
+            except ValueError as e:
+                # The trade stands; report why the levels were not attached
+                response['protection_error'] = str(e)
+        
+        return jsonify(response), 200
+    
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@challenge_bp.route('/<int:user_challenge_id>/what-if', methods=['POST'])
+@jwt_required()
+def what_if_trade(user_challenge_id):
+    """Simulate a market order without executing it (for the order ticket)."""
+    try:
+        user_id = get_jwt_identity()
+        data = request.get_json()
+        
+        if not data:
+            return jsonify({'error': 'No data provided'}), 400
+        
+        # Ownership is checked against the cached state, keeping the hot path off the database
+        state = pretrade_simulator.get_state(user_challenge_id)
+        if not state or str(state.user_id) != str(user_id):
+            return jsonify({'error': 'Challenge not found or access denied'}), 404
+        
+        instrument_id = data.get('instrument_id')
+        side = data.get('side')
+        qty = float(data.get('qty') or 0)
+        
+        if not instrument_id or not side:
+            return jsonify({'error': 'instrument_id, side, and qty are required'}), 400
+        
+        if side not in ['BUY', 'SELL']:
+            return jsonify({'error': 'side must be BUY or SELL'}), 400
+        
+        if qty <= 0:
+            return jsonify({'error': 'qty must be positive'}), 400
+        
+        result = pretrade_simulator.what_if(
+            state, int(instrument_id), side, qty, challenge_service.market_data_service.peek_quote
+        )
+        return jsonify(result), 200
+    
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@challenge_bp.route('/<int:user_challenge_id>/orders', methods=['POST'])
+@jwt_required()
+@idempotent
+def place_order(user_challenge_id):
+    """Place a resting limit, stop or stop-limit order for a user challenge."""
+    try:
+        user_id = get_jwt_identity()
+        data = request.get_json()
+        
+        if not data:
+            return jsonify({'error': 'No data provided'}), 400
+        
+        # Verify that the user owns this challenge
+        user_challenge = UserChallenge.query.filter_by(
+            id=user_challenge_id,
+            user_id=user_id
+        ).first()
+        
+        if not user_challenge:
+            return jsonify({'error': 'Challenge not found or access denied'}), 404
+        
+        instrument_id = data.get('instrument_id')
+        side = data.get('side')
+        order_type = (data.get('order_type') or data.get('type') or '').upper()
+        
+        if not all([instrument_id, side, order_type, data.get('qty')]):
+            return jsonify({'error': 'instrument_id, side, order_type, and qty are required'}), 400
+        
+        qty = float(data.get('qty'))
+        limit_price = float(data['limit_price']) if data.get('limit_price') is not None else None
+        stop_price = float(data['stop_price']) if data.get('stop_price') is not None else None
+        
+        order = order_service.place_order(
+            user_challenge,
+            instrument_id,
+            side,
+            order_type,
+            qty,
+            limit_price=limit_price,
+            stop_price=stop_price
+        )
+        
+        return jsonify({
+            'message': 'Order placed successfully',
+            'order': order.to_dict()
+        }), 201
+    
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@challenge_bp.route('/<int:user_challenge_id>/orders/batch', methods=['POST'])
+@jwt_required()
+@idempotent
+def execute_batch(user_challenge_id):
+    """Execute several market orders in one transaction with a single evaluation."""
+    try:
+        user_id = get_jwt_identity()
+        data = request.get_json()
+        
+        if not data:
+            return jsonify({'error': 'No data provided'}), 400
+        
+        # Verify that the user owns this challenge
+        user_challenge = UserChallenge.query.filter_by(
+            id=user_challenge_id,
+            user_id=user_id
+        ).first()
+        
+        if not user_challenge:
+            return jsonify({'error': 'Challenge not found or access denied'}), 404
+        
+        orders = data.get('orders') or []
+        flatten_all = bool(data.get('flatten_all', False))
+        
+        if not isinstance(orders, list):
+            return jsonify({'error': 'orders must be a list'}), 400
+        
+        if not orders and not flatten_all:
+            return jsonify({'error': 'orders or flatten_all is required'}), 400
+        
+        if len(orders) > Config.BATCH_MAX_ORDERS:
+            return jsonify({'error': f'At most {Config.BATCH_MAX_ORDERS} orders per batch'}), 400
+        
+        # Check the challenge's order rules on every leg (flatten legs are exempt)
+        for index, order in enumerate(orders):
+            if not isinstance(order, dict):
+                return jsonify({'error': f'Order {index} must be an object'}), 400
+            try:
+                qty = float(order.get('qty') or 0)
+            except (TypeError, ValueError):
+                return jsonify({'error': f'Order {index}: qty must be a number'}), 400
+            rejection = _check_order_rules(user_challenge, qty)
+            if rejection:
+                return rejection
+        
+        trades, evaluation = challenge_service.execute_batch(user_challenge, orders, flatten_all=flatten_all)
+        
+        return jsonify({
+            'message': f'{len(trades)} orders executed successfully',
+            'trades': [trade.to_dict() for trade in trades],
+            'evaluation': evaluation,
+            'user_challenge': user_challenge.to_dict()
+        }), 200
+    
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@challenge_bp.route('/<int:user_challenge_id>/orders', methods=['GET'])
+@jwt_required()
+def get_orders(user_challenge_id):
+    """Get orders for a user challenge, optionally filtered by status."""
+    try:
+        user_id = get_jwt_identity()
+        
+        # Verify that the user owns this challenge
+        user_challenge = UserChallenge.query.filter_by(
+            id=user_challenge_id,
+            user_id=user_id
+        ).first()
+        
+        if not user_challenge:
+            return jsonify({'error': 'Challenge not found or access denied'}), 404
+        
+        limit, cursor = parse_page_args(request.args)
+        status = request.args.get('status')
+        orders, next_cursor = order_service.get_orders_page(user_challenge_id, limit, cursor, status)
+        
+        return jsonify({
+            'orders': [order.to_dict() for order in orders],
+            'total': order_service.count_orders(user_challenge_id, status),
+            'returned': len(orders),
+            'next_cursor': next_cursor
+        }), 200
+    
+    except ValueError as e:
+        return jsonify({'error': f'Invalid parameter: {str(e)}'}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@challenge_bp.route('/<int:user_challenge_id>/orders/<int:order_id>', methods=['DELETE'])
+@jwt_required()
+def cancel_order(user_challenge_id, order_id):
+    """Cancel an open order."""
+    try:
+        user_id = get_jwt_identity()
+        
+        # Verify that the user owns this challenge
+        user_challenge = UserChallenge.query.filter_by(
+            id=user_challenge_id,
+            user_id=user_id
+        ).first()
+        
+        if not user_challenge:
+            return jsonify({'error': 'Challenge not found or access denied'}), 404
+        
+        order = order_service.cancel_order(user_challenge_id, order_id)
+        
+        return jsonify({
+            'message': 'Order cancelled successfully',
+            'order': order.to_dict()
         }), 200
     
     except ValueError as e:
@@ -212,13 +494,64 @@ def get_positions(user_challenge_id):
         if not user_challenge:
             return jsonify({'error': 'Challenge not found or access denied'}), 404
         
-        positions = challenge_service.get_current_positions(user_challenge_id)
+        limit, cursor = parse_page_args(request.args)
+        positions, next_cursor = challenge_service.get_positions_page(user_challenge_id, limit, cursor)
         
         return jsonify({
             'positions': [pos.to_dict() for pos in positions],
-            'total': len(positions)
+            'total': challenge_service.count_positions(user_challenge_id),
+            'returned': len(positions),
+            'next_cursor': next_cursor
+        }), 200
+    
+    except ValueError as e:
+        return jsonify({'error': f'Invalid parameter: {str(e)}'}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@challenge_bp.route('/<int:user_challenge_id>/positions/<int:position_id>', methods=['PATCH'])
+@jwt_required()
+def update_position_protection(user_challenge_id, position_id):
+    """Set or clear the stop-loss / take-profit of an open position."""
+    try:
+        user_id = get_jwt_identity()
+        data = request.get_json()
+        
+        if not data:
+            return jsonify({'error': 'No data provided'}), 400
+        
+        # Verify that the user owns this challenge
+        user_challenge = UserChallenge.query.filter_by(
+            id=user_challenge_id,
+            user_id=user_id
+        ).first()
+        
+        if not user_challenge:
+            return jsonify({'error': 'Challenge not found or access denied'}), 404
+        
+        position = Position.query.filter_by(
+            id=position_id,
+            user_challenge_id=user_challenge_id
+        ).first()
+        
+        if not position:
+            return jsonify({'error': 'Position not found'}), 404
+        
+        # Omitted fields are left unchanged; null clears a level
+        position = protection_service.set_protection(
+            position,
+            stop_loss=_optional_price(data, 'stop_loss') if 'stop_loss' in data else UNCHANGED,
+            take_profit=_optional_price(data, 'take_profit') if 'take_profit' in data else UNCHANGED
+        )
+        
+        return jsonify({
+            'message': 'Position updated successfully',
+            'position': position.to_dict()
         }), 200
     
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -239,13 +572,18 @@ def get_trades(user_challenge_id):
         if not user_challenge:
             return jsonify({'error': 'Challenge not found or access denied'}), 404
         
-        trades = challenge_service.get_trade_history(user_challenge_id)
+        limit, cursor = parse_page_args(request.args)
+        trades, next_cursor = challenge_service.get_trade_history(user_challenge_id, limit, cursor)
         
         return jsonify({
             'trades': [trade.to_dict() for trade in trades],
-            'total': len(trades)
+            'total': challenge_service.count_trades(user_challenge_id),
+            'returned': len(trades),
+            'next_cursor': next_cursor
         }), 200
     
+    except ValueError as e:
+        return jsonify({'error': f'Invalid parameter: {str(e)}'}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -267,12 +605,41 @@ def get_equity_history(user_challenge_id):
             return jsonify({'error': 'Challenge not found or access denied'}), 404
         
         range_hours = int(request.args.get('range', 24))
+        if range_hours < 0:
+            return jsonify({'error': 'range must not be negative'}), 400
+        range_hours = min(range_hours, Config.EQUITY_RANGE_HOURS_MAX)
+        
+        # Raw snapshot paging when the client asks for it explicitly
+        if 'limit' in request.args or 'cursor' in request.args:
+            limit, cursor = parse_page_args(request.args)
+            snapshots, next_cursor = challenge_service.get_equity_page(user_challenge_id, range_hours, limit, cursor)
+            return jsonify({
+                'equity_history': [snapshot.to_dict() for snapshot in snapshots],
+                'total': challenge_service.count_equity_snapshots(user_challenge_id, range_hours),
+                'returned': len(snapshots),
+                'next_cursor': next_cursor,
+                'range_hours': range_hours
+            }), 200
+        
+        max_points = int(request.args.get('max_points', Config.EQUITY_MAX_POINTS))
+        method = request.args.get('method', 'lttb')
+        
+        if method not in ['lttb', 'ohlc']:
+            return jsonify({'error': 'method must be lttb or ohlc'}), 400
+        
+        # Bound the payload regardless of the requested range
+        max_points = max(3, min(max_points, Config.EQUITY_MAX_POINTS_LIMIT))
         
-        equity_history = challenge_service.get_equity_history(user_challenge_id, range_hours)
+        series = challenge_service.get_equity_series(user_challenge_id, range_hours, max_points, method)
         
         return jsonify({
-            'equity_history': [snapshot.to_dict() for snapshot in equity_history],
-            'total': len(equity_history),
+            'equity_history': series['points'],
+            'total': series['total'],
+            'returned': len(series['points']),
+            'downsampled': series['downsampled'],
+            'resolution': series['resolution'],
+            'method': method,
+            'max_points': max_points,
             'range_hours': range_hours
         }), 200
     
@@ -0,0 +1,58 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy.orm import joinedload
+from app.services.dashboard_service import DashboardService, parse_fields
+from app.models import UserChallenge
+from app.config import Config
+
+dashboard_bp = Blueprint('dashboard', __name__, url_prefix='/dashboard')
+dashboard_service = DashboardService()
+
+
+@dashboard_bp.route('/<int:user_challenge_id>', methods=['GET'])
+@jwt_required()
+def get_dashboard(user_challenge_id):
+    """Get the whole trading dashboard of a user challenge in one request."""
+    try:
+        user_id = get_jwt_identity()
+
+        fields = parse_fields(request.args.get('fields'))
+        instrument_id = request.args.get('instrument_id')
+        instrument_id = int(instrument_id) if instrument_id else None
+        timeframe = request.args.get('timeframe', '1h')
+        ohlcv_limit = int(request.args.get('ohlcv_limit', 100))
+        trades_limit = int(request.args.get('trades_limit', 50))
+        range_hours = int(request.args.get('range', 24))
+        max_points = int(request.args.get('max_points', Config.EQUITY_MAX_POINTS))
+
+        if ohlcv_limit <= 0 or trades_limit <= 0:
+            return jsonify({'error': 'ohlcv_limit and trades_limit must be positive'}), 400
+        if range_hours < 0:
+            return jsonify({'error': 'range must not be negative'}), 400
+
+        # Verify that the user owns this challenge (template loaded with it)
+        user_challenge = UserChallenge.query.options(joinedload(UserChallenge.challenge)).filter_by(
+            id=user_challenge_id,
+            user_id=user_id
+        ).first()
+
+        if not user_challenge:
+            return jsonify({'error': 'Challenge not found or access denied'}), 404
+
+        dashboard = dashboard_service.build(
+            user_challenge, fields,
+            instrument_id=instrument_id,
+            timeframe=timeframe,
+            ohlcv_limit=min(ohlcv_limit, Config.OHLCV_LIMIT_MAX),
+            trades_limit=min(trades_limit, Config.PAGE_SIZE_MAX),
+            range_hours=min(range_hours, Config.EQUITY_RANGE_HOURS_MAX),
+            max_points=max(3, min(max_points, Config.EQUITY_MAX_POINTS_LIMIT))
+        )
+        dashboard['fields'] = fields
+
+        return jsonify(dashboard), 200
+
+    except ValueError as e:
+        return jsonify({'error': f'Invalid parameter: {str(e)}'}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
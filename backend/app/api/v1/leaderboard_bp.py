@@ -1,28 +1,92 @@
 from flask import Blueprint, request, jsonify
 from app.services import LeaderboardService
+from app.services.leaderboard_service import month_period, ALL_TIME
+from app.services.rank_index import leaderboard_ranks
+from app.services.percentile_service import percentile_service
+from app.services.trading_leaderboard_service import (
+    TradingLeaderboardService, TRADING_LEADERBOARD_TAG, INSTRUMENT, ASSET_CLASS
+)
+from app.utils import parse_page_args
+from app.utils.response_cache import response_cache, cached_response
 
 leaderboard_bp = Blueprint('leaderboard', __name__, url_prefix='/leaderboard')
 leaderboard_service = LeaderboardService()
 
+# Response cache tag of every leaderboard endpoint
+LEADERBOARD_TAG = 'leaderboard'
+# Archived months are immutable, so browsers and proxies may keep them
+ARCHIVE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Percentiles move with every equity tick; their cached responses only expire
+PERCENTILE_TAG = 'percentile'
+# Oldest year a monthly board may be asked for
+EARLIEST_YEAR = 2000
+
+
+def _invalidate_responses(user_id, standings):
+    """Drop cached leaderboard responses whenever standings are refreshed."""
+    response_cache.invalidate(LEADERBOARD_TAG)
+
+
+@leaderboard_bp.record_once
+def _subscribe(state):
+    LeaderboardService.add_standings_listener(_invalidate_responses)
+
+
+def _year_month_args():
+    """
+    (year, month) from ?year=&month=, either None when not given.
+
+    Raises:
+        ValueError: If the month is not 1-12 or the year is outside
+            EARLIEST_YEAR up to the current year
+    """
+    year_str = request.args.get('year')
+    month_str = request.args.get('month')
+    year = int(year_str) if year_str and year_str.strip() else None
+    month = int(month_str) if month_str and month_str.strip() else None
+    if month is not None and not 1 <= month <= 12:
+        raise ValueError('month must be between 1 and 12')
+    current_year = LeaderboardService.current_month()[0]
+    if year is not None and not EARLIEST_YEAR <= year <= current_year:
+        raise ValueError(f'year must be between {EARLIEST_YEAR} and {current_year}')
+    return year, month
+
+
+def _period_arg() -> str:
+    """Period from ?period=all or ?year=&month= (default: the current month)."""
+    if request.args.get('period') == ALL_TIME:
+        return ALL_TIME
+    year, month = _year_month_args()
+    period_year, period_month = (year, month) if year and month else LeaderboardService.current_month()
+    return month_period(period_year, period_month)
+
 
 @leaderboard_bp.route('/monthly', methods=['GET'])
+@cached_response(LEADERBOARD_TAG)
 def get_monthly_leaderboard():
     """Get monthly leaderboard."""
     try:
-        year_str = request.args.get('year')
-        month_str = request.args.get('month')
+        year, month = _year_month_args()
         
-        # Convert to int if provided and not empty
-        year = int(year_str) if year_str and year_str.strip() else None
-        month = int(month_str) if month_str and month_str.strip() else None
+        limit, cursor = parse_page_args(request.args, default_limit=10)
         
-        leaderboard = leaderboard_service.get_monthly_leaderboard(year, month)
+        period_year, period_month = (year, month) if year and month else LeaderboardService.current_month()
+        period = month_period(period_year, period_month)
+        leaderboard, next_cursor = leaderboard_service.get_page(period, limit, cursor)
+        archived = leaderboard_service.archived_standings(period)
         
-        return jsonify({
+        response = jsonify({
             'leaderboard': leaderboard,
             'month': month,
-            'year': year
-        }), 200
+            'year': year,
+            'next_cursor': next_cursor,
+            'total_estimate': len(archived) if archived is not None else leaderboard_ranks.count(period),
+            'archived': archived is not None
+        })
+        if archived is not None:
+            # Closed months never change once archived
+            response.headers['Cache-Control'] = ARCHIVE_CACHE_CONTROL
+        return response, 200
     
     except ValueError as e:
         return jsonify({'error': f'Invalid parameter: {str(e)}'}), 400
@@ -31,40 +95,101 @@ def get_monthly_leaderboard():
 
 
 @leaderboard_bp.route('/all-time', methods=['GET'])
+@cached_response(LEADERBOARD_TAG)
 def get_all_time_leaderboard():
     """Get all-time leaderboard."""
     try:
-        leaderboard = leaderboard_service.get_all_time_leaderboard()
+        limit, cursor = parse_page_args(request.args, default_limit=10)
+        leaderboard, next_cursor = leaderboard_service.get_page(ALL_TIME, limit, cursor)
         
         return jsonify({
-            'leaderboard': leaderboard
+            'leaderboard': leaderboard,
+            'next_cursor': next_cursor,
+            'total_estimate': leaderboard_ranks.count(ALL_TIME)
         }), 200
     
+    except ValueError as e:
+        return jsonify({'error': f'Invalid parameter: {str(e)}'}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
 @leaderboard_bp.route('/user-ranking', methods=['GET'])
+@cached_response(LEADERBOARD_TAG)
 def get_user_ranking():
     """Get a specific user's ranking."""
     try:
         user_id_str = request.args.get('user_id')
-        year_str = request.args.get('year')
-        month_str = request.args.get('month')
         
         if not user_id_str:
             return jsonify({'error': 'user_id is required'}), 400
         
         # Convert to int
         user_id = int(user_id_str)
-        year = int(year_str) if year_str and year_str.strip() else None
-        month = int(month_str) if month_str and month_str.strip() else None
+        year, month = _year_month_args()
+        around = min(int(request.args.get('around', 0)), 50)
         
-        ranking = leaderboard_service.get_user_ranking(user_id, year, month)
+        ranking = leaderboard_service.get_user_ranking(user_id, year, month, around=around)
         
         return jsonify(ranking), 200
     
     except ValueError as e:
         return jsonify({'error': f'Invalid parameter: {str(e)}'}), 400
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
+
+
+@leaderboard_bp.route('/percentile', methods=['GET'])
+@cached_response(PERCENTILE_TAG)
+def get_percentile():
+    """Get the approximate percentile of a profit among a period's challenges."""
+    try:
+        profit_str = request.args.get('profit_pct')
+        if not profit_str:
+            return jsonify({'error': 'profit_pct is required'}), 400
+        
+        profit = float(profit_str)
+        challenge_str = request.args.get('challenge_id')
+        
+        period = _period_arg()
+        challenge_id = int(challenge_str) if challenge_str and challenge_str.strip() else None
+        
+        return jsonify(percentile_service.percentile(profit, period, challenge_id)), 200
+    
+    except ValueError as e:
+        return jsonify({'error': f'Invalid parameter: {str(e)}'}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+def _trading_board(scope: str, scope_key: str):
+    try:
+        limit, cursor = parse_page_args(request.args, default_limit=10)
+        period = _period_arg()
+        leaderboard, next_cursor = TradingLeaderboardService.get_page(scope, scope_key, period, limit, cursor)
+        
+        return jsonify({
+            'leaderboard': leaderboard,
+            'period': period,
+            scope: scope_key,
+            'next_cursor': next_cursor
+        }), 200
+    
+    except ValueError as e:
+        return jsonify({'error': f'Invalid parameter: {str(e)}'}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@leaderboard_bp.route('/instruments/<int:instrument_id>', methods=['GET'])
+@cached_response(TRADING_LEADERBOARD_TAG)
+def get_instrument_leaderboard(instrument_id):
+    """Get the realized PnL leaderboard of one instrument."""
+    return _trading_board(INSTRUMENT, str(instrument_id))
+
+
+@leaderboard_bp.route('/asset-classes/<asset_class>', methods=['GET'])
+@cached_response(TRADING_LEADERBOARD_TAG)
+def get_asset_class_leaderboard(asset_class):
+    """Get the realized PnL leaderboard of one asset class (FX, CRYPTO, STOCK)."""
+    return _trading_board(ASSET_CLASS, asset_class.upper())
@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.models import Payment, User, Challenge, UserChallenge
+from app.services.percentile_service import percentile_service
 from app import db
 from datetime import datetime, timedelta
 import random
@@ -107,6 +108,7 @@ def mock_confirm(payment_id):
         )
         
         db.session.add(user_challenge)
+        percentile_service.on_equity_change(user_challenge, None, starting_capital)
         db.session.commit()
         
         return jsonify({
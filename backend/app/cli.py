@@ -0,0 +1,99 @@
+import click
+
+
+def register_commands(app):
+    """Register maintenance commands on the Flask CLI."""
+
+    @app.cli.command('prune-snapshots')
+    @click.option('--days', type=int, default=None, help='Days of raw snapshots to keep')
+    def prune_snapshots_command(days):
+        """Delete raw equity snapshots, minute rollups and quote ticks past retention."""
+        from app.tasks import prune_equity_snapshots, prune_minute_rollups, prune_quote_ticks
+        snapshots = prune_equity_snapshots(days)
+        rollups = prune_minute_rollups()
+        ticks = prune_quote_ticks()
+        click.echo(f"Deleted {snapshots} snapshots, {rollups} minute rollups and {ticks} quote ticks")
+
+    @app.cli.command('rebuild-equity-rollups')
+    @click.option('--user-challenge-id', type=int, default=None, help='Only rebuild this challenge')
+    @click.option('--days', type=int, default=None, help='Days of raw snapshots kept by pruning')
+    def rebuild_equity_rollups_command(user_challenge_id, days):
+        """Recompute equity rollups from the raw snapshots on disk."""
+        from app.services.equity_rollup_service import EquityRollupService
+        processed = EquityRollupService.rebuild(user_challenge_id, retention_days=days)
+        click.echo(f"Folded {processed} snapshots into rollups")
+
+    @app.cli.command('rebuild-exposure')
+    def rebuild_exposure_command():
+        """Recompute firm-wide instrument exposure from open positions."""
+        from app.services.exposure_service import ExposureService
+        instruments = ExposureService.rebuild()
+        click.echo(f"Rebuilt exposure for {instruments} instruments")
+
+    @app.cli.command('rebuild-leaderboards')
+    def rebuild_leaderboards_command():
+        """Recompute the materialized monthly and all-time leaderboards."""
+        from app.services.leaderboard_service import LeaderboardService
+        entries = LeaderboardService.rebuild()
+        click.echo(f"Rebuilt leaderboards with {entries} entries")
+
+    @app.cli.command('archive-leaderboard')
+    @click.option('--year', type=int, required=True)
+    @click.option('--month', type=int, required=True)
+    def archive_leaderboard_command(year, month):
+        """Freeze a closed month's final standings (kept if already archived)."""
+        from app.services.leaderboard_service import LeaderboardService, month_period
+        try:
+            entries = LeaderboardService().close_month(month_period(year, month))
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        click.echo(f"Archived {month_period(year, month)} with {entries} entries")
+
+    @app.cli.command('rebuild-trading-leaderboards')
+    def rebuild_trading_leaderboards_command():
+        """Recompute the instrument and asset-class leaderboards from the trades."""
+        from app.services.trading_leaderboard_service import TradingLeaderboardService
+        entries = TradingLeaderboardService.rebuild()
+        click.echo(f"Rebuilt trading leaderboards with {entries} entries")
+
+    @app.cli.command('rebuild-percentiles')
+    def rebuild_percentiles_command():
+        """Recompute the shared profit sketches behind the percentile lookups."""
+        from app.services.percentile_service import percentile_service
+        buckets = percentile_service.rebuild()
+        click.echo(f"Rebuilt profit sketches with {buckets} buckets")
+
+    @app.cli.command('roll-daily-equity')
+    def roll_daily_equity_command():
+        """Start the current Casablanca trading day for challenges not yet rolled over."""
+        from app.tasks import roll_over_daily_equity
+        rolled = roll_over_daily_equity()
+        click.echo(f"Rolled over {rolled} challenges")
+
+    @app.cli.command('replay-challenges')
+    @click.option('--user-challenge-id', type=int, multiple=True, help='Only replay these challenges')
+    @click.option('--status', default=None, help='Only replay challenges in this status')
+    @click.option('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    @click.option('--apply', is_flag=True, help='Write the recomputed state back')
+    def replay_challenges_command(user_challenge_id, status, workers, apply):
+        """Recompute challenges from their trade log and quote tape."""
+        from app import db
+        from app.models import UserChallenge
+        from app.services.replay_service import ReplayService
+        results = ReplayService.run(user_challenge_id or None, status=status, workers=workers, apply=apply)
+        current = dict(db.session.query(UserChallenge.id, UserChallenge.status).filter(
+            UserChallenge.id.in_([r['user_challenge_id'] for r in results])
+        ).all()) if not apply else {}
+
+        for result in results:
+            if not apply and current.get(result['user_challenge_id']) != result['status']:
+                click.echo(f"#{result['user_challenge_id']}: {current.get(result['user_challenge_id'])} -> "
+                           f"{result['status']} at {result['status_at']} "
+                           f"(equity {result['current_equity']:.2f})")
+        if apply and results:
+            from app.services.leaderboard_service import LeaderboardService
+            from app.services.percentile_service import percentile_service
+            LeaderboardService.rebuild()
+            percentile_service.rebuild()
+        action = 'Replayed and updated' if apply else 'Replayed (dry run)'
+        click.echo(f"{action} {len(results)} challenges")
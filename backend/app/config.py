@@ -21,7 +21,67 @@ class Config:
     # Cache TTLs (in seconds)
     QUOTE_CACHE_TTL = int(os.environ.get('QUOTE_CACHE_TTL', 1))  # 1 second
     OHLCV_CACHE_TTL = int(os.environ.get('OHLCV_CACHE_TTL', 60))  # 60 seconds
-    
+
+    # Equity snapshot write policy
+    SNAPSHOT_MIN_INTERVAL_SECONDS = int(os.environ.get('SNAPSHOT_MIN_INTERVAL_SECONDS', 30))
+    SNAPSHOT_MIN_EQUITY_CHANGE = float(os.environ.get('SNAPSHOT_MIN_EQUITY_CHANGE', 0.0005))  # 0.05%
+    SNAPSHOT_HEARTBEAT_SECONDS = int(os.environ.get('SNAPSHOT_HEARTBEAT_SECONDS', 900))  # 15 minutes
+
+    # Write-behind buffer for append-only rows
+    WRITE_BUFFER_ENABLED = os.environ.get('WRITE_BUFFER_ENABLED', 'true').lower() == 'true'
+    WRITE_BUFFER_MAX_SIZE = int(os.environ.get('WRITE_BUFFER_MAX_SIZE', 10000))
+    WRITE_BUFFER_BATCH_SIZE = int(os.environ.get('WRITE_BUFFER_BATCH_SIZE', 500))
+    WRITE_BUFFER_FLUSH_MS = int(os.environ.get('WRITE_BUFFER_FLUSH_MS', 250))
+
+    # Equity history downsampling
+    EQUITY_MAX_POINTS = int(os.environ.get('EQUITY_MAX_POINTS', 1000))  # Default points per response
+    EQUITY_MAX_POINTS_LIMIT = int(os.environ.get('EQUITY_MAX_POINTS_LIMIT', 5000))  # Hard cap
+    EQUITY_RANGE_HOURS_MAX = int(os.environ.get('EQUITY_RANGE_HOURS_MAX', 24 * 365))  # Longest equity history range (dashboard and /equity)
+    OHLCV_LIMIT_MAX = int(os.environ.get('OHLCV_LIMIT_MAX', 1000))  # Most bars per dashboard response
+
+    # Equity retention and rollups
+    EQUITY_RAW_HISTORY_HOURS = int(os.environ.get('EQUITY_RAW_HISTORY_HOURS', 24))  # Longer ranges read rollups
+    EQUITY_SNAPSHOT_RETENTION_DAYS = int(os.environ.get('EQUITY_SNAPSHOT_RETENTION_DAYS', 7))
+    EQUITY_ROLLUP_MINUTE_RETENTION_DAYS = int(os.environ.get('EQUITY_ROLLUP_MINUTE_RETENTION_DAYS', 30))
+
+    # Keyset pagination
+    PAGE_SIZE_DEFAULT = int(os.environ.get('PAGE_SIZE_DEFAULT', 100))
+    PAGE_SIZE_MAX = int(os.environ.get('PAGE_SIZE_MAX', 500))
+
+    # Orders
+    ORDER_BOOK_SYNC_SECONDS = int(os.environ.get('ORDER_BOOK_SYNC_SECONDS', 5))  # Pick up orders from other workers
+    BATCH_MAX_ORDERS = int(os.environ.get('BATCH_MAX_ORDERS', 50))  # Legs per /orders/batch request
+    PROTECTION_SYNC_SECONDS = int(os.environ.get('PROTECTION_SYNC_SECONDS', 5))  # Pick up SL/TP changes from other workers
+    EVENT_WORKER_ENABLED = os.environ.get('EVENT_WORKER_ENABLED', 'true').lower() == 'true'  # Persist fills/triggers off the request path
+
+    # Pre-trade what-if checks
+    PRETRADE_STATE_TTL_MS = int(os.environ.get('PRETRADE_STATE_TTL_MS', 2000))  # Cached portfolio state per challenge
+    PRETRADE_WARN_HEADROOM = float(os.environ.get('PRETRADE_WARN_HEADROOM', 0.2))  # Warn below 20% of a loss limit left
+    PRETRADE_REJECT_BREACHES = os.environ.get('PRETRADE_REJECT_BREACHES', 'false').lower() == 'true'  # Refuse breaching trades
+
+    # Quote tape (recorded quotes used to replay challenges)
+    QUOTE_TAPE_ENABLED = os.environ.get('QUOTE_TAPE_ENABLED', 'true').lower() == 'true'
+    QUOTE_TAPE_MIN_INTERVAL_MS = int(os.environ.get('QUOTE_TAPE_MIN_INTERVAL_MS', 1000))  # Per instrument
+    QUOTE_TAPE_RETENTION_DAYS = int(os.environ.get('QUOTE_TAPE_RETENTION_DAYS', 90))
+
+    # Idempotency-Key handling for order submission
+    IDEMPOTENCY_BACKEND = os.environ.get('IDEMPOTENCY_BACKEND', 'memory')  # 'memory' or 'redis'
+    IDEMPOTENCY_TTL_SECONDS = int(os.environ.get('IDEMPOTENCY_TTL_SECONDS', 86400))  # 24 hours
+    IDEMPOTENCY_LOCK_SECONDS = int(os.environ.get('IDEMPOTENCY_LOCK_SECONDS', 60))  # Lease of a request in flight
+    IDEMPOTENCY_MAX_KEYS = int(os.environ.get('IDEMPOTENCY_MAX_KEYS', 10000))  # In-process store bound
+
+    # Background jobs (Casablanca-midnight daily equity rollover)
+    SCHEDULER_ENABLED = os.environ.get('SCHEDULER_ENABLED', 'true').lower() == 'true'  # One process runs the jobs (advisory lock on PostgreSQL)
+    RISK_SWEEP_INTERVAL_SECONDS = int(os.environ.get('RISK_SWEEP_INTERVAL_SECONDS', 60))  # 0 disables the book sweep
+    EXPOSURE_REBUILD_SECONDS = int(os.environ.get('EXPOSURE_REBUILD_SECONDS', 300))  # Reconcile exposure; 0 disables
+    RESPONSE_CACHE_ENABLED = os.environ.get('RESPONSE_CACHE_ENABLED', 'true').lower() == 'true'
+    RESPONSE_CACHE_MAX_AGE_SECONDS = int(os.environ.get('RESPONSE_CACHE_MAX_AGE_SECONDS', 30))  # Bounds staleness across workers
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 1000))
+    LEADERBOARD_RANK_TTL_SECONDS = int(os.environ.get('LEADERBOARD_RANK_TTL_SECONDS', 60))  # Reload interval of the in-memory rank index
+    QUERY_BUDGET_PER_REQUEST = int(os.environ.get('QUERY_BUDGET_PER_REQUEST', 0))  # Log requests running more SQL statements; 0 disables
+    PERCENTILE_SKETCH_TTL_SECONDS = int(os.environ.get('PERCENTILE_SKETCH_TTL_SECONDS', 60))  # Reload interval of the shared profit sketches
+    PERCENTILE_REBUILD_SECONDS = int(os.environ.get('PERCENTILE_REBUILD_SECONDS', 3600))  # Reconcile profit sketches; 0 disables
+
     # Timezone
     TIMEZONE = os.environ.get('TIMEZONE', 'Africa/Casablanca')
     
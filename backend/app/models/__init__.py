@@ -1,9 +1,15 @@
 from app.models.user import User
 from app.models.instrument import Instrument
-from app.models.challenge import Challenge, UserChallenge
+from app.models.challenge import Challenge, UserChallenge, ACTIVE_STATUSES
 from app.models.position import Position
 from app.models.trade import Trade
+from app.models.order import Order
 from app.models.equity_snapshot import EquitySnapshot
+from app.models.equity_rollup import EquityRollup
+from app.models.quote_tick import QuoteTick
+from app.models.exposure import InstrumentExposure
+from app.models.leaderboard import LeaderboardEntry, TradingLeaderboardEntry, LeaderboardArchive
+from app.models.profit_sketch import ProfitSketchBucket
 from app.models.watchlist import Watchlist, WatchlistItem
 from app.models.learning import LearningModule, LearningLesson, Quiz, QuizAttempt, LearningProgress
 from app.models.payment import Payment
@@ -13,9 +19,18 @@ __all__ = [
     'Instrument',
     'Challenge',
     'UserChallenge',
+    'ACTIVE_STATUSES',
     'Position',
     'Trade',
+    'Order',
     'EquitySnapshot',
+    'EquityRollup',
+    'QuoteTick',
+    'InstrumentExposure',
+    'LeaderboardEntry',
+    'TradingLeaderboardEntry',
+    'LeaderboardArchive',
+    'ProfitSketchBucket',
     'Watchlist',
     'WatchlistItem',
     'LearningModule',
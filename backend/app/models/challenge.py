@@ -3,6 +3,9 @@ from app.models.base import BaseModel
 from sqlalchemy import String, Boolean, Float, Integer, DateTime, JSON
 from datetime import datetime
 
+# Statuses of a user challenge that is still trading
+ACTIVE_STATUSES = ('IN_PROGRESS', 'ACTIVE')
+
 
 class Challenge(BaseModel):
     __tablename__ = 'challenges'
@@ -37,12 +40,14 @@ class UserChallenge(BaseModel):
     start_time = db.Column(DateTime, nullable=False, default=datetime.utcnow)
     end_time = db.Column(DateTime, nullable=True)
     daily_start_equity = db.Column(Float, default=0.0)  # Equity at start of current day
+    daily_reset_at = db.Column(DateTime, nullable=True)  # Casablanca midnight (UTC) of the last day rollover
     current_equity = db.Column(Float, default=0.0)
     max_equity = db.Column(Float, default=0.0)
     min_equity = db.Column(Float, default=float('inf'))
     min_equity_all_time = db.Column(Float, default=float('inf'))
     min_equity_today = db.Column(Float, default=float('inf'))
     last_eval_at = db.Column(DateTime, nullable=True)
+    sketch_period = db.Column(String(7), nullable=True)  # Latest month the profit sketches count this challenge in
     stats_json = db.Column(JSON, nullable=True)  # Additional stats
     
     # Rule violations and flagging
@@ -52,7 +57,16 @@ class UserChallenge(BaseModel):
     # Relationships
     positions = db.relationship('Position', backref='user_challenge', lazy=True, cascade='all, delete-orphan')
     trades = db.relationship('Trade', backref='user_challenge', lazy=True, cascade='all, delete-orphan')
+    orders = db.relationship('Order', backref='user_challenge', lazy=True, cascade='all, delete-orphan')
     equity_snapshots = db.relationship('EquitySnapshot', backref='user_challenge', lazy=True, cascade='all, delete-orphan')
+    equity_rollups = db.relationship('EquityRollup', backref='user_challenge', lazy=True, cascade='all, delete-orphan')
+    
+    __table_args__ = (
+        db.Index('ix_user_challenges_status_window', 'status', 'start_time', 'end_time'),
+        db.Index('ix_user_challenges_user_status_created', 'user_id', 'status', 'created_at'),
+        db.Index('ix_user_challenges_user_created', 'user_id', 'created_at'),
+        db.Index('ix_user_challenges_challenge_status', 'challenge_id', 'status'),
+    )
     
     def to_dict(self):
         data = super().to_dict()
@@ -0,0 +1,25 @@
+from app import db
+from app.models.base import BaseModel
+from sqlalchemy import String, Float, Integer, DateTime
+
+
+class EquityRollup(BaseModel):
+    __tablename__ = 'equity_rollups'
+    
+    user_challenge_id = db.Column(Integer, db.ForeignKey('user_challenges.id'), nullable=False)
+    resolution = db.Column(String(4), nullable=False)  # '1m', '1h', '1d'
+    bucket_start = db.Column(DateTime, nullable=False)  # UTC start of the bucket
+    
+    open = db.Column(Float, nullable=False)
+    high = db.Column(Float, nullable=False)
+    low = db.Column(Float, nullable=False)
+    close = db.Column(Float, nullable=False)
+    samples = db.Column(Integer, nullable=False, default=0)  # Raw snapshots folded in
+    
+    __table_args__ = (
+        db.UniqueConstraint('user_challenge_id', 'resolution', 'bucket_start', name='uq_equity_rollups_bucket'),
+    )
+    
+    def to_dict(self):
+        data = super().to_dict()
+        return data
@@ -14,6 +14,10 @@ class EquitySnapshot(BaseModel):
     unrealized_pnl = db.Column(Float, nullable=False)
     ts = db.Column(DateTime, nullable=False)
     
+    __table_args__ = (
+        db.Index('ix_equity_snapshots_challenge_ts', 'user_challenge_id', 'ts'),
+    )
+    
     def to_dict(self):
         data = super().to_dict()
         return data
\ No newline at end of file
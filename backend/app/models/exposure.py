@@ -0,0 +1,42 @@
+from datetime import datetime
+from app import db
+from sqlalchemy import Float, Integer, DateTime
+
+
+class InstrumentExposure(db.Model):
+    """
+    Firm-wide open quantity per instrument across active challenges,
+    maintained incrementally on every fill.
+
+    Long and short legs are kept separately, each with its cost basis
+    (sum of qty * avg_price), so net and gross exposure and the book's
+    unrealized PnL can be valued from a quote without touching positions.
+    """
+    __tablename__ = 'instrument_exposures'
+
+    instrument_id = db.Column(Integer, db.ForeignKey('instruments.id'), primary_key=True)
+    long_qty = db.Column(Float, nullable=False, default=0.0)
+    short_qty = db.Column(Float, nullable=False, default=0.0)
+    long_cost = db.Column(Float, nullable=False, default=0.0)
+    short_cost = db.Column(Float, nullable=False, default=0.0)
+    updated_at = db.Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    @property
+    def net_qty(self) -> float:
+        return self.long_qty - self.short_qty
+
+    @property
+    def gross_qty(self) -> float:
+        return self.long_qty + self.short_qty
+
+    def to_dict(self):
+        return {
+            'instrument_id': self.instrument_id,
+            'long_qty': self.long_qty,
+            'short_qty': self.short_qty,
+            'net_qty': self.net_qty,
+            'gross_qty': self.gross_qty,
+            'long_cost': self.long_cost,
+            'short_cost': self.short_cost,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
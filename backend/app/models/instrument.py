@@ -21,6 +21,7 @@ class Instrument(BaseModel):
     # Relationships
     positions = db.relationship('Position', backref='instrument', lazy=True)
     trades = db.relationship('Trade', backref='instrument', lazy=True)
+    orders = db.relationship('Order', backref='instrument', lazy=True)
     watchlist_items = db.relationship('WatchlistItem', backref='instrument', lazy=True, cascade='all, delete-orphan')
     equity_snapshots = db.relationship('EquitySnapshot', backref='instrument', lazy=True)
     
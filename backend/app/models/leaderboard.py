@@ -0,0 +1,78 @@
+from datetime import datetime
+from app import db
+from sqlalchemy import String, Float, Integer, DateTime, LargeBinary
+
+
+class LeaderboardEntry(db.Model):
+    """
+    Materialized leaderboard standing of one user in one period.
+
+    period is 'YYYY-MM' (Casablanca calendar month) for the monthly boards
+    and 'all' for the all-time board. Each row holds the user's best
+    qualifying challenge for the period; rows are refreshed whenever one of
+    the user's challenges changes status or equity, so reads are an indexed
+    top-K scan on (period, profit_pct).
+    """
+    __tablename__ = 'leaderboard_entries'
+
+    period = db.Column(String(7), primary_key=True)
+    user_id = db.Column(Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    user_challenge_id = db.Column(Integer, db.ForeignKey('user_challenges.id', ondelete='CASCADE'), nullable=False)
+    username = db.Column(String(120), nullable=False)
+    start_balance = db.Column(Float, nullable=False)
+    equity = db.Column(Float, nullable=False)
+    profit_pct = db.Column(Float, nullable=False)
+    challenge_status = db.Column(String(20), nullable=False)
+    start_time = db.Column(DateTime, nullable=True)
+    end_time = db.Column(DateTime, nullable=True)
+    updated_at = db.Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+# Matches the board order (best first, lowest user id on ties) so pages are index seeks
+db.Index('ix_leaderboard_entries_rank', LeaderboardEntry.period, LeaderboardEntry.profit_pct.desc(),
+         LeaderboardEntry.user_id)
+
+
+class TradingLeaderboardEntry(db.Model):
+    """
+    Realized trading results of one user on one instrument or asset class
+    in one period.
+
+    scope is 'instrument' (scope_key: instrument id) or 'asset_class'
+    (scope_key: e.g. 'CRYPTO'); period is 'YYYY-MM' or 'all' as for the
+    challenge boards. Counters are bumped by every fill, so a board read
+    never aggregates trades.
+    """
+    __tablename__ = 'trading_leaderboard_entries'
+
+    period = db.Column(String(7), primary_key=True)
+    scope = db.Column(String(12), primary_key=True)
+    scope_key = db.Column(String(20), primary_key=True)
+    user_id = db.Column(Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    realized_pnl = db.Column(Float, nullable=False, default=0.0)
+    trade_count = db.Column(Integer, nullable=False, default=0)
+    closed_count = db.Column(Integer, nullable=False, default=0)  # fills that realized PnL
+    win_count = db.Column(Integer, nullable=False, default=0)
+    updated_at = db.Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+db.Index('ix_trading_leaderboard_entries_rank', TradingLeaderboardEntry.period, TradingLeaderboardEntry.scope,
+         TradingLeaderboardEntry.scope_key, TradingLeaderboardEntry.realized_pnl.desc(),
+         TradingLeaderboardEntry.user_id)
+
+
+class LeaderboardArchive(db.Model):
+    """
+    Final standings of a closed month, frozen when the month closes.
+
+    standings is the zlib-compressed JSON list of the month's serialized
+    leaderboard entries, best first. Rows are written once and never
+    updated, so past months stay consistent whatever happens to the
+    challenges afterwards.
+    """
+    __tablename__ = 'leaderboard_archives'
+
+    period = db.Column(String(7), primary_key=True)
+    entry_count = db.Column(Integer, nullable=False)
+    standings = db.Column(LargeBinary, nullable=False)
+    closed_at = db.Column(DateTime, default=datetime.utcnow, nullable=False)
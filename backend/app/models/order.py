@@ -0,0 +1,31 @@
+from app import db
+from app.models.base import BaseModel
+from sqlalchemy import String, Float, Integer, DateTime
+
+
+class Order(BaseModel):
+    __tablename__ = 'orders'
+    
+    user_challenge_id = db.Column(Integer, db.ForeignKey('user_challenges.id'), nullable=False)
+    instrument_id = db.Column(Integer, db.ForeignKey('instruments.id'), nullable=False)
+    
+    side = db.Column(String(10), nullable=False)  # 'BUY' or 'SELL'
+    order_type = db.Column(String(20), nullable=False)  # 'LIMIT', 'STOP', 'STOP_LIMIT'
+    qty = db.Column(Float, nullable=False)
+    limit_price = db.Column(Float, nullable=True)
+    stop_price = db.Column(Float, nullable=True)
+    
+    status = db.Column(String(20), nullable=False, default='OPEN')  # OPEN, TRIGGERED, FILLING, FILLED, CANCELLED, REJECTED
+    trade_id = db.Column(Integer, db.ForeignKey('trades.id'), nullable=True)
+    triggered_at = db.Column(DateTime, nullable=True)
+    filled_at = db.Column(DateTime, nullable=True)
+    reject_reason = db.Column(String(200), nullable=True)
+    
+    __table_args__ = (
+        db.Index('ix_orders_challenge_created', 'user_challenge_id', 'created_at', 'id'),
+        db.Index('ix_orders_status_instrument', 'status', 'instrument_id'),
+    )
+    
+    def to_dict(self):
+        data = super().to_dict()
+        return data
@@ -15,6 +15,10 @@ class Payment(BaseModel):
     provider_transaction_id = db.Column(String(100), nullable=True)
     completed_at = db.Column(DateTime, nullable=True)
     
+    __table_args__ = (
+        db.Index('ix_payments_user_created', 'user_id', 'created_at'),
+    )
+    
     def to_dict(self):
         data = super().to_dict()
         return data
\ No newline at end of file
@@ -14,6 +14,15 @@ class Position(BaseModel):
     avg_price = db.Column(Float, nullable=False)
     opened_at = db.Column(DateTime, nullable=False)
     
+    # Attached protective levels, closed automatically when crossed
+    stop_loss = db.Column(Float, nullable=True)
+    take_profit = db.Column(Float, nullable=True)
+    
+    __table_args__ = (
+        db.Index('ix_positions_challenge_created', 'user_challenge_id', 'created_at', 'id'),
+        db.Index('ix_positions_updated', 'updated_at'),
+    )
+    
     def to_dict(self):
         data = super().to_dict()
         return data
\ No newline at end of file
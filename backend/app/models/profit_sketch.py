@@ -0,0 +1,21 @@
+from app import db
+from sqlalchemy import String, Float, Integer, SmallInteger
+
+
+class ProfitSketchBucket(db.Model):
+    """
+    One bucket of a shared profit distribution sketch.
+
+    A sketch is identified by (period, challenge_id): period is 'YYYY-MM'
+    or 'all' like the leaderboards, challenge_id is the challenge tier.
+    Each user challenge counts once, in the bucket of its current
+    profit_pct; counts are moved with additive UPDATEs, so every worker
+    updates and reads the same sketch.
+    """
+    __tablename__ = 'profit_sketch_buckets'
+
+    period = db.Column(String(7), primary_key=True)
+    challenge_id = db.Column(Integer, db.ForeignKey('challenges.id', ondelete='CASCADE'), primary_key=True)
+    sign = db.Column(SmallInteger, primary_key=True)  # -1 losses, 0 flat, 1 gains
+    bucket = db.Column(Integer, primary_key=True)  # logarithmic bucket of |profit_pct|
+    count = db.Column(Float, nullable=False, default=0.0)
@@ -0,0 +1,30 @@
+from app import db
+from sqlalchemy import Float, Integer, DateTime
+
+
+class QuoteTick(db.Model):
+    """
+    Recorded quote tape used to replay challenges. Append-only and high
+    volume, so it skips the BaseModel created_at/updated_at columns.
+    """
+    __tablename__ = 'quote_ticks'
+    
+    id = db.Column(Integer, primary_key=True)
+    instrument_id = db.Column(Integer, db.ForeignKey('instruments.id'), nullable=False)
+    ts = db.Column(DateTime, nullable=False)
+    bid = db.Column(Float, nullable=True)
+    ask = db.Column(Float, nullable=True)
+    last = db.Column(Float, nullable=False)
+    
+    __table_args__ = (
+        db.Index('ix_quote_ticks_instrument_ts', 'instrument_id', 'ts'),
+    )
+    
+    def to_dict(self):
+        return {
+            'instrument_id': self.instrument_id,
+            'ts': self.ts.isoformat() if self.ts else None,
+            'bid': self.bid,
+            'ask': self.ask,
+            'last': self.last
+        }
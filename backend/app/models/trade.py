@@ -15,6 +15,10 @@ class Trade(BaseModel):
     fee = db.Column(Float, default=0.0)
     realized_pnl = db.Column(Float, default=0.0)
     
+    __table_args__ = (
+        db.Index('ix_trades_challenge_created', 'user_challenge_id', 'created_at', 'id'),
+    )
+    
     def to_dict(self):
         data = super().to_dict()
         return data
\ No newline at end of file
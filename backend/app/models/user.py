@@ -27,6 +27,10 @@ class User(BaseModel):
     payments = db.relationship('Payment', backref='user', lazy=True, cascade='all, delete-orphan')
     learning_progress = db.relationship('LearningProgress', backref='user', lazy=True, cascade='all, delete-orphan')
     
+    __table_args__ = (
+        db.Index('ix_users_created', 'created_at'),
+    )
+    
     def set_password(self, password):
         self.password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
     
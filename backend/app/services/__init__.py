@@ -1,6 +1,7 @@
 from app.services.auth_service import AuthService
 from app.services.market_data_service import MarketDataService
 from app.services.risk_service import RiskService
+from app.services.book_risk_service import BookRiskService
 from app.services.challenge_service import ChallengeService
 from app.services.signals_service import SignalsService
 from app.services.leaderboard_service import LeaderboardService
@@ -9,6 +10,7 @@ __all__ = [
     'AuthService',
     'MarketDataService',
     'RiskService',
+    'BookRiskService',
     'ChallengeService',
     'SignalsService',
     'LeaderboardService'
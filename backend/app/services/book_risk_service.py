@@ -0,0 +1,364 @@
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional
+import numpy as np
+from sqlalchemy import bindparam, update, or_
+from app.models import UserChallenge, Challenge, ACTIVE_STATUSES
+from app.services.leaderboard_service import LeaderboardService
+from app.services.exposure_service import ExposureService
+from app.services.pretrade_service import pretrade_simulator
+from app.services.rule_engine import rule_engine, RuleSet, RuleContext, trade_history_context
+from app import db
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Status codes used inside the vectorized pass
+IN_PROGRESS, FAILED, PASSED = 0, 1, 2
+STATUS_NAMES = {FAILED: 'FAILED', PASSED: 'PASSED'}
+
+
+@dataclass
+class RiskBook:
+    """Risk columns of a set of challenges, one array element per challenge."""
+    user_challenge_id: np.ndarray
+    user_id: np.ndarray
+    status: np.ndarray  # object array of status strings
+    start_balance: np.ndarray
+    current_equity: np.ndarray
+    daily_start_equity: np.ndarray
+    min_equity_today: np.ndarray
+    min_equity_all_time: np.ndarray
+    max_equity: np.ndarray
+    daily_max_loss: np.ndarray
+    total_max_loss: np.ndarray
+    profit_target: np.ndarray
+    trailing_max_loss: Optional[np.ndarray] = None  # inf where the template has no trailing rule
+    challenge_id: Optional[np.ndarray] = None
+    rule_sets: Dict[int, RuleSet] = field(default_factory=dict)  # challenge_id -> compiled rules
+
+    def __len__(self):
+        return len(self.user_challenge_id)
+
+    @classmethod
+    def from_rows(cls, rows: List[tuple]) -> 'RiskBook':
+        """Build a book from (id, user_id, status, start_balance, current_equity,
+        daily_start_equity, min_equity_today, min_equity_all_time, max_equity,
+        daily_max_loss, total_max_loss, profit_target) rows."""
+        columns = list(zip(*rows)) if rows else [()] * 12
+
+        def floats(values, default=0.0):
+            return np.array([default if v is None else v for v in values], dtype=np.float64)
+
+        return cls(
+            user_challenge_id=np.array(columns[0], dtype=np.int64),
+            user_id=np.array(columns[1], dtype=np.int64),
+            status=np.array(columns[2], dtype=object),
+            start_balance=floats(columns[3]),
+            current_equity=floats(columns[4]),
+            daily_start_equity=floats(columns[5]),
+            min_equity_today=floats(columns[6], np.inf),
+            min_equity_all_time=floats(columns[7], np.inf),
+            max_equity=floats(columns[8]),
+            daily_max_loss=floats(columns[9], np.inf),
+            total_max_loss=floats(columns[10], np.inf),
+            profit_target=floats(columns[11], np.inf),
+        )
+
+
+def _ratio(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    # 0 where the denominator is 0, like the scalar helpers in app.utils
+    out = np.zeros_like(numerator)
+    np.divide(numerator, denominator, out=out, where=denominator != 0)
+    return out
+
+
+def evaluate_book(book: RiskBook) -> Dict[str, np.ndarray]:
+    """
+    Evaluate every challenge of a book in one vectorized pass.
+
+    Applies the same rules, in the same order of precedence, as
+    RiskService.evaluate_challenge_status: daily max loss, total max loss,
+    trailing drawdown, then profit target. Gate rules (minimum trading
+    days, consistency) need trade history and are checked afterwards, by
+    status_changes, for the pass candidates only.
+
+    Returns:
+        Dict of arrays: daily_drawdown, total_drawdown, profit_pct,
+        trailing_drawdown, sharpe_like, new_status (IN_PROGRESS/FAILED/PASSED
+        codes) and the daily_breach / total_breach / trailing_breach /
+        target_hit masks
+    """
+    daily_drawdown = _ratio(book.daily_start_equity - book.min_equity_today, book.daily_start_equity)
+    total_drawdown = _ratio(book.start_balance - book.min_equity_all_time, book.start_balance)
+    trailing_drawdown = _ratio(book.max_equity - book.current_equity, book.max_equity)
+    profit_pct = _ratio(book.current_equity - book.start_balance, book.start_balance)
+
+    trailing_max_loss = book.trailing_max_loss if book.trailing_max_loss is not None else np.inf
+
+    daily_breach = daily_drawdown >= book.daily_max_loss
+    total_breach = total_drawdown >= book.total_max_loss
+    trailing_breach = trailing_drawdown >= trailing_max_loss
+    target_hit = book.current_equity >= book.start_balance * (1 + book.profit_target)
+
+    failed = daily_breach | total_breach | trailing_breach
+    new_status = np.full(len(book), IN_PROGRESS, dtype=np.int8)
+    new_status[target_hit & ~failed] = PASSED
+    new_status[failed] = FAILED
+
+    # Same sharpe-like ratio as RiskService._calculate_sharpe_like
+    drawdown = np.where(total_drawdown > 0, total_drawdown, 1e-6)
+    sharpe_like = _ratio(book.max_equity - book.start_balance, book.start_balance) / drawdown
+
+    return {
+        'daily_drawdown': daily_drawdown,
+        'total_drawdown': total_drawdown,
+        'trailing_drawdown': trailing_drawdown,
+        'profit_pct': profit_pct,
+        'sharpe_like': sharpe_like,
+        'new_status': new_status,
+        'daily_breach': daily_breach,
+        'total_breach': total_breach & ~daily_breach,
+        'trailing_breach': trailing_breach & ~daily_breach & ~total_breach,
+        'target_hit': target_hit & ~failed,
+    }
+
+
+def _reasons(book: RiskBook, metrics: Dict[str, np.ndarray], i: int) -> List[Dict]:
+    # Same rule/message shapes as RiskService.evaluate_challenge_status
+    if metrics['daily_breach'][i]:
+        observed, threshold = metrics['daily_drawdown'][i], book.daily_max_loss[i]
+        return [{'rule': 'daily_max_loss', 'threshold': float(threshold), 'observed': float(observed),
+                 'message': f'Daily drawdown {observed:.2%} exceeds maximum allowed {threshold:.2%}'}]
+    if metrics['total_breach'][i]:
+        observed, threshold = metrics['total_drawdown'][i], book.total_max_loss[i]
+        return [{'rule': 'total_max_loss', 'threshold': float(threshold), 'observed': float(observed),
+                 'message': f'Total drawdown {observed:.2%} exceeds maximum allowed {threshold:.2%}'}]
+    if metrics['trailing_breach'][i]:
+        observed, threshold = metrics['trailing_drawdown'][i], book.trailing_max_loss[i]
+        return [{'rule': 'trailing_drawdown', 'threshold': float(threshold), 'observed': float(observed),
+                 'message': f'Trailing drawdown {observed:.2%} exceeds maximum allowed {threshold:.2%}'}]
+    observed, threshold = metrics['profit_pct'][i], book.profit_target[i]
+    return [{'rule': 'profit_target', 'threshold': float(threshold), 'observed': float(observed),
+             'message': f'Profit target achieved: {observed:.2%} >= {threshold:.2%}'}]
+
+
+def _gates_hold(book: RiskBook, i: int) -> bool:
+    if book.challenge_id is None:
+        return True
+    rule_set = book.rule_sets.get(int(book.challenge_id[i]))
+    if rule_set is None or not rule_set.gates:
+        return True
+    trading_days, daily_realized_pnl = trade_history_context(int(book.user_challenge_id[i]))
+    context = RuleContext(float(book.start_balance[i]), {}, trading_days, daily_realized_pnl)
+    return not any(gate.check(context) for gate in rule_set.gates)
+
+
+class BookRiskService:
+    """
+    Service class to evaluate risk for the whole book of active challenges.
+
+    Loads the risk columns of every active challenge with one query and
+    evaluates them together with NumPy, instead of calling
+    RiskService.evaluate_challenge_status per challenge. Works from the
+    equity values stored by the last evaluation; it does not re-quote
+    positions.
+    """
+
+    @staticmethod
+    def load_book(statuses=ACTIVE_STATUSES, challenge_id: Optional[int] = None) -> RiskBook:
+        """
+        Load the risk columns of challenges in the given statuses.
+
+        Loss limits and profit targets come from each template's compiled
+        rule set, so rules_json overrides apply to the vectorized pass too.
+
+        Args:
+            statuses: UserChallenge statuses to include
+            challenge_id: Only include attempts of this challenge
+
+        Returns:
+            RiskBook of the matching challenges
+        """
+        query = db.session.query(
+            UserChallenge.id, UserChallenge.user_id, UserChallenge.status,
+            UserChallenge.start_balance, UserChallenge.current_equity,
+            UserChallenge.daily_start_equity, UserChallenge.min_equity_today,
+            UserChallenge.min_equity_all_time, UserChallenge.max_equity,
+            Challenge.daily_max_loss, Challenge.total_max_loss, Challenge.profit_target,
+            UserChallenge.challenge_id
+        ).join(Challenge, Challenge.id == UserChallenge.challenge_id).filter(
+            UserChallenge.status.in_(statuses)
+        )
+        if challenge_id is not None:
+            query = query.filter(UserChallenge.challenge_id == challenge_id)
+        rows = query.all()
+
+        book = RiskBook.from_rows([row[:12] for row in rows])
+        book.challenge_id = np.array([row[12] for row in rows], dtype=np.int64)
+        book.rule_sets = rule_engine.rule_sets_for_ids(book.challenge_id)
+
+        # One threshold lookup per template, broadcast over its attempts
+        book.trailing_max_loss = np.full(len(book), np.inf)
+        for template_id, rule_set in book.rule_sets.items():
+            mask = book.challenge_id == template_id
+            book.daily_max_loss[mask] = rule_set.threshold('daily_max_loss')
+            book.total_max_loss[mask] = rule_set.threshold('total_max_loss')
+            book.trailing_max_loss[mask] = rule_set.threshold('trailing_drawdown')
+            book.profit_target[mask] = rule_set.threshold('profit_target')
+        return book
+
+    @staticmethod
+    def status_changes(book: RiskBook, metrics: Optional[Dict[str, np.ndarray]] = None) -> List[Dict]:
+        """
+        List the challenges of a book whose evaluation passes or fails them.
+
+        Pass candidates whose template has gate rules are only listed once
+        the gates hold; their trade history is read one challenge at a time.
+
+        Returns:
+            One dict per changing challenge with its old and new status,
+            reasons and metrics
+        """
+        if metrics is None:
+            metrics = evaluate_book(book)
+
+        changes = []
+        for i in np.flatnonzero(metrics['new_status'] != IN_PROGRESS):
+            if metrics['new_status'][i] == PASSED and not _gates_hold(book, i):
+                continue
+            changes.append({
+                'user_challenge_id': int(book.user_challenge_id[i]),
+                'user_id': int(book.user_id[i]),
+                'old_status': book.status[i],
+                'new_status': STATUS_NAMES[int(metrics['new_status'][i])],
+                'reasons': _reasons(book, metrics, i),
+                'metrics': {
+                    'current_equity': float(book.current_equity[i]),
+                    'daily_drawdown': float(metrics['daily_drawdown'][i]),
+                    'total_drawdown': float(metrics['total_drawdown'][i]),
+                    'trailing_drawdown': float(metrics['trailing_drawdown'][i]),
+                    'profit_pct': float(metrics['profit_pct'][i]),
+                    'sharpe_like': float(metrics['sharpe_like'][i]),
+                }
+            })
+        return changes
+
+    @staticmethod
+    def at_risk(book: RiskBook, metrics: Dict[str, np.ndarray], limit: int = 50) -> List[Dict]:
+        """
+        Challenges still in progress that are closest to a loss limit.
+
+        Headroom is the smaller of the remaining daily and total drawdown
+        allowances, as a fraction of the limit (1 = untouched, 0 = breached).
+        """
+        open_mask = metrics['new_status'] == IN_PROGRESS
+        with np.errstate(divide='ignore', invalid='ignore'):
+            daily_headroom = 1 - metrics['daily_drawdown'] / book.daily_max_loss
+            total_headroom = 1 - metrics['total_drawdown'] / book.total_max_loss
+            headroom = np.minimum(daily_headroom, total_headroom)
+            if book.trailing_max_loss is not None:
+                headroom = np.minimum(headroom, 1 - metrics['trailing_drawdown'] / book.trailing_max_loss)
+        headroom = np.nan_to_num(headroom, nan=1.0)
+
+        candidates = np.flatnonzero(open_mask)
+        if len(candidates) > limit:
+            nearest = np.argpartition(headroom[candidates], limit - 1)[:limit]
+            candidates = candidates[nearest]
+        candidates = candidates[np.argsort(headroom[candidates], kind='stable')]
+
+        return [{
+            'user_challenge_id': int(book.user_challenge_id[i]),
+            'user_id': int(book.user_id[i]),
+            'current_equity': float(book.current_equity[i]),
+            'daily_drawdown': float(metrics['daily_drawdown'][i]),
+            'total_drawdown': float(metrics['total_drawdown'][i]),
+            'profit_pct': float(metrics['profit_pct'][i]),
+            'headroom': float(headroom[i]),
+        } for i in candidates]
+
+    @staticmethod
+    def apply_changes(changes: List[Dict]) -> int:
+        """
+        Write status changes back in one executemany UPDATE.
+
+        Rows that left the active statuses in the meantime (e.g. evaluated
+        by a request) are left alone. Reasons are merged into
+        violated_rules like the per-request evaluation does, and the changed
+        challenges go through the same status hooks: their positions leave
+        the exposure book, their cached pre-trade state is dropped and their
+        users' leaderboard rows are refreshed. Equity is not changed here, so
+        the profit sketches need no update.
+
+        Returns:
+            Number of challenges updated
+        """
+        if not changes:
+            return 0
+
+        # Lock the rows so a concurrent evaluation cannot change their status
+        # between this read and the UPDATE
+        existing = {
+            uc_id: (status, rules)
+            for uc_id, status, rules in db.session.query(
+                UserChallenge.id, UserChallenge.status, UserChallenge.violated_rules
+            ).filter(
+                UserChallenge.id.in_([c['user_challenge_id'] for c in changes])
+            ).with_for_update().all()
+        }
+        changes = [c for c in changes
+                   if c['user_challenge_id'] in existing and existing[c['user_challenge_id']][0] in ACTIVE_STATUSES]
+        if not changes:
+            db.session.rollback()
+            return 0
+
+        now = datetime.utcnow()
+        params = []
+        for change in changes:
+            rules = list(existing[change['user_challenge_id']][1] or [])
+            if change['new_status'] == 'FAILED':
+                for reason in change['reasons']:
+                    if reason['message'] not in rules:
+                        rules.append(reason['message'])
+            params.append({
+                'uc_id': change['user_challenge_id'],
+                'new_status': change['new_status'],
+                'rules': rules or None,
+                'evaluated_at': now,
+            })
+
+        table = UserChallenge.__table__
+        result = db.session.execute(
+            update(table)
+            # Expanding IN parameters cannot be used with executemany
+            .where(table.c.id == bindparam('uc_id'),
+                   or_(*(table.c.status == status for status in ACTIVE_STATUSES)))
+            .values(status=bindparam('new_status'), violated_rules=bindparam('rules'),
+                    last_eval_at=bindparam('evaluated_at')),
+            params
+        )
+        for change in changes:
+            old_status = existing[change['user_challenge_id']][0]
+            ExposureService.on_status_change(change['user_challenge_id'], old_status, change['new_status'])
+        db.session.commit()
+
+        for change in changes:
+            pretrade_simulator.invalidate(change['user_challenge_id'])
+        for user_id in {change['user_id'] for change in changes}:
+            LeaderboardService.on_challenge_change(user_id)
+        return result.rowcount
+
+    @classmethod
+    def sweep(cls, apply: bool = True) -> List[Dict]:
+        """
+        Evaluate the whole active book and optionally apply the result.
+
+        Returns:
+            The status changes found
+        """
+        book = cls.load_book()
+        changes = cls.status_changes(book)
+        if apply and changes:
+            updated = cls.apply_changes(changes)
+            logger.info(f"Risk sweep over {len(book)} challenges updated {updated} statuses")
+        return changes
@@ -1,10 +1,22 @@
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime
-from app.models import UserChallenge, Challenge, Position, Trade, EquitySnapshot, Instrument
+from sqlalchemy.orm import joinedload
+from app.models import UserChallenge, Challenge, Position, Trade, EquitySnapshot, Instrument, ACTIVE_STATUSES
 from app.services.risk_service import RiskService
 from app.services.market_data_service import MarketDataService
+from app.services.equity_snapshot_policy import snapshot_policy
+from app.services.trigger_index import trigger_index
+from app.services.exposure_service import ExposureService, position_legs, FLAT
+from app.services.pretrade_service import pretrade_simulator
+from app.services.leaderboard_service import LeaderboardService, MONTHLY_STATUSES
+from app.services.percentile_service import percentile_service
+from app.services.trading_leaderboard_service import TradingLeaderboardService
 from app import db
-from app.utils import calculate_equity, get_casablanca_time, get_start_of_day_casablanca
+from app.utils import (
+    calculate_equity, get_casablanca_midnight_utc, write_buffer,
+    lttb_indices, ohlc_buckets, keyset_paginate
+)
+import numpy as np
 import logging
 
 logger = logging.getLogger(__name__)
@@ -44,6 +56,7 @@ class ChallengeService:
             start_balance=challenge.start_balance,
             start_time=datetime.utcnow(),
             daily_start_equity=challenge.start_balance,
+            daily_reset_at=get_casablanca_midnight_utc(),
             current_equity=challenge.start_balance,
             max_equity=challenge.start_balance,
             min_equity=challenge.start_balance,
@@ -53,22 +66,26 @@ class ChallengeService:
         )
         
         db.session.add(user_challenge)
-        db.session.commit()
+        db.session.flush()
+        percentile_service.on_equity_change(user_challenge, None, challenge.start_balance)
         
-        # Create initial equity snapshot
-        initial_snapshot = EquitySnapshot(
-            user_challenge_id=user_challenge.id,
-            equity=challenge.start_balance,
-            balance=challenge.start_balance,
-            unrealized_pnl=0.0,
-            ts=datetime.utcnow()
-        )
-        db.session.add(initial_snapshot)
+        # Initial equity snapshot, queued only once its challenge row is
+        # committed so the background flush cannot race the foreign key
+        user_challenge_id, start_balance = user_challenge.id, user_challenge.start_balance
+        write_buffer.enqueue_on_commit(EquitySnapshot, {
+            'user_challenge_id': user_challenge_id,
+            'equity': start_balance,
+            'balance': start_balance,
+            'unrealized_pnl': 0.0,
+            'ts': datetime.utcnow()
+        })
         db.session.commit()
+        snapshot_policy.record(user_challenge_id, start_balance)
         
         return user_challenge
     
-    def execute_trade(self, user_challenge_id: int, instrument_id: int, side: str, qty: float) -> Trade:
+    def execute_trade(self, user_challenge_id: int, instrument_id: int, side: str, qty: float,
+                      price: Optional[float] = None) -> Trade:
         """
         Execute a market order for a user challenge.
 
@@ -77,6 +94,8 @@ class ChallengeService:
             instrument_id: ID of the instrument to trade
             side: 'BUY' or 'SELL'
             qty: Quantity to trade
+            price: Fill price decided elsewhere (e.g. a resting order fill);
+                the current quote is used when omitted
 
         Returns:
             Trade instance
@@ -93,22 +112,137 @@ class ChallengeService:
         if not user_challenge:
             raise ValueError("User challenge not found")
         
+        # A failed or passed challenge must not trade (nor reach the book or leaderboards)
+        if user_challenge.status not in ACTIVE_STATUSES:
+            raise ValueError("Challenge is not in progress")
+        
         instrument = Instrument.query.get(instrument_id)
         if not instrument:
             raise ValueError("Instrument not found")
         
-        # Get current market price
-        quote = self.market_data_service.get_quote(
-            instrument.provider_symbol,
-            instrument.provider
-        )
+        if price is None:
+            # Get current market price
+            quote = self.market_data_service.get_quote(
+                instrument.provider_symbol,
+                instrument.provider
+            )
+            
+            price = self._fill_price(quote, side)
         
-        # Determine price based on side (bid for sell, ask for buy)
-        if side == 'BUY':
-            price = quote['ask'] if quote.get('ask') else quote['last']
-        else:  # SELL
-            price = quote['bid'] if quote.get('bid') else quote['last']
+        trade = self._apply_fill(user_challenge_id, instrument_id, side, qty, price)
+        
+        db.session.commit()
+        
+        # Evaluate risk after trade (trades always leave a snapshot)
+        self.evaluate_challenge(user_challenge, force_snapshot=True)
+        
+        return trade
+    
+    def execute_batch(self, user_challenge: UserChallenge, orders: List[Dict],
+                      flatten_all: bool = False) -> Tuple[List[Trade], Dict]:
+        """
+        Execute several market orders as one unit.
+
+        Every instrument involved is quoted once, all legs are priced against
+        that snapshot and applied in a single transaction, and the challenge
+        is evaluated once at the end. If any leg is invalid nothing is applied.
+
+        Args:
+            user_challenge: UserChallenge to trade on
+            orders: List of dicts with instrument_id, side and qty
+            flatten_all: Close every open position first (legs appended after)
+
+        Returns:
+            Tuple of (trades in execution order, evaluation)
+        """
+        if user_challenge.status not in ACTIVE_STATUSES:
+            raise ValueError("Challenge is not in progress")
+        
+        positions = self.get_current_positions(user_challenge.id)
+        
+        legs = []
+        if flatten_all:
+            for position in positions:
+                legs.append({
+                    'instrument_id': position.instrument_id,
+                    'side': 'SELL' if position.side == 'LONG' else 'BUY',
+                    'qty': position.qty
+                })
+        
+        for index, order in enumerate(orders):
+            if not isinstance(order, dict):
+                raise ValueError(f"Order {index} must be an object")
+            side = order.get('side')
+            try:
+                instrument_id = int(order.get('instrument_id'))
+                qty = float(order.get('qty'))
+            except (TypeError, ValueError):
+                raise ValueError(f"Order {index}: instrument_id and qty are required")
+            if side not in ['BUY', 'SELL']:
+                raise ValueError(f"Order {index}: side must be BUY or SELL")
+            if qty <= 0:
+                raise ValueError(f"Order {index}: qty must be positive")
+            legs.append({'instrument_id': instrument_id, 'side': side, 'qty': qty})
+        
+        if not legs:
+            raise ValueError("No orders to execute")
         
+        # One quote per instrument, shared by pricing and the evaluation
+        instrument_ids = {leg['instrument_id'] for leg in legs} | {p.instrument_id for p in positions}
+        instruments = {
+            instrument.id: instrument
+            for instrument in Instrument.query.filter(Instrument.id.in_(instrument_ids)).all()
+        }
+        missing = [leg['instrument_id'] for leg in legs if leg['instrument_id'] not in instruments]
+        if missing:
+            raise ValueError(f"Instrument not found: {missing[0]}")
+        
+        quotes = {
+            instrument_id: self.market_data_service.get_quote(instrument.provider_symbol, instrument.provider)
+            for instrument_id, instrument in instruments.items()
+        }
+        
+        try:
+            trades = [
+                self._apply_fill(
+                    user_challenge.id,
+                    leg['instrument_id'],
+                    leg['side'],
+                    leg['qty'],
+                    self._fill_price(quotes[leg['instrument_id']], leg['side'])
+                )
+                for leg in legs
+            ]
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        
+        evaluation = self.evaluate_challenge(user_challenge, force_snapshot=True, quotes=quotes)
+        return trades, evaluation
+    
+    @staticmethod
+    def _fill_price(quote: Dict, side: str) -> float:
+        """Price a market order: buys at the ask, sells at the bid."""
+        if side == 'BUY':
+            return quote['ask'] if quote.get('ask') else quote['last']
+        return quote['bid'] if quote.get('bid') else quote['last']
+    
+    def _apply_fill(self, user_challenge_id: int, instrument_id: int, side: str, qty: float,
+                    price: float) -> Trade:
+        """
+        Record a fill and update the position, without committing.
+
+        Args:
+            user_challenge_id: ID of the user challenge
+            instrument_id: ID of the instrument traded
+            side: 'BUY' or 'SELL'
+            qty: Quantity filled
+            price: Fill price
+
+        Returns:
+            Trade instance (pending in the session)
+        """
         # Calculate trade value
         trade_value = qty * price
         
@@ -131,6 +265,10 @@ class ChallengeService:
             instrument_id=instrument_id
         ).first()
         
+        before = FLAT
+        if existing_position:
+            before = position_legs(existing_position.side, existing_position.qty, existing_position.avg_price)
+        
         if existing_position:
             # If same side, increase position
             if (side == 'BUY' and existing_position.side == 'LONG') or \
@@ -160,6 +298,11 @@ class ChallengeService:
                     existing_position.side = 'LONG' if side == 'BUY' else 'SHORT'
                     existing_position.qty = remaining_qty
                     existing_position.avg_price = price
+                    
+                    # SL/TP levels belonged to the old direction
+                    existing_position.stop_loss = None
+                    existing_position.take_profit = None
+                    trigger_index.disarm_on_commit(db.session, existing_position.id)
                 elif qty == existing_position.qty:
                     # Close position exactly
                     if (side == 'SELL' and existing_position.side == 'LONG') or \
@@ -172,7 +315,9 @@ class ChallengeService:
                         trade.realized_pnl = 0  # This shouldn't happen with proper validation
                     
                     # Remove the position since it's fully closed
+                    trigger_index.disarm_on_commit(db.session, existing_position.id)
                     db.session.delete(existing_position)
+                    existing_position = None
                 else:
                     # Partial close of existing position
                     if (side == 'SELL' and existing_position.side == 'LONG') or \
@@ -194,20 +339,17 @@ class ChallengeService:
                 opened_at=datetime.utcnow()
             )
             db.session.add(position)
+            existing_position = position
         
-        # Update user challenge equity based on trade
-        # This is a simplified approach - in a real system you'd recalculate from positions
-        if side == 'BUY':
-            # Buying decreases cash but creates position
-            pass  # Equity will be updated via position marking
-        else:
-            # Selling increases cash
-            pass  # Equity will be updated via position marking
+        # Keep the firm-wide exposure in step with the position
+        after = FLAT
+        if existing_position is not None:
+            after = position_legs(existing_position.side, existing_position.qty, existing_position.avg_price)
+        ExposureService.apply_delta(instrument_id, before, after)
+        pretrade_simulator.invalidate(user_challenge_id)
         
-        db.session.commit()
-        
-        # Evaluate risk after trade
-        self.evaluate_challenge(user_challenge)
+        # ...and the instrument / asset-class trading boards
+        TradingLeaderboardService.on_fill(user_challenge_id, instrument_id, trade.realized_pnl)
         
         return trade
     
@@ -223,17 +365,45 @@ class ChallengeService:
         """
         return Position.query.filter_by(user_challenge_id=user_challenge_id).all()
     
-    def get_trade_history(self, user_challenge_id: int) -> List[Trade]:
+    def get_positions_page(self, user_challenge_id: int, limit: int,
+                           cursor: Optional[str] = None) -> Tuple[List[Position], Optional[str]]:
         """
-        Get trade history for a user challenge.
+        Get one page of current positions for a user challenge, oldest first.
 
         Args:
             user_challenge_id: ID of the user challenge
+            limit: Page size
+            cursor: Cursor returned with the previous page
 
         Returns:
-            List of Trade instances
+            Tuple of (Position instances, next cursor or None)
         """
-        return Trade.query.filter_by(user_challenge_id=user_challenge_id).order_by(Trade.created_at.desc()).all()
+        query = Position.query.filter_by(user_challenge_id=user_challenge_id)
+        return keyset_paginate(query, Position.created_at, Position.id, limit, cursor, descending=False)
+    
+    def count_positions(self, user_challenge_id: int) -> int:
+        """Number of open positions of a user challenge (across every page)."""
+        return Position.query.filter_by(user_challenge_id=user_challenge_id).count()
+    
+    def get_trade_history(self, user_challenge_id: int, limit: int = 100,
+                          cursor: Optional[str] = None) -> Tuple[List[Trade], Optional[str]]:
+        """
+        Get one page of trade history for a user challenge, newest first.
+
+        Args:
+            user_challenge_id: ID of the user challenge
+            limit: Page size
+            cursor: Cursor returned with the previous page
+
+        Returns:
+            Tuple of (Trade instances, next cursor or None)
+        """
+        query = Trade.query.filter_by(user_challenge_id=user_challenge_id)
+        return keyset_paginate(query, Trade.created_at, Trade.id, limit, cursor, descending=True)
+    
+    def count_trades(self, user_challenge_id: int) -> int:
+        """Number of trades of a user challenge (across every page)."""
+        return Trade.query.filter_by(user_challenge_id=user_challenge_id).count()
     
     def get_equity_history(self, user_challenge_id: int, range_hours: int = 24) -> List[EquitySnapshot]:
         """
@@ -253,30 +423,172 @@ class ChallengeService:
             EquitySnapshot.ts >= start_time
         ).order_by(EquitySnapshot.ts.asc()).all()
     
-    def evaluate_challenge(self, user_challenge: UserChallenge) -> Dict:
+    def get_equity_page(self, user_challenge_id: int, range_hours: int, limit: int,
+                        cursor: Optional[str] = None) -> Tuple[List[EquitySnapshot], Optional[str]]:
+        """
+        Get one page of raw equity snapshots within a range, oldest first.
+
+        Args:
+            user_challenge_id: ID of the user challenge
+            range_hours: Number of hours to get history for
+            limit: Page size
+            cursor: Cursor returned with the previous page
+
+        Returns:
+            Tuple of (EquitySnapshot instances, next cursor or None)
+        """
+        from datetime import timedelta
+        start_time = datetime.utcnow() - timedelta(hours=range_hours)
+        query = EquitySnapshot.query.filter(
+            EquitySnapshot.user_challenge_id == user_challenge_id,
+            EquitySnapshot.ts >= start_time
+        )
+        return keyset_paginate(query, EquitySnapshot.ts, EquitySnapshot.id, limit, cursor, descending=False)
+    
+    def count_equity_snapshots(self, user_challenge_id: int, range_hours: int) -> int:
+        """Number of raw equity snapshots within a range (across every page)."""
+        from datetime import timedelta
+        start_time = datetime.utcnow() - timedelta(hours=range_hours)
+        return EquitySnapshot.query.filter(
+            EquitySnapshot.user_challenge_id == user_challenge_id,
+            EquitySnapshot.ts >= start_time
+        ).count()
+    
+    def get_equity_series(self, user_challenge_id: int, range_hours: int = 24,
+                          max_points: int = 1000, method: str = 'lttb') -> Dict:
+        """
+        Get equity history downsampled to at most `max_points` points.
+
+        Short ranges read raw snapshots; longer ranges read the 1m/1h/1d
+        rollups so the raw snapshot table is never scanned for them. Only the
+        plotted columns are loaded (no ORM objects), and the series is reduced
+        in NumPy with LTTB (real points that preserve the shape) or OHLC time
+        buckets.
+
+        Args:
+            user_challenge_id: ID of the user challenge
+            range_hours: Number of hours to get history for
+            max_points: Maximum number of points (or buckets) to return
+            method: 'lttb' or 'ohlc'
+
+        Returns:
+            Dict with points, total source row count, the resolution read and
+            whether downsampling applied
+        """
+        from datetime import timedelta
+        from app.config import Config
+        from app.services.equity_rollup_service import EquityRollupService
+        
+        start_time = datetime.utcnow() - timedelta(hours=range_hours)
+        
+        if range_hours > Config.EQUITY_RAW_HISTORY_HOURS:
+            resolution = EquityRollupService.choose_resolution(range_hours * 3600, max_points)
+            # (bucket_start, open, high, low, close)
+            rows = EquityRollupService.get_rollups(user_challenge_id, start_time, resolution)
+            closes = np.array([row[4] for row in rows], dtype=float)
+        else:
+            resolution = 'raw'
+            # (ts, equity, balance, unrealized_pnl)
+            rows = db.session.query(
+                EquitySnapshot.ts,
+                EquitySnapshot.equity,
+                EquitySnapshot.balance,
+                EquitySnapshot.unrealized_pnl
+            ).filter(
+                EquitySnapshot.user_challenge_id == user_challenge_id,
+                EquitySnapshot.ts >= start_time
+            ).order_by(EquitySnapshot.ts.asc()).all()
+            closes = np.array([row[1] for row in rows], dtype=float)
+        
+        total = len(rows)
+        result = {'points': [], 'total': total, 'resolution': resolution, 'downsampled': False}
+        if total == 0:
+            return result
+        
+        if method == 'ohlc':
+            ts = np.array([row[0] for row in rows], dtype='datetime64[us]').astype(np.int64) / 1e6
+            if resolution == 'raw':
+                buckets = ohlc_buckets(ts, closes, max_points)
+            else:
+                buckets = ohlc_buckets(
+                    ts, closes, max_points,
+                    opens=np.array([row[1] for row in rows], dtype=float),
+                    highs=np.array([row[2] for row in rows], dtype=float),
+                    lows=np.array([row[3] for row in rows], dtype=float)
+                )
+            result['points'] = [
+                {
+                    'ts': datetime.utcfromtimestamp(buckets['x'][i]).isoformat(),
+                    'open': float(buckets['open'][i]),
+                    'high': float(buckets['high'][i]),
+                    'low': float(buckets['low'][i]),
+                    'close': float(buckets['close'][i]),
+                    'count': int(buckets['count'][i])
+                }
+                for i in range(len(buckets['x']))
+            ]
+            result['downsampled'] = True
+            return result
+        
+        if total > max_points:
+            ts = np.array([row[0] for row in rows], dtype='datetime64[us]').astype(np.int64) / 1e6
+            rows = [rows[i] for i in lttb_indices(ts, closes, max_points)]
+            result['downsampled'] = True
+        
+        if resolution == 'raw':
+            result['points'] = [
+                {
+                    'ts': row[0].isoformat(),
+                    'equity': row[1],
+                    'balance': row[2],
+                    'unrealized_pnl': row[3]
+                }
+                for row in rows
+            ]
+        else:
+            result['points'] = [
+                {
+                    'ts': row[0].isoformat(),
+                    'equity': row[4],
+                    'high': row[2],
+                    'low': row[3]
+                }
+                for row in rows
+            ]
+        return result
+    
+    def evaluate_challenge(self, user_challenge: UserChallenge, force_snapshot: bool = False,
+                           quotes: Optional[Dict[int, Dict]] = None) -> Dict:
         """
         Evaluate the current status of a user challenge based on risk rules.
 
         Args:
             user_challenge: UserChallenge instance to evaluate
+            force_snapshot: Write an equity snapshot even if the write policy
+                would skip it (used after trades)
+            quotes: Quotes already fetched by the caller, keyed by instrument id;
+                instruments missing from it are quoted here
 
         Returns:
             Dict with evaluation results
         """
-        # Get current positions to calculate unrealized PnL
-        positions = self.get_current_positions(user_challenge.id)
+        # Get current positions (instruments loaded with them) to calculate unrealized PnL
+        positions = Position.query.options(joinedload(Position.instrument)).filter_by(
+            user_challenge_id=user_challenge.id
+        ).all()
         
         # Calculate unrealized PnL for all positions
         unrealized_pnl = 0.0
         for position in positions:
             # Get current market price for the instrument
-            instrument = Instrument.query.get(position.instrument_id)
+            quote = quotes.get(position.instrument_id) if quotes else None
+            instrument = position.instrument if quote is None else None
             if instrument:
                 quote = self.market_data_service.get_quote(
                     instrument.provider_symbol,
                     instrument.provider
                 )
-                
+            if quote:
                 current_price = quote['last']  # Use last price for marking
                 price_diff = current_price - position.avg_price
                 
@@ -286,27 +598,18 @@ class ChallengeService:
                     unrealized_pnl -= price_diff * position.qty
         
         # Calculate current equity
-        current_equity = user_challenge.start_balance + unrealized_pnl
+        current_equity = calculate_equity(user_challenge.start_balance, unrealized_pnl)
         
         # Update current equity
+        previous_equity = user_challenge.current_equity
         user_challenge.current_equity = current_equity
         
         # Update min equity if needed
         if current_equity < user_challenge.min_equity_all_time:
             user_challenge.min_equity_all_time = current_equity
         
-        # Check if we're at the start of a new day (Casablanca time)
-        current_time_casablanca = get_casablanca_time()
-        start_of_day_casablanca = get_start_of_day_casablanca()
-        
-        # If we're in a new day, update daily start equity
-        if user_challenge.start_time.replace(tzinfo=None) < start_of_day_casablanca.replace(tzinfo=None):
-            # Check if we're now in a new day
-            if user_challenge.start_time.replace(tzinfo=None) < current_time_casablanca.replace(tzinfo=None):
-                if current_time_casablanca.date() > user_challenge.start_time.replace(tzinfo=None).date():
-                    # New day has started
-                    user_challenge.daily_start_equity = current_equity
-                    user_challenge.min_equity_today = current_equity
+        # daily_start_equity / min_equity_today are reset at Casablanca midnight
+        # by the scheduled day rollover (app.tasks.day_rollover)
         
         # Update min equity for today if needed
         if current_equity < user_challenge.min_equity_today:
@@ -328,6 +631,7 @@ class ChallengeService:
         
         # Update challenge status and reasons
         new_status = evaluation['status']
+        status_changed = new_status != user_challenge.status
         if new_status == 'FAILED' and user_challenge.status != 'FAILED':
             # Collect reasons
             reasons = [r['message'] for r in evaluation.get('reasons', [])]
@@ -340,21 +644,40 @@ class ChallengeService:
             
             user_challenge.violated_rules = current_rules
             
+        if status_changed:
+            ExposureService.on_status_change(user_challenge.id, user_challenge.status, new_status)
         user_challenge.status = new_status
         user_challenge.last_eval_at = datetime.utcnow()
+        pretrade_simulator.invalidate(user_challenge.id)
+        
+        # Create equity snapshot only when the write policy says it is meaningful.
+        # Snapshots go through the write-behind buffer, off the request path,
+        # once the evaluation commits.
+        write_snapshot = snapshot_policy.should_write(
+            user_challenge.id,
+            current_equity,
+            force=force_snapshot or status_changed
+        )
+        if write_snapshot:
+            write_buffer.enqueue_on_commit(EquitySnapshot, {
+                'user_challenge_id': user_challenge.id,
+                'equity': current_equity,
+                'balance': user_challenge.start_balance + evaluation.get('realized_pnl', 0),
+                'unrealized_pnl': unrealized_pnl,
+                'ts': datetime.utcnow()
+            })
+        
+        # Keep the shared profit distribution in step with the new equity
+        percentile_service.on_equity_change(user_challenge, previous_equity, current_equity)
         
         # Save changes
         db.session.commit()
         
-        # Create equity snapshot
-        snapshot = EquitySnapshot(
-            user_challenge_id=user_challenge.id,
-            equity=current_equity,
-            balance=user_challenge.start_balance + evaluation.get('realized_pnl', 0),
-            unrealized_pnl=unrealized_pnl,
-            ts=datetime.utcnow()
-        )
-        db.session.add(snapshot)
-        db.session.commit()
+        if write_snapshot:
+            snapshot_policy.record(user_challenge.id, current_equity)
+        
+        # Keep the materialized leaderboards in step with ranked challenges
+        if status_changed or (new_status in MONTHLY_STATUSES and current_equity != previous_equity):
+            LeaderboardService.on_challenge_change(user_challenge.user_id)
         
         return evaluation
\ No newline at end of file
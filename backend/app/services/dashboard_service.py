@@ -0,0 +1,216 @@
+from typing import Dict, Iterable, List, Optional
+from datetime import datetime
+from sqlalchemy.orm import joinedload
+from app.models import UserChallenge, Position, Instrument
+from app.services.challenge_service import ChallengeService
+from app.services.signals_service import SignalsService
+from app import db
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Sections of the dashboard payload, in the order they are assembled
+DASHBOARD_FIELDS = (
+    'instruments', 'challenges', 'challenge', 'evaluation', 'positions',
+    'trades', 'equity', 'quote', 'quotes', 'ohlcv', 'signals'
+)
+
+
+def parse_fields(value: Optional[str]) -> List[str]:
+    """
+    Parse a comma-separated `fields` selection (every section when empty).
+
+    Raises:
+        ValueError: If a field is not a dashboard section
+    """
+    if not value:
+        return list(DASHBOARD_FIELDS)
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    unknown = sorted(set(fields) - set(DASHBOARD_FIELDS))
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)} (expected {', '.join(DASHBOARD_FIELDS)})")
+    return [field for field in DASHBOARD_FIELDS if field in fields]
+
+
+class DashboardService:
+    """
+    Service class assembling the trading dashboard of a user challenge.
+
+    The dashboard used to load with one request per panel, each repeating
+    the JWT and ownership checks and the challenge detail running its own
+    evaluation. Here the caller checks ownership once and every panel is
+    built from one quote snapshot: the positions, the evaluation and the
+    selected instrument are all marked at the same prices, and the OHLCV
+    bars fetched for the chart also feed the signals.
+    """
+
+    def __init__(self, challenge_service: Optional[ChallengeService] = None):
+        self.challenge_service = challenge_service or ChallengeService()
+        self.market_data_service = self.challenge_service.market_data_service
+        self.signals_service = SignalsService()
+
+    def _quote_snapshot(self, instruments: Iterable[Instrument], errors: Dict) -> Dict[int, Dict]:
+        """Quote each instrument once; failures are reported, not raised."""
+        quotes = {}
+        for instrument in instruments:
+            if instrument.id in quotes:
+                continue
+            try:
+                quotes[instrument.id] = self.market_data_service.get_quote(
+                    instrument.provider_symbol, instrument.provider
+                )
+            except Exception as e:
+                logger.warning(f"Dashboard quote failed for {instrument.display_symbol}: {e}")
+                errors.setdefault('quotes', {})[instrument.id] = str(e)
+        return quotes
+
+    @staticmethod
+    def _serialize_position(position: Position, quote: Optional[Dict]) -> Dict:
+        """Position marked at the snapshot price (unmarked when unquoted)."""
+        data = position.to_dict()
+        data['mark_price'] = None
+        data['unrealized_pnl'] = None
+        if quote:
+            mark = quote['last']
+            pnl = (mark - position.avg_price) * position.qty
+            data['mark_price'] = mark
+            data['unrealized_pnl'] = pnl if position.side == 'LONG' else -pnl
+        return data
+
+    def build(self, user_challenge: UserChallenge, fields: List[str], instrument_id: Optional[int] = None,
+              timeframe: str = '1h', ohlcv_limit: int = 100, trades_limit: int = 50,
+              range_hours: int = 24, max_points: int = 1000) -> Dict:
+        """
+        Build the selected dashboard sections for a user challenge.
+
+        Args:
+            user_challenge: UserChallenge the caller already checked ownership of
+                (challenge template loaded with it)
+            fields: Sections to include (see DASHBOARD_FIELDS)
+            instrument_id: Instrument for the quote, chart and signals (default:
+                the first open position's, else the first active instrument)
+            timeframe: OHLCV timeframe
+            ohlcv_limit: Number of OHLCV bars
+            trades_limit: Size of the first trade history page
+            range_hours: Equity history range
+            max_points: Equity history downsampling bound
+
+        Returns:
+            Dict with one key per selected section, the selected instrument,
+            the snapshot time and an `errors` dict for sections that failed
+
+        Raises:
+            ValueError: If instrument_id is not a known instrument
+        """
+        selected = set(fields)
+        result: Dict = {}
+        errors: Dict = {}
+
+        user_challenge_id, user_id = user_challenge.id, user_challenge.user_id
+        challenge_data = user_challenge.challenge.to_dict() if user_challenge.challenge else None
+
+        instruments = []
+        if 'instruments' in selected or instrument_id is None:
+            instruments = Instrument.query.filter(Instrument.active == True).all()
+            if 'instruments' in selected:
+                result['instruments'] = [instrument.to_dict() for instrument in instruments]
+
+        positions = []
+        needs_positions = selected & {'positions', 'quotes', 'evaluation', 'challenge'}
+        if needs_positions:
+            positions = Position.query.options(joinedload(Position.instrument)).filter_by(
+                user_challenge_id=user_challenge_id
+            ).order_by(Position.created_at.asc(), Position.id.asc()).all()
+
+        instrument = None
+        if selected & {'quote', 'quotes', 'ohlcv', 'signals'}:
+            if instrument_id is not None:
+                instrument = next((i for i in instruments if i.id == instrument_id), None) \
+                    or next((p.instrument for p in positions if p.instrument_id == instrument_id), None) \
+                    or db.session.get(Instrument, instrument_id)
+                if instrument is None:
+                    raise ValueError(f'Instrument {instrument_id} not found')
+            elif positions:
+                instrument = positions[0].instrument
+            elif instruments:
+                instrument = instruments[0]
+            result['instrument'] = instrument.to_dict() if instrument else None
+
+        # One quote per instrument, shared by every section below
+        snapshot_instruments = [p.instrument for p in positions if p.instrument is not None]
+        if instrument is not None and selected & {'quote', 'quotes'}:
+            snapshot_instruments.append(instrument)
+        quotes = self._quote_snapshot(snapshot_instruments, errors)
+        result['as_of'] = int(datetime.utcnow().timestamp() * 1000)
+
+        # Everything read from the session is serialized before the evaluation commits
+        if 'positions' in selected:
+            result['positions'] = [
+                self._serialize_position(position, quotes.get(position.instrument_id)) for position in positions
+            ]
+        market = (instrument.id, instrument.provider_symbol, instrument.provider, instrument.display_symbol) \
+            if instrument is not None else None
+
+        if selected & {'challenge', 'evaluation'}:
+            try:
+                evaluation = self.challenge_service.evaluate_challenge(user_challenge, quotes=quotes)
+                if 'evaluation' in selected:
+                    result['evaluation'] = evaluation
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Dashboard evaluation failed for challenge {user_challenge_id}: {e}")
+                errors['evaluation'] = str(e)
+
+        # Listing the user's challenges also reloads this one after the evaluation's commit
+        if 'challenges' in selected:
+            mine = UserChallenge.query.options(joinedload(UserChallenge.challenge)).filter_by(
+                user_id=user_id
+            ).order_by(UserChallenge.created_at.desc()).all()
+            result['challenges'] = []
+            for other in mine:
+                data = other.to_dict()
+                if other.challenge:
+                    data['challenge'] = other.challenge.to_dict()
+                result['challenges'].append(data)
+
+        if 'challenge' in selected:
+            data = user_challenge.to_dict()
+            if challenge_data is not None:
+                data['challenge'] = challenge_data
+            result['challenge'] = data
+
+        if 'trades' in selected:
+            trades, next_cursor = self.challenge_service.get_trade_history(user_challenge_id, trades_limit)
+            result['trades'] = {'items': [trade.to_dict() for trade in trades], 'next_cursor': next_cursor}
+
+        if 'equity' in selected:
+            series = self.challenge_service.get_equity_series(user_challenge_id, range_hours, max_points)
+            result['equity'] = {
+                'points': series['points'],
+                'total': series['total'],
+                'downsampled': series['downsampled'],
+                'resolution': series['resolution'],
+                'range_hours': range_hours
+            }
+
+        if 'quote' in selected and market is not None:
+            result['quote'] = quotes.get(market[0])
+
+        if 'quotes' in selected:
+            result['quotes'] = quotes
+
+        if market is not None and selected & {'ohlcv', 'signals'}:
+            _, provider_symbol, provider, display_symbol = market
+            try:
+                ohlcv = self.market_data_service.get_ohlcv(provider_symbol, provider, timeframe, ohlcv_limit)
+                if 'ohlcv' in selected:
+                    result['ohlcv'] = {'timeframe': timeframe, 'bars': ohlcv}
+                if 'signals' in selected:
+                    result['signals'] = self.signals_service.signals_from_ohlcv(ohlcv)
+            except Exception as e:
+                logger.warning(f"Dashboard market data failed for {display_symbol}: {e}")
+                for field in selected & {'ohlcv', 'signals'}:
+                    errors[field] = str(e)
+
+        result['errors'] = errors
+        return result
@@ -0,0 +1,312 @@
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime, timedelta
+from sqlalchemy import func, insert, select, update, and_, bindparam
+from app.models import EquitySnapshot, EquityRollup
+from app import db
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class EquityRollupService:
+    """
+    Service class to maintain per-challenge equity rollups.
+    Raw equity snapshots are folded into open/high/low/close buckets at
+    1 minute, 1 hour and 1 day resolution as they are written, so long-range
+    charts never scan the raw snapshot table.
+    """
+
+    # Resolution name -> bucket width in seconds
+    RESOLUTIONS = {
+        '1m': 60,
+        '1h': 3600,
+        '1d': 86400
+    }
+
+    @staticmethod
+    def bucket_start(ts: datetime, resolution: str) -> datetime:
+        """Floor a UTC timestamp to the start of its bucket."""
+        if resolution == '1m':
+            return ts.replace(second=0, microsecond=0)
+        if resolution == '1h':
+            return ts.replace(minute=0, second=0, microsecond=0)
+        if resolution == '1d':
+            return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+        raise ValueError(f"Unknown rollup resolution: {resolution}")
+
+    @staticmethod
+    def on_rows_written(model, rows: List[Dict], connection) -> None:
+        """Write buffer flush listener: fold new snapshots into the rollups."""
+        if model is EquitySnapshot:
+            EquityRollupService.apply_snapshots(rows, connection)
+
+    @staticmethod
+    def aggregate(rows: List[Dict]) -> List[Dict]:
+        """
+        Aggregate snapshot rows into rollup rows for every resolution.
+
+        Args:
+            rows: Snapshot column dicts (user_challenge_id, equity, ts)
+
+        Returns:
+            List of rollup column dicts, one per (challenge, resolution, bucket)
+        """
+        buckets: Dict[Tuple[int, str, datetime], Dict] = {}
+        now = datetime.utcnow()
+
+        for row in sorted(rows, key=lambda r: r['ts']):
+            equity = row['equity']
+            for resolution in EquityRollupService.RESOLUTIONS:
+                key = (row['user_challenge_id'], resolution, EquityRollupService.bucket_start(row['ts'], resolution))
+                bucket = buckets.get(key)
+                if bucket is None:
+                    buckets[key] = {
+                        'user_challenge_id': key[0],
+                        'resolution': resolution,
+                        'bucket_start': key[2],
+                        'open': equity,
+                        'high': equity,
+                        'low': equity,
+                        'close': equity,
+                        'samples': 1,
+                        'created_at': now,
+                        'updated_at': now
+                    }
+                else:
+                    bucket['high'] = max(bucket['high'], equity)
+                    bucket['low'] = min(bucket['low'], equity)
+                    bucket['close'] = equity
+                    bucket['samples'] += 1
+
+        return list(buckets.values())
+
+    @staticmethod
+    def apply_snapshots(rows: List[Dict], connection) -> int:
+        """
+        Merge snapshot rows into the rollup table.
+
+        Uses a single INSERT ... ON CONFLICT DO UPDATE on PostgreSQL and
+        SQLite; other databases fall back to select-then-write.
+
+        Args:
+            rows: Snapshot column dicts
+            connection: Connection of the transaction that wrote the snapshots
+
+        Returns:
+            Number of rollup buckets touched
+        """
+        return EquityRollupService.upsert(EquityRollupService.aggregate(rows), connection)
+
+    @staticmethod
+    def upsert(rollups: List[Dict], connection) -> int:
+        """
+        Merge aggregated rollup rows into the rollup table: existing buckets
+        keep their open, widen their high/low, take the new close and add
+        the samples.
+
+        Args:
+            rollups: Rollup column dicts from `aggregate`
+            connection: Connection to write with
+
+        Returns:
+            Number of rollup buckets touched
+        """
+        if not rollups:
+            return 0
+
+        table = EquityRollup.__table__
+        dialect = connection.dialect.name
+
+        if dialect in ('postgresql', 'sqlite'):
+            if dialect == 'postgresql':
+                from sqlalchemy.dialects.postgresql import insert as dialect_insert
+                greatest, least = func.greatest, func.least
+            else:
+                from sqlalchemy.dialects.sqlite import insert as dialect_insert
+                greatest, least = func.max, func.min
+
+            stmt = dialect_insert(table)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['user_challenge_id', 'resolution', 'bucket_start'],
+                set_={
+                    'high': greatest(table.c.high, stmt.excluded.high),
+                    'low': least(table.c.low, stmt.excluded.low),
+                    'close': stmt.excluded.close,
+                    'samples': table.c.samples + stmt.excluded.samples,
+                    'updated_at': stmt.excluded.updated_at
+                }
+            )
+            connection.execute(stmt, rollups)
+            return len(rollups)
+
+        # Generic fallback: look up existing buckets, then update or insert
+        existing = {}
+        for rollup in rollups:
+            found = connection.execute(
+                select(table.c.id, table.c.high, table.c.low, table.c.samples).where(and_(
+                    table.c.user_challenge_id == rollup['user_challenge_id'],
+                    table.c.resolution == rollup['resolution'],
+                    table.c.bucket_start == rollup['bucket_start']
+                ))
+            ).first()
+            if found:
+                existing[id(rollup)] = found
+
+        updates, inserts = [], []
+        for rollup in rollups:
+            found = existing.get(id(rollup))
+            if found is None:
+                inserts.append(rollup)
+            else:
+                updates.append({
+                    'rollup_id': found.id,
+                    'high': max(found.high, rollup['high']),
+                    'low': min(found.low, rollup['low']),
+                    'close': rollup['close'],
+                    'samples': found.samples + rollup['samples'],
+                    'updated_at': rollup['updated_at']
+                })
+
+        if inserts:
+            connection.execute(insert(table), inserts)
+        if updates:
+            connection.execute(
+                update(table).where(table.c.id == bindparam('rollup_id')).values(
+                    high=bindparam('high'),
+                    low=bindparam('low'),
+                    close=bindparam('close'),
+                    samples=bindparam('samples'),
+                    updated_at=bindparam('updated_at')
+                ),
+                updates
+            )
+        return len(rollups)
+
+    @staticmethod
+    def choose_resolution(range_seconds: float, max_points: int) -> str:
+        """
+        Pick the coarsest resolution that still gives the chart enough buckets.
+
+        Args:
+            range_seconds: Width of the requested window
+            max_points: Points the chart will display
+
+        Returns:
+            Resolution name
+        """
+        from app.config import Config
+        minute_retention = Config.EQUITY_ROLLUP_MINUTE_RETENTION_DAYS * 86400
+
+        chosen = '1d'
+        for resolution, width in sorted(EquityRollupService.RESOLUTIONS.items(), key=lambda item: -item[1]):
+            if resolution == '1m' and range_seconds > minute_retention:
+                continue
+            chosen = resolution
+            if range_seconds / width >= max_points / 4:
+                break
+        return chosen
+
+    @staticmethod
+    def get_rollups(user_challenge_id: int, start_time: datetime, resolution: str) -> List[Tuple]:
+        """
+        Get rollup buckets for a challenge since a given time.
+
+        Returns:
+            List of (bucket_start, open, high, low, close) tuples in time order
+        """
+        return db.session.query(
+            EquityRollup.bucket_start,
+            EquityRollup.open,
+            EquityRollup.high,
+            EquityRollup.low,
+            EquityRollup.close
+        ).filter(
+            EquityRollup.user_challenge_id == user_challenge_id,
+            EquityRollup.resolution == resolution,
+            EquityRollup.bucket_start >= EquityRollupService.bucket_start(start_time, resolution)
+        ).order_by(EquityRollup.bucket_start.asc()).all()
+
+    @staticmethod
+    def bucket_after(ts: datetime, resolution: str) -> datetime:
+        """Start of the first bucket beginning at or after a timestamp."""
+        start = EquityRollupService.bucket_start(ts, resolution)
+        if start < ts:
+            start += timedelta(seconds=EquityRollupService.RESOLUTIONS[resolution])
+        return start
+
+    @staticmethod
+    def rebuild(user_challenge_id: Optional[int] = None, chunk_size: int = 5000,
+                retention_days: Optional[int] = None) -> int:
+        """
+        Recompute rollups from the raw snapshots still on disk.
+
+        Buckets that start before the prune horizon may already have lost
+        raw samples, so their existing rollup rows are kept as they are (and
+        the raw rows still in them are not folded again); only buckets with
+        no rollup row yet are filled in there. Every later bucket is replaced.
+
+        Args:
+            user_challenge_id: Only rebuild this challenge (default: all)
+            chunk_size: Number of snapshots folded per batch
+            retention_days: Days of raw snapshots kept by pruning (default: config)
+
+        Returns:
+            Number of snapshots processed
+        """
+        if retention_days is None:
+            from app.config import Config
+            retention_days = Config.EQUITY_SNAPSHOT_RETENTION_DAYS
+        horizon = datetime.utcnow() - timedelta(days=retention_days)
+        replace_from = {
+            resolution: EquityRollupService.bucket_after(horizon, resolution)
+            for resolution in EquityRollupService.RESOLUTIONS
+        }
+
+        challenge_ids = [user_challenge_id] if user_challenge_id else [
+            row[0] for row in db.session.query(EquitySnapshot.user_challenge_id).distinct().all()
+        ]
+
+        processed = 0
+        for uc_id in challenge_ids:
+            first_ts = db.session.query(func.min(EquitySnapshot.ts)).filter(
+                EquitySnapshot.user_challenge_id == uc_id
+            ).scalar()
+            if first_ts is None:
+                continue
+
+            kept = set()
+            for resolution, start in replace_from.items():
+                kept.update((resolution, row[0]) for row in db.session.query(EquityRollup.bucket_start).filter(
+                    EquityRollup.user_challenge_id == uc_id,
+                    EquityRollup.resolution == resolution,
+                    EquityRollup.bucket_start < start
+                ).all())
+                EquityRollup.query.filter(
+                    EquityRollup.user_challenge_id == uc_id,
+                    EquityRollup.resolution == resolution,
+                    EquityRollup.bucket_start >= max(start, EquityRollupService.bucket_start(first_ts, resolution))
+                ).delete(synchronize_session=False)
+
+            rows = db.session.query(
+                EquitySnapshot.user_challenge_id,
+                EquitySnapshot.equity,
+                EquitySnapshot.ts
+            ).filter(
+                EquitySnapshot.user_challenge_id == uc_id
+            ).order_by(EquitySnapshot.ts.asc()).all()
+
+            for offset in range(0, len(rows), chunk_size):
+                batch = [
+                    {'user_challenge_id': row[0], 'equity': row[1], 'ts': row[2]}
+                    for row in rows[offset:offset + chunk_size]
+                ]
+                rollups = [
+                    rollup for rollup in EquityRollupService.aggregate(batch)
+                    if (rollup['resolution'], rollup['bucket_start']) not in kept
+                ]
+                EquityRollupService.upsert(rollups, db.session.connection())
+                processed += len(batch)
+
+            db.session.commit()
+
+        return processed
@@ -0,0 +1,73 @@
+import time
+import threading
+from typing import Dict, Optional, Tuple
+
+
+class EquitySnapshotPolicy:
+    """
+    Decides whether an evaluation should persist an EquitySnapshot row.
+    Keeps the last written (timestamp, equity) per challenge in memory so the
+    decision never needs a database query.
+    """
+
+    def __init__(self, min_interval: float = None, min_change: float = None, heartbeat: float = None):
+        from app.config import Config
+        self.min_interval = Config.SNAPSHOT_MIN_INTERVAL_SECONDS if min_interval is None else min_interval
+        self.min_change = Config.SNAPSHOT_MIN_EQUITY_CHANGE if min_change is None else min_change
+        self.heartbeat = Config.SNAPSHOT_HEARTBEAT_SECONDS if heartbeat is None else heartbeat
+        self._last_written: Dict[int, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def should_write(self, user_challenge_id: int, equity: float, force: bool = False,
+                     now: Optional[float] = None) -> bool:
+        """
+        Check whether a snapshot for this equity value is worth writing.
+
+        Args:
+            user_challenge_id: ID of the user challenge
+            equity: Equity value that would be written
+            force: Always write (trades and status changes)
+            now: Current epoch seconds (optional, for testing)
+
+        Returns:
+            True if the snapshot should be written, False otherwise
+        """
+        if force:
+            return True
+
+        with self._lock:
+            last = self._last_written.get(user_challenge_id)
+
+        # Nothing written by this process yet
+        if last is None:
+            return True
+
+        if now is None:
+            now = time.time()
+        last_ts, last_equity = last
+        elapsed = now - last_ts
+
+        if elapsed < self.min_interval:
+            return False
+
+        if last_equity and abs(equity - last_equity) / abs(last_equity) >= self.min_change:
+            return True
+
+        # Keep the chart continuous for flat accounts
+        return elapsed >= self.heartbeat
+
+    def record(self, user_challenge_id: int, equity: float, now: Optional[float] = None) -> None:
+        """Remember that a snapshot was written for this challenge."""
+        if now is None:
+            now = time.time()
+        with self._lock:
+            self._last_written[user_challenge_id] = (now, equity)
+
+    def forget(self, user_challenge_id: int) -> None:
+        """Drop the tracker entry for a challenge (e.g. after an admin reset)."""
+        with self._lock:
+            self._last_written.pop(user_challenge_id, None)
+
+
+# Global policy instance shared by all ChallengeService instances
+snapshot_policy = EquitySnapshotPolicy()
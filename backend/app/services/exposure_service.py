@@ -0,0 +1,256 @@
+import threading
+from datetime import datetime
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import update, case, func
+from sqlalchemy.exc import IntegrityError
+from app.models import InstrumentExposure, Instrument, Position, UserChallenge, ACTIVE_STATUSES
+from app.services.market_data_service import MarketDataService
+from app import db
+import logging
+
+logger = logging.getLogger(__name__)
+
+# (long_qty, short_qty, long_cost, short_cost)
+Legs = Tuple[float, float, float, float]
+FLAT: Legs = (0.0, 0.0, 0.0, 0.0)
+
+
+def position_legs(side: Optional[str], qty: float, avg_price: float) -> Legs:
+    """Contribution of one position to its instrument's exposure."""
+    if not side or not qty:
+        return FLAT
+    if side == 'LONG':
+        return (qty, 0.0, qty * avg_price, 0.0)
+    return (0.0, qty, 0.0, qty * avg_price)
+
+
+class ExposureService:
+    """
+    Service class to maintain and value firm-wide exposure per instrument.
+
+    Every fill applies the change in its position's contribution to the
+    instrument_exposures row, in the fill's own transaction, with an
+    additive UPDATE that is safe across workers. Reading the book is one
+    query over instruments; each row is valued at the last quote this
+    process has seen for it.
+
+    Every path that writes a challenge's status (evaluation, risk sweep,
+    admin overrides, replay) calls on_status_change in the same
+    transaction, so challenges leaving or re-entering the active statuses
+    move their positions out of or into the book. The periodic rebuild
+    only reconciles drift.
+    """
+
+    def __init__(self):
+        self._marks: Dict[Tuple[str, str], Dict] = {}
+        self._lock = threading.Lock()
+        self._market_data_service = None
+
+    @property
+    def market_data_service(self) -> MarketDataService:
+        if self._market_data_service is None:
+            self._market_data_service = MarketDataService()
+        return self._market_data_service
+
+    def init_app(self, app) -> None:
+        """Track served quotes so the book can be valued per tick."""
+        MarketDataService.add_quote_listener(self.on_quote)
+
+    def on_quote(self, provider: str, instrument: str, quote: Dict) -> None:
+        """MarketDataService quote listener: remember the latest quote."""
+        with self._lock:
+            self._marks[(provider, instrument)] = quote
+
+    @staticmethod
+    def apply_delta(instrument_id: int, before: Legs, after: Legs) -> None:
+        """
+        Move an instrument's exposure from a position's old contribution to
+        its new one, without committing.
+
+        Args:
+            instrument_id: Instrument of the position
+            before: Legs of the position before the fill (FLAT if new)
+            after: Legs of the position after the fill (FLAT if closed)
+        """
+        delta = [a - b for a, b in zip(after, before)]
+        if not any(delta):
+            return
+
+        table = InstrumentExposure.__table__
+        statement = update(table).where(table.c.instrument_id == instrument_id).values(
+            long_qty=table.c.long_qty + delta[0],
+            short_qty=table.c.short_qty + delta[1],
+            long_cost=table.c.long_cost + delta[2],
+            short_cost=table.c.short_cost + delta[3],
+            updated_at=datetime.utcnow()
+        )
+        if db.session.execute(statement).rowcount:
+            return
+
+        # First fill on this instrument; another worker may create the row concurrently
+        try:
+            with db.session.begin_nested():
+                db.session.add(InstrumentExposure(
+                    instrument_id=instrument_id,
+                    long_qty=delta[0], short_qty=delta[1],
+                    long_cost=delta[2], short_cost=delta[3]
+                ))
+        except IntegrityError:
+            db.session.execute(statement)
+
+    @classmethod
+    def on_status_change(cls, user_challenge_id: int, old_status: str, new_status: str) -> None:
+        """
+        Take a challenge's open positions out of (or back into) the book when
+        it leaves (or re-enters) the active statuses, without committing.
+        """
+        was_active, is_active = old_status in ACTIVE_STATUSES, new_status in ACTIVE_STATUSES
+        if was_active == is_active:
+            return
+
+        positions = db.session.query(Position.instrument_id, Position.side, Position.qty, Position.avg_price).filter(
+            Position.user_challenge_id == user_challenge_id
+        ).all()
+        for instrument_id, side, qty, avg_price in positions:
+            legs = position_legs(side, qty, avg_price)
+            if is_active:
+                cls.apply_delta(instrument_id, FLAT, legs)
+            else:
+                cls.apply_delta(instrument_id, legs, FLAT)
+
+    @staticmethod
+    def rebuild() -> int:
+        """
+        Reconcile every instrument's exposure with the open positions of
+        active challenges (one grouped query), updating rows in place.
+
+        The exposure rows are locked first, so fills in flight commit before
+        the positions are read and later fills wait for the reconciliation
+        instead of being overwritten by it. Instruments no longer held are
+        zeroed rather than deleted. Runs as a scheduled job in the one
+        process that holds the scheduler lock.
+
+        Returns:
+            Number of instruments with exposure
+        """
+        existing = {row.instrument_id: row for row in InstrumentExposure.query.with_for_update().all()}
+
+        is_long = Position.side == 'LONG'
+        rows = db.session.query(
+            Position.instrument_id,
+            func.sum(case((is_long, Position.qty), else_=0.0)),
+            func.sum(case((is_long, 0.0), else_=Position.qty)),
+            func.sum(case((is_long, Position.qty * Position.avg_price), else_=0.0)),
+            func.sum(case((is_long, 0.0), else_=Position.qty * Position.avg_price))
+        ).join(UserChallenge, UserChallenge.id == Position.user_challenge_id).filter(
+            UserChallenge.status.in_(ACTIVE_STATUSES)
+        ).group_by(Position.instrument_id).all()
+        computed = {row[0]: tuple(value or 0.0 for value in row[1:]) for row in rows}
+
+        columns = ('long_qty', 'short_qty', 'long_cost', 'short_cost')
+        drifted = 0
+        for instrument_id in set(existing) | set(computed):
+            legs = computed.get(instrument_id, FLAT)
+            exposure = existing.get(instrument_id)
+            if exposure is None:
+                # First exposure on this instrument; a fill may create the row concurrently
+                try:
+                    with db.session.begin_nested():
+                        db.session.add(InstrumentExposure(instrument_id=instrument_id, **dict(zip(columns, legs))))
+                except IntegrityError:
+                    db.session.execute(update(InstrumentExposure).where(
+                        InstrumentExposure.instrument_id == instrument_id
+                    ).values(**dict(zip(columns, legs)), updated_at=datetime.utcnow()))
+                drifted += 1
+            elif any(abs((getattr(exposure, column) or 0.0) - value) > 1e-9
+                     for column, value in zip(columns, legs)):
+                for column, value in zip(columns, legs):
+                    setattr(exposure, column, value)
+                drifted += 1
+        db.session.commit()
+
+        if drifted:
+            logger.info(f"Exposure rebuild corrected {drifted} instruments")
+        return len(rows)
+
+    def _mark(self, instrument: Instrument) -> Optional[Dict]:
+        with self._lock:
+            quote = self._marks.get((instrument.provider.upper(), instrument.provider_symbol))
+        if quote is not None:
+            return quote
+        try:
+            # Not quoted in this process yet; the listener stores the result
+            return self.market_data_service.get_quote(instrument.provider_symbol, instrument.provider)
+        except Exception as e:
+            logger.warning(f"No quote to value exposure in {instrument.display_symbol}: {e}")
+            return None
+
+    def get_exposure(self, group_by: Optional[str] = None) -> Dict:
+        """
+        Value the firm-wide book.
+
+        Args:
+            group_by: Also aggregate by 'asset_class' or 'currency'
+
+        Returns:
+            Dict with per-instrument rows (largest gross notional first) and,
+            when grouped, per-group sums. Notionals are in each instrument's
+            quote currency, so asset-class sums mix currencies.
+        """
+        rows = db.session.query(InstrumentExposure, Instrument).join(
+            Instrument, Instrument.id == InstrumentExposure.instrument_id
+        ).filter(
+            # Ignore float residue left by partial closes
+            (func.abs(InstrumentExposure.long_qty) > 1e-9) | (func.abs(InstrumentExposure.short_qty) > 1e-9)
+        ).all()
+
+        instruments: List[Dict] = []
+        for exposure, instrument in rows:
+            quote = self._mark(instrument)
+            price = quote.get('last') if quote else None
+            entry = {
+                'instrument_id': instrument.id,
+                'symbol': instrument.display_symbol,
+                'asset_class': instrument.asset_class,
+                'currency': instrument.currency,
+                'long_qty': exposure.long_qty,
+                'short_qty': exposure.short_qty,
+                'net_qty': exposure.net_qty,
+                'gross_qty': exposure.gross_qty,
+                'price': price,
+                'net_notional': None,
+                'gross_notional': None,
+                'unrealized_pnl': None,
+            }
+            if price is not None:
+                entry['net_notional'] = exposure.net_qty * price
+                entry['gross_notional'] = exposure.gross_qty * price
+                # Traders' open PnL; the firm's mirror of it is what gets hedged
+                entry['unrealized_pnl'] = ((exposure.long_qty * price - exposure.long_cost) +
+                                           (exposure.short_cost - exposure.short_qty * price))
+            instruments.append(entry)
+
+        instruments.sort(key=lambda e: abs(e['gross_notional'] or 0.0), reverse=True)
+        result = {'instruments': instruments}
+
+        if group_by in ('asset_class', 'currency'):
+            groups: Dict[str, Dict] = defaultdict(lambda: {
+                'net_notional': 0.0, 'gross_notional': 0.0, 'unrealized_pnl': 0.0, 'instruments': 0, 'unpriced': 0
+            })
+            for entry in instruments:
+                group = groups[entry[group_by]]
+                group['instruments'] += 1
+                if entry['price'] is None:
+                    group['unpriced'] += 1
+                    continue
+                group['net_notional'] += entry['net_notional']
+                group['gross_notional'] += entry['gross_notional']
+                group['unrealized_pnl'] += entry['unrealized_pnl']
+            result['groups'] = dict(groups)
+
+        return result
+
+
+# Global exposure service instance
+exposure_service = ExposureService()
@@ -1,18 +1,328 @@
-from typing import Dict, List, Optional
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from collections import OrderedDict
 from datetime import datetime
-from app.models import UserChallenge, User
+from sqlalchemy.exc import IntegrityError
+from app.models import UserChallenge, User, LeaderboardEntry, LeaderboardArchive
+from app.utils import encode_cursor, decode_cursor, keyset_paginate
 from app import db
-from sqlalchemy import func
-from datetime import datetime
-import calendar
+import json
+import zlib
+import pytz
+import logging
+
+logger = logging.getLogger(__name__)
+
+ALL_TIME = 'all'
+
+# Challenges that count towards the monthly boards; only PASSED counts all-time
+MONTHLY_STATUSES = ('PASSED', 'STOPPED', 'FAILED')
+ALL_TIME_STATUSES = ('PASSED',)
+
+
+def month_period(year: int, month: int) -> str:
+    """Leaderboard period key of a month, e.g. '2026-03'."""
+    return f'{year:04d}-{month:02d}'
+
+
+def _local_month(dt: datetime) -> Tuple[int, int]:
+    local = pytz.utc.localize(dt).astimezone(pytz.timezone('Africa/Casablanca'))
+    return local.year, local.month
+
+
+def next_month_start(now: datetime) -> datetime:
+    """Start of the next Casablanca month as a naive UTC datetime (scheduler next_run)."""
+    tz = pytz.timezone('Africa/Casablanca')
+    year, month = _local_month(now)
+    year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return tz.localize(datetime(year, month, 1)).astimezone(pytz.utc).replace(tzinfo=None)
+
+
+def previous_month_period(now: datetime) -> str:
+    """Period key of the Casablanca month before the one containing now."""
+    year, month = _local_month(now)
+    year, month = (year - 1, 12) if month == 1 else (year, month - 1)
+    return month_period(year, month)
+
+
+def months_between(start: datetime, end: datetime) -> List[str]:
+    """Period keys of the Casablanca months from start to end (naive UTC), inclusive."""
+    year, month = _local_month(start)
+    last = _local_month(end)
+    periods = []
+    while (year, month) <= last:
+        periods.append(month_period(year, month))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return periods
+
+
+def compute_standings(rows: Iterable[tuple], now: Optional[datetime] = None) -> Dict[Tuple[str, int], Dict]:
+    """
+    Best challenge per (period, user) from challenge rows.
+
+    A challenge in MONTHLY_STATUSES counts for every month from its start
+    until its end_time (or now when it has none); a PASSED challenge also
+    counts for the all-time board.
+
+    Args:
+        rows: (user_challenge_id, user_id, email, status, start_balance,
+            current_equity, start_time, end_time) tuples
+        now: Naive UTC time closing open-ended challenges (default: now)
+
+    Returns:
+        Dict mapping (period, user_id) to LeaderboardEntry column values
+    """
+    now = now or datetime.utcnow()
+    best: Dict[Tuple[str, int], Dict] = {}
+
+    for uc_id, user_id, email, status, start_balance, equity, start_time, end_time in rows:
+        if status not in MONTHLY_STATUSES or not start_balance:
+            continue
+        entry = {
+            'user_id': user_id,
+            'user_challenge_id': uc_id,
+            'username': email.split('@')[0],  # Use email prefix as username
+            'start_balance': start_balance,
+            'equity': equity or 0.0,
+            'profit_pct': ((equity or 0.0) - start_balance) / start_balance,
+            'challenge_status': status,
+            'start_time': start_time,
+            'end_time': end_time,
+        }
+        periods = months_between(start_time, end_time or now) if start_time else []
+        if status in ALL_TIME_STATUSES:
+            periods.append(ALL_TIME)
+
+        for period in periods:
+            current = best.get((period, user_id))
+            if current is None or entry['profit_pct'] > current['profit_pct']:
+                best[(period, user_id)] = dict(entry, period=period)
+    return best
 
 
 class LeaderboardService:
     """
     Service class to manage leaderboard functionality.
     Provides monthly and all-time leaderboards based on challenge performance.
+
+    Standings are materialized in leaderboard_entries, one row per user and
+    period, and refreshed for a user whenever one of their challenges
+    changes status or equity. Reading a board is an indexed top-K scan
+    whose cost does not depend on the number of challenges.
     """
     
+    # Decompressed archives of closed months (standings, user_id -> index);
+    # archives never change, so they are only evicted for size
+    _archives: 'OrderedDict[str, Tuple[List[Dict], Dict[int, int]]]' = OrderedDict()
+    ARCHIVE_MEMO_SIZE = 24
+    
+    # Called as listener(user_id, {period: profit_pct}) after a user's standings
+    # are refreshed, and as listener(None, {}) after a full rebuild
+    _standings_listeners: List[Callable[[Optional[int], Dict[str, float]], None]] = []
+    
+    @classmethod
+    def add_standings_listener(cls, listener: Callable[[Optional[int], Dict[str, float]], None]) -> None:
+        """Register a callback fed with refreshed standings. Registering twice is a no-op."""
+        if listener not in cls._standings_listeners:
+            cls._standings_listeners.append(listener)
+    
+    @classmethod
+    def _notify_standings(cls, user_id: Optional[int], standings: Dict[str, float]) -> None:
+        for listener in cls._standings_listeners:
+            try:
+                listener(user_id, standings)
+            except Exception as e:
+                logger.error(f"Standings listener failed for user {user_id}: {e}")
+    
+    @staticmethod
+    def _challenge_rows(user_id: Optional[int] = None) -> List[tuple]:
+        query = db.session.query(
+            UserChallenge.id, UserChallenge.user_id, User.email, UserChallenge.status,
+            UserChallenge.start_balance, UserChallenge.current_equity,
+            UserChallenge.start_time, UserChallenge.end_time
+        ).join(User, UserChallenge.user_id == User.id).filter(
+            UserChallenge.status.in_(MONTHLY_STATUSES)
+        )
+        if user_id is not None:
+            query = query.filter(UserChallenge.user_id == user_id)
+        return query.all()
+    
+    @staticmethod
+    def refresh_user(user_id: int) -> int:
+        """
+        Recompute one user's standings in every period.
+        
+        Returns:
+            Number of leaderboard rows written
+        """
+        standings = compute_standings(LeaderboardService._challenge_rows(user_id))
+        LeaderboardEntry.query.filter(LeaderboardEntry.user_id == user_id).delete(synchronize_session=False)
+        db.session.add_all([LeaderboardEntry(**entry) for entry in standings.values()])
+        db.session.commit()
+        LeaderboardService._notify_standings(user_id, {period: entry['profit_pct'] for (period, _), entry in standings.items()})
+        return len(standings)
+    
+    @staticmethod
+    def on_challenge_change(user_id: int) -> None:
+        """
+        Refresh a user's standings after one of their challenges changed.
+        
+        Runs after the change is committed; a failure is logged and left for
+        the next refresh or `flask rebuild-leaderboards` instead of failing
+        the request.
+        """
+        try:
+            LeaderboardService.refresh_user(user_id)
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error refreshing leaderboard standings of user {user_id}: {e}")
+    
+    @staticmethod
+    def rebuild() -> int:
+        """
+        Recompute every leaderboard from user_challenges in one pass.
+        
+        Returns:
+            Number of leaderboard rows written
+        """
+        standings = compute_standings(LeaderboardService._challenge_rows())
+        LeaderboardEntry.query.delete(synchronize_session=False)
+        db.session.add_all([LeaderboardEntry(**entry) for entry in standings.values()])
+        db.session.commit()
+        LeaderboardService._notify_standings(None, {})
+        logger.info(f"Rebuilt leaderboards with {len(standings)} entries")
+        return len(standings)
+    
+    def close_month(self, period: str) -> int:
+        """
+        Freeze a closed month's final standings into leaderboard_archives.
+        
+        A month is archived once; closing it again keeps the first archive.
+        
+        Args:
+            period: Period key of a past month ('YYYY-MM')
+            
+        Returns:
+            Number of archived entries
+            
+        Raises:
+            ValueError: If the month has not ended yet
+        """
+        if period == ALL_TIME or period >= month_period(*self.current_month()):
+            raise ValueError(f'Month {period} has not ended yet')
+        
+        existing = db.session.get(LeaderboardArchive, period)
+        if existing is not None:
+            return existing.entry_count
+        
+        rows = LeaderboardEntry.query.filter(LeaderboardEntry.period == period).order_by(
+            LeaderboardEntry.profit_pct.desc(), LeaderboardEntry.user_id
+        ).all()
+        standings = [self._serialize(entry, rank, 'final_equity') for rank, entry in enumerate(rows, 1)]
+        try:
+            db.session.add(LeaderboardArchive(
+                period=period,
+                entry_count=len(standings),
+                standings=zlib.compress(json.dumps(standings).encode())
+            ))
+            db.session.commit()
+        except IntegrityError:
+            # Another worker closed the month first; theirs is the archive
+            db.session.rollback()
+            return db.session.get(LeaderboardArchive, period).entry_count
+        
+        logger.info(f"Archived leaderboard {period} with {len(standings)} entries")
+        return len(standings)
+    
+    def open_month(self) -> int:
+        """
+        Month-open job: rebuild the boards so open-ended challenges enter the
+        new month, then freeze the month that just closed.
+        
+        Returns:
+            Number of archived entries of the closed month
+        """
+        self.rebuild()
+        return self.close_month(previous_month_period(datetime.utcnow()))
+    
+    def archived_standings(self, period: str) -> Optional[List[Dict]]:
+        """Frozen standings of a closed month, or None if it is live or not archived."""
+        archive = self._archive(period)
+        return archive[0] if archive else None
+    
+    def _archive(self, period: str) -> Optional[Tuple[List[Dict], Dict[int, int]]]:
+        if period == ALL_TIME or period >= month_period(*self.current_month()):
+            return None
+        archive = self._archives.get(period)
+        if archive is not None:
+            return archive
+        
+        row = db.session.get(LeaderboardArchive, period)
+        if row is None:
+            return None
+        standings = json.loads(zlib.decompress(row.standings))
+        archive = (standings, {entry['user_id']: index for index, entry in enumerate(standings)})
+        self._archives[period] = archive
+        while len(self._archives) > self.ARCHIVE_MEMO_SIZE:
+            self._archives.popitem(last=False)
+        return archive
+    
+    def _serialize(self, entry: LeaderboardEntry, rank: int, equity_key: str) -> Dict:
+        return {
+            'rank': rank,
+            'user_id': entry.user_id,
+            'username': entry.username,
+            'start_balance': entry.start_balance,
+            equity_key: float(entry.equity),
+            'profit_pct': float(entry.profit_pct),
+            'challenge_status': entry.challenge_status,
+            'challenge_duration': self._calculate_duration(entry.start_time, entry.end_time)
+        }
+    
+    def get_page(self, period: str, limit: int = 10, cursor: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        """
+        Get one page of a leaderboard, best first.
+        
+        Pages are keyset-paginated on (profit_pct desc, user_id) over the
+        (period, profit_pct desc, user_id) index, so a deep page costs the
+        same as the first one. The cursor also carries the rank reached, so
+        ranks continue across pages. Closed months that were archived are
+        sliced from their frozen standings instead.
+        
+        Args:
+            period: Period key ('YYYY-MM' or 'all')
+            limit: Page size
+            cursor: Cursor from the previous page, if any
+            
+        Returns:
+            Tuple of (entries, next_cursor); next_cursor is None on the last page
+            
+        Raises:
+            ValueError: If the cursor is malformed
+        """
+        offset, seek = 0, None
+        if cursor:
+            values = decode_cursor(cursor)
+            if len(values) != 3:
+                raise ValueError('Invalid cursor')
+            offset, seek = int(values[2]), encode_cursor(values[:2])
+        
+        archived = self.archived_standings(period)
+        if archived is not None:
+            entries = archived[offset:offset + limit]
+            more = offset + limit < len(archived)
+            next_cursor = encode_cursor([entries[-1]['profit_pct'], entries[-1]['user_id'], offset + len(entries)]) if more else None
+            return entries, next_cursor
+        
+        rows, more = keyset_paginate(
+            LeaderboardEntry.query.filter(LeaderboardEntry.period == period),
+            LeaderboardEntry.profit_pct, LeaderboardEntry.user_id, limit, seek,
+            descending=True, id_descending=False
+        )
+        equity_key = 'max_equity' if period == ALL_TIME else 'final_equity'
+        entries = [self._serialize(entry, rank, equity_key) for rank, entry in enumerate(rows, offset + 1)]
+        next_cursor = encode_cursor([rows[-1].profit_pct, rows[-1].user_id, offset + len(rows)]) if more else None
+        return entries, next_cursor
+    
     def get_monthly_leaderboard(self, year: Optional[int] = None, month: Optional[int] = None) -> List[Dict]:
         """
         Get monthly leaderboard for a specific month.
@@ -25,67 +335,8 @@ class LeaderboardService:
             List of top 10 users for the month
         """
         if year is None or month is None:
-            now = datetime.utcnow()
-            year = now.year
-            month = now.month
-        
-        # Calculate start and end dates for the month in Casablanca timezone
-        from app.utils import get_casablanca_time
-        casablanca_time = get_casablanca_time()
-        
-        # If the requested month is the current month, use current time, otherwise use month end
-        if year == casablanca_time.year and month == casablanca_time.month:
-            # For current month, get challenges that are completed or have latest equity snapshot
-            start_date = casablanca_time.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-            end_date = casablanca_time
-        else:
-            # For past months, get last day of the month
-            last_day = calendar.monthrange(year, month)[1]
-            start_date = datetime(year, month, 1)
-            end_date = datetime(year, month, last_day, 23, 59, 59)
-        
-        # Query for challenges that were active during the month and have passed/completed
-        from sqlalchemy import and_, or_
-        
-        # Get top 10 users based on percentage return for the month
-        leaderboard_query = db.session.query(
-            UserChallenge,
-            User,
-            func.max(UserChallenge.current_equity).label('final_equity')
-        ).join(
-            User, UserChallenge.user_id == User.id
-        ).filter(
-            and_(
-                UserChallenge.status.in_(['PASSED', 'STOPPED', 'FAILED']),  # Completed challenges
-                UserChallenge.start_time <= end_date,
-                or_(
-                    UserChallenge.end_time.is_(None),  # No end time (still in progress)
-                    UserChallenge.end_time >= start_date  # Ended after start of month
-                )
-            )
-        ).group_by(
-            UserChallenge.user_id
-        ).order_by(
-            (func.max(UserChallenge.current_equity) - UserChallenge.start_balance) / UserChallenge.start_balance.desc()
-        ).limit(10)
-        
-        results = leaderboard_query.all()
-        
-        leaderboard = []
-        for user_challenge, user, final_equity in results:
-            profit_pct = (final_equity - user_challenge.start_balance) / user_challenge.start_balance
-            leaderboard.append({
-                'rank': len(leaderboard) + 1,
-                'user_id': user.id,
-                'username': user.email.split('@')[0],  # Use email prefix as username
-                'start_balance': user_challenge.start_balance,
-                'final_equity': float(final_equity),
-                'profit_pct': float(profit_pct),
-                'challenge_status': user_challenge.status,
-                'challenge_duration': self._calculate_duration(user_challenge.start_time, user_challenge.end_time)
-            })
-        
-        return leaderboard
+            year, month = _local_month(datetime.utcnow())
+        return self.get_page(month_period(year, month))[0]
     
     def get_all_time_leaderboard(self) -> List[Dict]:
         """
@@ -94,38 +345,12 @@ class LeaderboardService:
         Returns:
             List of top users of all time
         """
-        # Get top 10 users based on best percentage return across all challenges
-        leaderboard_query = db.session.query(
-            UserChallenge,
-            User,
-            func.max(UserChallenge.current_equity).label('max_equity')
-        ).join(
-            User, UserChallenge.user_id == User.id
-        ).filter(
-            UserChallenge.status == 'PASSED'  # Only passed challenges count
-        ).group_by(
-            UserChallenge.user_id
-        ).order_by(
-            (func.max(UserChallenge.current_equity) - UserChallenge.start_balance) / UserChallenge.start_balance.desc()
-        ).limit(10)
-        
-        results = leaderboard_query.all()
-        
-        leaderboard = []
-        for user_challenge, user, max_equity in results:
-            profit_pct = (max_equity - user_challenge.start_balance) / user_challenge.start_balance
-            leaderboard.append({
-                'rank': len(leaderboard) + 1,
-                'user_id': user.id,
-                'username': user.email.split('@')[0],  # Use email prefix as username
-                'start_balance': user_challenge.start_balance,
-                'max_equity': float(max_equity),
-                'profit_pct': float(profit_pct),
-                'challenge_status': user_challenge.status,
-                'challenge_duration': self._calculate_duration(user_challenge.start_time, user_challenge.end_time)
-            })
-        
-        return leaderboard
+        return self.get_page(ALL_TIME)[0]
+    
+    @staticmethod
+    def current_month() -> Tuple[int, int]:
+        """(year, month) of the current Casablanca month."""
+        return _local_month(datetime.utcnow())
     
     def _calculate_duration(self, start_time: datetime, end_time: datetime) -> str:
         """Calculate duration string from start to end time."""
@@ -144,43 +369,86 @@ class LeaderboardService:
         else:
             return f"{minutes}m"
     
-    def get_user_ranking(self, user_id: int, year: Optional[int] = None, month: Optional[int] = None) -> Dict:
+    def get_user_ranking(self, user_id: int, year: Optional[int] = None, month: Optional[int] = None,
+                         around: int = 0) -> Dict:
         """
         Get a specific user's ranking.
         
+        Ranks come from the in-memory rank index, so every ranked user gets
+        their true position, not only the top 10; archived months use their
+        frozen standings.
+        
+        The two sources can disagree briefly: ranks and totals reflect other
+        workers' refreshes only after LEADERBOARD_RANK_TTL_SECONDS, while the
+        performance blocks are read from leaderboard_entries at request time.
+        A user the index does not rank yet gets no performance block for
+        that board, rather than a row with a rank that belongs to an older
+        profit.
+        
         Args:
             user_id: ID of the user
             year: Year for the ranking (default: current year)
             month: Month for the ranking (default: current month)
+            around: Also list this many users either side of the user
             
         Returns:
             Dict with user's ranking information
         """
+        from app.services.rank_index import leaderboard_ranks
+        
         if year is None or month is None:
-            now = datetime.utcnow()
-            year = now.year
-            month = now.month
-        
-        # Get monthly ranking
-        monthly_leaderboard = self.get_monthly_leaderboard(year, month)
-        monthly_rank = None
-        for idx, entry in enumerate(monthly_leaderboard):
-            if entry['user_id'] == user_id:
-                monthly_rank = idx + 1
-                break
-        
-        # Get all-time ranking
-        all_time_leaderboard = self.get_all_time_leaderboard()
-        all_time_rank = None
-        for idx, entry in enumerate(all_time_leaderboard):
-            if entry['user_id'] == user_id:
-                all_time_rank = idx + 1
-                break
+            year, month = _local_month(datetime.utcnow())
+        monthly_period = month_period(year, month)
+        archive = self._archive(monthly_period)
         
-        return {
+        all_time_rank = leaderboard_ranks.rank(ALL_TIME, user_id)
+        periods = [ALL_TIME] if archive else [monthly_period, ALL_TIME]
+        entries = {entry.period: entry for entry in LeaderboardEntry.query.filter(
+            LeaderboardEntry.user_id == user_id,
+            LeaderboardEntry.period.in_(periods)
+        ).all()}
+        all_time_entry = entries.get(ALL_TIME)
+        
+        if archive is not None:
+            # A closed month answers from its frozen standings
+            standings, positions = archive
+            index = positions.get(user_id)
+            monthly_rank = index + 1 if index is not None else None
+            monthly_total = len(standings)
+            monthly_performance = standings[index] if index is not None else None
+        else:
+            monthly_rank = leaderboard_ranks.rank(monthly_period, user_id)
+            monthly_total = leaderboard_ranks.count(monthly_period)
+            monthly_entry = entries.get(monthly_period)
+            monthly_performance = self._serialize(monthly_entry, monthly_rank, 'final_equity') if monthly_entry and monthly_rank else None
+        
+        result = {
             'user_id': user_id,
             'monthly_rank': monthly_rank,
             'all_time_rank': all_time_rank,
-            'monthly_performance': next((item for item in monthly_leaderboard if item['user_id'] == user_id), None),
-            'all_time_performance': next((item for item in all_time_leaderboard if item['user_id'] == user_id), None)
-        }
\ No newline at end of file
+            'monthly_total': monthly_total,
+            'all_time_total': leaderboard_ranks.count(ALL_TIME),
+            'monthly_performance': monthly_performance,
+            'all_time_performance': self._serialize(all_time_entry, all_time_rank, 'max_equity') if all_time_entry and all_time_rank else None
+        }
+        
+        if around > 0:
+            if archive is not None:
+                result['monthly_around'] = standings[max(monthly_rank - 1 - around, 0):monthly_rank + around] if monthly_rank else []
+            else:
+                result['monthly_around'] = self._neighbours(monthly_period, user_id, around, 'final_equity')
+            result['all_time_around'] = self._neighbours(ALL_TIME, user_id, around, 'max_equity')
+        
+        return result
+    
+    def _neighbours(self, period: str, user_id: int, radius: int, equity_key: str) -> List[Dict]:
+        from app.services.rank_index import leaderboard_ranks
+        
+        ranked = leaderboard_ranks.around(period, user_id, radius)
+        if not ranked:
+            return []
+        entries = {entry.user_id: entry for entry in LeaderboardEntry.query.filter(
+            LeaderboardEntry.period == period,
+            LeaderboardEntry.user_id.in_([uid for _, uid, _ in ranked])
+        ).all()}
+        return [self._serialize(entries[uid], rank, equity_key) for rank, uid, _ in ranked if uid in entries]
@@ -1,6 +1,6 @@
 import time
 import random
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional
 from app.providers import BinanceProvider, MT5Provider, MoroccoProvider, YahooProvider
 from app.utils import InMemoryCache
 import logging
@@ -14,6 +14,26 @@ class MarketDataService:
     Implements the adapter pattern to provide a unified interface to different market data providers.
     """
     
+    # Callbacks notified of every quote served, shared by all instances
+    _quote_listeners: List[Callable[[str, str, Dict], None]] = []
+    
+    @classmethod
+    def add_quote_listener(cls, listener: Callable[[str, str, Dict], None]) -> None:
+        """
+        Register a callback invoked as listener(provider, instrument, quote)
+        whenever a quote is served. Registering the same callback twice is a no-op.
+        """
+        if listener not in cls._quote_listeners:
+            cls._quote_listeners.append(listener)
+    
+    def _notify_quote(self, instrument: str, provider: str, quote: Dict) -> None:
+        """Pass a served quote to the registered listeners."""
+        for listener in self._quote_listeners:
+            try:
+                listener(provider.upper(), instrument, quote)
+            except Exception as e:
+                logger.error(f"Quote listener failed for {provider}:{instrument}: {e}")
+    
     def __init__(self):
         # Initialize providers
         try:
@@ -84,12 +104,35 @@ class MarketDataService:
         Returns:
             Dict with keys: bid, ask, last, ts (timestamp)
         """
+        # Always return a jittered version for immediate UI feedback
+        quote = self._apply_dynamic_jitter(self._raw_quote(instrument, provider))
+        self._notify_quote(instrument, provider, quote)
+        return quote
+
+    def peek_quote(self, instrument: str, provider: str) -> Dict:
+        """
+        Get the current quote without passing it to the quote listeners.
+
+        For lookups that must not act on the market, such as pre-trade
+        simulations: a served quote can trigger resting orders and SL/TP.
+
+        Args:
+            instrument: Provider-specific instrument symbol
+            provider: Provider name ('BINANCE', 'MT5', 'MOROCCO')
+
+        Returns:
+            Dict with keys: bid, ask, last, ts (timestamp)
+        """
+        return dict(self._raw_quote(instrument, provider))
+
+    def _raw_quote(self, instrument: str, provider: str) -> Dict:
+        """Cached provider quote, fetched and cached on a miss."""
         cache_key = f"quote_{provider}_{instrument}"
         
         # Try to get from cache first
         cached_result = self.cache.get(cache_key)
         if cached_result:
-            return self._apply_dynamic_jitter(cached_result)
+            return cached_result
         
         # Get provider instance
         provider_instance = self.providers.get(provider.upper())
@@ -108,9 +151,7 @@ class MarketDataService:
             pass
         
         self.cache.set(cache_key, result, ttl)
-        
-        # Always return a jittered version for immediate UI feedback
-        return self._apply_dynamic_jitter(result)
+        return result
     
     def get_ohlcv(self, instrument: str, provider: str, timeframe: str, limit: int) -> List[Dict]:
         """
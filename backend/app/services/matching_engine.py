@@ -0,0 +1,223 @@
+import heapq
+import itertools
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple
+
+
+@dataclass
+class RestingOrder:
+    """In-memory view of an open order held by the matching engine."""
+    order_id: int
+    user_challenge_id: int
+    instrument_id: int
+    side: str  # 'BUY' or 'SELL'
+    order_type: str  # 'LIMIT', 'STOP', 'STOP_LIMIT'
+    qty: float
+    limit_price: Optional[float] = None
+    stop_price: Optional[float] = None
+    triggered: bool = False  # STOP_LIMIT whose stop has been hit
+
+
+@dataclass
+class EngineEvent:
+    """Something the engine decided on a quote: a fill or a stop trigger."""
+    kind: str  # 'FILL' or 'TRIGGER'
+    order: RestingOrder
+    price: float
+
+
+class InstrumentBook:
+    """
+    Price-sorted resting orders for one instrument.
+
+    Four binary heaps, each keyed so the order closest to executing is on top:
+    buy limits (highest price first), sell limits (lowest first), buy stops
+    (lowest stop first) and sell stops (highest stop first). Entries are
+    (sort_key, sequence, order_id); the sequence gives time priority at equal
+    prices. Cancelled orders are removed lazily when they reach the top.
+    """
+
+    def __init__(self):
+        self.buy_limits: List[Tuple[float, int, int]] = []
+        self.sell_limits: List[Tuple[float, int, int]] = []
+        self.buy_stops: List[Tuple[float, int, int]] = []
+        self.sell_stops: List[Tuple[float, int, int]] = []
+        self.dead = 0
+
+    def __len__(self):
+        return len(self.buy_limits) + len(self.sell_limits) + len(self.buy_stops) + len(self.sell_stops)
+
+
+class MatchingEngine:
+    """
+    In-memory matching engine for resting challenge orders.
+
+    Orders rest in per-instrument heaps and are matched against incoming
+    quotes: a quote that crosses nothing costs four heap-top comparisons, and
+    each fill or trigger costs one heap pop, so matching is O(log n + fills)
+    per tick regardless of book size. The engine only decides; persisting
+    fills is the caller's job.
+    """
+
+    COMPACT_THRESHOLD = 1024
+
+    def __init__(self):
+        self._books: Dict[int, InstrumentBook] = {}
+        self._orders: Dict[int, RestingOrder] = {}
+        self._symbols: Dict[Tuple[str, str], int] = {}
+        self._sequence = itertools.count()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._orders)
+
+    def __contains__(self, order_id: int) -> bool:
+        return order_id in self._orders
+
+    def order_ids(self) -> Set[int]:
+        """Ids of the orders currently resting."""
+        with self._lock:
+            return set(self._orders)
+
+    def register_instrument(self, instrument_id: int, provider: str, provider_symbol: str) -> None:
+        """Map a provider quote stream to an instrument book."""
+        with self._lock:
+            self._symbols[(provider.upper(), provider_symbol)] = instrument_id
+
+    def instrument_for_symbol(self, provider: str, provider_symbol: str) -> Optional[int]:
+        """Get the instrument id registered for a provider symbol, if any."""
+        return self._symbols.get((provider.upper(), provider_symbol))
+
+    def add(self, order: RestingOrder) -> None:
+        """
+        Add an order to its instrument book (no-op if it is already resting).
+
+        Raises:
+            ValueError: If the order is missing the prices its type needs
+        """
+        if order.order_type in ('LIMIT', 'STOP_LIMIT') and order.limit_price is None:
+            raise ValueError(f"{order.order_type} order requires a limit price")
+        if order.order_type in ('STOP', 'STOP_LIMIT') and order.stop_price is None:
+            raise ValueError(f"{order.order_type} order requires a stop price")
+        if order.order_type not in ('LIMIT', 'STOP', 'STOP_LIMIT'):
+            raise ValueError(f"Unsupported order type: {order.order_type}")
+
+        with self._lock:
+            if order.order_id in self._orders:
+                return
+            book = self._books.setdefault(order.instrument_id, InstrumentBook())
+            self._orders[order.order_id] = order
+            self._push(book, order)
+
+    def cancel(self, order_id: int) -> bool:
+        """
+        Remove an order from the engine.
+
+        Returns:
+            True if the order was resting, False otherwise
+        """
+        with self._lock:
+            order = self._orders.pop(order_id, None)
+            if order is None:
+                return False
+            book = self._books[order.instrument_id]
+            book.dead += 1
+            if book.dead > self.COMPACT_THRESHOLD and book.dead * 2 > len(book):
+                self._compact(order.instrument_id)
+            return True
+
+    def on_quote(self, instrument_id: int, bid: float, ask: float) -> List[EngineEvent]:
+        """
+        Match resting orders against a new quote.
+
+        Buy orders execute against the ask and sell orders against the bid.
+        Stops are processed first so a STOP_LIMIT triggered by this quote can
+        fill on the same quote.
+
+        Args:
+            instrument_id: Instrument the quote belongs to
+            bid: Current bid
+            ask: Current ask
+
+        Returns:
+            List of events (fills and STOP_LIMIT triggers) in execution order
+        """
+        book = self._books.get(instrument_id)
+        if book is None:
+            return []
+
+        events: List[EngineEvent] = []
+        with self._lock:
+            # Buy stops trigger when the ask rises to the stop
+            while book.buy_stops and book.buy_stops[0][0] <= ask:
+                order = self._pop_live(book, book.buy_stops)
+                if order:
+                    self._trigger(book, order, ask, events)
+
+            # Sell stops trigger when the bid falls to the stop
+            while book.sell_stops and -book.sell_stops[0][0] >= bid:
+                order = self._pop_live(book, book.sell_stops)
+                if order:
+                    self._trigger(book, order, bid, events)
+
+            # Buy limits fill when the ask is at or below the limit
+            while book.buy_limits and -book.buy_limits[0][0] >= ask:
+                order = self._pop_live(book, book.buy_limits)
+                if order:
+                    del self._orders[order.order_id]
+                    events.append(EngineEvent('FILL', order, ask))
+
+            # Sell limits fill when the bid is at or above the limit
+            while book.sell_limits and book.sell_limits[0][0] <= bid:
+                order = self._pop_live(book, book.sell_limits)
+                if order:
+                    del self._orders[order.order_id]
+                    events.append(EngineEvent('FILL', order, bid))
+
+        return events
+
+    def _push(self, book: InstrumentBook, order: RestingOrder) -> None:
+        entry_seq = next(self._sequence)
+        if order.order_type == 'LIMIT' or order.triggered:
+            if order.side == 'BUY':
+                heapq.heappush(book.buy_limits, (-order.limit_price, entry_seq, order.order_id))
+            else:
+                heapq.heappush(book.sell_limits, (order.limit_price, entry_seq, order.order_id))
+        else:
+            if order.side == 'BUY':
+                heapq.heappush(book.buy_stops, (order.stop_price, entry_seq, order.order_id))
+            else:
+                heapq.heappush(book.sell_stops, (-order.stop_price, entry_seq, order.order_id))
+
+    def _pop_live(self, book: InstrumentBook, heap: List) -> Optional[RestingOrder]:
+        """Pop the top entry, returning its order or None if it was cancelled."""
+        _, _, order_id = heapq.heappop(heap)
+        order = self._orders.get(order_id)
+        if order is None:
+            book.dead -= 1
+        return order
+
+    def _trigger(self, book: InstrumentBook, order: RestingOrder, price: float, events: List[EngineEvent]) -> None:
+        if order.order_type == 'STOP':
+            # Stop becomes a market order at the triggering quote
+            del self._orders[order.order_id]
+            events.append(EngineEvent('FILL', order, price))
+        else:
+            # Stop-limit becomes a resting limit order
+            order.triggered = True
+            events.append(EngineEvent('TRIGGER', order, price))
+            self._push(book, order)
+
+    def _compact(self, instrument_id: int) -> None:
+        """Rebuild an instrument's heaps without cancelled entries."""
+        book = self._books[instrument_id]
+        for name in ('buy_limits', 'sell_limits', 'buy_stops', 'sell_stops'):
+            heap = [entry for entry in getattr(book, name) if entry[2] in self._orders]
+            heapq.heapify(heap)
+            setattr(book, name, heap)
+        book.dead = 0
+
+
+# Global engine instance shared by all request threads of this process
+matching_engine = MatchingEngine()
@@ -0,0 +1,351 @@
+import time
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import update
+from app.models import Order, UserChallenge, Instrument, ACTIVE_STATUSES
+from app.services.matching_engine import matching_engine, RestingOrder, EngineEvent
+from app.services.market_data_service import MarketDataService
+from app.services.rule_engine import rule_engine
+from app import db
+from app.utils import keyset_paginate
+from app.utils.event_worker import EventWorker
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class OrderService:
+    """
+    Service class to manage resting limit, stop and stop-limit orders.
+
+    Open orders live in the in-memory matching engine and in the orders
+    table. Quotes served by MarketDataService are matched as they arrive;
+    the resulting fills are queued and executed by this process's event
+    worker, so quote reads never write to the database themselves and no
+    request pays for fills it did not cause.
+    """
+
+    ORDER_TYPES = ('LIMIT', 'STOP', 'STOP_LIMIT')
+    OPEN_STATUSES = ('OPEN', 'TRIGGERED')
+
+    def __init__(self, engine=matching_engine):
+        self.engine = engine
+        self._pending: deque = deque()
+        self._drain_lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._synced_up_to: Optional[datetime] = None
+        self._last_sync = 0.0
+        self.sync_interval = 5
+        self._challenge_service = None
+        self.worker = EventWorker('order-events', self.process_pending)
+
+    @property
+    def challenge_service(self):
+        if self._challenge_service is None:
+            from app.services.challenge_service import ChallengeService
+            self._challenge_service = ChallengeService()
+        return self._challenge_service
+
+    def init_app(self, app) -> None:
+        """Hook the service into quote updates and the request cycle."""
+        self.sync_interval = app.config.get('ORDER_BOOK_SYNC_SECONDS', 5)
+        MarketDataService.add_quote_listener(self.on_quote)
+        self.worker.init_app(app)
+
+        @app.before_request
+        def _sync_order_book():
+            try:
+                self.sync_open_orders()
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Failed to sync order book: {e}")
+
+    def place_order(self, user_challenge: UserChallenge, instrument_id: int, side: str, order_type: str,
+                    qty: float, limit_price: Optional[float] = None, stop_price: Optional[float] = None) -> Order:
+        """
+        Place a resting order for a user challenge.
+
+        Args:
+            user_challenge: Owning user challenge (must be in progress)
+            instrument_id: ID of the instrument to trade
+            side: 'BUY' or 'SELL'
+            order_type: 'LIMIT', 'STOP' or 'STOP_LIMIT'
+            qty: Quantity to trade
+            limit_price: Limit price (LIMIT and STOP_LIMIT)
+            stop_price: Trigger price (STOP and STOP_LIMIT)
+
+        Returns:
+            Order instance
+        """
+        if side not in ['BUY', 'SELL']:
+            raise ValueError("Side must be 'BUY' or 'SELL'")
+        if order_type not in self.ORDER_TYPES:
+            raise ValueError(f"order_type must be one of {', '.join(self.ORDER_TYPES)}")
+        if qty <= 0:
+            raise ValueError("Quantity must be positive")
+        if order_type in ('LIMIT', 'STOP_LIMIT') and (limit_price is None or limit_price <= 0):
+            raise ValueError(f"{order_type} order requires a positive limit_price")
+        if order_type in ('STOP', 'STOP_LIMIT') and (stop_price is None or stop_price <= 0):
+            raise ValueError(f"{order_type} order requires a positive stop_price")
+        if user_challenge.status not in ACTIVE_STATUSES:
+            raise ValueError("Challenge is not in progress")
+
+        if user_challenge.challenge:
+            violations = rule_engine.rule_set_for(user_challenge.challenge).check_order(qty)
+            if violations:
+                raise ValueError(violations[0]['message'])
+
+        instrument = Instrument.query.get(instrument_id)
+        if not instrument:
+            raise ValueError("Instrument not found")
+
+        order = Order(
+            user_challenge_id=user_challenge.id,
+            instrument_id=instrument_id,
+            side=side,
+            order_type=order_type,
+            qty=qty,
+            limit_price=limit_price if order_type != 'STOP' else None,
+            stop_price=stop_price if order_type != 'LIMIT' else None,
+            status='OPEN'
+        )
+        db.session.add(order)
+        db.session.commit()
+
+        self.engine.register_instrument(instrument.id, instrument.provider, instrument.provider_symbol)
+        self.engine.add(self._to_resting(order))
+        return order
+
+    def cancel_order(self, user_challenge_id: int, order_id: int) -> Order:
+        """
+        Cancel an open order.
+
+        Returns:
+            The cancelled Order
+
+        Raises:
+            ValueError: If the order does not exist or is no longer open
+        """
+        order = Order.query.filter_by(id=order_id, user_challenge_id=user_challenge_id).first()
+        if not order:
+            raise ValueError("Order not found")
+
+        # Conditional update so a fill racing in another worker wins cleanly
+        result = db.session.execute(
+            update(Order)
+            .where(Order.id == order_id, Order.status.in_(self.OPEN_STATUSES))
+            .values(status='CANCELLED', updated_at=datetime.utcnow())
+        )
+        db.session.commit()
+        self.engine.cancel(order_id)
+
+        if result.rowcount != 1:
+            raise ValueError(f"Order is already {order.status}")
+
+        db.session.refresh(order)
+        return order
+
+    def get_orders_page(self, user_challenge_id: int, limit: int, cursor: Optional[str] = None,
+                        status: Optional[str] = None) -> Tuple[List[Order], Optional[str]]:
+        """
+        Get one page of orders for a user challenge, newest first.
+
+        Args:
+            user_challenge_id: ID of the user challenge
+            limit: Page size
+            cursor: Cursor from the previous page, if any
+            status: Optional status filter
+
+        Returns:
+            Tuple of (orders, next_cursor)
+        """
+        query = Order.query.filter(Order.user_challenge_id == user_challenge_id)
+        if status:
+            query = query.filter(Order.status == status.upper())
+        return keyset_paginate(query, Order.created_at, Order.id, limit, cursor, descending=True)
+
+    def count_orders(self, user_challenge_id: int, status: Optional[str] = None) -> int:
+        """Number of orders of a user challenge matching the status filter (across every page)."""
+        query = Order.query.filter(Order.user_challenge_id == user_challenge_id)
+        if status:
+            query = query.filter(Order.status == status.upper())
+        return query.count()
+
+    def sync_open_orders(self, force: bool = False) -> int:
+        """
+        Reconcile the engine with the open orders in the database.
+
+        Every OPEN or TRIGGERED order that is neither resting nor waiting in
+        the event queue is (re)loaded, so orders placed through other worker
+        processes and orders whose fill failed to persist come back. Orders
+        filled or cancelled elsewhere since the last sync are dropped.
+
+        Runs on the first request and then at most every ORDER_BOOK_SYNC_SECONDS.
+
+        Returns:
+            Number of orders added to or removed from the engine
+        """
+        now = time.monotonic()
+        if not force and self._last_sync and now - self._last_sync < self.sync_interval:
+            return 0
+
+        with self._load_lock:
+            if not force and self._last_sync and now - self._last_sync < self.sync_interval:
+                return 0
+            self._last_sync = now
+
+            # Overlap the previous window to catch transactions that committed late
+            started = datetime.utcnow() - timedelta(seconds=max(self.sync_interval, 1))
+            in_flight = {event.order.order_id for event in list(self._pending)}
+
+            open_ids = {order_id for (order_id,) in db.session.query(Order.id).filter(
+                Order.status.in_(self.OPEN_STATUSES)
+            )}
+            missing = open_ids - self.engine.order_ids() - in_flight
+
+            changed = 0
+            if missing:
+                rows = db.session.query(Order, Instrument.provider, Instrument.provider_symbol).join(
+                    Instrument, Instrument.id == Order.instrument_id
+                ).filter(
+                    Order.id.in_(missing),
+                    Order.status.in_(self.OPEN_STATUSES)
+                ).order_by(Order.id.asc()).all()
+                for order, provider, provider_symbol in rows:
+                    self.engine.register_instrument(order.instrument_id, provider, provider_symbol)
+                    self.engine.add(self._to_resting(order))
+                    changed += 1
+
+            if self._synced_up_to is not None:
+                closed = db.session.query(Order.id).filter(
+                    Order.status.notin_(self.OPEN_STATUSES),
+                    Order.updated_at >= self._synced_up_to
+                )
+                for (order_id,) in closed:
+                    if order_id not in in_flight and self.engine.cancel(order_id):
+                        changed += 1
+
+            self._synced_up_to = started
+            return changed
+
+    def on_quote(self, provider: str, instrument: str, quote: Dict) -> None:
+        """MarketDataService quote listener: match the quote and queue the events."""
+        instrument_id = self.engine.instrument_for_symbol(provider, instrument)
+        if instrument_id is None:
+            return
+
+        bid = quote.get('bid') or quote.get('last')
+        ask = quote.get('ask') or quote.get('last')
+        if not bid or not ask:
+            return
+
+        events = self.engine.on_quote(instrument_id, bid, ask)
+        if events:
+            self._pending.extend(events)
+            self.worker.wake()
+
+    def process_pending(self) -> int:
+        """
+        Persist queued engine events: fill orders through ChallengeService and
+        mark triggered stop-limits. Fills executed here fetch fresh quotes for
+        risk evaluation, which can queue further events; those are drained in
+        the same call.
+
+        An event stays at the head of the queue until its outcome is committed
+        or rolled back, so a concurrent sync never reloads an order that is
+        still being filled. An order whose event failed to persist is still
+        open in the database and is reloaded by the next sync.
+
+        Returns:
+            Number of orders filled
+        """
+        if not self._drain_lock.acquire(blocking=False):
+            return 0
+
+        filled = 0
+        try:
+            while self._pending:
+                event = self._pending[0]
+                try:
+                    if event.kind == 'TRIGGER':
+                        self._mark_triggered(event)
+                    elif self._fill(event):
+                        filled += 1
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"Failed to persist {event.kind} of order {event.order.order_id}: {e}")
+                self._pending.popleft()
+        finally:
+            self._drain_lock.release()
+        return filled
+
+    def _mark_triggered(self, event: EngineEvent) -> None:
+        db.session.execute(
+            update(Order)
+            .where(Order.id == event.order.order_id, Order.status == 'OPEN')
+            .values(status='TRIGGERED', triggered_at=datetime.utcnow(), updated_at=datetime.utcnow())
+        )
+        db.session.commit()
+
+    def _fill(self, event: EngineEvent) -> bool:
+        resting = event.order
+
+        # Claim the order; another worker may already have filled or cancelled it
+        claimed = db.session.execute(
+            update(Order)
+            .where(Order.id == resting.order_id, Order.status.in_(self.OPEN_STATUSES))
+            .values(status='FILLING', updated_at=datetime.utcnow())
+        )
+        if claimed.rowcount != 1:
+            db.session.rollback()
+            return False
+
+        user_challenge = UserChallenge.query.get(resting.user_challenge_id)
+        if not user_challenge or user_challenge.status not in ACTIVE_STATUSES:
+            self._finish(resting.order_id, 'CANCELLED', reject_reason='Challenge is no longer in progress')
+            return False
+
+        try:
+            trade = self.challenge_service.execute_trade(
+                resting.user_challenge_id,
+                resting.instrument_id,
+                resting.side,
+                resting.qty,
+                price=event.price
+            )
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Failed to fill order {resting.order_id}: {e}")
+            self._finish(resting.order_id, 'REJECTED', reject_reason=str(e)[:200])
+            return False
+
+        self._finish(resting.order_id, 'FILLED', trade_id=trade.id, filled_at=trade.created_at)
+        return True
+
+    def _finish(self, order_id: int, status: str, **values) -> None:
+        db.session.execute(
+            update(Order)
+            .where(Order.id == order_id)
+            .values(status=status, updated_at=datetime.utcnow(), **values)
+        )
+        db.session.commit()
+
+    @staticmethod
+    def _to_resting(order: Order) -> RestingOrder:
+        return RestingOrder(
+            order_id=order.id,
+            user_challenge_id=order.user_challenge_id,
+            instrument_id=order.instrument_id,
+            side=order.side,
+            order_type=order.order_type,
+            qty=order.qty,
+            limit_price=order.limit_price,
+            stop_price=order.stop_price,
+            triggered=order.status == 'TRIGGERED'
+        )
+
+
+# Global order service instance
+order_service = OrderService()
@@ -0,0 +1,492 @@
+import math
+import time
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import update, bindparam, event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.models import ProfitSketchBucket, UserChallenge
+from app.services.leaderboard_service import ALL_TIME, months_between
+from app.utils import EventWorker
+from app import db
+import logging
+
+logger = logging.getLogger(__name__)
+
+# (sign, bucket) of a value in a sketch
+BucketKey = Tuple[int, int]
+# (period, challenge_id, bucket) -> count change
+Deltas = Dict[Tuple[str, int, BucketKey], float]
+
+# (challenge_id, bucket) -> count change applied to a period while it reloads;
+# the None key marks a reload that predates a rebuild
+Journal = Dict[Optional[Tuple[int, BucketKey]], float]
+
+# Session.info key of the sketch deltas waiting for their transaction to commit
+PENDING_DELTAS = 'percentile_deltas'
+
+
+class ProfitSketch:
+    """
+    Mergeable quantile sketch of profit percentages with relative accuracy.
+
+    Values are counted in logarithmic buckets of their magnitude (the
+    DDSketch layout): every quantile is within RELATIVE_ACCURACY of the
+    true value, and the number of buckets is bounded by the value range,
+    not by how many values were added. Unlike rank-based sketches, a value
+    can be taken out again by adding it with a negative weight, which is
+    what lets a challenge move buckets as its equity changes. Two sketches
+    merge by adding their bucket counts.
+    """
+
+    RELATIVE_ACCURACY = 0.01
+    GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+    # |profit_pct| below this counts as flat; above the cap lands in the top bucket
+    ZERO_THRESHOLD = 1e-4
+    MAX_VALUE = 100.0
+
+    _LOG_GAMMA = math.log(GAMMA)
+    _MAX_BUCKET = math.ceil(math.log(MAX_VALUE) / _LOG_GAMMA)
+
+    def __init__(self):
+        self.buckets: Dict[BucketKey, float] = {}
+        self._cumulative: Optional[Tuple[List[float], List[float], List[float]]] = None
+
+    @classmethod
+    def key(cls, value: float) -> BucketKey:
+        """Bucket of a value."""
+        magnitude = abs(value)
+        if magnitude < cls.ZERO_THRESHOLD:
+            return (0, 0)
+        bucket = min(math.ceil(math.log(magnitude) / cls._LOG_GAMMA), cls._MAX_BUCKET)
+        return (1 if value > 0 else -1, bucket)
+
+    @classmethod
+    def value_of(cls, key: BucketKey) -> float:
+        """Representative value of a bucket (within RELATIVE_ACCURACY of its members)."""
+        sign, bucket = key
+        if sign == 0:
+            return 0.0
+        return sign * 2 * cls.GAMMA ** bucket / (cls.GAMMA + 1)
+
+    @property
+    def count(self) -> float:
+        return sum(count for count in self.buckets.values() if count > 0)
+
+    def add_bucket(self, key: BucketKey, weight: float = 1.0) -> None:
+        """Add weight to a bucket; a negative weight removes values."""
+        count = self.buckets.get(key, 0.0) + weight
+        if abs(count) < 1e-9:
+            self.buckets.pop(key, None)
+        else:
+            self.buckets[key] = count
+        self._cumulative = None
+
+    def add(self, value: float, weight: float = 1.0) -> None:
+        """Add a value (a negative weight removes it)."""
+        self.add_bucket(self.key(value), weight)
+
+    def merge(self, other: 'ProfitSketch') -> None:
+        """Add another sketch's counts to this one."""
+        for key, count in other.buckets.items():
+            self.add_bucket(key, count)
+
+    def _sorted(self) -> Tuple[List[float], List[float], List[float]]:
+        # (bucket values, counts, counts below) in value order, rebuilt after a change.
+        # Counts driven below zero by unreconciled removals are ignored.
+        if self._cumulative is None:
+            items = sorted((self.value_of(key), count) for key, count in self.buckets.items() if count > 0)
+            values, counts, below = [], [], []
+            total = 0.0
+            for value, count in items:
+                values.append(value)
+                counts.append(count)
+                below.append(total)
+                total += count
+            self._cumulative = (values, counts, below)
+        return self._cumulative
+
+    def rank(self, value: float) -> float:
+        """
+        Fraction of values below a value, counting values in its own bucket
+        as half below; 0.0 when the sketch is empty.
+        """
+        values, counts, below = self._sorted()
+        if not values:
+            return 0.0
+        total = below[-1] + counts[-1]
+        target = self.value_of(self.key(value))
+        index = bisect_left(values, target)
+        rank = below[index] if index < len(values) else total
+        if index < len(values) and values[index] == target:
+            rank += counts[index] / 2
+        return rank / total
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Approximate q-quantile (0 <= q <= 1), or None when the sketch is empty."""
+        values, counts, below = self._sorted()
+        if not values:
+            return None
+        target = q * (below[-1] + counts[-1])
+        index = max(bisect_left(below, target) - 1, 0)
+        while index + 1 < len(values) and below[index] + counts[index] <= target:
+            index += 1
+        return values[index]
+
+    def to_dict(self) -> Dict:
+        """Serializable form, e.g. to ship a sketch between processes."""
+        return {
+            'relative_accuracy': self.RELATIVE_ACCURACY,
+            'buckets': [[sign, bucket, count] for (sign, bucket), count in sorted(self.buckets.items())]
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'ProfitSketch':
+        if data.get('relative_accuracy', cls.RELATIVE_ACCURACY) != cls.RELATIVE_ACCURACY:
+            raise ValueError('Sketch was built with a different relative accuracy')
+        sketch = cls()
+        for sign, bucket, count in data.get('buckets', []):
+            sketch.add_bucket((int(sign), int(bucket)), float(count))
+        return sketch
+
+
+def challenge_periods(start_time: Optional[datetime], end_time: Optional[datetime],
+                      now: Optional[datetime] = None) -> List[str]:
+    """Sketch periods a challenge counts in: the months it spans and all-time."""
+    if not start_time:
+        return [ALL_TIME]
+    return months_between(start_time, end_time or now or datetime.utcnow()) + [ALL_TIME]
+
+
+def profit_pct(start_balance: Optional[float], equity: Optional[float]) -> Optional[float]:
+    if not start_balance:
+        return None
+    return ((equity or 0.0) - start_balance) / start_balance
+
+
+@dataclass
+class _PeriodSketches:
+    # challenge_id -> sketch; None holds the merge of every tier
+    sketches: Dict[Optional[int], ProfitSketch] = field(default_factory=dict)
+    loaded_at: float = 0.0
+
+
+class PercentileService:
+    """
+    Service class answering "what percentile is this profit?" per period
+    and challenge tier from streaming quantile sketches.
+
+    The sketches live in profit_sketch_buckets, one row per bucket, so all
+    workers share them. An equity change that moves a challenge to another
+    bucket (or into a month it is not counted in yet) records -1/+1 deltas;
+    once the change commits they are merged into a per-process queue and
+    written by a background EventWorker, in one short transaction per
+    batch, so evaluations never hold bucket row locks. Each process keeps
+    the sketches it has read in memory, applies its own committed changes
+    to them and reloads them after PERCENTILE_SKETCH_TTL_SECONDS; a lookup
+    never scans challenges. A reload reads the buckets outside the lock, so
+    lookups and committed changes keep using the previous sketches
+    meanwhile; changes that arrive during the reload are journaled and
+    replayed onto the new sketches before they are swapped in.
+
+    user_challenges.sketch_period records the latest month a challenge is
+    counted in, so an old value is only taken out of months it was added
+    to. Paths that change equity outside evaluation (deleted users, bulk
+    updates) and deltas lost with a process are reconciled by the periodic
+    rebuild, which also moves open-ended challenges into a newly opened
+    month.
+    """
+
+    def __init__(self):
+        self.ttl = 60.0
+        self._periods: Dict[str, _PeriodSketches] = {}
+        # period -> journals of the reloads in progress
+        self._journals: Dict[str, List[Journal]] = {}
+        self._lock = threading.Lock()
+        self._pending: Deltas = defaultdict(float)
+        self._pending_lock = threading.Lock()
+        self.worker = EventWorker('percentile-deltas', self.flush)
+
+    def init_app(self, app) -> None:
+        """Read the reload interval from the app config and bind the delta writer."""
+        self.ttl = float(app.config.get('PERCENTILE_SKETCH_TTL_SECONDS', 60))
+        self.worker.init_app(app)
+
+    @staticmethod
+    def _write(period: str, challenge_id: int, key: BucketKey, delta: float) -> None:
+        table = ProfitSketchBucket.__table__
+        statement = update(table).where(
+            table.c.period == period, table.c.challenge_id == challenge_id,
+            table.c.sign == key[0], table.c.bucket == key[1]
+        ).values(count=table.c.count + delta)
+        if db.session.execute(statement).rowcount:
+            return
+
+        # First value in this bucket; another worker may create the row concurrently
+        try:
+            with db.session.begin_nested():
+                db.session.add(ProfitSketchBucket(period=period, challenge_id=challenge_id,
+                                                  sign=key[0], bucket=key[1], count=delta))
+        except IntegrityError:
+            db.session.execute(statement)
+
+    def on_equity_change(self, user_challenge: UserChallenge, old_equity: Optional[float],
+                         new_equity: Optional[float]) -> None:
+        """
+        Move a challenge between sketch buckets after its equity changed,
+        without committing. old_equity None adds a new challenge; new_equity
+        None takes it out.
+
+        The old value is taken out of the months up to sketch_period, where
+        it was counted; the new value goes into every month the challenge
+        spans now. The bucket writes wait for the transaction to commit.
+        """
+        if user_challenge.challenge_id is None:
+            return
+        old_pct = profit_pct(user_challenge.start_balance, old_equity) if old_equity is not None else None
+        new_pct = profit_pct(user_challenge.start_balance, new_equity) if new_equity is not None else None
+        old_key = ProfitSketch.key(old_pct) if old_pct is not None else None
+        new_key = ProfitSketch.key(new_pct) if new_pct is not None else None
+
+        periods = challenge_periods(user_challenge.start_time, user_challenge.end_time)
+        months = [period for period in periods if period != ALL_TIME]
+        counted_through = user_challenge.sketch_period
+        deltas: Deltas = defaultdict(float)
+        if old_key is not None:
+            for period in periods:
+                if period == ALL_TIME or (counted_through is not None and period <= counted_through):
+                    deltas[(period, user_challenge.challenge_id, old_key)] -= 1.0
+        if new_key is not None:
+            for period in periods:
+                deltas[(period, user_challenge.challenge_id, new_key)] += 1.0
+        user_challenge.sketch_period = months[-1] if months and new_key is not None else None
+
+        deltas = {bucket: delta for bucket, delta in deltas.items() if delta}
+        if deltas:
+            db.session.info.setdefault(PENDING_DELTAS, []).append((self, deltas))
+
+    def _queue(self, deltas: Deltas) -> None:
+        """Take committed deltas: apply them to the loaded sketches and queue the writes."""
+        with self._lock:
+            for (period, challenge_id, key), delta in deltas.items():
+                loaded = self._periods.get(period)
+                if loaded is not None:
+                    self._add(loaded, challenge_id, key, delta)
+                for journal in self._journals.get(period, ()):
+                    journal[(challenge_id, key)] = journal.get((challenge_id, key), 0.0) + delta
+        self._merge(deltas)
+        self.worker.wake()
+
+    def _merge(self, deltas: Deltas) -> None:
+        with self._pending_lock:
+            for bucket, delta in deltas.items():
+                self._pending[bucket] += delta
+
+    def flush(self) -> int:
+        """
+        Write the queued deltas in one transaction, in bucket order so
+        concurrent flushes of other workers cannot deadlock. A failed batch
+        is put back for the next flush.
+
+        Returns:
+            Number of bucket rows written
+        """
+        with self._pending_lock:
+            pending, self._pending = self._pending, defaultdict(float)
+        pending = {bucket: delta for bucket, delta in pending.items() if delta}
+        if not pending:
+            return 0
+
+        try:
+            for (period, challenge_id, key), delta in sorted(pending.items()):
+                self._write(period, challenge_id, key, delta)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            self._merge(pending)
+            raise
+        return len(pending)
+
+    def rebuild(self) -> int:
+        """
+        Reconcile every sketch with user_challenges in one pass, updating
+        bucket rows in place.
+
+        This process's queued deltas are written first and the bucket rows
+        are locked before the challenges are read, so other workers' delta
+        batches wait for the reconciliation instead of being overwritten by
+        it. Buckets left empty are zeroed rather than deleted. Runs as a
+        scheduled job in the one process that holds the scheduler lock.
+
+        Returns:
+            Number of non-empty sketch buckets
+        """
+        self.flush()
+        existing = {(row.period, row.challenge_id, (row.sign, row.bucket)): row
+                    for row in ProfitSketchBucket.query.with_for_update().all()}
+
+        counts: Deltas = defaultdict(float)
+        moved = []
+        now = datetime.utcnow()
+        rows = db.session.query(
+            UserChallenge.id, UserChallenge.challenge_id, UserChallenge.start_balance, UserChallenge.current_equity,
+            UserChallenge.start_time, UserChallenge.end_time, UserChallenge.sketch_period
+        ).all()
+        for uc_id, challenge_id, start_balance, equity, start_time, end_time, sketch_period in rows:
+            pct = profit_pct(start_balance, equity)
+            if pct is None or challenge_id is None:
+                continue
+            key = ProfitSketch.key(pct)
+            periods = challenge_periods(start_time, end_time, now)
+            for period in periods:
+                counts[(period, challenge_id, key)] += 1.0
+            counted_through = periods[-2] if len(periods) > 1 else None
+            if counted_through != sketch_period:
+                moved.append({'b_id': uc_id, 'sketch_period': counted_through})
+
+        drifted = 0
+        for bucket in set(existing) | set(counts):
+            count = counts.get(bucket, 0.0)
+            row = existing.get(bucket)
+            if row is None:
+                period, challenge_id, (sign, index) = bucket
+                # First value in this bucket; a delta batch may create the row concurrently
+                try:
+                    with db.session.begin_nested():
+                        db.session.add(ProfitSketchBucket(period=period, challenge_id=challenge_id,
+                                                          sign=sign, bucket=index, count=count))
+                except IntegrityError:
+                    db.session.execute(update(ProfitSketchBucket).where(
+                        ProfitSketchBucket.period == period, ProfitSketchBucket.challenge_id == challenge_id,
+                        ProfitSketchBucket.sign == sign, ProfitSketchBucket.bucket == index
+                    ).values(count=count))
+            elif abs((row.count or 0.0) - count) > 1e-9:
+                row.count = count
+            else:
+                continue
+            drifted += 1
+
+        if moved:
+            table = UserChallenge.__table__
+            db.session.execute(
+                update(table).where(table.c.id == bindparam('b_id')).values(sketch_period=bindparam('sketch_period')),
+                moved
+            )
+        db.session.commit()
+        with self._lock:
+            self._periods.clear()
+            for journals in self._journals.values():
+                for journal in journals:
+                    journal[None] = 0.0  # the reload may predate the rebuild: don't keep it
+        if drifted:
+            logger.info(f"Profit sketch rebuild corrected {drifted} buckets")
+        return len(counts)
+
+    @staticmethod
+    def _add(loaded: _PeriodSketches, challenge_id: int, key: BucketKey, delta: float) -> None:
+        loaded.sketches.setdefault(challenge_id, ProfitSketch()).add_bucket(key, delta)
+        loaded.sketches[None].add_bucket(key, delta)
+
+    @staticmethod
+    def _load(period: str) -> List[Tuple[int, int, int, float]]:
+        return db.session.query(
+            ProfitSketchBucket.challenge_id, ProfitSketchBucket.sign,
+            ProfitSketchBucket.bucket, ProfitSketchBucket.count
+        ).filter(ProfitSketchBucket.period == period).all()
+
+    def _sketches(self, period: str) -> _PeriodSketches:
+        """The period's sketches, reloaded if they expired; read them under the lock."""
+        with self._lock:
+            loaded = self._periods.get(period)
+            if loaded is not None and (time.monotonic() - loaded.loaded_at < self.ttl or self._journals.get(period)):
+                # Fresh, or another thread is already reloading them
+                return loaded
+            journal: Journal = {}
+            self._journals.setdefault(period, []).append(journal)
+
+        try:
+            loaded = _PeriodSketches(sketches={None: ProfitSketch()})
+            for challenge_id, sign, bucket, count in self._load(period):
+                self._add(loaded, challenge_id, (sign, bucket), count)
+        except Exception:
+            with self._lock:
+                self._drop_journal(period, journal)
+            raise
+
+        with self._lock:
+            self._drop_journal(period, journal)
+            if None not in journal:
+                for (challenge_id, key), delta in journal.items():
+                    self._add(loaded, challenge_id, key, delta)
+                loaded.loaded_at = time.monotonic()
+                self._periods[period] = loaded
+        return loaded
+
+    def _drop_journal(self, period: str, journal: Journal) -> None:
+        journals = [other for other in self._journals[period] if other is not journal]
+        if journals:
+            self._journals[period] = journals
+        else:
+            del self._journals[period]
+
+    def sketch(self, period: str, challenge_id: Optional[int] = None) -> Dict:
+        """Serialized sketch of a period and tier (None: every tier)."""
+        loaded = self._sketches(period)
+        with self._lock:
+            sketch = loaded.sketches.get(challenge_id) or ProfitSketch()
+            return sketch.to_dict()
+
+    def percentile(self, profit: float, period: str, challenge_id: Optional[int] = None) -> Dict:
+        """
+        Where a profit percentage stands among the challenges of a period.
+
+        Args:
+            profit: Profit as a fraction of the start balance (0.05 = 5%)
+            period: Period key ('YYYY-MM' or 'all')
+            challenge_id: Challenge tier to compare within (default: all tiers)
+
+        Returns:
+            Dict with the percentile (share of challenges doing worse, in
+            percent), top_pct, the number of challenges and a few quantiles
+        """
+        loaded = self._sketches(period)
+        with self._lock:
+            sketch = loaded.sketches.get(challenge_id) or ProfitSketch()
+            total = sketch.count
+            below = sketch.rank(profit)
+            quantiles = {name: sketch.quantile(q) for name, q in (('p25', 0.25), ('p50', 0.5), ('p75', 0.75), ('p90', 0.9))}
+        percentile = round(below * 100, 2)
+        return {
+            'period': period,
+            'challenge_id': challenge_id,
+            'profit_pct': profit,
+            'percentile': percentile,
+            'top_pct': round(100 - percentile, 2) if total else None,
+            'count': int(round(total)),
+            'quantiles': quantiles,
+            'relative_accuracy': ProfitSketch.RELATIVE_ACCURACY
+        }
+
+
+# Global percentile service instance
+percentile_service = PercentileService()
+
+
+@event.listens_for(Session, 'after_commit')
+def _queue_committed_deltas(session):
+    if session.in_nested_transaction():
+        # A savepoint was released; the outer transaction can still roll back
+        return
+    for service, deltas in session.info.pop(PENDING_DELTAS, ()):
+        service._queue(deltas)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _drop_pending_deltas(session):
+    if session.in_nested_transaction():
+        return
+    session.info.pop(PENDING_DELTAS, None)
@@ -0,0 +1,326 @@
+import time
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Optional, Tuple
+from app.models import UserChallenge, Challenge, Position, Instrument, ACTIVE_STATUSES
+from app.services.rule_engine import rule_engine, RuleSet, RuleContext, compile_rules
+from app.utils import (
+    calculate_equity, calculate_daily_drawdown, calculate_total_drawdown, calculate_profit_percentage
+)
+from app import db
+import logging
+
+logger = logging.getLogger(__name__)
+
+# instrument_id -> (side, qty, avg_price)
+Book = Dict[int, Tuple[str, float, float]]
+
+
+@dataclass
+class PortfolioState:
+    """Everything a what-if needs about one challenge, held in memory."""
+    user_challenge_id: int
+    user_id: int
+    status: str
+    start_balance: float
+    daily_start_equity: float
+    min_equity_today: float
+    min_equity_all_time: float
+    max_equity: float
+    daily_max_loss: float
+    total_max_loss: float
+    profit_target: float
+    max_trade_quantity: Optional[float]
+    rule_set: Optional[RuleSet] = None  # compiled template rules, for order rules beyond max lots
+    positions: Book = field(default_factory=dict)
+    symbols: Dict[int, Tuple[str, str]] = field(default_factory=dict)  # instrument_id -> (provider, symbol)
+    loaded_at: float = 0.0
+
+
+def apply_fill(positions: Book, instrument_id: int, side: str, qty: float, price: float) -> Tuple[Book, float]:
+    """
+    Apply a fill to a copy of a position book with ChallengeService._apply_fill's rules.
+
+    Returns:
+        (new book, realized PnL of the fill)
+    """
+    book = dict(positions)
+    fill_side = 'LONG' if side == 'BUY' else 'SHORT'
+    existing = book.get(instrument_id)
+
+    if existing is None:
+        book[instrument_id] = (fill_side, qty, price)
+        return book, 0.0
+
+    pos_side, pos_qty, avg_price = existing
+    if pos_side == fill_side:
+        total_qty = pos_qty + qty
+        book[instrument_id] = (pos_side, total_qty, (pos_qty * avg_price + qty * price) / total_qty)
+        return book, 0.0
+
+    closed = min(qty, pos_qty)
+    realized = (price - avg_price) * closed * (1 if pos_side == 'LONG' else -1)
+    if qty > pos_qty:
+        book[instrument_id] = (fill_side, qty - pos_qty, price)
+    elif qty == pos_qty:
+        del book[instrument_id]
+    else:
+        book[instrument_id] = (pos_side, pos_qty - qty, avg_price)
+    return book, realized
+
+
+def unrealized_pnl(positions: Book, marks: Dict[int, float]) -> float:
+    """Open PnL of a book marked at the given last prices."""
+    total = 0.0
+    for instrument_id, (side, qty, avg_price) in positions.items():
+        price = marks.get(instrument_id)
+        if price is None:
+            continue
+        diff = (price - avg_price) * qty
+        total += diff if side == 'LONG' else -diff
+    return total
+
+
+def simulate_order(state: PortfolioState, instrument_id: int, side: str, qty: float,
+                   fill_price: float, marks: Dict[int, float], warn_headroom: float = 0.2) -> Dict:
+    """
+    Compute the post-trade state of a market order without touching the database.
+
+    Equity is computed with calculate_equity, exactly as
+    ChallengeService.evaluate_challenge will compute it after the fill, and
+    the post-trade metrics are judged by the template's compiled RuleSet
+    (rules compiled from the state's limits when it has none), so the
+    verdict predicts what the real evaluation would do. Gates that read
+    trade history are not checked: would_pass only says every profit
+    target would be met.
+
+    Args:
+        state: Cached portfolio state of the challenge
+        instrument_id: Instrument to trade
+        side: 'BUY' or 'SELL'
+        qty: Order quantity
+        fill_price: Price the order would fill at
+        marks: Last price per instrument, including the traded one
+        warn_headroom: Warn when less than this fraction of a loss limit is left
+
+    Returns:
+        Dict with decision ('OK', 'WARN' or 'REJECT'), reasons, and the
+        pre/post-trade equity and drawdown metrics
+    """
+    reasons = []
+    if state.status not in ACTIVE_STATUSES:
+        reasons.append({'rule': 'status', 'message': f'Challenge is {state.status}'})
+    if state.max_trade_quantity and qty > state.max_trade_quantity:
+        reasons.append({
+            'rule': 'max_trade_quantity',
+            'message': f'Trade quantity {qty} exceeds limit of {state.max_trade_quantity} (the challenge would fail)'
+        })
+
+    equity_before = calculate_equity(state.start_balance, unrealized_pnl(state.positions, marks))
+    positions, realized = apply_fill(state.positions, instrument_id, side, qty, fill_price)
+    equity_after = calculate_equity(state.start_balance, unrealized_pnl(positions, marks))
+
+    min_today = min(state.min_equity_today, equity_after)
+    min_all_time = min(state.min_equity_all_time, equity_after)
+    daily_drawdown = calculate_daily_drawdown(state.daily_start_equity, min_today)
+    total_drawdown = calculate_total_drawdown(state.start_balance, min_all_time)
+    trailing_drawdown = calculate_total_drawdown(max(state.max_equity, equity_after), equity_after)
+    profit_pct = calculate_profit_percentage(state.start_balance, equity_after)
+
+    daily_headroom = 1 - daily_drawdown / state.daily_max_loss if state.daily_max_loss else 1.0
+    total_headroom = 1 - total_drawdown / state.total_max_loss if state.total_max_loss else 1.0
+
+    # The same rules RiskService.evaluate_challenge_status applies after the fill
+    rule_set = state.rule_set or compile_rules(state)
+    status, verdict, pending = rule_set.evaluate(RuleContext(
+        start_balance=state.start_balance,
+        metrics={
+            'daily_drawdown': daily_drawdown,
+            'total_drawdown': total_drawdown,
+            'trailing_drawdown': trailing_drawdown,
+            'profit_pct': profit_pct,
+            'current_equity': equity_after,
+            'initial_balance': state.start_balance,
+            'daily_start_equity': state.daily_start_equity
+        }
+    ))
+    if status == 'FAILED':
+        reasons.extend(verdict)
+
+    warnings = []
+    if not reasons:
+        if daily_headroom < warn_headroom:
+            warnings.append({'rule': 'daily_max_loss',
+                             'message': f'Only {daily_headroom:.0%} of the daily loss limit would remain'})
+        if total_headroom < warn_headroom:
+            warnings.append({'rule': 'total_max_loss',
+                             'message': f'Only {total_headroom:.0%} of the total loss limit would remain'})
+
+    position = positions.get(instrument_id)
+    return {
+        'decision': 'REJECT' if reasons else ('WARN' if warnings else 'OK'),
+        'reasons': reasons,
+        'warnings': warnings,
+        'fill_price': fill_price,
+        'realized_pnl': realized,
+        'position_after': {'side': position[0], 'qty': position[1], 'avg_price': position[2]} if position else None,
+        'equity_before': equity_before,
+        'equity_after': equity_after,
+        'daily_drawdown': daily_drawdown,
+        'total_drawdown': total_drawdown,
+        'trailing_drawdown': trailing_drawdown,
+        'profit_pct': profit_pct,
+        'daily_headroom': daily_headroom,
+        'total_headroom': total_headroom,
+        'would_pass': (status == 'PASSED' or bool(pending)) and not reasons,
+    }
+
+
+class PreTradeSimulator:
+    """
+    Service class for pre-trade "what-if" checks.
+
+    Portfolio state is loaded once per challenge and kept in memory for
+    PRETRADE_STATE_TTL_MS, and dropped in this process whenever the
+    challenge trades or is evaluated; other workers pick changes up when
+    the TTL lapses. With quotes served from the market data cache a check
+    runs without any database access.
+    """
+
+    def __init__(self):
+        self.ttl = 2.0
+        self.warn_headroom = 0.2
+        self._states: Dict[int, PortfolioState] = {}
+        self._instruments: Dict[int, Tuple[str, str, str]] = {}  # id -> (provider, symbol, display symbol)
+        self._lock = threading.Lock()
+
+    def init_app(self, app) -> None:
+        """Read the cache TTL and warning threshold from the app config."""
+        self.ttl = app.config.get('PRETRADE_STATE_TTL_MS', 2000) / 1000.0
+        self.warn_headroom = app.config.get('PRETRADE_WARN_HEADROOM', 0.2)
+
+    def invalidate(self, user_challenge_id: int) -> None:
+        """Drop the cached state of a challenge after it changed."""
+        self._states.pop(user_challenge_id, None)
+
+    def get_state(self, user_challenge_id: int) -> Optional[PortfolioState]:
+        """Cached portfolio state of a challenge, loading it when missing or stale."""
+        state = self._states.get(user_challenge_id)
+        if state is not None and time.monotonic() - state.loaded_at < self.ttl:
+            return state
+
+        state = self._load(user_challenge_id)
+        if state is not None:
+            with self._lock:
+                self._states[user_challenge_id] = state
+        return state
+
+    def get_instrument(self, instrument_id: int) -> Optional[Tuple[str, str, str]]:
+        """(provider, provider symbol, display symbol) of an active instrument, cached."""
+        instrument = self._instruments.get(instrument_id)
+        if instrument is None:
+            row = db.session.query(Instrument.provider, Instrument.provider_symbol, Instrument.display_symbol).filter(
+                Instrument.id == instrument_id, Instrument.active.is_(True)
+            ).first()
+            if row is None:
+                return None
+            instrument = self._instruments[instrument_id] = tuple(row)
+        return instrument
+
+    @staticmethod
+    def _load(user_challenge_id: int) -> Optional[PortfolioState]:
+        row = db.session.query(
+            UserChallenge.user_id, UserChallenge.status, UserChallenge.start_balance,
+            UserChallenge.daily_start_equity, UserChallenge.min_equity_today,
+            UserChallenge.min_equity_all_time, UserChallenge.max_equity,
+            Challenge.daily_max_loss, Challenge.total_max_loss, Challenge.profit_target,
+            Challenge.max_trade_quantity, Challenge.id
+        ).join(Challenge, Challenge.id == UserChallenge.challenge_id).filter(
+            UserChallenge.id == user_challenge_id
+        ).first()
+        if row is None:
+            return None
+
+        state = PortfolioState(user_challenge_id, int(row[0]), row[1], row[2], row[3] or 0.0,
+                               row[4] if row[4] is not None else float('inf'),
+                               row[5] if row[5] is not None else float('inf'),
+                               row[6] or 0.0, row[7], row[8], row[9], row[10])
+
+        # Limits come from the template's compiled rules (rules_json overrides the columns)
+        rule_set = rule_engine.rule_sets_for_ids([row[11]]).get(row[11])
+        if rule_set is not None:
+            state.rule_set = rule_set
+            state.daily_max_loss = rule_set.threshold('daily_max_loss')
+            state.total_max_loss = rule_set.threshold('total_max_loss')
+            state.profit_target = rule_set.threshold('profit_target')
+            max_lots = rule_set.rule('max_lots')
+            state.max_trade_quantity = max_lots.max_qty if max_lots else None
+
+        positions = db.session.query(
+            Position.instrument_id, Position.side, Position.qty, Position.avg_price,
+            Instrument.provider, Instrument.provider_symbol
+        ).join(Instrument, Instrument.id == Position.instrument_id).filter(
+            Position.user_challenge_id == user_challenge_id
+        ).all()
+        for instrument_id, side, qty, avg_price, provider, symbol in positions:
+            state.positions[instrument_id] = (side, qty, avg_price)
+            state.symbols[instrument_id] = (provider, symbol)
+
+        state.loaded_at = time.monotonic()
+        return state
+
+    def what_if(self, state: PortfolioState, instrument_id: int, side: str, qty: float,
+                get_quote: Callable[[str, str], Dict]) -> Dict:
+        """
+        Simulate a market order against a challenge's current portfolio.
+
+        Args:
+            state: Portfolio state from get_state
+            instrument_id: Instrument to trade
+            side: 'BUY' or 'SELL'
+            qty: Order quantity
+            get_quote: Quote lookup taking (provider_symbol, provider); pass one
+                that does not notify the quote listeners, such as
+                MarketDataService.peek_quote, so a simulation never fills orders
+
+        Returns:
+            Simulation result from simulate_order
+
+        Raises:
+            ValueError: If the instrument is unknown or cannot be quoted
+        """
+        instrument = self.get_instrument(instrument_id)
+        if instrument is None:
+            raise ValueError("Instrument not found")
+        provider, provider_symbol, display_symbol = instrument
+
+        symbols = dict(state.symbols)
+        symbols[instrument_id] = (provider, provider_symbol)
+
+        marks = {}
+        quote = None
+        for marked_id, (marked_provider, marked_symbol) in symbols.items():
+            marked_quote = get_quote(marked_symbol, marked_provider)
+            if marked_quote:
+                marks[marked_id] = marked_quote['last']
+            if marked_id == instrument_id:
+                quote = marked_quote
+        if not quote:
+            raise ValueError(f"No quote available for {display_symbol}")
+
+        from app.services.challenge_service import ChallengeService
+        fill_price = ChallengeService._fill_price(quote, side)
+        result = simulate_order(state, instrument_id, side, qty, fill_price, marks, self.warn_headroom)
+
+        # Order rules other than max lots (e.g. a news blackout) reject the order outright
+        if state.rule_set is not None:
+            blocked = [v for v in state.rule_set.check_order(qty) if v['rule'] != 'max_lots']
+            if blocked:
+                result['reasons'] = blocked + result['reasons']
+                result['decision'] = 'REJECT'
+                result['would_pass'] = False
+        return result
+
+
+# Global pre-trade simulator instance
+pretrade_simulator = PreTradeSimulator()
@@ -0,0 +1,257 @@
+import time
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+from sqlalchemy import update, or_
+from app.models import Position, UserChallenge, Instrument, ACTIVE_STATUSES
+from app.services.trigger_index import trigger_index, TriggerEvent
+from app.services.market_data_service import MarketDataService
+from app import db
+from app.utils.event_worker import EventWorker
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Sentinel for "leave this level unchanged"
+UNCHANGED = object()
+
+
+class ProtectionService:
+    """
+    Service class to manage stop-loss / take-profit levels attached to positions.
+
+    Armed levels are held in the in-memory trigger index and on the position
+    rows. Quotes served by MarketDataService are checked against the index as
+    they arrive; crossed levels are queued and closed through
+    ChallengeService.execute_trade by this process's event worker.
+    """
+
+    def __init__(self, index=trigger_index):
+        self.index = index
+        self._pending: deque = deque()
+        self._drain_lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._synced_up_to: Optional[datetime] = None
+        self._last_sync = 0.0
+        self.sync_interval = 5
+        self._challenge_service = None
+        self.worker = EventWorker('protection-events', self.process_pending)
+
+    @property
+    def challenge_service(self):
+        if self._challenge_service is None:
+            from app.services.challenge_service import ChallengeService
+            self._challenge_service = ChallengeService()
+        return self._challenge_service
+
+    def init_app(self, app) -> None:
+        """Hook the service into quote updates and the request cycle."""
+        self.sync_interval = app.config.get('PROTECTION_SYNC_SECONDS', 5)
+        MarketDataService.add_quote_listener(self.on_quote)
+        self.worker.init_app(app)
+
+        @app.before_request
+        def _sync_trigger_index():
+            try:
+                self.sync_levels()
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Failed to sync SL/TP levels: {e}")
+
+    def set_protection(self, position: Position, stop_loss=UNCHANGED, take_profit=UNCHANGED,
+                       quote: Optional[Dict] = None) -> Position:
+        """
+        Set or clear the stop-loss and take-profit of a position.
+
+        Args:
+            position: Position to protect
+            stop_loss: New stop-loss price, None to clear, or UNCHANGED
+            take_profit: New take-profit price, None to clear, or UNCHANGED
+            quote: Current quote for the instrument (fetched when omitted)
+
+        Returns:
+            The updated Position
+
+        Raises:
+            ValueError: If a level is not positive or is already crossed
+        """
+        stop_loss = position.stop_loss if stop_loss is UNCHANGED else stop_loss
+        take_profit = position.take_profit if take_profit is UNCHANGED else take_profit
+
+        for name, level in (('stop_loss', stop_loss), ('take_profit', take_profit)):
+            if level is not None and level <= 0:
+                raise ValueError(f"{name} must be positive")
+
+        instrument = Instrument.query.get(position.instrument_id)
+        if stop_loss is not None or take_profit is not None:
+            if quote is None:
+                quote = self.challenge_service.market_data_service.get_quote(
+                    instrument.provider_symbol,
+                    instrument.provider
+                )
+            self._validate_levels(position.side, stop_loss, take_profit, quote)
+
+        position.stop_loss = stop_loss
+        position.take_profit = take_profit
+        db.session.commit()
+
+        self.index.register_instrument(instrument.id, instrument.provider, instrument.provider_symbol)
+        self.index.arm(position.id, position.user_challenge_id, position.instrument_id, position.side,
+                       stop_loss, take_profit)
+        return position
+
+    @staticmethod
+    def _validate_levels(side: str, stop_loss: Optional[float], take_profit: Optional[float], quote: Dict) -> None:
+        # Longs close at the bid, shorts at the ask
+        if side == 'LONG':
+            price = quote.get('bid') or quote['last']
+            if stop_loss is not None and stop_loss >= price:
+                raise ValueError(f"stop_loss must be below the current bid ({price})")
+            if take_profit is not None and take_profit <= price:
+                raise ValueError(f"take_profit must be above the current bid ({price})")
+        else:
+            price = quote.get('ask') or quote['last']
+            if stop_loss is not None and stop_loss <= price:
+                raise ValueError(f"stop_loss must be above the current ask ({price})")
+            if take_profit is not None and take_profit >= price:
+                raise ValueError(f"take_profit must be below the current ask ({price})")
+
+    def sync_levels(self, force: bool = False) -> int:
+        """
+        Bring the trigger index up to date with positions changed since the
+        last sync, including changes made by other worker processes.
+
+        Returns:
+            Number of positions re-armed or disarmed
+        """
+        now = time.monotonic()
+        if not force and self._last_sync and now - self._last_sync < self.sync_interval:
+            return 0
+
+        with self._sync_lock:
+            if not force and self._last_sync and now - self._last_sync < self.sync_interval:
+                return 0
+            self._last_sync = now
+
+            # Overlap the previous window to catch transactions that committed late
+            started = datetime.utcnow() - timedelta(seconds=max(self.sync_interval, 1))
+
+            query = db.session.query(Position, Instrument.provider, Instrument.provider_symbol).join(
+                Instrument, Instrument.id == Position.instrument_id
+            )
+            if self._synced_up_to is None:
+                query = query.filter(or_(Position.stop_loss.isnot(None), Position.take_profit.isnot(None)))
+            else:
+                query = query.filter(Position.updated_at >= self._synced_up_to)
+
+            changed = 0
+            for position, provider, provider_symbol in query.all():
+                self.index.register_instrument(position.instrument_id, provider, provider_symbol)
+                self.index.arm(position.id, position.user_challenge_id, position.instrument_id,
+                               position.side, position.stop_loss, position.take_profit)
+                changed += 1
+
+            self._synced_up_to = started
+            return changed
+
+    def on_quote(self, provider: str, instrument: str, quote: Dict) -> None:
+        """MarketDataService quote listener: check the quote against armed levels."""
+        instrument_id = self.index.instrument_for_symbol(provider, instrument)
+        if instrument_id is None:
+            return
+
+        bid = quote.get('bid') or quote.get('last')
+        ask = quote.get('ask') or quote.get('last')
+        if not bid or not ask:
+            return
+
+        events = self.index.on_quote(instrument_id, bid, ask)
+        if events:
+            self._pending.extend(events)
+            self.worker.wake()
+
+    def process_pending(self) -> int:
+        """
+        Close the positions whose levels were crossed.
+
+        An event stays queued until its close is committed or rolled back;
+        a position whose close rolled back is re-armed from its row.
+
+        Returns:
+            Number of positions closed
+        """
+        if not self._drain_lock.acquire(blocking=False):
+            return 0
+
+        closed = 0
+        try:
+            while self._pending:
+                event = self._pending[0]
+                try:
+                    if self._close(event):
+                        closed += 1
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"Failed to close position {event.position_id} on {event.kind}: {e}")
+                    self._rearm(event.position_id)
+                self._pending.popleft()
+        finally:
+            self._drain_lock.release()
+        return closed
+
+    def _close(self, event: TriggerEvent) -> bool:
+        level_column = Position.stop_loss if event.kind == 'STOP_LOSS' else Position.take_profit
+
+        # Claim the level; it may have been changed, or fired in another worker
+        claimed = db.session.execute(
+            update(Position)
+            .where(Position.id == event.position_id,
+                   Position.side == event.position_side,
+                   level_column == event.level)
+            .values(stop_loss=None, take_profit=None, updated_at=datetime.utcnow())
+        )
+        if claimed.rowcount != 1:
+            db.session.rollback()
+            return False
+
+        position = Position.query.get(event.position_id)
+        user_challenge = UserChallenge.query.get(event.user_challenge_id)
+        if not position or not user_challenge or user_challenge.status not in ACTIVE_STATUSES:
+            db.session.rollback()
+            return False
+
+        try:
+            self.challenge_service.execute_trade(
+                position.user_challenge_id,
+                position.instrument_id,
+                'SELL' if position.side == 'LONG' else 'BUY',
+                position.qty,
+                price=event.price
+            )
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Failed to close position {event.position_id} on {event.kind}: {e}")
+            # The index disarmed the position when the level was crossed; the
+            # rollback restored its levels, so arm them again
+            self._rearm(event.position_id)
+            return False
+
+        logger.info(f"Closed position {event.position_id} on {event.kind} at {event.price} (level {event.level})")
+        return True
+
+    def _rearm(self, position_id: int) -> None:
+        """Arm a position's levels again from its row, if it still has any."""
+        try:
+            position = db.session.get(Position, position_id)
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Failed to re-arm position {position_id}: {e}")
+            return
+        if position is not None:
+            self.index.arm(position.id, position.user_challenge_id, position.instrument_id,
+                           position.side, position.stop_loss, position.take_profit)
+
+
+# Global protection service instance
+protection_service = ProtectionService()
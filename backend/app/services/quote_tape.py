@@ -0,0 +1,82 @@
+import time
+import threading
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+from app.models import QuoteTick, Instrument
+from app.services.market_data_service import MarketDataService
+from app.utils import write_buffer
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class QuoteTapeRecorder:
+    """
+    Records served quotes into the quote_ticks table so challenges can be
+    replayed later. At most one tick per instrument is kept every
+    QUOTE_TAPE_MIN_INTERVAL_MS; ticks go through the write-behind buffer.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.min_interval = 1.0
+        self._instrument_ids: Dict[Tuple[str, str], int] = {}
+        self._last_recorded: Dict[int, float] = {}
+        self._last_refresh = 0.0
+        self._lock = threading.Lock()
+
+    def init_app(self, app) -> None:
+        """Start recording quotes if the tape is enabled."""
+        self.enabled = app.config.get('QUOTE_TAPE_ENABLED', True)
+        self.min_interval = app.config.get('QUOTE_TAPE_MIN_INTERVAL_MS', 1000) / 1000.0
+        if self.enabled:
+            MarketDataService.add_quote_listener(self.on_quote)
+
+    def on_quote(self, provider: str, instrument: str, quote: Dict) -> None:
+        """MarketDataService quote listener: record the quote if it is due."""
+        last = quote.get('last')
+        if not self.enabled or not last:
+            return
+
+        instrument_id = self._instrument_id(provider, instrument)
+        if instrument_id is None:
+            return
+
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_recorded.get(instrument_id, float('-inf')) < self.min_interval:
+                return
+            self._last_recorded[instrument_id] = now
+
+        write_buffer.enqueue(QuoteTick, {
+            'instrument_id': instrument_id,
+            'ts': datetime.utcnow(),
+            'bid': quote.get('bid'),
+            'ask': quote.get('ask'),
+            'last': last
+        })
+
+    def _instrument_id(self, provider: str, instrument: str) -> Optional[int]:
+        key = (provider.upper(), instrument)
+        instrument_id = self._instrument_ids.get(key)
+        if instrument_id is not None:
+            return instrument_id
+
+        # Unknown symbol: reload the instrument map, at most once a minute
+        now = time.monotonic()
+        if self._last_refresh and now - self._last_refresh < 60:
+            return None
+        self._last_refresh = now
+        try:
+            rows = Instrument.query.with_entities(
+                Instrument.id, Instrument.provider, Instrument.provider_symbol
+            ).all()
+        except Exception as e:
+            logger.error(f"Failed to load instruments for the quote tape: {e}")
+            return None
+        self._instrument_ids = {(row[1].upper(), row[2]): row[0] for row in rows}
+        return self._instrument_ids.get(key)
+
+
+# Global quote tape recorder instance
+quote_tape = QuoteTapeRecorder()
@@ -0,0 +1,284 @@
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+from app.models import LeaderboardEntry
+from app import db
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Ranking key: best profit first, ties broken by user id like the board queries
+RankKey = Tuple[float, int]
+
+
+def rank_key(user_id: int, profit_pct: float) -> RankKey:
+    return (-profit_pct, user_id)
+
+
+class _Node:
+    __slots__ = ('key', 'next', 'width')
+
+    def __init__(self, key, levels: int):
+        self.key = key
+        self.next: List[Optional['_Node']] = [None] * levels
+        self.width: List[int] = [1] * levels  # level-0 steps to the next node on this level
+
+
+class RankIndex:
+    """
+    Indexable skip list: a sorted set with O(log n) expected insert,
+    remove, rank-of-key and key-at-rank.
+
+    Each forward link records how many level-0 nodes it skips, so a search
+    that sums the widths it crosses knows the position it reached.
+    """
+
+    MAX_LEVELS = 24  # comfortable up to ~16M keys
+
+    def __init__(self, seed: Optional[int] = None):
+        self._head = _Node(None, self.MAX_LEVELS)
+        self._size = 0
+        self._random = random.Random(seed)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _random_levels(self) -> int:
+        levels = 1
+        while levels < self.MAX_LEVELS and self._random.random() < 0.5:
+            levels += 1
+        return levels
+
+    def insert(self, key) -> None:
+        """Add a key (keys must be unique)."""
+        chain = [self._head] * self.MAX_LEVELS
+        steps_at_level = [0] * self.MAX_LEVELS
+        node = self._head
+        for level in reversed(range(self.MAX_LEVELS)):
+            while node.next[level] is not None and node.next[level].key < key:
+                steps_at_level[level] += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+
+        levels = self._random_levels()
+        new_node = _Node(key, levels)
+        steps = 0
+        for level in range(levels):
+            prev = chain[level]
+            new_node.next[level] = prev.next[level]
+            prev.next[level] = new_node
+            new_node.width[level] = prev.width[level] - steps
+            prev.width[level] = steps + 1
+            steps += steps_at_level[level]
+        for level in range(levels, self.MAX_LEVELS):
+            chain[level].width[level] += 1
+        self._size += 1
+
+    def remove(self, key) -> None:
+        """Remove a key; KeyError if it is missing."""
+        chain = [self._head] * self.MAX_LEVELS
+        node = self._head
+        for level in reversed(range(self.MAX_LEVELS)):
+            while node.next[level] is not None and node.next[level].key < key:
+                node = node.next[level]
+            chain[level] = node
+
+        target = chain[0].next[0]
+        if target is None or target.key != key:
+            raise KeyError(key)
+        for level in range(len(target.next)):
+            prev = chain[level]
+            prev.width[level] += target.width[level] - 1
+            prev.next[level] = target.next[level]
+        for level in range(len(target.next), self.MAX_LEVELS):
+            chain[level].width[level] -= 1
+        self._size -= 1
+
+    def rank(self, key) -> int:
+        """Zero-based position of a key; KeyError if it is missing."""
+        position = 0
+        node = self._head
+        for level in reversed(range(self.MAX_LEVELS)):
+            while node.next[level] is not None and node.next[level].key < key:
+                position += node.width[level]
+                node = node.next[level]
+        found = node.next[0]
+        if found is None or found.key != key:
+            raise KeyError(key)
+        return position
+
+    def _node_at(self, index: int) -> _Node:
+        if not 0 <= index < self._size:
+            raise IndexError(index)
+        remaining = index + 1
+        node = self._head
+        for level in reversed(range(self.MAX_LEVELS)):
+            while node.next[level] is not None and node.width[level] <= remaining:
+                remaining -= node.width[level]
+                node = node.next[level]
+        return node
+
+    def at(self, index: int):
+        """Key at a zero-based position."""
+        return self._node_at(index).key
+
+    def slice(self, start: int, count: int) -> List:
+        """Up to `count` keys from a zero-based position, in order."""
+        if count <= 0 or start >= self._size:
+            return []
+        node = self._node_at(max(start, 0))
+        keys = []
+        while node is not None and len(keys) < count:
+            keys.append(node.key)
+            node = node.next[0]
+        return keys
+
+
+@dataclass
+class _PeriodRanks:
+    index: RankIndex = field(default_factory=RankIndex)
+    scores: Dict[int, float] = field(default_factory=dict)  # user_id -> profit_pct
+    loaded_at: float = 0.0
+
+
+class LeaderboardRanks:
+    """
+    In-memory rank index per leaderboard period.
+
+    A period is loaded from leaderboard_entries on first use and then kept
+    in step with the standings refreshes of this process. Other workers'
+    refreshes are picked up when the period is reloaded after
+    LEADERBOARD_RANK_TTL_SECONDS.
+
+    A reload reads and indexes the period outside the lock, so readers keep
+    using the previous index meanwhile; refreshes that arrive during the
+    reload are journaled and replayed onto the new index before it is
+    swapped in. A period nobody read for a TTL is dropped, since its next
+    read would reload it anyway.
+    """
+
+    def __init__(self):
+        self.ttl = 60.0
+        self._periods: Dict[str, _PeriodRanks] = {}
+        # period -> journals of the reloads in progress (user_id -> profit_pct or None)
+        self._journals: Dict[str, List[Dict[int, Optional[float]]]] = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app) -> None:
+        """Read the reload interval and subscribe to standings refreshes."""
+        from app.services.leaderboard_service import LeaderboardService
+        self.ttl = float(app.config.get('LEADERBOARD_RANK_TTL_SECONDS', 60))
+        LeaderboardService.add_standings_listener(self.on_standings)
+
+    def on_standings(self, user_id: Optional[int], standings: Dict[str, float]) -> None:
+        """Apply a user's refreshed standings to the loaded periods (None: drop everything)."""
+        with self._lock:
+            if user_id is None:
+                self._periods.clear()
+                for journals in self._journals.values():
+                    for journal in journals:
+                        journal[None] = None  # the reload may predate the rebuild: don't keep it
+                return
+            for period, ranks in self._periods.items():
+                self._set(ranks, user_id, standings.get(period))
+            for period, journals in self._journals.items():
+                for journal in journals:
+                    journal[user_id] = standings.get(period)
+
+    @staticmethod
+    def _set(ranks: _PeriodRanks, user_id: int, profit_pct: Optional[float]) -> None:
+        previous = ranks.scores.pop(user_id, None)
+        if previous is not None:
+            ranks.index.remove(rank_key(user_id, previous))
+        if profit_pct is not None:
+            ranks.scores[user_id] = profit_pct
+            ranks.index.insert(rank_key(user_id, profit_pct))
+
+    @staticmethod
+    def _load(period: str) -> List[Tuple[int, float]]:
+        return db.session.query(LeaderboardEntry.user_id, LeaderboardEntry.profit_pct).filter(
+            LeaderboardEntry.period == period
+        ).all()
+
+    def _ranks(self, period: str) -> _PeriodRanks:
+        """The period's index, reloaded if it expired; read it under the lock."""
+        with self._lock:
+            ranks = self._periods.get(period)
+            if ranks is not None and (time.monotonic() - ranks.loaded_at < self.ttl or self._journals.get(period)):
+                # Fresh, or another thread is already reloading it
+                return ranks
+            journal: Dict[int, Optional[float]] = {}
+            self._journals.setdefault(period, []).append(journal)
+            self._evict_expired()
+
+        try:
+            loaded = _PeriodRanks()
+            for user_id, profit_pct in self._load(period):
+                self._set(loaded, user_id, profit_pct)
+        except Exception:
+            with self._lock:
+                self._drop_journal(period, journal)
+            raise
+
+        with self._lock:
+            self._drop_journal(period, journal)
+            if None not in journal:
+                for user_id, profit_pct in journal.items():
+                    self._set(loaded, user_id, profit_pct)
+                loaded.loaded_at = time.monotonic()
+                self._periods[period] = loaded
+        return loaded
+
+    def _evict_expired(self) -> None:
+        # Expired indexes are only still read while their period reloads
+        now = time.monotonic()
+        for period in [period for period, ranks in self._periods.items()
+                       if now - ranks.loaded_at >= self.ttl and period not in self._journals]:
+            del self._periods[period]
+
+    def _drop_journal(self, period: str, journal: Dict[int, Optional[float]]) -> None:
+        journals = [other for other in self._journals[period] if other is not journal]
+        if journals:
+            self._journals[period] = journals
+        else:
+            del self._journals[period]
+
+    def count(self, period: str) -> int:
+        """Number of ranked users in a period."""
+        ranks = self._ranks(period)
+        with self._lock:
+            return len(ranks.index)
+
+    def rank(self, period: str, user_id: int) -> Optional[int]:
+        """One-based rank of a user, or None if they are not ranked in the period."""
+        ranks = self._ranks(period)
+        with self._lock:
+            profit_pct = ranks.scores.get(user_id)
+            if profit_pct is None:
+                return None
+            return ranks.index.rank(rank_key(user_id, profit_pct)) + 1
+
+    def top(self, period: str, k: int = 10) -> List[Tuple[int, int, float]]:
+        """(rank, user_id, profit_pct) of the best k users."""
+        return self.page(period, 0, k)
+
+    def page(self, period: str, offset: int, limit: int) -> List[Tuple[int, int, float]]:
+        """(rank, user_id, profit_pct) of `limit` users from a zero-based offset."""
+        ranks = self._ranks(period)
+        with self._lock:
+            keys = ranks.index.slice(offset, limit)
+        return [(offset + i + 1, user_id, -negated) for i, (negated, user_id) in enumerate(keys)]
+
+    def around(self, period: str, user_id: int, radius: int = 2) -> List[Tuple[int, int, float]]:
+        """(rank, user_id, profit_pct) of a user and up to `radius` users either side."""
+        rank = self.rank(period, user_id)
+        if rank is None:
+            return []
+        start = max(rank - 1 - radius, 0)
+        return self.page(period, start, rank - start + radius)
+
+
+# Global leaderboard rank index instance
+leaderboard_ranks = LeaderboardRanks()
@@ -0,0 +1,460 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+import pytz
+from sqlalchemy import bindparam, update
+from app.models import UserChallenge, Challenge, Trade, Position, QuoteTick, ACTIVE_STATUSES
+from app.services.exposure_service import ExposureService, position_legs, FLAT
+from app import db
+from app.utils import calculate_equity
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Rule that is enforced at order submission and cannot be seen in the trade log
+QUANTITY_LIMIT_RULE = "Trade Quantity Limit Exceeded"
+
+
+@dataclass
+class ReplayInput:
+    """Everything needed to replay one challenge, as plain arrays (picklable)."""
+    user_challenge_id: int
+    start_balance: float
+    start_time: float  # epoch seconds (UTC)
+    end_time: float
+    daily_max_loss: float
+    total_max_loss: float
+    profit_target: float
+    trade_ids: np.ndarray
+    trade_ts: np.ndarray
+    trade_instrument: np.ndarray
+    trade_side: np.ndarray  # +1 buy, -1 sell
+    trade_qty: np.ndarray
+    trade_price: np.ndarray
+    tape: Dict[int, Tuple[np.ndarray, np.ndarray]] = field(default_factory=dict)  # instrument -> (ts, last)
+    timezone: str = 'Africa/Casablanca'
+
+
+def to_epoch(values) -> np.ndarray:
+    """Convert naive UTC datetimes to float epoch seconds."""
+    return np.array(values, dtype='datetime64[us]').astype(np.int64) / 1e6
+
+
+def from_epoch(seconds: float) -> datetime:
+    return datetime.utcfromtimestamp(float(seconds))
+
+
+def day_boundaries(start: float, end: float, timezone: str) -> np.ndarray:
+    """Epoch seconds of every local midnight in (start, end]."""
+    tz = pytz.timezone(timezone)
+    local = pytz.utc.localize(from_epoch(start)).astimezone(tz)
+    day = local.date()
+    boundaries = []
+    while True:
+        day = day + timedelta(days=1)
+        midnight = tz.localize(datetime(day.year, day.month, day.day))
+        epoch = midnight.timestamp()
+        if epoch > end:
+            break
+        boundaries.append(epoch)
+    return np.array(boundaries, dtype=float)
+
+
+def rebuild_positions(trade_instrument: np.ndarray, trade_side: np.ndarray, trade_qty: np.ndarray,
+                      trade_price: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Walk the trade log once, applying ChallengeService's position rules.
+
+    Returns:
+        Arrays aligned with the trades: signed position qty and average price
+        on the traded instrument after each trade, and realized PnL per trade
+    """
+    n = len(trade_qty)
+    qty_after = np.zeros(n)
+    avg_after = np.zeros(n)
+    realized = np.zeros(n)
+    state: Dict[int, Tuple[float, float]] = {}
+
+    for k in range(n):
+        instrument = int(trade_instrument[k])
+        side = trade_side[k]
+        qty = trade_qty[k]
+        price = trade_price[k]
+        position, avg = state.get(instrument, (0.0, 0.0))
+
+        if position == 0 or np.sign(position) == side:
+            # Open or increase
+            new_position = position + side * qty
+            avg = (abs(position) * avg + qty * price) / abs(new_position)
+            position = new_position
+        else:
+            held = abs(position)
+            closed = min(qty, held)
+            realized[k] = (price - avg) * closed * np.sign(position)
+            if abs(qty - held) <= 1e-12 * max(qty, 1.0):
+                position, avg = 0.0, 0.0
+            elif qty > held:
+                # Reverse: the remainder opens at the fill price
+                position, avg = side * (qty - held), price
+            else:
+                position = position + side * qty
+
+        state[instrument] = (position, avg)
+        qty_after[k] = position
+        avg_after[k] = avg
+
+    return qty_after, avg_after, realized
+
+
+def replay_challenge(inputs: ReplayInput) -> Dict:
+    """
+    Deterministically recompute a challenge from its trade log and quote tape.
+
+    Positions and realized PnL come from one sequential pass over the trades.
+    The equity curve, drawdowns and rule checks are then evaluated for every
+    tape timestamp at once with NumPy: each instrument's position and mark
+    price at each timestamp are looked up with searchsorted. Equity comes
+    from calculate_equity with the unrealized PnL marked at the last price,
+    the same definition live evaluation uses; realized PnL is reported and
+    written back to the trades but, as live, not added to equity.
+
+    Args:
+        inputs: ReplayInput for one challenge
+
+    Returns:
+        Dict with status, reasons, equity metrics, positions and per-trade realized PnL
+    """
+    order = np.lexsort((inputs.trade_ids, inputs.trade_ts))
+    trade_ids = inputs.trade_ids[order]
+    trade_ts = inputs.trade_ts[order]
+    trade_instrument = inputs.trade_instrument[order]
+    trade_price = inputs.trade_price[order]
+    qty_after, avg_after, realized = rebuild_positions(
+        trade_instrument, inputs.trade_side[order], inputs.trade_qty[order], trade_price
+    )
+
+    # Evaluation timeline: start, every trade and every tape tick in the window
+    tape_ts = [ts for ts, _ in inputs.tape.values()]
+    timeline = np.unique(np.concatenate([[inputs.start_time], trade_ts] + tape_ts))
+    timeline = timeline[(timeline >= inputs.start_time) & (timeline <= inputs.end_time)]
+
+    cumulative = np.cumsum(realized)
+
+    # Unrealized PnL, one vectorized pass per traded instrument
+    unrealized = np.zeros(len(timeline))
+    final_positions = {}
+    for instrument in np.unique(trade_instrument):
+        mask = trade_instrument == instrument
+        ts_i, qty_i, avg_i, price_i = trade_ts[mask], qty_after[mask], avg_after[mask], trade_price[mask]
+
+        idx = np.searchsorted(ts_i, timeline, side='right') - 1
+        held = idx >= 0
+        idx = np.maximum(idx, 0)
+        position = np.where(held, qty_i[idx], 0.0)
+        avg = avg_i[idx]
+
+        # Mark at the latest tape price, or the latest fill if that is more recent
+        mark = price_i[idx]
+        tick_ts, tick_last = inputs.tape.get(int(instrument), (np.empty(0), np.empty(0)))
+        if len(tick_ts):
+            pidx = np.searchsorted(tick_ts, timeline, side='right') - 1
+            fresh_tick = (pidx >= 0) & (tick_ts[np.maximum(pidx, 0)] >= ts_i[idx])
+            mark = np.where(fresh_tick, tick_last[np.maximum(pidx, 0)], mark)
+
+        unrealized += position * (mark - avg)
+
+        if qty_i[-1] != 0:
+            final_positions[int(instrument)] = {
+                'side': 'LONG' if qty_i[-1] > 0 else 'SHORT',
+                'qty': float(abs(qty_i[-1])),
+                'avg_price': float(avg_i[-1])
+            }
+
+    equity = calculate_equity(inputs.start_balance, unrealized)
+
+    # Daily start equity is the first equity seen on each local day
+    day_id = np.searchsorted(day_boundaries(inputs.start_time, inputs.end_time, inputs.timezone), timeline, side='right')
+    day_starts = np.flatnonzero(np.r_[True, day_id[1:] != day_id[:-1]])
+    daily_start = np.repeat(equity[day_starts], np.diff(np.r_[day_starts, len(equity)]))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        daily_drawdown = np.where(daily_start > 0, (daily_start - equity) / daily_start, 0.0)
+    total_drawdown = (inputs.start_balance - equity) / inputs.start_balance if inputs.start_balance else np.zeros(len(equity))
+
+    daily_breach = daily_drawdown >= inputs.daily_max_loss
+    total_breach = total_drawdown >= inputs.total_max_loss
+    target_hit = equity >= inputs.start_balance * (1 + inputs.profit_target)
+
+    failed = daily_breach | total_breach
+    first_fail = int(np.argmax(failed)) if failed.any() else None
+    first_pass = int(np.argmax(target_hit)) if target_hit.any() else None
+
+    status, status_at, reasons = 'IN_PROGRESS', None, []
+    if first_fail is not None and (first_pass is None or first_fail <= first_pass):
+        status, status_at = 'FAILED', first_fail
+        if daily_breach[first_fail]:
+            observed = float(daily_drawdown[first_fail])
+            reasons.append({
+                'rule': 'daily_max_loss',
+                'threshold': inputs.daily_max_loss,
+                'observed': observed,
+                'message': f'Daily drawdown {observed:.2%} exceeds maximum allowed {inputs.daily_max_loss:.2%}'
+            })
+        else:
+            observed = float(total_drawdown[first_fail])
+            reasons.append({
+                'rule': 'total_max_loss',
+                'threshold': inputs.total_max_loss,
+                'observed': observed,
+                'message': f'Total drawdown {observed:.2%} exceeds maximum allowed {inputs.total_max_loss:.2%}'
+            })
+    elif first_pass is not None:
+        status, status_at = 'PASSED', first_pass
+        observed = float((equity[first_pass] - inputs.start_balance) / inputs.start_balance)
+        reasons.append({
+            'rule': 'profit_target',
+            'threshold': inputs.profit_target,
+            'observed': observed,
+            'message': f'Profit target achieved: {observed:.2%} >= {inputs.profit_target:.2%}'
+        })
+
+    last_day = day_starts[-1]
+    return {
+        'user_challenge_id': inputs.user_challenge_id,
+        'status': status,
+        'status_at': from_epoch(timeline[status_at]).isoformat() if status_at is not None else None,
+        'reasons': reasons,
+        'current_equity': float(equity[-1]),
+        'realized_pnl': float(cumulative[-1]) if len(cumulative) else 0.0,
+        'unrealized_pnl': float(unrealized[-1]),
+        'max_equity': float(equity.max()),
+        'min_equity_all_time': float(equity.min()),
+        'daily_start_equity': float(equity[last_day]),
+        'min_equity_today': float(equity[last_day:].min()),
+        'positions': final_positions,
+        'trade_realized_pnl': {int(trade_id): float(pnl) for trade_id, pnl in zip(trade_ids, realized)},
+        'points': int(len(timeline))
+    }
+
+
+class ReplayService:
+    """
+    Service class to recompute challenges from their trade log and quote tape.
+
+    Inputs are loaded in the parent process in chunks (one trade query and
+    one tape query per chunk) and replayed in a process pool.
+    """
+
+    @staticmethod
+    def load_inputs(user_challenge_ids: List[int], until: Optional[datetime] = None) -> List[ReplayInput]:
+        """
+        Load replay inputs for a set of challenges.
+
+        Args:
+            user_challenge_ids: Challenges to load
+            until: Replay horizon for challenges still running (default: now)
+
+        Returns:
+            List of ReplayInput, one per challenge found
+        """
+        from app.config import Config
+        until = until or datetime.utcnow()
+
+        rows = db.session.query(UserChallenge, Challenge).join(
+            Challenge, Challenge.id == UserChallenge.challenge_id
+        ).filter(UserChallenge.id.in_(user_challenge_ids)).all()
+        if not rows:
+            return []
+
+        trades_by_challenge: Dict[int, List] = {}
+        for trade in db.session.query(
+            Trade.user_challenge_id, Trade.id, Trade.created_at, Trade.instrument_id,
+            Trade.side, Trade.qty, Trade.price
+        ).filter(Trade.user_challenge_id.in_(user_challenge_ids)).order_by(
+            Trade.user_challenge_id, Trade.created_at, Trade.id
+        ).all():
+            trades_by_challenge.setdefault(trade[0], []).append(trade)
+
+        # One tape query for every instrument traded in this chunk
+        windows = {uc.id: (uc.start_time, uc.end_time or until) for uc, _ in rows}
+        instrument_ids = {trade[3] for trades in trades_by_challenge.values() for trade in trades}
+        tape: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+        if instrument_ids:
+            ticks = db.session.query(QuoteTick.instrument_id, QuoteTick.ts, QuoteTick.last).filter(
+                QuoteTick.instrument_id.in_(instrument_ids),
+                QuoteTick.ts >= min(start for start, _ in windows.values()),
+                QuoteTick.ts <= max(end for _, end in windows.values())
+            ).order_by(QuoteTick.instrument_id, QuoteTick.ts).all()
+            by_instrument: Dict[int, List] = {}
+            for tick in ticks:
+                by_instrument.setdefault(tick[0], []).append(tick)
+            tape = {
+                instrument_id: (to_epoch([t[1] for t in items]), np.array([t[2] for t in items], dtype=float))
+                for instrument_id, items in by_instrument.items()
+            }
+
+        inputs = []
+        for uc, challenge in rows:
+            trades = trades_by_challenge.get(uc.id, [])
+            start, end = (to_epoch([value])[0] for value in windows[uc.id])
+            traded = {trade[3] for trade in trades}
+
+            # Slice each instrument's tape to this challenge's window
+            uc_tape = {}
+            for instrument_id in traded:
+                if instrument_id in tape:
+                    ts, last = tape[instrument_id]
+                    lo, hi = np.searchsorted(ts, start, 'left'), np.searchsorted(ts, end, 'right')
+                    uc_tape[instrument_id] = (ts[lo:hi], last[lo:hi])
+
+            inputs.append(ReplayInput(
+                user_challenge_id=uc.id,
+                start_balance=uc.start_balance,
+                start_time=start,
+                end_time=end,
+                daily_max_loss=challenge.daily_max_loss,
+                total_max_loss=challenge.total_max_loss,
+                profit_target=challenge.profit_target,
+                trade_ids=np.array([t[1] for t in trades], dtype=np.int64),
+                trade_ts=to_epoch([t[2] for t in trades]) if trades else np.empty(0),
+                trade_instrument=np.array([t[3] for t in trades], dtype=np.int64),
+                trade_side=np.array([1 if t[4] == 'BUY' else -1 for t in trades], dtype=np.int8),
+                trade_qty=np.array([t[5] for t in trades], dtype=float),
+                trade_price=np.array([t[6] for t in trades], dtype=float),
+                tape=uc_tape,
+                timezone=Config.TIMEZONE
+            ))
+        return inputs
+
+    @staticmethod
+    def run(user_challenge_ids: Optional[Iterable[int]] = None, status: Optional[str] = None,
+            workers: Optional[int] = None, apply: bool = False, chunk_size: int = 500,
+            until: Optional[datetime] = None) -> List[Dict]:
+        """
+        Replay challenges, optionally writing the recomputed state back.
+
+        Args:
+            user_challenge_ids: Challenges to replay (default: all)
+            status: Only replay challenges currently in this status
+            workers: Worker processes (default: CPU count; 1 runs inline)
+            apply: Persist recomputed state, positions and trade PnL
+            chunk_size: Challenges loaded and replayed per batch
+            until: Replay horizon for challenges still running (default: now)
+
+        Returns:
+            List of replay results (without per-trade PnL)
+        """
+        query = db.session.query(UserChallenge.id)
+        if user_challenge_ids:
+            query = query.filter(UserChallenge.id.in_(list(user_challenge_ids)))
+        if status:
+            query = query.filter(UserChallenge.status == status)
+        ids = [row[0] for row in query.order_by(UserChallenge.id).all()]
+
+        workers = workers or os.cpu_count() or 1
+        executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 and len(ids) > 1 else None
+
+        results = []
+        try:
+            for offset in range(0, len(ids), chunk_size):
+                inputs = ReplayService.load_inputs(ids[offset:offset + chunk_size], until)
+                if executor:
+                    chunk_results = list(executor.map(
+                        replay_challenge, inputs, chunksize=max(1, len(inputs) // (workers * 4))
+                    ))
+                else:
+                    chunk_results = [replay_challenge(item) for item in inputs]
+
+                for result in chunk_results:
+                    if apply:
+                        ReplayService.apply_result(result)
+                    result.pop('trade_realized_pnl', None)
+                    results.append(result)
+                if apply:
+                    db.session.commit()
+        finally:
+            if executor:
+                executor.shutdown()
+
+        return results
+
+    @staticmethod
+    def apply_result(result: Dict) -> None:
+        """
+        Write a replay result back to its challenge, positions and trades
+        (caller commits).
+        """
+        uc = UserChallenge.query.get(result['user_challenge_id'])
+        previous_rules = list(uc.violated_rules) if uc.violated_rules else []
+        old_status = uc.status
+
+        uc.current_equity = result['current_equity']
+        uc.max_equity = result['max_equity']
+        uc.min_equity_all_time = result['min_equity_all_time']
+        uc.daily_start_equity = result['daily_start_equity']
+        uc.min_equity_today = result['min_equity_today']
+
+        # A quantity-limit failure happened at submission, outside the trade log
+        if QUANTITY_LIMIT_RULE in previous_rules:
+            new_status = 'FAILED'
+            uc.violated_rules = [QUANTITY_LIMIT_RULE] + [r['message'] for r in result['reasons'] if result['status'] == 'FAILED']
+        else:
+            new_status = result['status']
+            uc.violated_rules = [r['message'] for r in result['reasons']] if result['status'] == 'FAILED' else []
+
+        stats = dict(uc.stats_json or {})
+        stats['replay'] = {
+            'replayed_at': datetime.utcnow().isoformat(),
+            'status_at': result['status_at'],
+            'realized_pnl': result['realized_pnl'],
+            'points': result['points']
+        }
+        uc.stats_json = stats
+
+        if result['trade_realized_pnl']:
+            db.session.execute(
+                update(Trade.__table__).where(Trade.__table__.c.id == bindparam('trade_id')).values(
+                    realized_pnl=bindparam('pnl')
+                ),
+                [{'trade_id': trade_id, 'pnl': pnl} for trade_id, pnl in result['trade_realized_pnl'].items()]
+            )
+
+        # Bring position rows in line with the replayed book; while the
+        # challenge is in the exposure book its rows move the book with them
+        in_book = old_status in ACTIVE_STATUSES
+        existing = {p.instrument_id: p for p in Position.query.filter_by(user_challenge_id=uc.id).all()}
+        for instrument_id, replayed in result['positions'].items():
+            after = position_legs(replayed['side'], replayed['qty'], replayed['avg_price'])
+            position = existing.pop(instrument_id, None)
+            if position is None:
+                db.session.add(Position(
+                    user_challenge_id=uc.id,
+                    instrument_id=instrument_id,
+                    side=replayed['side'],
+                    qty=replayed['qty'],
+                    avg_price=replayed['avg_price'],
+                    opened_at=datetime.utcnow()
+                ))
+                if in_book:
+                    ExposureService.apply_delta(instrument_id, FLAT, after)
+                continue
+            if in_book:
+                ExposureService.apply_delta(instrument_id, position_legs(position.side, position.qty, position.avg_price), after)
+            if position.side != replayed['side']:
+                position.stop_loss = None
+                position.take_profit = None
+            position.side = replayed['side']
+            position.qty = replayed['qty']
+            position.avg_price = replayed['avg_price']
+        for position in existing.values():
+            if in_book:
+                ExposureService.apply_delta(position.instrument_id,
+                                            position_legs(position.side, position.qty, position.avg_price), FLAT)
+            db.session.delete(position)
+
+        # ...then the status change takes the replayed positions out of (or into) the book
+        ExposureService.on_status_change(uc.id, old_status, new_status)
+        uc.status = new_status
@@ -1,9 +1,9 @@
 from typing import Dict, List, Optional, Tuple
 from datetime import datetime
-from app.utils import calculate_daily_drawdown, calculate_total_drawdown, calculate_profit_percentage, get_start_of_day_casablanca
+from app.utils import calculate_daily_drawdown, calculate_total_drawdown, calculate_profit_percentage
 from app.models import UserChallenge
+from app.services.rule_engine import rule_engine, RuleContext, trade_history_context
 import logging
-from typing import Optional
 
 logger = logging.getLogger(__name__)
 
@@ -38,10 +38,12 @@ class RiskService:
             Dict with status, reasons, and metrics
         """
         challenge = user_challenge.challenge
+        rule_set = rule_engine.rule_set_for(challenge)
         
         # Calculate metrics
         daily_drawdown = calculate_daily_drawdown(daily_start_equity, min_equity_today)
         total_drawdown = calculate_total_drawdown(user_challenge.start_balance, min_equity_all_time)
+        trailing_drawdown = calculate_total_drawdown(max_equity_all_time, current_equity)
         profit_pct = calculate_profit_percentage(user_challenge.start_balance, current_equity)
         
         # Initialize result
@@ -51,6 +53,7 @@ class RiskService:
             'metrics': {
                 'daily_drawdown': daily_drawdown,
                 'total_drawdown': total_drawdown,
+                'trailing_drawdown': trailing_drawdown,
                 'profit_pct': profit_pct,
                 'current_equity': current_equity,
                 'initial_balance': user_challenge.start_balance,
@@ -58,35 +61,20 @@ class RiskService:
             }
         }
         
-        # Check daily max loss rule
-        if daily_drawdown >= challenge.daily_max_loss:
-            result['status'] = 'FAILED'
-            result['reasons'].append({
-                'rule': 'daily_max_loss',
-                'threshold': challenge.daily_max_loss,
-                'observed': daily_drawdown,
-                'message': f'Daily drawdown {daily_drawdown:.2%} exceeds maximum allowed {challenge.daily_max_loss:.2%}'
-            })
-        
-        # Check total max loss rule (only if not already failed for daily loss)
-        if result['status'] != 'FAILED' and total_drawdown >= challenge.total_max_loss:
-            result['status'] = 'FAILED'
-            result['reasons'].append({
-                'rule': 'total_max_loss',
-                'threshold': challenge.total_max_loss,
-                'observed': total_drawdown,
-                'message': f'Total drawdown {total_drawdown:.2%} exceeds maximum allowed {challenge.total_max_loss:.2%}'
-            })
-        
-        # Check profit target (only if not already failed)
-        if result['status'] != 'FAILED' and current_equity >= user_challenge.start_balance * (1 + challenge.profit_target):
-            result['status'] = 'PASSED'
-            result['reasons'].append({
-                'rule': 'profit_target',
-                'threshold': challenge.profit_target,
-                'observed': profit_pct,
-                'message': f'Profit target achieved: {profit_pct:.2%} >= {challenge.profit_target:.2%}'
-            })
+        # Loss limits first (the first breach is reported), then the profit
+        # target, which only passes once the template's gates hold
+        trading_days, daily_realized_pnl = trade_history_context(user_challenge.id)
+        status, reasons, pending = rule_set.evaluate(RuleContext(
+            start_balance=user_challenge.start_balance,
+            metrics=result['metrics'],
+            trading_days=trading_days,
+            daily_realized_pnl=daily_realized_pnl
+        ))
+        if status == 'FAILED' or (status == 'PASSED' and result['status'] != 'FAILED'):
+            result['status'] = status
+            result['reasons'] = reasons
+        if pending:
+            result['pending'] = pending
         
         # Add additional metrics
         result['metrics']['max_equity'] = max_equity_all_time
@@ -157,43 +145,6 @@ class RiskService:
         total_equity = balance + unrealized_pnl
         return total_equity, unrealized_pnl, realized_pnl
     
-    @staticmethod
-    def should_update_daily_start_equity(
-        user_challenge: UserChallenge,
-        current_time: Optional[datetime] = None
-    ) -> bool:
-        """
-        Determine if we should update the daily start equity.
-        This happens when we cross into a new day in the Casablanca timezone.
-        
-        Args:
-            user_challenge: UserChallenge model instance
-            current_time: Current time (optional, will use now if not provided)
-            
-        Returns:
-            True if daily start equity should be updated, False otherwise
-        """
-        if current_time is None:
-            from app.utils import get_casablanca_time
-            current_time = get_casablanca_time()
-        
-        # Get start of current day in Casablanca timezone
-        start_of_current_day = get_start_of_day_casablanca(current_time)
-        
-        # Get start of day when challenge started
-        start_of_challenge_day = get_start_of_day_casablanca(user_challenge.start_time)
-        
-        # If current day is different from the day we last updated daily_start_equity,
-        # or if it's the same day as challenge start but we haven't set it yet
-        if not user_challenge.daily_start_equity:
-            # First time setting it - should be the equity at challenge start
-            return True
-        
-        # Check if we've moved to a new day
-        last_equity_update_day = get_start_of_day_casablanca(user_challenge.updated_at)
-        
-        return start_of_current_day > last_equity_update_day
-    
     @staticmethod
     def calculate_position_sizing(
         account_equity: float,
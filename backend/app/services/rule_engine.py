@@ -0,0 +1,404 @@
+import threading
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, time as dtime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import pytz
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEZONE = 'Africa/Casablanca'
+
+
+def _number(value) -> Optional[float]:
+    """A plain int/float, or None (ignores unset columns and non-numeric values)."""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return float(value)
+
+
+@dataclass
+class RuleContext:
+    """
+    What a rule can look at when evaluating one challenge.
+
+    Trade history is only loaded if a rule asks for it, through the
+    trading_days / daily_realized_pnl callables.
+    """
+    start_balance: float
+    metrics: Dict[str, float]
+    trading_days: Callable[[], int] = lambda: 0
+    daily_realized_pnl: Callable[[], List[float]] = lambda: []
+
+
+class Rule(ABC):
+    """
+    A compiled challenge rule.
+
+    kind is one of:
+        'fail'   - a breach fails the challenge
+        'target' - all targets met passes the challenge (subject to gates)
+        'gate'   - must hold for a met target to pass the challenge
+        'order'  - checked when an order is submitted
+
+    Fail, target and gate rules implement check(ctx); order rules
+    implement check_order(qty, now).
+    """
+    type = ''
+    kind = ''
+
+    def to_dict(self) -> Dict:
+        return {'type': self.type, **{k: v for k, v in vars(self).items() if not k.startswith('_')}}
+
+
+class ThresholdRule(Rule):
+    """metric >= threshold, for fail and target rules; vectorizable over a book."""
+    metric = ''
+
+    def __init__(self, threshold: float):
+        if threshold is None or threshold < 0:
+            raise ValueError(f"{self.type} needs a non-negative threshold")
+        self.threshold = float(threshold)
+
+    def check(self, ctx: RuleContext) -> Optional[Dict]:
+        observed = ctx.metrics.get(self.metric, 0.0)
+        if observed >= self.threshold:
+            return {'rule': self.type, 'threshold': self.threshold, 'observed': observed,
+                    'message': self.message(observed)}
+        return None
+
+    @abstractmethod
+    def message(self, observed: float) -> str:
+        """Human-readable reason for a met threshold."""
+
+
+class DailyLossRule(ThresholdRule):
+    type, kind, metric = 'daily_max_loss', 'fail', 'daily_drawdown'
+
+    def message(self, observed):
+        return f'Daily drawdown {observed:.2%} exceeds maximum allowed {self.threshold:.2%}'
+
+
+class TotalLossRule(ThresholdRule):
+    type, kind, metric = 'total_max_loss', 'fail', 'total_drawdown'
+
+    def message(self, observed):
+        return f'Total drawdown {observed:.2%} exceeds maximum allowed {self.threshold:.2%}'
+
+
+class TrailingDrawdownRule(ThresholdRule):
+    """Drawdown measured from the equity high-water mark instead of the start balance."""
+    type, kind, metric = 'trailing_drawdown', 'fail', 'trailing_drawdown'
+
+    def message(self, observed):
+        return f'Trailing drawdown {observed:.2%} exceeds maximum allowed {self.threshold:.2%}'
+
+
+class ProfitTargetRule(ThresholdRule):
+    type, kind, metric = 'profit_target', 'target', 'profit_pct'
+
+    def check(self, ctx: RuleContext) -> Optional[Dict]:
+        # Compared on equity, like the vectorized book evaluation
+        if ctx.metrics.get('current_equity', 0.0) >= ctx.start_balance * (1 + self.threshold):
+            observed = ctx.metrics.get(self.metric, 0.0)
+            return {'rule': self.type, 'threshold': self.threshold, 'observed': observed,
+                    'message': self.message(observed)}
+        return None
+
+    def message(self, observed):
+        return f'Profit target achieved: {observed:.2%} >= {self.threshold:.2%}'
+
+
+class MinTradingDaysRule(Rule):
+    type, kind = 'min_trading_days', 'gate'
+
+    def __init__(self, days: int):
+        if not days or days < 1:
+            raise ValueError("min_trading_days needs days >= 1")
+        self.days = int(days)
+
+    def check(self, ctx: RuleContext) -> Optional[Dict]:
+        traded = ctx.trading_days()
+        if traded < self.days:
+            return {'rule': self.type, 'threshold': self.days, 'observed': traded,
+                    'message': f'Traded on {traded} of the required {self.days} days'}
+        return None
+
+
+class ConsistencyRule(Rule):
+    """No single day may account for more than max_day_share of the realized profit."""
+    type, kind = 'consistency', 'gate'
+
+    def __init__(self, max_day_share: float):
+        if not max_day_share or not 0 < max_day_share <= 1:
+            raise ValueError("consistency needs 0 < max_day_share <= 1")
+        self.max_day_share = float(max_day_share)
+
+    def check(self, ctx: RuleContext) -> Optional[Dict]:
+        days = ctx.daily_realized_pnl()
+        total = sum(days)
+        if total <= 0:
+            return None
+        share = max(days) / total
+        if share > self.max_day_share:
+            return {'rule': self.type, 'threshold': self.max_day_share, 'observed': share,
+                    'message': f'Best day is {share:.0%} of profit, above the allowed {self.max_day_share:.0%}'}
+        return None
+
+
+class MaxLotsRule(Rule):
+    """Per-order quantity cap. Exceeding it fails the challenge unless action is 'reject'."""
+    type, kind = 'max_lots', 'order'
+
+    def __init__(self, max_qty: float, action: str = 'fail'):
+        if not max_qty or max_qty <= 0:
+            raise ValueError("max_lots needs a positive max_qty")
+        if action not in ('fail', 'reject'):
+            raise ValueError("max_lots action must be 'fail' or 'reject'")
+        self.max_qty = float(max_qty)
+        self.action = action
+
+    def check_order(self, qty: float, now: datetime) -> Optional[Dict]:
+        if qty > self.max_qty:
+            return {'rule': self.type, 'action': self.action, 'threshold': self.max_qty, 'observed': qty,
+                    'message': f'Trade quantity {qty} exceeds limit of {self.max_qty}'}
+        return None
+
+
+class NewsBlackoutRule(Rule):
+    """
+    No new orders inside news windows.
+
+    windows: explicit [{"start": ISO UTC, "end": ISO UTC}, ...]
+    daily:   recurring local-time ranges ["14:25-14:35", ...] in `timezone`
+    """
+    type, kind = 'news_blackout', 'order'
+
+    def __init__(self, windows: Optional[List[Dict]] = None, daily: Optional[List[str]] = None,
+                 timezone: str = DEFAULT_TIMEZONE):
+        self._windows: List[Tuple[datetime, datetime]] = sorted(
+            (self._parse_utc(w['start']), self._parse_utc(w['end'])) for w in (windows or [])
+        )
+        self._daily: List[Tuple[dtime, dtime]] = [self._parse_range(r) for r in (daily or [])]
+        if not self._windows and not self._daily:
+            raise ValueError("news_blackout needs windows or daily ranges")
+        self._tz = pytz.timezone(timezone)
+        self.windows = windows or []
+        self.daily = daily or []
+        self.timezone = timezone
+
+    @staticmethod
+    def _parse_utc(value: str) -> datetime:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(pytz.utc).replace(tzinfo=None)
+        return parsed
+
+    @staticmethod
+    def _parse_range(value: str) -> Tuple[dtime, dtime]:
+        start, end = value.split('-')
+        return dtime.fromisoformat(start.strip()), dtime.fromisoformat(end.strip())
+
+    def check_order(self, qty: float, now: datetime) -> Optional[Dict]:
+        for start, end in self._windows:
+            if start > now:
+                break
+            if now <= end:
+                return self._violation(f'{start.isoformat()}Z - {end.isoformat()}Z')
+
+        local = pytz.utc.localize(now).astimezone(self._tz).time()
+        for start, end in self._daily:
+            if start <= local <= end:
+                return self._violation(f'{start.strftime("%H:%M")}-{end.strftime("%H:%M")} {self.timezone}')
+        return None
+
+    def _violation(self, window: str) -> Dict:
+        return {'rule': self.type, 'action': 'reject', 'message': f'Trading is paused for news ({window})'}
+
+
+RULE_TYPES = {
+    'daily_max_loss': lambda p: DailyLossRule(p.get('limit')),
+    'total_max_loss': lambda p: TotalLossRule(p.get('limit')),
+    'trailing_drawdown': lambda p: TrailingDrawdownRule(p.get('limit')),
+    'profit_target': lambda p: ProfitTargetRule(p.get('target')),
+    'min_trading_days': lambda p: MinTradingDaysRule(p.get('days')),
+    'consistency': lambda p: ConsistencyRule(p.get('max_day_share')),
+    'max_lots': lambda p: MaxLotsRule(p.get('max_qty'), p.get('action', 'fail')),
+    'news_blackout': lambda p: NewsBlackoutRule(p.get('windows'), p.get('daily'), p.get('timezone', DEFAULT_TIMEZONE)),
+}
+
+# Evaluation order of fail rules; the first breach is the reported one
+FAIL_ORDER = ('daily_max_loss', 'total_max_loss', 'trailing_drawdown')
+
+
+@dataclass
+class RuleSet:
+    """The compiled rules of one challenge template."""
+    fail: List[ThresholdRule] = field(default_factory=list)
+    targets: List[ThresholdRule] = field(default_factory=list)
+    gates: List[Rule] = field(default_factory=list)
+    orders: List[Rule] = field(default_factory=list)
+
+    def threshold(self, rule_type: str, default: float = float('inf')) -> float:
+        """Threshold of a fail/target rule (inf when the template does not have it)."""
+        for rule in self.fail + self.targets:
+            if rule.type == rule_type:
+                return rule.threshold
+        return default
+
+    def rule(self, rule_type: str) -> Optional[Rule]:
+        for rule in self.fail + self.targets + self.gates + self.orders:
+            if rule.type == rule_type:
+                return rule
+        return None
+
+    def evaluate(self, ctx: RuleContext) -> Tuple[str, List[Dict], List[Dict]]:
+        """
+        Evaluate a challenge.
+
+        Returns:
+            (status, reasons, pending) where status is FAILED, PASSED or
+            IN_PROGRESS, reasons explain a FAILED/PASSED status, and pending
+            lists gates holding back a met target
+        """
+        for rule in self.fail:
+            reason = rule.check(ctx)
+            if reason:
+                return 'FAILED', [reason], []
+
+        if not self.targets:
+            return 'IN_PROGRESS', [], []
+        met = [rule.check(ctx) for rule in self.targets]
+        if not all(met):
+            return 'IN_PROGRESS', [], []
+
+        # Gates may read trade history, so they only run once every target is met
+        pending = [reason for reason in (gate.check(ctx) for gate in self.gates) if reason]
+        if pending:
+            return 'IN_PROGRESS', [], pending
+        return 'PASSED', met, []
+
+    def check_order(self, qty: float, now: Optional[datetime] = None) -> List[Dict]:
+        """Order rules violated by submitting `qty` now."""
+        now = now or datetime.utcnow()
+        return [reason for reason in (rule.check_order(qty, now) for rule in self.orders) if reason]
+
+    def to_list(self) -> List[Dict]:
+        return [rule.to_dict() for rule in self.fail + self.targets + self.gates + self.orders]
+
+
+def compile_rules(challenge) -> RuleSet:
+    """
+    Compile a challenge template into a RuleSet.
+
+    The daily_max_loss, total_max_loss, profit_target and
+    max_trade_quantity columns give the base rules; entries of rules_json
+    add rules or override a base rule of the same type. rules_json is a
+    list of {"type": ..., <params>} objects or a {type: params} mapping.
+    Invalid entries are logged and skipped.
+    """
+    specs: Dict[str, Dict] = {}
+    for rule_type, column, param in (('daily_max_loss', 'daily_max_loss', 'limit'),
+                                     ('total_max_loss', 'total_max_loss', 'limit'),
+                                     ('profit_target', 'profit_target', 'target'),
+                                     ('max_lots', 'max_trade_quantity', 'max_qty')):
+        value = _number(getattr(challenge, column, None))
+        if value:
+            specs[rule_type] = {param: value}
+
+    raw = getattr(challenge, 'rules_json', None)
+    if isinstance(raw, dict):
+        raw = [{'type': rule_type, **(params if isinstance(params, dict) else {})} for rule_type, params in raw.items()]
+    if isinstance(raw, list):
+        for entry in raw:
+            if isinstance(entry, dict) and entry.get('type') in RULE_TYPES:
+                specs[entry['type']] = {k: v for k, v in entry.items() if k != 'type'}
+            else:
+                logger.error(f"Challenge {getattr(challenge, 'id', '?')}: unknown rule {entry!r}")
+
+    rule_set = RuleSet()
+    for rule_type, params in specs.items():
+        try:
+            rule = RULE_TYPES[rule_type](params)
+        except (ValueError, TypeError, KeyError) as e:
+            logger.error(f"Challenge {getattr(challenge, 'id', '?')}: invalid {rule_type} rule {params!r}: {e}")
+            continue
+        {'fail': rule_set.fail, 'target': rule_set.targets,
+         'gate': rule_set.gates, 'order': rule_set.orders}[rule.kind].append(rule)
+
+    rule_set.fail.sort(key=lambda r: FAIL_ORDER.index(r.type))
+    return rule_set
+
+
+class RuleEngine:
+    """
+    Compiles challenge templates into rule sets once and caches them by
+    template id, recompiling when the template's updated_at changes.
+    """
+
+    def __init__(self):
+        self._cache: Dict[int, Tuple[Optional[datetime], RuleSet]] = {}
+        self._lock = threading.Lock()
+
+    def rule_set_for(self, challenge) -> RuleSet:
+        """Compiled rules of a Challenge template."""
+        challenge_id = getattr(challenge, 'id', None)
+        if not isinstance(challenge_id, int):
+            # Unsaved or stand-in template: nothing to key the cache on
+            return compile_rules(challenge)
+
+        version = getattr(challenge, 'updated_at', None)
+        cached = self._cache.get(challenge_id)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        rule_set = compile_rules(challenge)
+        with self._lock:
+            self._cache[challenge_id] = (version, rule_set)
+        return rule_set
+
+    def rule_sets_for_ids(self, challenge_ids: Iterable[int]) -> Dict[int, RuleSet]:
+        """Compiled rules of several templates, loading them with one query."""
+        from app.models import Challenge
+        ids = sorted({int(i) for i in challenge_ids})
+        if not ids:
+            return {}
+        return {challenge.id: self.rule_set_for(challenge)
+                for challenge in Challenge.query.filter(Challenge.id.in_(ids)).all()}
+
+    def invalidate(self, challenge_id: Optional[int] = None) -> None:
+        with self._lock:
+            if challenge_id is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(challenge_id, None)
+
+
+def trade_history_context(user_challenge_id: int, timezone: str = DEFAULT_TIMEZONE):
+    """
+    Lazy (trading_days, daily_realized_pnl) callables over a challenge's
+    trades, grouped by local calendar day. The trades are read once, on
+    first use.
+    """
+    loaded: Dict[str, List[float]] = {}
+
+    def by_day() -> List[float]:
+        if 'days' not in loaded:
+            from app.models import Trade
+            from app import db
+            tz = pytz.timezone(timezone)
+            days: Dict = defaultdict(float)
+            for created_at, realized in db.session.query(Trade.created_at, Trade.realized_pnl).filter(
+                Trade.user_challenge_id == user_challenge_id
+            ).all():
+                days[pytz.utc.localize(created_at).astimezone(tz).date()] += realized or 0.0
+            loaded['days'] = list(days.values())
+        return loaded['days']
+
+    return (lambda: len(by_day())), by_day
+
+
+# Global rule engine instance
+rule_engine = RuleEngine()
@@ -29,7 +29,18 @@ class SignalsService:
         """
         # Get OHLCV data
         ohlcv_data = self.market_data_service.get_ohlcv(instrument, provider, timeframe, limit)
+        return self.signals_from_ohlcv(ohlcv_data)
+    
+    def signals_from_ohlcv(self, ohlcv_data: List[Dict]) -> Dict:
+        """
+        Generate trading signals from OHLCV bars the caller already fetched.
         
+        Args:
+            ohlcv_data: OHLCV bars, oldest first
+            
+        Returns:
+            Dict with signals and indicators
+        """
         if not ohlcv_data or len(ohlcv_data) < 50:  # Need enough data for indicators
             return {
                 'bias': 'NEUTRAL',
@@ -0,0 +1,199 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+from datetime import datetime
+from sqlalchemy import update, case, func, literal, literal_column
+from sqlalchemy.exc import IntegrityError
+from app.models import Trade, Instrument, UserChallenge, User, TradingLeaderboardEntry
+from app.services.leaderboard_service import LeaderboardService, ALL_TIME, months_between, month_period
+from app.utils import encode_cursor, decode_cursor, keyset_paginate
+from app.utils.response_cache import response_cache
+from app import db
+import pytz
+import logging
+
+logger = logging.getLogger(__name__)
+
+INSTRUMENT = 'instrument'
+ASSET_CLASS = 'asset_class'
+
+# Response cache tag of the instrument and asset-class boards
+TRADING_LEADERBOARD_TAG = 'trading-leaderboard'
+
+COUNTERS = ('realized_pnl', 'trade_count', 'closed_count', 'win_count')
+
+
+def month_starts(start: datetime, end: datetime) -> List[Tuple[str, datetime]]:
+    """(period, naive UTC start) of the Casablanca months from start to end."""
+    tz = pytz.timezone('Africa/Casablanca')
+    starts = []
+    for period in months_between(start, end):
+        year, month = int(period[:4]), int(period[5:])
+        starts.append((period, tz.localize(datetime(year, month, 1)).astimezone(pytz.utc).replace(tzinfo=None)))
+    return starts
+
+
+def aggregate_trades(rows: Iterable[tuple]) -> Dict[Tuple[str, str, str, int], Dict]:
+    """
+    Fold per-instrument monthly trade aggregates into every board.
+
+    Each row counts towards its instrument and its asset class, for its
+    month and for all-time.
+
+    Args:
+        rows: (user_id, instrument_id, asset_class, period, realized_pnl,
+            trade_count, closed_count, win_count) tuples
+
+    Returns:
+        Dict mapping (period, scope, scope_key, user_id) to counter values
+    """
+    boards: Dict[Tuple[str, str, str, int], Dict] = {}
+    for user_id, instrument_id, asset_class, period, *counters in rows:
+        for board_period in (period, ALL_TIME):
+            for scope, scope_key in ((INSTRUMENT, str(instrument_id)), (ASSET_CLASS, asset_class)):
+                entry = boards.setdefault((board_period, scope, scope_key, user_id), dict.fromkeys(COUNTERS, 0))
+                for name, value in zip(COUNTERS, counters):
+                    entry[name] += value or 0
+    return boards
+
+
+class TradingLeaderboardService:
+    """
+    Service class for instrument and asset-class trading leaderboards.
+
+    Users are ranked by realized PnL per instrument and per asset class,
+    monthly and all-time, with their win rate and trade count. The boards
+    are materialized in trading_leaderboard_entries: every fill bumps its
+    user's counters with additive UPDATEs in the fill's own transaction,
+    and `rebuild` recomputes everything with one GROUP BY over trades.
+    """
+
+    @staticmethod
+    def _bump(key: Tuple[str, str, str, int], values: Dict) -> None:
+        period, scope, scope_key, user_id = key
+        table = TradingLeaderboardEntry.__table__
+        statement = update(table).where(
+            table.c.period == period, table.c.scope == scope,
+            table.c.scope_key == scope_key, table.c.user_id == user_id
+        ).values(updated_at=datetime.utcnow(), **{name: table.c[name] + values[name] for name in COUNTERS})
+        if db.session.execute(statement).rowcount:
+            return
+
+        # First fill of this user on this board; another worker may create the row concurrently
+        try:
+            with db.session.begin_nested():
+                db.session.add(TradingLeaderboardEntry(period=period, scope=scope, scope_key=scope_key,
+                                                       user_id=user_id, **values))
+        except IntegrityError:
+            db.session.execute(statement)
+
+    @staticmethod
+    def on_fill(user_challenge_id: int, instrument_id: int, realized_pnl: float) -> None:
+        """Count a fill on its instrument's and asset class's boards, without committing."""
+        user_challenge = db.session.get(UserChallenge, user_challenge_id)
+        instrument = db.session.get(Instrument, instrument_id)
+        if user_challenge is None or instrument is None:
+            return
+
+        pnl = realized_pnl or 0.0
+        values = {'realized_pnl': pnl, 'trade_count': 1,
+                  'closed_count': 1 if pnl != 0 else 0, 'win_count': 1 if pnl > 0 else 0}
+        row = (user_challenge.user_id, instrument_id, instrument.asset_class,
+               month_period(*LeaderboardService.current_month()), *values.values())
+        for key in aggregate_trades([row]):
+            TradingLeaderboardService._bump(key, values)
+        # A render racing this uncommitted fill is bounded by the cache max age
+        response_cache.invalidate(TRADING_LEADERBOARD_TAG)
+
+    @staticmethod
+    def rebuild() -> int:
+        """
+        Recompute every trading leaderboard from the trades in one grouped
+        query (per user, instrument and Casablanca month).
+
+        Returns:
+            Number of leaderboard rows written
+        """
+        first, last = db.session.query(func.min(Trade.created_at), func.max(Trade.created_at)).one()
+        boards = {}
+        if first is not None:
+            # Months are bucketed by their UTC bounds, latest first, so the
+            # grouping is the same on every database
+            bounds = month_starts(first, last)
+            period = literal(bounds[0][0])
+            if len(bounds) > 1:
+                period = case(*[(Trade.created_at >= start, name) for name, start in reversed(bounds[1:])],
+                              else_=period)
+            period = period.label('trade_period')
+            rows = db.session.query(
+                UserChallenge.user_id, Trade.instrument_id, Instrument.asset_class, period,
+                func.sum(Trade.realized_pnl),
+                func.count(Trade.id),
+                func.sum(case((Trade.realized_pnl != 0, 1), else_=0)),
+                func.sum(case((Trade.realized_pnl > 0, 1), else_=0))
+            ).join(UserChallenge, UserChallenge.id == Trade.user_challenge_id).join(
+                Instrument, Instrument.id == Trade.instrument_id
+            ).group_by(
+                UserChallenge.user_id, Trade.instrument_id, Instrument.asset_class, literal_column('trade_period')
+            ).all()
+            boards = aggregate_trades(rows)
+
+        TradingLeaderboardEntry.query.delete(synchronize_session=False)
+        db.session.add_all([
+            TradingLeaderboardEntry(period=period, scope=scope, scope_key=scope_key, user_id=user_id, **values)
+            for (period, scope, scope_key, user_id), values in boards.items()
+        ])
+        db.session.commit()
+        response_cache.invalidate(TRADING_LEADERBOARD_TAG)
+        logger.info(f"Rebuilt trading leaderboards with {len(boards)} entries")
+        return len(boards)
+
+    @staticmethod
+    def get_page(scope: str, scope_key: str, period: str, limit: int = 10,
+                 cursor: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        """
+        Get one page of an instrument or asset-class board, best realized
+        PnL first, keyset-paginated like the challenge boards.
+
+        Args:
+            scope: INSTRUMENT or ASSET_CLASS
+            scope_key: Instrument id or asset class
+            period: Period key ('YYYY-MM' or 'all')
+            limit: Page size
+            cursor: Cursor from the previous page, if any
+
+        Returns:
+            Tuple of (entries, next_cursor); next_cursor is None on the last page
+
+        Raises:
+            ValueError: If the cursor is malformed
+        """
+        offset, seek = 0, None
+        if cursor:
+            values = decode_cursor(cursor)
+            if len(values) != 3:
+                raise ValueError('Invalid cursor')
+            offset, seek = int(values[2]), encode_cursor(values[:2])
+
+        rows, more = keyset_paginate(
+            TradingLeaderboardEntry.query.filter(
+                TradingLeaderboardEntry.period == period,
+                TradingLeaderboardEntry.scope == scope,
+                TradingLeaderboardEntry.scope_key == scope_key
+            ),
+            TradingLeaderboardEntry.realized_pnl, TradingLeaderboardEntry.user_id, limit, seek,
+            descending=True, id_descending=False
+        )
+        emails = dict(db.session.query(User.id, User.email).filter(
+            User.id.in_([row.user_id for row in rows])
+        ).all()) if rows else {}
+
+        entries = [{
+            'rank': rank,
+            'user_id': row.user_id,
+            'username': emails.get(row.user_id, '').split('@')[0],  # Use email prefix as username
+            'realized_pnl': float(row.realized_pnl),
+            'trade_count': row.trade_count,
+            'closed_trades': row.closed_count,
+            'win_rate': row.win_count / row.closed_count if row.closed_count else None
+        } for rank, row in enumerate(rows, offset + 1)]
+        next_cursor = encode_cursor([rows[-1].realized_pnl, rows[-1].user_id, offset + len(rows)]) if more else None
+        return entries, next_cursor
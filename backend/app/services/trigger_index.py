@@ -0,0 +1,243 @@
+import threading
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# Session.info key of the disarms waiting for their transaction to commit
+PENDING_DISARMS = 'trigger_index_disarms'
+
+
+@dataclass
+class TriggerEvent:
+    """A stop-loss or take-profit level crossed by a quote."""
+    position_id: int
+    user_challenge_id: int
+    instrument_id: int
+    position_side: str  # 'LONG' or 'SHORT'
+    kind: str  # 'STOP_LOSS' or 'TAKE_PROFIT'
+    level: float
+    price: float
+
+
+class SortedLevels:
+    """
+    Trigger prices kept sorted with bisect, with position ids in a parallel list.
+
+    Finding the crossed range is two binary searches; removing it is one
+    slice delete.
+    """
+
+    def __init__(self):
+        self.prices: List[float] = []
+        self.position_ids: List[int] = []
+
+    def __len__(self):
+        return len(self.prices)
+
+    def insert(self, price: float, position_id: int) -> None:
+        i = bisect_right(self.prices, price)
+        self.prices.insert(i, price)
+        self.position_ids.insert(i, position_id)
+
+    def remove(self, price: float, position_id: int) -> bool:
+        i = bisect_left(self.prices, price)
+        end = bisect_right(self.prices, price, i)
+        for j in range(i, end):
+            if self.position_ids[j] == position_id:
+                del self.prices[j]
+                del self.position_ids[j]
+                return True
+        return False
+
+    def pop_at_or_above(self, price: float) -> List[Tuple[float, int]]:
+        i = bisect_left(self.prices, price)
+        return self._pop_range(i, len(self.prices))
+
+    def pop_at_or_below(self, price: float) -> List[Tuple[float, int]]:
+        i = bisect_right(self.prices, price)
+        return self._pop_range(0, i)
+
+    def _pop_range(self, start: int, end: int) -> List[Tuple[float, int]]:
+        if start >= end:
+            return []
+        popped = list(zip(self.prices[start:end], self.position_ids[start:end]))
+        del self.prices[start:end]
+        del self.position_ids[start:end]
+        return popped
+
+
+class InstrumentTriggers:
+    """
+    Armed levels for one instrument.
+
+    Long positions are closed at the bid, so long stop-losses fire when the
+    bid falls to the level and long take-profits when it rises to it. Short
+    positions are closed at the ask, with the directions reversed.
+    """
+
+    def __init__(self):
+        self.long_stop_loss = SortedLevels()
+        self.long_take_profit = SortedLevels()
+        self.short_stop_loss = SortedLevels()
+        self.short_take_profit = SortedLevels()
+
+    def __len__(self):
+        return (len(self.long_stop_loss) + len(self.long_take_profit) +
+                len(self.short_stop_loss) + len(self.short_take_profit))
+
+    def levels_for(self, side: str, kind: str) -> SortedLevels:
+        if side == 'LONG':
+            return self.long_stop_loss if kind == 'STOP_LOSS' else self.long_take_profit
+        return self.short_stop_loss if kind == 'STOP_LOSS' else self.short_take_profit
+
+
+@dataclass
+class ArmedPosition:
+    user_challenge_id: int
+    instrument_id: int
+    side: str
+    stop_loss: Optional[float]
+    take_profit: Optional[float]
+
+
+class TriggerIndex:
+    """
+    Per-instrument index of position stop-loss and take-profit levels.
+
+    Each quote finds every crossed level with binary searches over sorted
+    price arrays, so the cost per tick is O(log n + fired) for n armed
+    levels on the instrument. A position fires at most once: when either of
+    its levels is crossed both are disarmed.
+    """
+
+    def __init__(self):
+        self._instruments: Dict[int, InstrumentTriggers] = {}
+        self._positions: Dict[int, ArmedPosition] = {}
+        self._symbols: Dict[Tuple[str, str], int] = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __contains__(self, position_id: int) -> bool:
+        return position_id in self._positions
+
+    def register_instrument(self, instrument_id: int, provider: str, provider_symbol: str) -> None:
+        """Map a provider quote stream to an instrument's triggers."""
+        with self._lock:
+            self._symbols[(provider.upper(), provider_symbol)] = instrument_id
+
+    def instrument_for_symbol(self, provider: str, provider_symbol: str) -> Optional[int]:
+        """Get the instrument id registered for a provider symbol, if any."""
+        return self._symbols.get((provider.upper(), provider_symbol))
+
+    def arm(self, position_id: int, user_challenge_id: int, instrument_id: int, side: str,
+            stop_loss: Optional[float] = None, take_profit: Optional[float] = None) -> None:
+        """
+        Arm (or re-arm) a position's levels, replacing any previous ones.
+        Passing neither level disarms the position.
+        """
+        with self._lock:
+            self.disarm(position_id)
+            if stop_loss is None and take_profit is None:
+                return
+
+            triggers = self._instruments.setdefault(instrument_id, InstrumentTriggers())
+            if stop_loss is not None:
+                triggers.levels_for(side, 'STOP_LOSS').insert(stop_loss, position_id)
+            if take_profit is not None:
+                triggers.levels_for(side, 'TAKE_PROFIT').insert(take_profit, position_id)
+            self._positions[position_id] = ArmedPosition(
+                user_challenge_id, instrument_id, side, stop_loss, take_profit
+            )
+
+    def disarm(self, position_id: int) -> bool:
+        """
+        Remove a position's levels.
+
+        Returns:
+            True if the position was armed
+        """
+        with self._lock:
+            armed = self._positions.pop(position_id, None)
+            if armed is None:
+                return False
+            triggers = self._instruments[armed.instrument_id]
+            if armed.stop_loss is not None:
+                triggers.levels_for(armed.side, 'STOP_LOSS').remove(armed.stop_loss, position_id)
+            if armed.take_profit is not None:
+                triggers.levels_for(armed.side, 'TAKE_PROFIT').remove(armed.take_profit, position_id)
+            return True
+
+    def disarm_on_commit(self, session: Session, position_id: int) -> None:
+        """
+        Disarm a position once the session's transaction commits.
+
+        Used where a position is closed or reversed inside a transaction: if
+        the transaction rolls back the levels are still on the row, so they
+        stay armed.
+        """
+        session.info.setdefault(PENDING_DISARMS, []).append((self, position_id))
+
+    def on_quote(self, instrument_id: int, bid: float, ask: float) -> List[TriggerEvent]:
+        """
+        Find and disarm every level crossed by a quote.
+
+        Args:
+            instrument_id: Instrument the quote belongs to
+            bid: Current bid (closes longs)
+            ask: Current ask (closes shorts)
+
+        Returns:
+            List of trigger events, at most one per position
+        """
+        triggers = self._instruments.get(instrument_id)
+        if triggers is None:
+            return []
+
+        with self._lock:
+            crossed = [
+                ('LONG', 'STOP_LOSS', bid, triggers.long_stop_loss.pop_at_or_above(bid)),
+                ('LONG', 'TAKE_PROFIT', bid, triggers.long_take_profit.pop_at_or_below(bid)),
+                ('SHORT', 'STOP_LOSS', ask, triggers.short_stop_loss.pop_at_or_below(ask)),
+                ('SHORT', 'TAKE_PROFIT', ask, triggers.short_take_profit.pop_at_or_above(ask)),
+            ]
+
+            events: List[TriggerEvent] = []
+            for side, kind, price, levels in crossed:
+                for level, position_id in levels:
+                    armed = self._positions.pop(position_id, None)
+                    if armed is None:
+                        # Other level of a position that already fired on this quote
+                        continue
+                    # Drop the position's other level
+                    if kind == 'STOP_LOSS' and armed.take_profit is not None:
+                        triggers.levels_for(side, 'TAKE_PROFIT').remove(armed.take_profit, position_id)
+                    elif kind == 'TAKE_PROFIT' and armed.stop_loss is not None:
+                        triggers.levels_for(side, 'STOP_LOSS').remove(armed.stop_loss, position_id)
+                    events.append(TriggerEvent(
+                        position_id, armed.user_challenge_id, instrument_id, side, kind, level, price
+                    ))
+            return events
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_pending_disarms(session):
+    if session.in_nested_transaction():
+        # A savepoint was released; the outer transaction can still roll back
+        return
+    for index, position_id in session.info.pop(PENDING_DISARMS, ()):
+        index.disarm(position_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _drop_pending_disarms(session):
+    if session.in_nested_transaction():
+        return
+    session.info.pop(PENDING_DISARMS, None)
+
+
+# Global trigger index shared by all request threads of this process
+trigger_index = TriggerIndex()
@@ -0,0 +1,10 @@
+from app.tasks.retention import prune_equity_snapshots, prune_minute_rollups, prune_quote_ticks
+from app.tasks.day_rollover import roll_over_daily_equity, next_rollover_at
+
+__all__ = [
+    'prune_equity_snapshots',
+    'prune_minute_rollups',
+    'prune_quote_ticks',
+    'roll_over_daily_equity',
+    'next_rollover_at'
+]
@@ -0,0 +1,47 @@
+from typing import Optional
+from datetime import datetime
+from sqlalchemy import update, or_
+from app.models import UserChallenge, ACTIVE_STATUSES
+from app.utils import get_casablanca_midnight_utc
+from app import db
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def roll_over_daily_equity(now: Optional[datetime] = None) -> int:
+    """
+    Start a new trading day for every active challenge.
+
+    One set-based UPDATE copies each challenge's current equity into
+    daily_start_equity and min_equity_today and stamps daily_reset_at with
+    the Casablanca midnight that started the current day. Challenges already
+    rolled for that day are skipped, so running the job more than once (or
+    from several workers) is harmless, and a late run catches up.
+
+    Args:
+        now: Reference time, naive UTC (default: now)
+
+    Returns:
+        Number of challenges rolled over
+    """
+    day_start = get_casablanca_midnight_utc(now)
+
+    result = db.session.execute(
+        update(UserChallenge)
+        .where(UserChallenge.status.in_(ACTIVE_STATUSES),
+               or_(UserChallenge.daily_reset_at.is_(None), UserChallenge.daily_reset_at < day_start))
+        .values(daily_start_equity=UserChallenge.current_equity,
+                min_equity_today=UserChallenge.current_equity,
+                daily_reset_at=day_start)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+    logger.info(f"Rolled {result.rowcount} challenges over to the day starting {day_start.isoformat()}Z")
+    return result.rowcount
+
+
+def next_rollover_at(now: datetime) -> datetime:
+    """Next Casablanca midnight after `now` (naive UTC), for the scheduler."""
+    return get_casablanca_midnight_utc(now, days_ahead=1)
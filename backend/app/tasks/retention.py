@@ -0,0 +1,107 @@
+from typing import Optional
+from datetime import datetime, timedelta
+from app.models import EquitySnapshot, EquityRollup, QuoteTick
+from app import db
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def prune_equity_snapshots(retention_days: Optional[int] = None, batch_size: int = 10000) -> int:
+    """
+    Delete raw equity snapshots older than the retention window.
+
+    Rows are deleted in id batches so no single transaction holds long locks.
+    Their history survives in the equity rollups.
+
+    Args:
+        retention_days: Days of raw snapshots to keep (default: config)
+        batch_size: Rows deleted per transaction
+
+    Returns:
+        Number of snapshots deleted
+    """
+    if retention_days is None:
+        from app.config import Config
+        retention_days = Config.EQUITY_SNAPSHOT_RETENTION_DAYS
+
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    deleted = 0
+
+    while True:
+        ids = [
+            row[0] for row in db.session.query(EquitySnapshot.id).filter(
+                EquitySnapshot.ts < cutoff
+            ).limit(batch_size).all()
+        ]
+        if not ids:
+            break
+
+        EquitySnapshot.query.filter(EquitySnapshot.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+        deleted += len(ids)
+
+    logger.info(f"Pruned {deleted} equity snapshots older than {cutoff.isoformat()}")
+    return deleted
+
+
+def prune_minute_rollups(retention_days: Optional[int] = None) -> int:
+    """
+    Delete 1-minute equity rollups older than their retention window.
+    Hourly and daily rollups are kept for the life of the challenge.
+
+    Args:
+        retention_days: Days of minute rollups to keep (default: config)
+
+    Returns:
+        Number of rollup rows deleted
+    """
+    if retention_days is None:
+        from app.config import Config
+        retention_days = Config.EQUITY_ROLLUP_MINUTE_RETENTION_DAYS
+
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    deleted = EquityRollup.query.filter(
+        EquityRollup.resolution == '1m',
+        EquityRollup.bucket_start < cutoff
+    ).delete(synchronize_session=False)
+    db.session.commit()
+
+    logger.info(f"Pruned {deleted} minute equity rollups older than {cutoff.isoformat()}")
+    return deleted
+
+
+def prune_quote_ticks(retention_days: Optional[int] = None, batch_size: int = 10000) -> int:
+    """
+    Delete recorded quote ticks older than the tape retention window.
+    Challenges older than the window can no longer be replayed tick by tick.
+
+    Args:
+        retention_days: Days of quote tape to keep (default: config)
+        batch_size: Rows deleted per transaction
+
+    Returns:
+        Number of ticks deleted
+    """
+    if retention_days is None:
+        from app.config import Config
+        retention_days = Config.QUOTE_TAPE_RETENTION_DAYS
+
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    deleted = 0
+
+    while True:
+        ids = [
+            row[0] for row in db.session.query(QuoteTick.id).filter(
+                QuoteTick.ts < cutoff
+            ).limit(batch_size).all()
+        ]
+        if not ids:
+            break
+
+        QuoteTick.query.filter(QuoteTick.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+        deleted += len(ids)
+
+    logger.info(f"Pruned {deleted} quote ticks older than {cutoff.isoformat()}")
+    return deleted
@@ -1,4 +1,12 @@
 from app.utils.cache import cache, InMemoryCache
+from app.utils.write_buffer import write_buffer, BulkWriteBuffer
+from app.utils.scheduler import scheduler, JobScheduler, every
+from app.utils.event_worker import EventWorker
+from app.utils.downsample import lttb_indices, ohlc_buckets
+from app.utils.pagination import encode_cursor, decode_cursor, parse_page_args, keyset_paginate
+from app.utils.idempotency import idempotency_store, idempotent, IdempotencyStore
+from app.utils.response_cache import response_cache, cached_response, ResponseCache
+from app.utils.query_budget import query_budget, QueryBudget
 from app.utils.validation import (
     validate_email,
     validate_password,
@@ -10,6 +18,7 @@ from app.utils.validation import (
 from app.utils.helpers import (
     get_casablanca_time,
     get_start_of_day_casablanca,
+    get_casablanca_midnight_utc,
     calculate_equity,
     calculate_daily_drawdown,
     calculate_total_drawdown,
@@ -24,6 +33,42 @@ __all__ = [
     'cache',
     'InMemoryCache',
     
+    # Write buffer
+    'write_buffer',
+    'BulkWriteBuffer',
+    
+    # Scheduler
+    'scheduler',
+    'JobScheduler',
+    'every',
+    
+    # Event worker
+    'EventWorker',
+    
+    # Downsampling
+    'lttb_indices',
+    'ohlc_buckets',
+    
+    # Pagination
+    'encode_cursor',
+    'decode_cursor',
+    'parse_page_args',
+    'keyset_paginate',
+    
+    # Idempotency
+    'idempotency_store',
+    'idempotent',
+    'IdempotencyStore',
+    
+    # Response cache
+    'response_cache',
+    'cached_response',
+    'ResponseCache',
+    
+    # Query budget
+    'query_budget',
+    'QueryBudget',
+    
     # Validation
     'validate_email',
     'validate_password',
@@ -35,6 +80,7 @@ __all__ = [
     # Helpers
     'get_casablanca_time',
     'get_start_of_day_casablanca',
+    'get_casablanca_midnight_utc',
     'calculate_equity',
     'calculate_daily_drawdown',
     'calculate_total_drawdown',
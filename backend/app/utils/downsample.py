@@ -0,0 +1,105 @@
+import numpy as np
+from typing import Dict, Optional
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Select points with the Largest-Triangle-Three-Buckets algorithm.
+
+    Keeps the first and last points and, for every bucket in between, the
+    point forming the largest triangle with the previously selected point
+    and the average of the next bucket. Preserves the visual shape of a
+    series (peaks and troughs) far better than striding.
+
+    Args:
+        x: Monotonic x values (e.g. epoch seconds)
+        y: Series values
+        threshold: Maximum number of points to keep (at least 3)
+
+    Returns:
+        Sorted array of selected indices
+    """
+    n = len(x)
+    threshold = max(int(threshold), 3)
+    if threshold >= n:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    # Bucket boundaries for the n - 2 interior points
+    edges = np.floor(np.linspace(1, n - 1, threshold - 1)).astype(int)
+
+    selected = np.empty(threshold, dtype=int)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        if end <= start:
+            end = start + 1
+
+        # Average of the next bucket (the last point for the final bucket)
+        next_start = end
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        if next_end <= next_start:
+            next_end = next_start + 1
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        bucket_x = x[start:end]
+        bucket_y = y[start:end]
+        areas = np.abs(
+            (x[a] - avg_x) * (bucket_y - y[a]) - (x[a] - bucket_x) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(areas))
+        selected[i + 1] = a
+
+    return selected
+
+
+def ohlc_buckets(x: np.ndarray, y: np.ndarray, buckets: int, opens: Optional[np.ndarray] = None,
+                 highs: Optional[np.ndarray] = None, lows: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+    """
+    Aggregate a series into equal-width time buckets with open/high/low/close.
+
+    Args:
+        x: Monotonic x values (e.g. epoch seconds)
+        y: Series values (closes when the input is already OHLC)
+        buckets: Maximum number of buckets
+        opens: Optional per-point opens, for re-bucketing OHLC input
+        highs: Optional per-point highs, for re-bucketing OHLC input
+        lows: Optional per-point lows, for re-bucketing OHLC input
+
+    Returns:
+        Dict of arrays: x (bucket start), open, high, low, close, count.
+        Empty buckets are omitted.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if len(x) == 0 or buckets <= 0:
+        empty = np.array([], dtype=float)
+        return {'x': empty, 'open': empty, 'high': empty, 'low': empty, 'close': empty,
+                'count': np.array([], dtype=int)}
+
+    span = x[-1] - x[0]
+    width = span / buckets if span > 0 else 1.0
+    bucket_ids = np.minimum(((x - x[0]) // width).astype(int), buckets - 1)
+
+    # Start offset of each non-empty bucket in the (sorted) series
+    starts = np.flatnonzero(np.r_[True, bucket_ids[1:] != bucket_ids[:-1]])
+    ends = np.r_[starts[1:], len(x)]
+
+    opens = y if opens is None else np.asarray(opens, dtype=float)
+    highs = y if highs is None else np.asarray(highs, dtype=float)
+    lows = y if lows is None else np.asarray(lows, dtype=float)
+
+    return {
+        'x': x[0] + bucket_ids[starts] * width,
+        'open': opens[starts],
+        'high': np.maximum.reduceat(highs, starts),
+        'low': np.minimum.reduceat(lows, starts),
+        'close': y[ends - 1],
+        'count': ends - starts
+    }
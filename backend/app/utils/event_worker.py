@@ -0,0 +1,76 @@
+import atexit
+import threading
+import logging
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class EventWorker:
+    """
+    Per-process daemon thread that drains an in-memory event queue.
+
+    Quote listeners only queue events and call `wake()`; the worker then runs
+    the drain function inside an app context, off the request that happened
+    to serve the quote. It also runs every `interval` seconds so events left
+    behind by a failed drain are retried. Queues are per process, so unlike
+    scheduled jobs every worker process runs its own EventWorker.
+
+    When disabled (EVENT_WORKER_ENABLED=false, e.g. in tests) nothing is run
+    and queued events wait for an explicit drain call.
+    """
+
+    def __init__(self, name: str, func: Callable[[], object], interval: float = 1.0):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.enabled = False
+        self.app = None
+        self._thread: Optional[threading.Thread] = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._start_lock = threading.Lock()
+
+    def init_app(self, app) -> None:
+        """Bind the worker to an app; the thread starts on the first wake()."""
+        self.app = app
+        self.enabled = app.config.get('EVENT_WORKER_ENABLED', False)
+        if self.enabled:
+            atexit.register(self.shutdown)
+
+    def wake(self) -> None:
+        """Ask the worker to drain now."""
+        if not self.enabled:
+            return
+        self._ensure_started()
+        self._wake.set()
+
+    def shutdown(self) -> None:
+        """Stop the worker thread."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=5)
+        self._thread = None
+
+    def _ensure_started(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            try:
+                with self.app.app_context():
+                    self.func()
+            except Exception as e:
+                logger.error(f"Event worker {self.name} failed: {e}")
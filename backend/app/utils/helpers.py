@@ -1,4 +1,4 @@
-from datetime import datetime, timedelta
+from datetime import datetime, time, timedelta
 import pytz
 from typing import Dict, Any, Optional
 
@@ -11,21 +11,49 @@ def get_casablanca_time() -> datetime:
 
 def get_start_of_day_casablanca(dt: Optional[datetime] = None) -> datetime:
     """Get the start of the day in Casablanca timezone."""
+    tz = pytz.timezone('Africa/Casablanca')
     if dt is None:
         dt = get_casablanca_time()
     else:
         # Convert to Casablanca timezone if needed
         if dt.tzinfo is None:
-            tz = pytz.timezone('Africa/Casablanca')
             dt = tz.localize(dt)
         else:
-            dt = dt.astimezone(pytz.timezone('Africa/Casablanca'))
+            dt = dt.astimezone(tz)
     
-    return dt.replace(hour=0, minute=0, second=0, microsecond=0)
+    # Localize the wall-clock midnight so it carries that instant's offset
+    # (Morocco shifts its UTC offset for DST and around Ramadan)
+    return tz.localize(datetime.combine(dt.date(), time.min))
+
+
+def get_casablanca_midnight_utc(now: Optional[datetime] = None, days_ahead: int = 0) -> datetime:
+    """
+    Get a Casablanca midnight as a naive UTC datetime, the form stored in the
+    database.
+
+    Args:
+        now: Reference instant, naive UTC (default: now)
+        days_ahead: 0 for the midnight that started the current local day,
+            1 for the next one
+
+    Returns:
+        Naive UTC datetime of that midnight
+    """
+    tz = pytz.timezone('Africa/Casablanca')
+    if now is None:
+        now = datetime.utcnow()
+    local_date = pytz.utc.localize(now).astimezone(tz).date() + timedelta(days=days_ahead)
+    midnight = tz.localize(datetime.combine(local_date, time.min))
+    return midnight.astimezone(pytz.utc).replace(tzinfo=None)
 
 
 def calculate_equity(balance: float, unrealized_pnl: float) -> float:
-    """Calculate total equity."""
+    """
+    Calculate the equity of a challenge: its start balance marked with the
+    unrealized PnL of the open positions. Live evaluation, the pre-trade
+    simulator and replay all use this definition (it also works on NumPy
+    arrays).
+    """
     return balance + unrealized_pnl
 
 
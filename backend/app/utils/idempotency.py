@@ -0,0 +1,212 @@
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Dict, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+# Marker stored while the first request for a key is still running
+IN_FLIGHT = '__in_flight__'
+
+
+class MemoryIdempotencyBackend:
+    """
+    Bounded in-process key -> record store with TTL and LRU eviction.
+
+    Eviction only drops expired or completed records: a key whose request
+    is still in flight is kept until its lease expires, so a concurrent
+    retry cannot claim it again.
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[str, Tuple[float, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def reserve(self, key: str, ttl: int) -> Tuple[bool, Any]:
+        """Atomically claim a key; returns (claimed, existing record)."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                return False, entry[1]
+
+            self._entries[key] = (now + ttl, IN_FLIGHT)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                victim = next((name for name, (expires_at, record) in self._entries.items()
+                               if record != IN_FLIGHT or expires_at <= now), None)
+                if victim is None:
+                    # Every entry is a live reservation; they expire with their lease
+                    break
+                del self._entries[victim]
+            return True, None
+
+    def store(self, key: str, record: Dict, ttl: int) -> None:
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, record)
+            self._entries.move_to_end(key)
+
+    def release(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class RedisIdempotencyBackend:
+    """
+    Redis-backed store, shared by every worker process.
+    """
+
+    def __init__(self, url: str, prefix: str = 'idempotency:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def reserve(self, key: str, ttl: int) -> Tuple[bool, Any]:
+        name = self.prefix + key
+        if self.client.set(name, IN_FLIGHT, nx=True, ex=ttl):
+            return True, None
+        value = self.client.get(name)
+        if value is None:
+            # Expired between the two calls; try once more
+            return bool(self.client.set(name, IN_FLIGHT, nx=True, ex=ttl)), None
+        value = value.decode('utf-8')
+        return False, IN_FLIGHT if value == IN_FLIGHT else json.loads(value)
+
+    def store(self, key: str, record: Dict, ttl: int) -> None:
+        self.client.set(self.prefix + key, json.dumps(record), ex=ttl)
+
+    def release(self, key: str) -> None:
+        self.client.delete(self.prefix + key)
+
+    def clear(self) -> None:
+        for name in self.client.scan_iter(self.prefix + '*'):
+            self.client.delete(name)
+
+
+class IdempotencyStore:
+    """
+    Stores responses of POST endpoints by Idempotency-Key so retried
+    submissions replay the first response instead of executing again.
+
+    Keys are scoped to the user and endpoint. A claimed key is held for
+    IDEMPOTENCY_LOCK_SECONDS while its request runs, so a worker that dies
+    mid-request only blocks retries for that lease. Completed responses
+    (any status below 500) are kept for IDEMPOTENCY_TTL_SECONDS; server
+    errors release the key so the client can retry for real.
+    """
+
+    def __init__(self):
+        self.ttl = 86400
+        self.lock_ttl = 60
+        self.backend = MemoryIdempotencyBackend()
+
+    def init_app(self, app) -> None:
+        """Configure TTLs, size and backend from the app config."""
+        self.ttl = app.config.get('IDEMPOTENCY_TTL_SECONDS', 86400)
+        self.lock_ttl = app.config.get('IDEMPOTENCY_LOCK_SECONDS', 60)
+        max_entries = app.config.get('IDEMPOTENCY_MAX_KEYS', 10000)
+
+        if app.config.get('IDEMPOTENCY_BACKEND', 'memory') == 'redis':
+            try:
+                self.backend = RedisIdempotencyBackend(app.config.get('REDIS_URL'))
+                return
+            except Exception as e:
+                logger.warning(f"Redis idempotency store unavailable, using in-process store: {e}")
+
+        self.backend = MemoryIdempotencyBackend(max_entries)
+
+    def reserve(self, key: str) -> Tuple[bool, Any]:
+        """
+        Claim a key for a new request.
+
+        Returns:
+            (True, None) if the caller should execute the request, otherwise
+            (False, record) where record is the stored response or IN_FLIGHT
+        """
+        return self.backend.reserve(key, self.lock_ttl)
+
+    def complete(self, key: str, record: Dict) -> None:
+        """Store the response for a claimed key, kept for the full TTL."""
+        self.backend.store(key, record, self.ttl)
+
+    def release(self, key: str) -> None:
+        """Forget a claimed key so it can be retried."""
+        self.backend.release(key)
+
+    def clear(self) -> None:
+        self.backend.clear()
+
+
+# Global idempotency store instance
+idempotency_store = IdempotencyStore()
+
+
+def idempotent(view):
+    """
+    Decorator making a JSON POST endpoint honour the Idempotency-Key header.
+    Apply it below @jwt_required() so the caller's identity is available.
+
+    A retried request with the same key and body replays the stored response
+    with an Idempotent-Replayed header; the same key with a different body
+    gets 422, and a retry while the first request is still running gets 409.
+    Requests without the header are executed normally.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        from flask import request, jsonify, make_response
+        from flask_jwt_extended import get_jwt_identity
+
+        client_key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not client_key:
+            return view(*args, **kwargs)
+
+        if len(client_key) > MAX_KEY_LENGTH:
+            return jsonify({'error': f'{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters'}), 400
+
+        key = f"{get_jwt_identity()}:{request.method}:{request.path}:{client_key}"
+        fingerprint = hashlib.sha256(request.get_data()).hexdigest()
+
+        claimed, record = idempotency_store.reserve(key)
+        if not claimed:
+            if record == IN_FLIGHT:
+                return jsonify({'error': 'A request with this Idempotency-Key is still in progress'}), 409
+            if record['fingerprint'] != fingerprint:
+                return jsonify({'error': 'Idempotency-Key was already used with a different request body'}), 422
+
+            response = make_response(record['body'], record['status'])
+            response.headers['Content-Type'] = record['content_type']
+            response.headers[REPLAYED_HEADER] = 'true'
+            return response
+
+        try:
+            response = make_response(view(*args, **kwargs))
+        except Exception:
+            idempotency_store.release(key)
+            raise
+
+        if response.status_code >= 500:
+            idempotency_store.release(key)
+        else:
+            idempotency_store.complete(key, {
+                'fingerprint': fingerprint,
+                'status': response.status_code,
+                'body': response.get_data(as_text=True),
+                'content_type': response.headers.get('Content-Type', 'application/json')
+            })
+        return response
+
+    return wrapper
@@ -0,0 +1,116 @@
+import json
+import base64
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(values: List[Any]) -> str:
+    """
+    Encode keyset values into an opaque, URL-safe cursor.
+
+    Args:
+        values: Sort key values of the last row on a page (datetimes allowed)
+
+    Returns:
+        Cursor string
+    """
+    payload = [
+        {'dt': value.isoformat()} if isinstance(value, datetime) else value
+        for value in values
+    ]
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> List[Any]:
+    """
+    Decode a cursor produced by encode_cursor.
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if not isinstance(payload, list):
+            raise ValueError('Invalid cursor')
+        return [
+            datetime.fromisoformat(value['dt']) if isinstance(value, dict) else value
+            for value in payload
+        ]
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+
+def parse_page_args(args, default_limit: Optional[int] = None) -> Tuple[int, Optional[str]]:
+    """
+    Read and bound `limit` and `cursor` query parameters.
+
+    Args:
+        args: Request args (MultiDict)
+        default_limit: Limit when none is given (default: config)
+
+    Returns:
+        Tuple of (limit, cursor)
+
+    Raises:
+        ValueError: If limit is not a positive integer
+    """
+    from app.config import Config
+    if default_limit is None:
+        default_limit = Config.PAGE_SIZE_DEFAULT
+
+    limit = int(args.get('limit', default_limit))
+    if limit <= 0:
+        raise ValueError('limit must be positive')
+
+    cursor = args.get('cursor') or None
+    return min(limit, Config.PAGE_SIZE_MAX), cursor
+
+
+def keyset_paginate(query, sort_column, id_column, limit: int, cursor: Optional[str] = None,
+                    descending: bool = True, id_descending: Optional[bool] = None) -> Tuple[List[Any], Optional[str]]:
+    """
+    Page through a query ordered by (sort_column, id_column) using keyset
+    pagination. Each page seeks directly past the previous page's last row,
+    so deep pages cost the same as the first one given an index on the sort
+    columns.
+
+    Args:
+        query: SQLAlchemy query (filters applied, no ordering)
+        sort_column: Primary sort column (e.g. created_at)
+        id_column: Unique tiebreaker column (e.g. id)
+        limit: Page size
+        cursor: Cursor from the previous page, if any
+        descending: Newest first when True
+        id_descending: Direction of the tiebreaker (default: same as
+            descending), e.g. False for "best score first, lowest id on ties"
+
+    Returns:
+        Tuple of (rows, next_cursor); next_cursor is None on the last page
+    """
+    if id_descending is None:
+        id_descending = descending
+
+    if cursor:
+        values = decode_cursor(cursor)
+        if len(values) != 2:
+            raise ValueError('Invalid cursor')
+        last_sort, last_id = values
+        query = query.filter(or_(
+            sort_column < last_sort if descending else sort_column > last_sort,
+            and_(sort_column == last_sort, id_column < last_id if id_descending else id_column > last_id)
+        ))
+
+    query = query.order_by(sort_column.desc() if descending else sort_column.asc(),
+                           id_column.desc() if id_descending else id_column.asc())
+
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    next_cursor = encode_cursor([getattr(last, sort_column.key), getattr(last, id_column.key)])
+    return rows, next_cursor
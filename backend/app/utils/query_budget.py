@@ -0,0 +1,92 @@
+import threading
+from contextlib import contextmanager
+from typing import List
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class QueryCounter:
+    """Number of SQL statements run by this thread while the counter is active."""
+
+    def __init__(self):
+        self.count = 0
+        self.statements: List[str] = []
+
+
+class QueryBudget:
+    """
+    Counts SQL statements per request and per block of code.
+
+    count_queries() is meant for tests pinning an endpoint's query count.
+    With QUERY_BUDGET_PER_REQUEST set, every request is counted too and
+    one that runs more statements than the budget is logged, which is how
+    new N+1 patterns show up before they reach the dashboard.
+    """
+
+    def __init__(self):
+        self.budget = 0
+        self._local = threading.local()
+        self._listening = False
+        self._lock = threading.Lock()
+
+    def _counters(self) -> List[QueryCounter]:
+        counters = getattr(self._local, 'counters', None)
+        if counters is None:
+            counters = self._local.counters = []
+        return counters
+
+    def _listen(self) -> None:
+        with self._lock:
+            if not self._listening:
+                event.listen(Engine, 'before_cursor_execute', self._on_execute)
+                self._listening = True
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        for counter in self._counters():
+            counter.count += 1
+            counter.statements.append(statement)
+
+    @contextmanager
+    def count_queries(self):
+        """Count the statements run by this thread inside the block."""
+        self._listen()
+        counter = QueryCounter()
+        counters = self._counters()
+        counters.append(counter)
+        try:
+            yield counter
+        finally:
+            counters.remove(counter)
+
+    def init_app(self, app) -> None:
+        """Count every request when QUERY_BUDGET_PER_REQUEST is set (0 disables)."""
+        self.budget = app.config.get('QUERY_BUDGET_PER_REQUEST', 0)
+        if self.budget <= 0:
+            return
+        self._listen()
+
+        from flask import g, request
+
+        @app.before_request
+        def _start_counting():
+            g.query_counter = QueryCounter()
+            self._counters().append(g.query_counter)
+
+        @app.teardown_request
+        def _check_budget(exc=None):
+            counter = g.pop('query_counter', None)
+            if counter is None:
+                return
+            counters = self._counters()
+            if counter in counters:
+                counters.remove(counter)
+            if counter.count > self.budget:
+                logger.warning(f"{request.method} {request.path} ran {counter.count} queries "
+                               f"(budget {self.budget})")
+
+
+# Global query budget instance
+query_budget = QueryBudget()
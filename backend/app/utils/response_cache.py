@@ -0,0 +1,157 @@
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+from typing import Callable, Dict, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """
+    In-process cache of rendered GET responses, invalidated by events.
+
+    Every entry remembers the generation of the tags it was rendered under;
+    invalidate(tag) bumps the generation, so the next request re-renders
+    once. Concurrent misses for the same key are collapsed into a single
+    render (single flight). Entries also expire after max_age seconds,
+    which bounds how long another worker's invalidations go unseen.
+    """
+
+    def __init__(self, max_entries: int = 1000, max_age: float = 30.0):
+        self.enabled = True
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._entries: 'OrderedDict[str, Tuple[Tuple[int, ...], float, Dict]]' = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self._flights: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app) -> None:
+        """Read size, max age and the on/off switch from the app config."""
+        self.enabled = app.config.get('RESPONSE_CACHE_ENABLED', True)
+        self.max_entries = app.config.get('RESPONSE_CACHE_MAX_ENTRIES', 1000)
+        self.max_age = app.config.get('RESPONSE_CACHE_MAX_AGE_SECONDS', 30)
+
+    def invalidate(self, tag: Optional[str] = None) -> None:
+        """Mark everything rendered under a tag (or every tag) stale."""
+        with self._lock:
+            if tag is None:
+                self._entries.clear()
+                for name in self._generations:
+                    self._generations[name] += 1
+            else:
+                self._generations[tag] = self._generations.get(tag, 0) + 1
+
+    def _stamp(self, tags: Tuple[str, ...]) -> Tuple[int, ...]:
+        return tuple(self._generations.get(tag, 0) for tag in tags)
+
+    def _fresh(self, key: str, tags: Tuple[str, ...]) -> Optional[Dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stamp, created, record = entry
+        if stamp != self._stamp(tags) or time.monotonic() - created >= self.max_age:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return record
+
+    def get_or_render(self, key: str, tags: Tuple[str, ...], render: Callable[[], Optional[Dict]]) -> Optional[Dict]:
+        """
+        Return the cached record for a key, rendering it on a miss.
+
+        render returns a record dict (body, status, content_type, etag) or
+        None for a response that must not be cached.
+        """
+        while True:
+            with self._lock:
+                record = self._fresh(key, tags)
+                if record is not None:
+                    return record
+                flight = self._flights.get(key)
+                if flight is None:
+                    flight = self._flights[key] = threading.Event()
+                    stamp = self._stamp(tags)
+                    break
+            # Someone else is rendering this key; wait for them and look again
+            flight.wait(timeout=10)
+
+        try:
+            record = render()
+            if record is not None:
+                with self._lock:
+                    # Stamped with the generation seen before rendering, so an
+                    # invalidation that raced the render still wins
+                    self._entries[key] = (stamp, time.monotonic(), record)
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+            return record
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.set()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+# Global response cache instance
+response_cache = ResponseCache()
+
+
+def cached_response(*tags: str):
+    """
+    Decorator caching a public GET endpoint's 200 responses in the
+    response cache under the given invalidation tags.
+
+    The cache key is the path plus the sorted query string. Responses carry
+    a strong ETag and `Cache-Control: no-cache`, so browsers revalidate with
+    If-None-Match and get an empty 304 while nothing has changed. A view
+    that sets its own Cache-Control (e.g. for immutable data) keeps it.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            from flask import request, make_response
+
+            if not response_cache.enabled:
+                return view(*args, **kwargs)
+
+            uncached = {}
+
+            def render() -> Optional[Dict]:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    uncached['response'] = response
+                    return None
+                body = response.get_data()
+                return {
+                    'body': body,
+                    'status': response.status_code,
+                    'content_type': response.headers.get('Content-Type', 'application/json'),
+                    'etag': hashlib.sha1(body).hexdigest(),
+                    'cache_control': response.headers.get('Cache-Control', 'no-cache'),
+                }
+
+            key = f"{request.path}?{'&'.join(sorted(f'{k}={v}' for k, v in request.args.items(multi=True)))}"
+            record = response_cache.get_or_render(key, tags, render)
+            if record is None:
+                # Not cacheable (e.g. a 400): hand back what this request rendered
+                return uncached['response']
+
+            if request.if_none_match.contains(record['etag']):
+                response = make_response('', 304)
+            else:
+                response = make_response(record['body'], record['status'])
+                response.headers['Content-Type'] = record['content_type']
+            response.set_etag(record['etag'])
+            response.headers['Cache-Control'] = record['cache_control']
+            return response
+
+        return wrapper
+    return decorator
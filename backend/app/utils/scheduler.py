@@ -0,0 +1,190 @@
+import atexit
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional
+import logging
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# PostgreSQL advisory lock key held by the one process that runs the jobs
+SCHEDULER_LOCK_KEY = 73102601
+
+
+@dataclass
+class ScheduledJob:
+    name: str
+    func: Callable[[], object]
+    next_run: Callable[[datetime], datetime]  # naive UTC now -> naive UTC next run
+    due_at: Optional[datetime] = None
+
+
+def every(seconds: float) -> Callable[[datetime], datetime]:
+    """Fixed-interval schedule for JobScheduler.add_job."""
+    return lambda now: now + timedelta(seconds=seconds)
+
+
+class JobScheduler:
+    """
+    Minimal in-process scheduler for periodic maintenance jobs.
+
+    Each job supplies a function computing its next run time from the
+    current UTC time, so calendar schedules such as "every Casablanca
+    midnight" follow the timezone rules instead of a fixed interval. Jobs
+    run one at a time on a daemon thread inside an app context.
+
+    Every process that creates the app (gunicorn workers, CLI commands)
+    starts a scheduler, but only one of them runs the jobs: on PostgreSQL
+    the first to take a session-level advisory lock becomes the leader and
+    keeps it until it exits, when another process takes over. Other
+    databases are treated as single-process deployments. Jobs should still
+    be idempotent, since a leader can die halfway through one.
+    """
+
+    def __init__(self, poll_seconds: float = 30.0):
+        self.poll_seconds = poll_seconds
+        self.enabled = False
+        self.app = None
+        self._jobs: List[ScheduledJob] = []
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.use_leader_lock = False
+        self._leader_connection = None
+
+    def init_app(self, app) -> None:
+        """Bind the scheduler to an app and start it if enabled."""
+        from app import db
+
+        self.app = app
+        self.enabled = app.config.get('SCHEDULER_ENABLED', False)
+        with app.app_context():
+            self.use_leader_lock = db.engine.dialect.name == 'postgresql'
+        if self.enabled:
+            self.start()
+            atexit.register(self.shutdown)
+
+    def add_job(self, name: str, func: Callable[[], object],
+                next_run: Callable[[datetime], datetime], run_now: bool = False) -> None:
+        """
+        Register a job.
+
+        Args:
+            name: Job name used in logs
+            func: Callable run inside an app context
+            next_run: Callable mapping the current naive UTC time to the
+                next naive UTC run time
+            run_now: Also run once as soon as the scheduler starts (catches
+                up on a run missed while the process was down)
+        """
+        with self._lock:
+            if any(job.name == name for job in self._jobs):
+                return
+            job = ScheduledJob(name, func, next_run)
+            job.due_at = datetime.utcnow() if run_now else next_run(datetime.utcnow())
+            self._jobs.append(job)
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='job-scheduler', daemon=True)
+            self._thread.start()
+
+    def shutdown(self) -> None:
+        """Stop the scheduler thread."""
+        self._stop.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=5)
+        self._thread = None
+        self._release_leadership()
+
+    def is_leader(self) -> bool:
+        """
+        Whether this process runs the jobs, taking the leader lock if it is free.
+
+        On PostgreSQL the lock is held by a dedicated autocommit connection;
+        it is checked on every call so a dropped connection hands the jobs
+        over instead of leaving two leaders.
+        """
+        from app import db
+
+        if not self.use_leader_lock:
+            return True
+        with self.app.app_context():
+            try:
+                if self._leader_connection is not None:
+                    self._leader_connection.execute(text('SELECT 1'))
+                    return True
+                connection = db.engine.connect().execution_options(isolation_level='AUTOCOMMIT')
+                acquired = connection.execute(
+                    text('SELECT pg_try_advisory_lock(:key)'), {'key': SCHEDULER_LOCK_KEY}
+                ).scalar()
+                if not acquired:
+                    connection.close()
+                    return False
+                self._leader_connection = connection
+                logger.info("This process now runs the scheduled jobs")
+                return True
+            except Exception as e:
+                logger.error(f"Scheduler leader check failed: {e}")
+                self._release_leadership()
+                return False
+
+    def _release_leadership(self) -> None:
+        connection, self._leader_connection = self._leader_connection, None
+        if connection is not None:
+            try:
+                # Drop the DBAPI connection rather than pooling it with the lock held
+                connection.invalidate()
+                connection.close()
+            except Exception:
+                pass
+
+    def run_pending(self, now: Optional[datetime] = None) -> int:
+        """
+        Run every job that is due.
+
+        Returns:
+            Number of jobs run
+        """
+        now = now or datetime.utcnow()
+        with self._lock:
+            due = [job for job in self._jobs if job.due_at is not None and job.due_at <= now]
+        if due and not self.is_leader():
+            # Another process runs the jobs; keep the schedule moving so this
+            # one is up to date if it takes over
+            for job in due:
+                job.due_at = job.next_run(datetime.utcnow())
+            return 0
+
+        for job in due:
+            try:
+                with self.app.app_context():
+                    job.func()
+            except Exception as e:
+                logger.error(f"Scheduled job {job.name} failed: {e}")
+            job.due_at = job.next_run(datetime.utcnow())
+            logger.info(f"Scheduled job {job.name} next run at {job.due_at.isoformat()}Z")
+        return len(due)
+
+    def _seconds_until_next(self) -> float:
+        with self._lock:
+            upcoming = [job.due_at for job in self._jobs if job.due_at is not None]
+        if not upcoming:
+            return self.poll_seconds
+        wait = (min(upcoming) - datetime.utcnow()).total_seconds()
+        # Re-check at least every poll interval so wall-clock jumps are noticed
+        return max(0.0, min(wait, self.poll_seconds))
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.run_pending()
+            self._stop.wait(self._seconds_until_next())
+
+
+# Global scheduler instance
+scheduler = JobScheduler()
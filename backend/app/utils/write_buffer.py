@@ -0,0 +1,272 @@
+import csv
+import io
+import time
+import queue
+import atexit
+import threading
+import logging
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import insert, event
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# Session.info key of the rows waiting for their transaction to commit
+PENDING_ROWS = 'write_buffer_rows'
+
+
+class BulkWriteBuffer:
+    """
+    Write-behind buffer for append-only rows (equity snapshots, audit rows).
+    Rows are queued in a bounded in-process queue and drained by a background
+    thread that writes them in bulk: COPY on PostgreSQL (psycopg2), executemany
+    everywhere else. A batch is flushed every `batch_size` rows or
+    `flush_interval_ms` milliseconds, whichever comes first. A batch that
+    fails is written again row by row, so one bad row only loses itself.
+    """
+
+    def __init__(self, max_size: int = 10000, batch_size: int = 500, flush_interval_ms: int = 250):
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval_ms = flush_interval_ms
+        self.enabled = False
+        self.app = None
+        self._queue: queue.Queue = queue.Queue(maxsize=max_size)
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._start_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flush_listeners: List[Callable] = []
+
+    def init_app(self, app) -> None:
+        """Bind the buffer to an app and read its configuration."""
+        self.app = app
+        self.enabled = app.config.get('WRITE_BUFFER_ENABLED', False)
+        self.batch_size = app.config.get('WRITE_BUFFER_BATCH_SIZE', self.batch_size)
+        self.flush_interval_ms = app.config.get('WRITE_BUFFER_FLUSH_MS', self.flush_interval_ms)
+        max_size = app.config.get('WRITE_BUFFER_MAX_SIZE', self.max_size)
+        if max_size != self.max_size:
+            self.max_size = max_size
+            self._queue = queue.Queue(maxsize=max_size)
+        if self.enabled:
+            atexit.register(self.shutdown)
+
+    def add_flush_listener(self, listener: Callable[[Any, List[Dict], Any], None]) -> None:
+        """
+        Register a callback run after rows of a model are written.
+
+        Args:
+            listener: Callable taking (model, rows, connection); it runs inside
+                the transaction that wrote the rows
+        """
+        if listener not in self._flush_listeners:
+            self._flush_listeners.append(listener)
+
+    def enqueue(self, model, row: Dict) -> None:
+        """
+        Queue a row for insertion.
+
+        When the buffer is disabled the row is inserted into the current
+        session instead, so it commits with the caller's transaction.
+
+        Args:
+            model: SQLAlchemy model class of the row
+            row: Column values for the row
+        """
+        row = self._prepare_row(model, row)
+
+        if not self.enabled:
+            from app import db
+            db.session.execute(insert(model.__table__), [row])
+            self._notify(model, [row], db.session.connection())
+            return
+
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((model, row))
+        except queue.Full:
+            # Back-pressure: drain on the caller thread rather than dropping rows
+            logger.warning("Write buffer full, flushing synchronously")
+            self.flush()
+            self._queue.put((model, row))
+
+    def enqueue_on_commit(self, model, row: Dict) -> None:
+        """
+        Queue a row that belongs to the current transaction.
+
+        The row is only handed to the background writer once the session
+        commits, and is dropped if it rolls back, so it can never be
+        written ahead of (or without) the rows it refers to. When the
+        buffer is disabled the row is inserted into the session right away,
+        which gives the same guarantee.
+
+        Args:
+            model: SQLAlchemy model class of the row
+            row: Column values for the row
+        """
+        if not self.enabled:
+            self.enqueue(model, row)
+            return
+
+        from app import db
+        db.session.info.setdefault(PENDING_ROWS, []).append((self, model, self._prepare_row(model, row)))
+
+    def flush(self) -> int:
+        """
+        Synchronously write every queued row.
+
+        Returns:
+            Number of rows written
+        """
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            self._write_or_split(batch)
+        return len(batch)
+
+    def shutdown(self) -> None:
+        """Stop the background thread and flush whatever is left."""
+        self._stop.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=5)
+        self._thread = None
+        self.flush()
+        self._stop.clear()
+
+    def _ensure_started(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='bulk-write-buffer', daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        interval = self.flush_interval_ms / 1000.0
+        while not self._stop.is_set():
+            batch = []
+            deadline = time.monotonic() + interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            if batch:
+                self._write_or_split(batch)
+
+    def _write_or_split(self, batch: List[Tuple[Any, Dict]]) -> int:
+        """
+        Write a batch; if it fails, write its rows one by one and log only
+        the rows that still fail.
+
+        Returns:
+            Number of rows that could not be written
+        """
+        try:
+            self._write_batch(batch)
+            return 0
+        except Exception as e:
+            if len(batch) == 1:
+                model, row = batch[0]
+                logger.error(f"Write buffer dropped a {model.__tablename__} row {row}: {e}")
+                return 1
+            logger.warning(f"Write buffer flush of {len(batch)} rows failed, retrying row by row: {e}")
+
+        failed = 0
+        for item in batch:
+            failed += self._write_or_split([item])
+        return failed
+
+    def _write_batch(self, batch: List[Tuple[Any, Dict]]) -> None:
+        from app import db
+
+        # Group rows per model so each table gets a single bulk statement
+        grouped: Dict[Any, List[Dict]] = {}
+        for model, row in batch:
+            grouped.setdefault(model, []).append(row)
+
+        with self._flush_lock, self.app.app_context():
+            with db.engine.begin() as connection:
+                for model, rows in grouped.items():
+                    if self._supports_copy(connection):
+                        self._copy_rows(connection, model.__table__, rows)
+                    else:
+                        connection.execute(insert(model.__table__), rows)
+                    self._notify(model, rows, connection)
+
+    def _notify(self, model, rows: List[Dict], connection) -> None:
+        for listener in self._flush_listeners:
+            try:
+                listener(model, rows, connection)
+            except Exception as e:
+                logger.error(f"Write buffer flush listener failed: {e}")
+
+    @staticmethod
+    def _prepare_row(model, row: Dict) -> Dict:
+        """Fill BaseModel timestamps now so queued rows keep their real creation time."""
+        row = dict(row)
+        now = datetime.utcnow()
+        columns = model.__table__.columns
+        for name in ('created_at', 'updated_at'):
+            if name in columns and row.get(name) is None:
+                row[name] = now
+        return row
+
+    @staticmethod
+    def _supports_copy(connection) -> bool:
+        return connection.dialect.name == 'postgresql' and connection.dialect.driver == 'psycopg2'
+
+    @staticmethod
+    def _copy_rows(connection, table, rows: List[Dict]) -> None:
+        """Stream rows into PostgreSQL with COPY ... FROM STDIN."""
+        columns = list(rows[0].keys())
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            values = []
+            for column in columns:
+                value = row.get(column)
+                if value is None:
+                    value = ''
+                elif isinstance(value, datetime):
+                    value = value.isoformat()
+                values.append(value)
+            writer.writerow(values)
+        buffer.seek(0)
+
+        column_list = ', '.join(columns)
+        cursor = connection.connection.cursor()
+        try:
+            cursor.copy_expert(f"COPY {table.name} ({column_list}) FROM STDIN WITH (FORMAT csv)", buffer)
+        finally:
+            cursor.close()
+
+
+# Global write buffer instance
+write_buffer = BulkWriteBuffer()
+
+
+@event.listens_for(Session, 'after_commit')
+def _enqueue_committed_rows(session):
+    if session.in_nested_transaction():
+        # A savepoint was released; the outer transaction can still roll back
+        return
+    for buffer, model, row in session.info.pop(PENDING_ROWS, ()):
+        buffer.enqueue(model, row)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _drop_pending_rows(session):
+    if session.in_nested_transaction():
+        return
+    session.info.pop(PENDING_ROWS, None)
@@ -0,0 +1,60 @@
+"""
+Tick throughput of the resting order matching engine.
+
+Usage (from backend/):
+    python -m benchmarks.bench_matching_engine [resting_orders] [ticks]
+"""
+import random
+import sys
+import time
+
+from app.services.matching_engine import MatchingEngine, RestingOrder
+
+
+def build_engine(resting_orders: int, mid: float) -> MatchingEngine:
+    engine = MatchingEngine()
+    for order_id in range(resting_orders):
+        side = 'BUY' if order_id % 2 else 'SELL'
+        order_type = ('LIMIT', 'STOP', 'STOP_LIMIT')[order_id % 3]
+        # Spread prices 0.5% to 20% away from the mid so most orders rest
+        offset = mid * random.uniform(0.005, 0.2)
+        away = -offset if side == 'BUY' else offset
+        limit_price = mid + away
+        stop_price = mid - away
+        engine.add(RestingOrder(
+            order_id=order_id,
+            user_challenge_id=order_id % 1000,
+            instrument_id=1,
+            side=side,
+            order_type=order_type,
+            qty=1.0,
+            limit_price=limit_price if order_type != 'STOP' else None,
+            stop_price=stop_price if order_type != 'LIMIT' else None
+        ))
+    return engine
+
+
+def main():
+    resting_orders = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    ticks = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+    mid = 50000.0
+
+    random.seed(42)
+    started = time.perf_counter()
+    engine = build_engine(resting_orders, mid)
+    build_seconds = time.perf_counter() - started
+
+    fills = 0
+    started = time.perf_counter()
+    for _ in range(ticks):
+        mid *= 1 + random.gauss(0, 0.0002)
+        fills += len(engine.on_quote(1, mid * 0.9999, mid * 1.0001))
+    tick_seconds = time.perf_counter() - started
+
+    print(f"built {resting_orders} resting orders in {build_seconds:.2f}s")
+    print(f"{ticks} ticks in {tick_seconds:.2f}s ({ticks / tick_seconds:,.0f} ticks/s), "
+          f"{fills} events, {len(engine)} orders still resting")
+
+
+if __name__ == '__main__':
+    main()
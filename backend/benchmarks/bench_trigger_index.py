@@ -0,0 +1,53 @@
+"""
+Tick throughput of the SL/TP trigger index.
+
+Usage (from backend/):
+    python -m benchmarks.bench_trigger_index [armed_positions] [instruments] [ticks]
+"""
+import random
+import sys
+import time
+
+from app.services.trigger_index import TriggerIndex
+
+
+def main():
+    armed_positions = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    instruments = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    ticks = int(sys.argv[3]) if len(sys.argv) > 3 else 200000
+
+    random.seed(42)
+    mids = {instrument_id: random.uniform(10, 50000) for instrument_id in range(instruments)}
+
+    index = TriggerIndex()
+    started = time.perf_counter()
+    for position_id in range(armed_positions):
+        instrument_id = position_id % instruments
+        mid = mids[instrument_id]
+        side = 'LONG' if position_id % 2 else 'SHORT'
+        # Levels 0.5% to 10% away from the mid on the correct side
+        stop_distance = mid * random.uniform(0.005, 0.1)
+        target_distance = mid * random.uniform(0.005, 0.1)
+        if side == 'LONG':
+            index.arm(position_id, position_id % 5000, instrument_id, side,
+                      stop_loss=mid - stop_distance, take_profit=mid + target_distance)
+        else:
+            index.arm(position_id, position_id % 5000, instrument_id, side,
+                      stop_loss=mid + stop_distance, take_profit=mid - target_distance)
+    build_seconds = time.perf_counter() - started
+
+    fired = 0
+    started = time.perf_counter()
+    for tick in range(ticks):
+        instrument_id = tick % instruments
+        mid = mids[instrument_id] = mids[instrument_id] * (1 + random.gauss(0, 0.0005))
+        fired += len(index.on_quote(instrument_id, mid * 0.9999, mid * 1.0001))
+    tick_seconds = time.perf_counter() - started
+
+    print(f"armed {armed_positions} positions across {instruments} instruments in {build_seconds:.2f}s")
+    print(f"{ticks} ticks in {tick_seconds:.2f}s ({ticks / tick_seconds:,.0f} ticks/s), "
+          f"{fired} fired, {len(index)} still armed")
+
+
+if __name__ == '__main__':
+    main()
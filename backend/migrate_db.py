@@ -1,20 +1,53 @@
 from app import create_app, db
+from app.config import Config
 from sqlalchemy import text
 import traceback
 
+MIGRATIONS = [
+    ("column max_trade_quantity to challenges table", "ALTER TABLE challenges ADD COLUMN max_trade_quantity FLOAT"),
+    ("column stop_loss to positions table", "ALTER TABLE positions ADD COLUMN stop_loss FLOAT"),
+    ("column take_profit to positions table", "ALTER TABLE positions ADD COLUMN take_profit FLOAT"),
+    ("index ix_positions_updated", "CREATE INDEX IF NOT EXISTS ix_positions_updated ON positions(updated_at)"),
+    ("column daily_reset_at to user_challenges table", "ALTER TABLE user_challenges ADD COLUMN daily_reset_at TIMESTAMP"),
+    ("drop of the ascending ix_leaderboard_entries_rank", "DROP INDEX IF EXISTS ix_leaderboard_entries_rank"),
+    ("index ix_leaderboard_entries_rank", "CREATE INDEX IF NOT EXISTS ix_leaderboard_entries_rank ON leaderboard_entries(period, profit_pct DESC, user_id)"),
+    ("index ix_user_challenges_status_window", "CREATE INDEX IF NOT EXISTS ix_user_challenges_status_window ON user_challenges(status, start_time, end_time)"),
+    ("index ix_user_challenges_user_status_created", "CREATE INDEX IF NOT EXISTS ix_user_challenges_user_status_created ON user_challenges(user_id, status, created_at)"),
+    ("index ix_user_challenges_user_created", "CREATE INDEX IF NOT EXISTS ix_user_challenges_user_created ON user_challenges(user_id, created_at)"),
+    ("index ix_user_challenges_challenge_status", "CREATE INDEX IF NOT EXISTS ix_user_challenges_challenge_status ON user_challenges(challenge_id, status)"),
+    ("index ix_users_created", "CREATE INDEX IF NOT EXISTS ix_users_created ON users(created_at)"),
+    ("index ix_payments_user_created", "CREATE INDEX IF NOT EXISTS ix_payments_user_created ON payments(user_id, created_at)"),
+    ("column sketch_period to user_challenges table", "ALTER TABLE user_challenges ADD COLUMN sketch_period VARCHAR(7)"),
+    ("index ix_equity_snapshots_challenge_ts", "CREATE INDEX IF NOT EXISTS ix_equity_snapshots_challenge_ts ON equity_snapshots(user_challenge_id, ts)"),
+    ("index ix_trades_challenge_created", "CREATE INDEX IF NOT EXISTS ix_trades_challenge_created ON trades(user_challenge_id, created_at, id)"),
+    ("index ix_positions_challenge_created", "CREATE INDEX IF NOT EXISTS ix_positions_challenge_created ON positions(user_challenge_id, created_at, id)"),
+    ("index ix_orders_challenge_created", "CREATE INDEX IF NOT EXISTS ix_orders_challenge_created ON orders(user_challenge_id, created_at, id)"),
+    ("index ix_orders_status_instrument", "CREATE INDEX IF NOT EXISTS ix_orders_status_instrument ON orders(status, instrument_id)"),
+    ("index ix_quote_ticks_instrument_ts", "CREATE INDEX IF NOT EXISTS ix_quote_ticks_instrument_ts ON quote_ticks(instrument_id, ts)"),
+    ("index ix_trading_leaderboard_entries_rank", "CREATE INDEX IF NOT EXISTS ix_trading_leaderboard_entries_rank ON trading_leaderboard_entries(period, scope, scope_key, realized_pnl DESC, user_id)"),
+]
+
+class MigrationConfig(Config):
+    # No background jobs or writers while the schema is behind the models
+    SCHEDULER_ENABLED = False
+    WRITE_BUFFER_ENABLED = False
+    EVENT_WORKER_ENABLED = False
+
+
 def migrate():
-    app = create_app()
+    app = create_app(MigrationConfig)
     with app.app_context():
-        try:
-            print("Attempting to add column max_trade_quantity to challenges table...")
-            db.session.execute(text("ALTER TABLE challenges ADD COLUMN max_trade_quantity FLOAT"))
-            db.session.commit()
-            print("Column added successfully.")
-        except Exception as e:
-            print(f"Migration error (likely column already exists): {e}")
-            db.session.rollback()
-            # If it's something else, print it
-            # traceback.print_exc()
+        for description, statement in MIGRATIONS:
+            try:
+                print(f"Attempting to add {description}...")
+                db.session.execute(text(statement))
+                db.session.commit()
+                print("Added successfully.")
+            except Exception as e:
+                print(f"Migration error (likely already exists): {e}")
+                db.session.rollback()
+                # If it's something else, print it
+                # traceback.print_exc()
 
 if __name__ == "__main__":
     migrate()
@@ -1,5 +1,76 @@
 import sys
 import os
+from unittest.mock import patch
+import pytest
 
 # Add the backend directory to the Python path so tests can import modules
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
\ No newline at end of file
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app import create_app, db
+from app.config import Config
+from app.models import UserChallenge
+
+
+class AppTestConfig(Config):
+    """In-memory database, no scheduler, no event worker and synchronous snapshot writes."""
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    SCHEDULER_ENABLED = False
+    WRITE_BUFFER_ENABLED = False
+    EVENT_WORKER_ENABLED = False
+    TESTING = True
+
+
+class QuoteStub:
+    """Stands in for MarketDataService.get_quote: fixed prices, recorded calls."""
+
+    def __init__(self, default: float = 100.0):
+        self.default = default
+        self.prices = {}
+        self.calls = []
+
+    def __call__(self, instrument, provider):
+        self.calls.append(instrument)
+        last = self.prices.get(instrument, self.default)
+        return {'bid': last - 0.1, 'ask': last + 0.1, 'last': last, 'ts': 0}
+
+
+@pytest.fixture
+def app():
+    """App on an empty in-memory database, inside an app context."""
+    app = create_app(AppTestConfig)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def quotes():
+    """Patch live quotes with a QuoteStub (set `prices[symbol]`, read `calls`)."""
+    stub = QuoteStub()
+    with patch('app.services.market_data_service.MarketDataService.get_quote', stub), \
+            patch('app.services.market_data_service.MarketDataService.peek_quote', stub):
+        yield stub
+
+
+@pytest.fixture
+def auth_headers():
+    """Build JWT headers for a user id."""
+    from flask_jwt_extended import create_access_token
+
+    def headers(user_id):
+        return {'Authorization': f'Bearer {create_access_token(identity=str(user_id))}'}
+    return headers
+
+
+@pytest.fixture
+def make_user_challenge():
+    """Build a user challenge with every equity field at its start balance."""
+    def make(user_id, challenge_id, status='IN_PROGRESS', balance=10000.0, **fields):
+        values = dict(user_id=user_id, challenge_id=challenge_id, status=status, start_balance=balance,
+                      current_equity=balance, daily_start_equity=balance, max_equity=balance,
+                      min_equity=balance, min_equity_all_time=balance, min_equity_today=balance)
+        values.update(fields)
+        return UserChallenge(**values)
+    return make
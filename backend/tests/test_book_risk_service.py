@@ -0,0 +1,89 @@
+from datetime import datetime
+import numpy as np
+from unittest.mock import Mock
+from app import db
+from app.models import User, Challenge, Instrument, Position, InstrumentExposure
+from app.services.exposure_service import ExposureService
+from app.services.risk_service import RiskService
+from app.services.book_risk_service import RiskBook, BookRiskService, evaluate_book, IN_PROGRESS, FAILED, PASSED
+
+
+def _row(uc_id, current, daily_start, min_today, min_all, max_equity, start=10000.0):
+    return (uc_id, 1, 'IN_PROGRESS', start, current, daily_start, min_today, min_all, max_equity, 0.05, 0.10, 0.10)
+
+
+def test_matches_scalar_evaluation():
+    rng = np.random.default_rng(7)
+    rows = []
+    for uc_id in range(1, 301):
+        current = float(rng.uniform(8500, 11500))
+        daily_start = float(rng.uniform(9000, 11000))
+        min_today = min(current, float(rng.uniform(8500, 11000)))
+        min_all = min(min_today, float(rng.uniform(8500, 10000)))
+        rows.append(_row(uc_id, current, daily_start, min_today, min_all, max(current, 10000.0)))
+
+    book = RiskBook.from_rows(rows)
+    metrics = evaluate_book(book)
+    codes = {'IN_PROGRESS': IN_PROGRESS, 'FAILED': FAILED, 'PASSED': PASSED}
+
+    for i, row in enumerate(rows):
+        user_challenge = Mock(status='IN_PROGRESS', start_balance=row[3],
+                              challenge=Mock(daily_max_loss=0.05, total_max_loss=0.10, profit_target=0.10))
+        expected = RiskService.evaluate_challenge_status(user_challenge, row[4], row[5], row[6], row[7], row[8])
+        assert metrics['new_status'][i] == codes[expected['status']]
+        assert np.isclose(metrics['daily_drawdown'][i], expected['metrics']['daily_drawdown'])
+        assert np.isclose(metrics['sharpe_like'][i], expected['metrics']['sharpe_like'])
+
+
+def test_status_changes_only_lists_changing_challenges():
+    book = RiskBook.from_rows([
+        _row(1, 10000.0, 10000.0, 9400.0, 9400.0, 10000.0),   # daily breach
+        _row(2, 11200.0, 11000.0, 11000.0, 9800.0, 11200.0),  # target hit
+        _row(3, 9950.0, 10000.0, 9900.0, 9900.0, 10000.0),    # fine
+    ])
+    changes = BookRiskService.status_changes(book)
+
+    assert [(c['user_challenge_id'], c['new_status']) for c in changes] == [(1, 'FAILED'), (2, 'PASSED')]
+    assert changes[0]['reasons'][0]['rule'] == 'daily_max_loss'
+
+
+def test_at_risk_orders_by_headroom():
+    book = RiskBook.from_rows([
+        _row(1, 9990.0, 10000.0, 9990.0, 9990.0, 10000.0),
+        _row(2, 9700.0, 10000.0, 9700.0, 9700.0, 10000.0),
+        _row(3, 9800.0, 10000.0, 9800.0, 9800.0, 10000.0),
+    ])
+    at_risk = BookRiskService.at_risk(book, evaluate_book(book), limit=2)
+
+    assert [r['user_challenge_id'] for r in at_risk] == [2, 3]
+    assert np.isclose(at_risk[0]['headroom'], 0.4)
+
+
+def test_apply_changes_runs_the_status_hooks(app, make_user_challenge):
+    user = User(email='sweep@x.ma', password_hash='x')
+    challenge = Challenge(name='Starter', start_balance=10000.0)
+    instrument = Instrument(asset_class='CRYPTO', display_symbol='BTC', provider='BINANCE',
+                            provider_symbol='BTCUSDT', currency='USDT')
+    db.session.add_all([user, challenge, instrument])
+    db.session.flush()
+    uc = make_user_challenge(user.id, challenge.id)
+    db.session.add(uc)
+    db.session.flush()
+    db.session.add(Position(user_challenge_id=uc.id, instrument_id=instrument.id, side='LONG', qty=2.0,
+                            avg_price=100.0, opened_at=datetime.utcnow()))
+    db.session.commit()
+    ExposureService.rebuild()
+    assert db.session.get(InstrumentExposure, instrument.id).long_qty == 2.0
+
+    change = {'user_challenge_id': uc.id, 'user_id': user.id, 'new_status': 'FAILED',
+              'reasons': [{'message': 'Daily drawdown exceeded'}]}
+    assert BookRiskService.apply_changes([change]) == 1
+
+    db.session.expire_all()
+    assert uc.status == 'FAILED' and uc.violated_rules == ['Daily drawdown exceeded']
+    # The failed challenge's position left the firm-wide book
+    assert db.session.get(InstrumentExposure, instrument.id).long_qty == 0.0
+
+    # Already applied: nothing changes and the exposure is not taken out twice
+    assert BookRiskService.apply_changes([change]) == 0
+    assert db.session.get(InstrumentExposure, instrument.id).long_qty == 0.0
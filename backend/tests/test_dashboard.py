@@ -0,0 +1,100 @@
+"""
+Dashboard aggregate endpoint: one ownership check, one quote snapshot
+shared by every section, field selection and a bounded query count.
+"""
+from unittest.mock import patch
+import pytest
+from app import db
+from app.config import Config
+from app.models import User, Instrument, Challenge, Position
+from app.utils.query_budget import query_budget
+
+
+def _ohlcv(self, instrument, provider, timeframe, limit):
+    return [{'ts': i * 3600000, 'open': 100.0 + i, 'high': 101.0 + i, 'low': 99.0 + i,
+             'close': 100.5 + i, 'volume': 1.0} for i in range(limit)]
+
+
+@pytest.fixture
+def client(app, quotes, auth_headers, make_user_challenge):
+    user = User(email='dash@x.ma', password_hash='x')
+    other = User(email='other@x.ma', password_hash='x')
+    challenge = Challenge(name='Starter', start_balance=10000.0)
+    db.session.add_all([user, other, challenge])
+    db.session.flush()
+    uc = make_user_challenge(user.id, challenge.id)
+    db.session.add(uc)
+    db.session.flush()
+    for i in range(3):
+        instrument = Instrument(asset_class='CRYPTO', display_symbol=f'C{i}', provider='BINANCE',
+                                provider_symbol=f'C{i}USDT', currency='USDT')
+        db.session.add(instrument)
+        db.session.flush()
+        db.session.add(Position(user_challenge_id=uc.id, instrument_id=instrument.id, side='LONG',
+                                qty=1.0, avg_price=90.0, opened_at=uc.created_at))
+        quotes.prices[instrument.provider_symbol] = 100.0 + i
+    db.session.commit()
+    with patch('app.services.market_data_service.MarketDataService.get_ohlcv', _ohlcv):
+        yield app.test_client(), auth_headers(user.id), auth_headers(other.id), uc.id
+
+
+def test_dashboard_shares_one_quote_snapshot(client, quotes):
+    test_client, headers, _, uc_id = client
+    response = test_client.get(f'/api/v1/dashboard/{uc_id}', headers=headers)
+    body = response.get_json()
+
+    assert response.status_code == 200, body
+    assert body['errors'] == {}
+    # One quote per instrument, shared by the positions, the evaluation and the quote panel
+    assert sorted(quotes.calls) == ['C0USDT', 'C1USDT', 'C2USDT']
+    unrealized = sum(position['unrealized_pnl'] for position in body['positions'])
+    assert body['evaluation']['status'] == 'IN_PROGRESS'
+    assert body['challenge']['current_equity'] == pytest.approx(10000.0 + unrealized)
+    assert body['quote'] == body['quotes'][str(body['instrument']['id'])]
+    assert body['challenge']['challenge']['name'] == 'Starter'
+    assert len(body['instruments']) == 3 and len(body['challenges']) == 1
+    assert len(body['ohlcv']['bars']) == 100 and body['signals']['bias'] in ('LONG', 'SHORT', 'NEUTRAL')
+
+
+def test_dashboard_field_selection(client, quotes):
+    test_client, headers, _, uc_id = client
+    response = test_client.get(f'/api/v1/dashboard/{uc_id}?fields=trades,equity', headers=headers)
+    body = response.get_json()
+
+    assert response.status_code == 200, body
+    assert set(body) == {'trades', 'equity', 'as_of', 'errors', 'fields'}
+    assert quotes.calls == []  # nothing selected needs a quote or an evaluation
+
+    response = test_client.get(f'/api/v1/dashboard/{uc_id}?fields=positions,bogus', headers=headers)
+    assert response.status_code == 400
+
+
+def test_dashboard_bounds_its_limits(client):
+    test_client, headers, _, uc_id = client
+    response = test_client.get(f'/api/v1/dashboard/{uc_id}?fields=ohlcv,equity&ohlcv_limit=100000&range=1000000',
+                               headers=headers)
+    body = response.get_json()
+
+    assert response.status_code == 200, body
+    assert len(body['ohlcv']['bars']) == Config.OHLCV_LIMIT_MAX
+    assert body['equity']['range_hours'] == Config.EQUITY_RANGE_HOURS_MAX
+    assert test_client.get(f'/api/v1/dashboard/{uc_id}?range=-1', headers=headers).status_code == 400
+
+
+def test_dashboard_checks_ownership(client):
+    test_client, _, other_headers, uc_id = client
+    assert test_client.get(f'/api/v1/dashboard/{uc_id}', headers=other_headers).status_code == 404
+
+
+def test_dashboard_query_budget(client):
+    test_client, headers, _, uc_id = client
+    path = f'/api/v1/dashboard/{uc_id}'
+    test_client.get(path, headers=headers)  # warm up one-off loads
+    db.session.remove()
+    with query_budget.count_queries() as counter:
+        response = test_client.get(path, headers=headers)
+
+    assert response.status_code == 200
+    # ownership, instruments, positions (and the evaluation's), the evaluation write,
+    # challenges, trades, equity; fixed however many positions the challenge holds
+    assert counter.count <= 8, counter.statements
@@ -0,0 +1,36 @@
+from contextlib import nullcontext
+from datetime import datetime
+from app.utils.helpers import get_casablanca_midnight_utc
+from app.utils.scheduler import JobScheduler
+
+
+def test_midnight_follows_offset_changes():
+    # Morocco runs UTC+1 most of the year
+    assert get_casablanca_midnight_utc(datetime(2026, 1, 10, 12, 0)) == datetime(2026, 1, 9, 23, 0)
+    # ...and UTC+0 during Ramadan (15 Feb - 22 Mar 2026)
+    assert get_casablanca_midnight_utc(datetime(2026, 3, 1, 12, 0)) == datetime(2026, 3, 1, 0, 0)
+    # The next midnight after the switch back uses the new offset
+    assert get_casablanca_midnight_utc(datetime(2026, 3, 22, 12, 0), days_ahead=1) == datetime(2026, 3, 22, 23, 0)
+
+
+def test_midnight_just_before_and_after_local_midnight():
+    # 22:59 UTC on 9 Jan is 23:59 local: still the 9th
+    assert get_casablanca_midnight_utc(datetime(2026, 1, 9, 22, 59)) == datetime(2026, 1, 8, 23, 0)
+    assert get_casablanca_midnight_utc(datetime(2026, 1, 9, 23, 0)) == datetime(2026, 1, 9, 23, 0)
+
+
+def test_scheduler_runs_due_jobs_and_reschedules():
+    class FakeApp:
+        def app_context(self):
+            return nullcontext()
+
+    runs = []
+    scheduler = JobScheduler()
+    scheduler.app = FakeApp()
+    scheduler.add_job('catch-up', lambda: runs.append('catch-up'), lambda now: datetime(2100, 1, 1), run_now=True)
+    scheduler.add_job('later', lambda: runs.append('later'), lambda now: datetime(2100, 1, 1))
+
+    assert scheduler.run_pending() == 1
+    assert runs == ['catch-up']
+    assert scheduler.run_pending() == 0
+    assert scheduler.run_pending(now=datetime(2100, 1, 2)) == 2
@@ -0,0 +1,48 @@
+import numpy as np
+from app.utils.downsample import lttb_indices, ohlc_buckets
+
+
+def test_lttb_keeps_endpoints_and_bound():
+    """Test that LTTB returns at most the threshold, including both endpoints."""
+    x = np.arange(10000, dtype=float)
+    y = np.sin(x / 100.0)
+
+    indices = lttb_indices(x, y, 200)
+
+    assert len(indices) == 200
+    assert indices[0] == 0
+    assert indices[-1] == len(x) - 1
+    assert np.all(np.diff(indices) > 0)
+
+
+def test_lttb_preserves_spike():
+    """Test that a single extreme point survives downsampling."""
+    x = np.arange(5000, dtype=float)
+    y = np.zeros(5000)
+    y[2345] = 100.0
+
+    indices = lttb_indices(x, y, 50)
+
+    assert 2345 in indices
+
+
+def test_lttb_short_series_untouched():
+    """Test that series shorter than the threshold are returned whole."""
+    x = np.arange(10, dtype=float)
+    indices = lttb_indices(x, x, 100)
+
+    assert list(indices) == list(range(10))
+
+
+def test_ohlc_buckets():
+    """Test OHLC aggregation over equal-width buckets."""
+    x = np.array([0, 1, 2, 3, 10, 11], dtype=float)
+    y = np.array([5, 7, 3, 4, 9, 8], dtype=float)
+
+    buckets = ohlc_buckets(x, y, 2)
+
+    assert list(buckets['open']) == [5, 9]
+    assert list(buckets['high']) == [7, 9]
+    assert list(buckets['low']) == [3, 8]
+    assert list(buckets['close']) == [4, 8]
+    assert list(buckets['count']) == [4, 2]
@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta
+import pytest
+from app import db
+from app.models import User, Challenge, EquitySnapshot, EquityRollup
+from app.services.equity_rollup_service import EquityRollupService
+
+
+@pytest.fixture
+def uc_id(app, make_user_challenge):
+    user = User(email='rollup@x.ma', password_hash='x')
+    challenge = Challenge(name='Starter', start_balance=10000.0)
+    db.session.add_all([user, challenge])
+    db.session.flush()
+    uc = make_user_challenge(user.id, challenge.id)
+    db.session.add(uc)
+    db.session.commit()
+    return uc.id
+
+
+def _rows(uc_id, start, equities, step=timedelta(seconds=20)):
+    return [{'user_challenge_id': uc_id, 'equity': equity, 'ts': start + i * step}
+            for i, equity in enumerate(equities)]
+
+
+def _bucket(uc_id, resolution, bucket_start):
+    return EquityRollup.query.filter_by(user_challenge_id=uc_id, resolution=resolution,
+                                        bucket_start=bucket_start).one()
+
+
+def test_aggregate_builds_ohlc_per_resolution():
+    start = datetime(2026, 5, 4, 10, 0, 0)
+    rollups = EquityRollupService.aggregate(_rows(1, start, [100.0, 105.0, 95.0, 101.0]))
+
+    minutes = sorted((r for r in rollups if r['resolution'] == '1m'), key=lambda r: r['bucket_start'])
+    assert [(r['open'], r['high'], r['low'], r['close'], r['samples']) for r in minutes] == [
+        (100.0, 105.0, 95.0, 95.0, 3),
+        (101.0, 101.0, 101.0, 101.0, 1),
+    ]
+    hour = next(r for r in rollups if r['resolution'] == '1h')
+    assert (hour['open'], hour['high'], hour['low'], hour['close'], hour['samples']) == (100.0, 105.0, 95.0, 101.0, 4)
+    assert len([r for r in rollups if r['resolution'] == '1d']) == 1
+
+
+def test_upsert_merges_into_existing_buckets(uc_id):
+    start = datetime(2026, 5, 4, 10, 0, 0)
+    EquityRollupService.apply_snapshots(_rows(uc_id, start, [100.0, 104.0]), db.session.connection())
+    # Same minute again: ON CONFLICT widens the range, keeps the open and adds the samples
+    EquityRollupService.apply_snapshots(_rows(uc_id, start + timedelta(seconds=45), [90.0]), db.session.connection())
+    db.session.commit()
+
+    bucket = _bucket(uc_id, '1m', start)
+    assert (bucket.open, bucket.high, bucket.low, bucket.close, bucket.samples) == (100.0, 104.0, 90.0, 90.0, 3)
+    assert EquityRollup.query.filter_by(resolution='1m').count() == 1
+
+
+def test_choose_resolution_keeps_enough_points():
+    assert EquityRollupService.choose_resolution(3600, 100) == '1m'
+    assert EquityRollupService.choose_resolution(7 * 86400, 100) == '1h'
+    assert EquityRollupService.choose_resolution(365 * 86400, 100) == '1d'
+
+
+def test_rebuild_keeps_partly_pruned_buckets(uc_id):
+    now = datetime.utcnow()
+    old_day = EquityRollupService.bucket_start(now - timedelta(days=10), '1d')
+    recent = EquityRollupService.bucket_start(now - timedelta(hours=2), '1m')
+
+    # An old day whose earlier samples were pruned: its rollup row is the only full record
+    db.session.add(EquityRollup(user_challenge_id=uc_id, resolution='1d', bucket_start=old_day,
+                                open=100.0, high=130.0, low=80.0, close=110.0, samples=50))
+    # A recent bucket gone stale, which the rebuild must replace
+    db.session.add(EquityRollup(user_challenge_id=uc_id, resolution='1m', bucket_start=recent,
+                                open=1.0, high=1.0, low=1.0, close=1.0, samples=99))
+    for row in _rows(uc_id, old_day + timedelta(hours=23), [110.0]) + _rows(uc_id, recent, [200.0, 210.0]):
+        db.session.add(EquitySnapshot(balance=10000.0, unrealized_pnl=0.0, **row))
+    db.session.commit()
+
+    assert EquityRollupService.rebuild(uc_id, retention_days=7) == 3
+
+    kept = _bucket(uc_id, '1d', old_day)
+    assert (kept.high, kept.low, kept.samples) == (130.0, 80.0, 50)
+    rebuilt = _bucket(uc_id, '1m', recent)
+    assert (rebuilt.open, rebuilt.close, rebuilt.samples) == (200.0, 210.0, 2)
+    # Finer buckets of the old day had no row yet and are filled from the raw snapshot
+    assert _bucket(uc_id, '1h', old_day + timedelta(hours=23)).samples == 1
@@ -0,0 +1,55 @@
+from app.services.equity_snapshot_policy import EquitySnapshotPolicy
+
+
+def make_policy():
+    return EquitySnapshotPolicy(min_interval=30, min_change=0.001, heartbeat=900)
+
+
+def test_first_snapshot_is_written():
+    """Test that a challenge with no tracked snapshot always gets one."""
+    policy = make_policy()
+    assert policy.should_write(1, 10000.0, now=1000.0)
+
+
+def test_skips_within_min_interval():
+    """Test that page views inside the minimum interval do not write."""
+    policy = make_policy()
+    policy.record(1, 10000.0, now=1000.0)
+
+    # Large move, but too soon
+    assert not policy.should_write(1, 9000.0, now=1010.0)
+
+
+def test_writes_on_meaningful_change():
+    """Test that a relative equity change above the threshold writes."""
+    policy = make_policy()
+    policy.record(1, 10000.0, now=1000.0)
+
+    assert not policy.should_write(1, 10005.0, now=1060.0)  # 0.05% change
+    assert policy.should_write(1, 10020.0, now=1060.0)  # 0.2% change
+
+
+def test_heartbeat_for_flat_equity():
+    """Test that a flat account still gets a periodic snapshot."""
+    policy = make_policy()
+    policy.record(1, 10000.0, now=1000.0)
+
+    assert not policy.should_write(1, 10000.0, now=1800.0)
+    assert policy.should_write(1, 10000.0, now=1900.0)
+
+
+def test_force_bypasses_policy():
+    """Test that trades and status changes always write."""
+    policy = make_policy()
+    policy.record(1, 10000.0, now=1000.0)
+
+    assert policy.should_write(1, 10000.0, force=True, now=1001.0)
+
+
+def test_forget_resets_tracker():
+    """Test that forgetting a challenge makes the next snapshot unconditional."""
+    policy = make_policy()
+    policy.record(1, 10000.0, now=1000.0)
+    policy.forget(1)
+
+    assert policy.should_write(1, 10000.0, now=1001.0)
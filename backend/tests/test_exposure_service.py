@@ -0,0 +1,120 @@
+from datetime import datetime
+import numpy as np
+import pytest
+from app import db
+from app.models import User, Challenge, Instrument, Position, Trade, InstrumentExposure
+from app.services.challenge_service import ChallengeService
+from app.services.exposure_service import ExposureService, position_legs, FLAT
+
+
+def test_position_legs():
+    assert position_legs('LONG', 2.0, 100.0) == (2.0, 0.0, 200.0, 0.0)
+    assert position_legs('SHORT', 3.0, 10.0) == (0.0, 3.0, 0.0, 30.0)
+    assert position_legs(None, 0.0, 0.0) == FLAT
+
+
+def test_fill_deltas_telescope_to_final_positions():
+    # Open long, add, reverse short, close: the summed per-fill deltas equal
+    # the contribution of whatever is left open
+    states = [None, ('LONG', 1.0, 100.0), ('LONG', 3.0, 110.0), ('SHORT', 2.0, 120.0), None]
+    total = np.zeros(4)
+    for before, after in zip(states, states[1:]):
+        total += np.subtract(position_legs(*after) if after else FLAT, position_legs(*before) if before else FLAT)
+
+    assert np.allclose(total, FLAT)
+    assert np.allclose(total + position_legs('SHORT', 2.0, 120.0), (0.0, 2.0, 0.0, 240.0))
+
+
+@pytest.fixture
+def book(app, make_user_challenge):
+    user = User(email='exposure@x.ma', password_hash='x')
+    challenge = Challenge(name='Starter', start_balance=10000.0)
+    instrument = Instrument(asset_class='CRYPTO', display_symbol='BTC', provider='BINANCE',
+                            provider_symbol='BTCUSDT', currency='USDT')
+    db.session.add_all([user, challenge, instrument])
+    db.session.flush()
+    uc = make_user_challenge(user.id, challenge.id)
+    db.session.add(uc)
+    db.session.flush()
+    db.session.add(Position(user_challenge_id=uc.id, instrument_id=instrument.id,
+                            side='LONG', qty=2.0, avg_price=100.0, opened_at=datetime.utcnow()))
+    db.session.commit()
+    return uc, instrument
+
+
+def _legs(instrument_id):
+    row = db.session.get(InstrumentExposure, instrument_id)
+    return (row.long_qty, row.short_qty, row.long_cost, row.short_cost) if row else None
+
+
+def test_apply_delta_creates_then_adds(book):
+    _, instrument = book
+    ExposureService.apply_delta(instrument.id, FLAT, position_legs('LONG', 2.0, 100.0))
+    ExposureService.apply_delta(instrument.id, FLAT, position_legs('SHORT', 1.0, 50.0))
+    db.session.commit()
+
+    assert _legs(instrument.id) == (2.0, 1.0, 200.0, 50.0)
+    assert InstrumentExposure.query.count() == 1
+
+
+def test_status_change_moves_positions_out_of_and_into_the_book(book):
+    uc, instrument = book
+    ExposureService.apply_delta(instrument.id, FLAT, position_legs('LONG', 2.0, 100.0))
+
+    ExposureService.on_status_change(uc.id, 'IN_PROGRESS', 'FAILED')
+    assert _legs(instrument.id) == FLAT
+    # Between two inactive statuses nothing moves
+    ExposureService.on_status_change(uc.id, 'FAILED', 'PASSED')
+    assert _legs(instrument.id) == FLAT
+
+    ExposureService.on_status_change(uc.id, 'FAILED', 'IN_PROGRESS')
+    assert _legs(instrument.id) == (2.0, 0.0, 200.0, 0.0)
+
+
+def test_rebuild_reconciles_rows_in_place(book):
+    uc, instrument = book
+    other = Instrument(asset_class='CRYPTO', display_symbol='ETH', provider='BINANCE',
+                       provider_symbol='ETHUSDT', currency='USDT')
+    db.session.add(other)
+    db.session.flush()
+    # Drift on a held instrument, and a stale row for one nobody holds
+    db.session.add_all([
+        InstrumentExposure(instrument_id=instrument.id, long_qty=5.0, short_qty=0.0, long_cost=1.0, short_cost=0.0),
+        InstrumentExposure(instrument_id=other.id, long_qty=1.0, short_qty=0.0, long_cost=10.0, short_cost=0.0),
+    ])
+    db.session.commit()
+
+    assert ExposureService.rebuild() == 1
+
+    assert _legs(instrument.id) == (2.0, 0.0, 200.0, 0.0)
+    # Zeroed, not deleted, so concurrent additive updates still find their row
+    assert _legs(other.id) == FLAT
+    assert InstrumentExposure.query.count() == 2
+
+
+def test_admin_status_change_updates_the_book(app, book, auth_headers):
+    uc, instrument = book
+    ExposureService.apply_delta(instrument.id, FLAT, position_legs('LONG', 2.0, 100.0))
+    db.session.commit()
+    admin = User(email='admin@x.ma', password_hash='x', role='admin')
+    db.session.add(admin)
+    db.session.commit()
+
+    response = app.test_client().post(f'/api/v1/admin/user-challenges/{uc.id}/status',
+                                     json={'status': 'FAILED'}, headers=auth_headers(admin.id))
+
+    assert response.status_code == 200
+    assert _legs(instrument.id) == FLAT
+
+
+@pytest.mark.parametrize('status', ['FAILED', 'PASSED'])
+def test_inactive_challenge_cannot_trade(book, quotes, status):
+    uc, instrument = book
+    uc.status = status
+    db.session.commit()
+
+    with pytest.raises(ValueError, match='not in progress'):
+        ChallengeService().execute_trade(uc.id, instrument.id, 'BUY', 1.0)
+
+    assert Trade.query.count() == 0
+    assert _legs(instrument.id) is None
@@ -0,0 +1,160 @@
+from unittest.mock import patch
+import pytest
+from app import db
+from app.models import User, Challenge, Instrument, UserChallenge, Trade, Order
+from app.services.challenge_service import ChallengeService
+from app.services.order_service import OrderService
+from app.utils.idempotency import IdempotencyStore, MemoryIdempotencyBackend, IN_FLIGHT, idempotency_store
+
+
+def test_reserve_complete_replay():
+    """Test that a completed key is returned instead of being claimed again."""
+    store = IdempotencyStore()
+
+    assert store.reserve('u1:k1') == (True, None)
+    assert store.reserve('u1:k1') == (False, IN_FLIGHT)
+
+    store.complete('u1:k1', {'status': 200, 'body': '{}'})
+    claimed, record = store.reserve('u1:k1')
+    assert claimed is False
+    assert record['status'] == 200
+
+
+def test_release_allows_retry():
+    """Test that a released key can be claimed again."""
+    store = IdempotencyStore()
+    store.reserve('u1:k1')
+    store.release('u1:k1')
+
+    assert store.reserve('u1:k1') == (True, None)
+
+
+def test_memory_backend_ttl_and_bound():
+    """Test that entries expire and the oldest completed record is evicted beyond the bound."""
+    backend = MemoryIdempotencyBackend(max_entries=2)
+
+    backend.reserve('a', ttl=0)
+    assert backend.reserve('a', ttl=60) == (True, None)
+
+    backend.store('a', {'status': 200}, ttl=60)
+    backend.store('b', {'status': 200}, ttl=60)
+    backend.reserve('c', ttl=60)
+    assert backend.reserve('a', ttl=60) == (True, None)
+
+
+def test_memory_backend_keeps_in_flight_keys():
+    """Test that eviction never drops a reservation whose request is still running."""
+    backend = MemoryIdempotencyBackend(max_entries=2)
+
+    backend.reserve('a', ttl=60)
+    backend.reserve('b', ttl=60)
+    backend.reserve('c', ttl=60)
+
+    assert backend.reserve('a', ttl=60) == (False, IN_FLIGHT)
+    assert backend.reserve('b', ttl=60) == (False, IN_FLIGHT)
+
+
+def test_reservation_uses_lock_lease():
+    """Test that a claimed key is held for the short lease and completed for the full TTL."""
+    store = IdempotencyStore()
+    store.lock_ttl = 0
+
+    store.reserve('u1:k1')
+    assert store.reserve('u1:k1') == (True, None)
+
+    store.complete('u1:k1', {'status': 200})
+    assert store.reserve('u1:k1') == (False, {'status': 200})
+
+
+@pytest.fixture
+def client(app, quotes, auth_headers, make_user_challenge):
+    user = User(email='retry@x.ma', password_hash='x')
+    challenge = Challenge(name='Starter', start_balance=10000.0)
+    instrument = Instrument(asset_class='CRYPTO', display_symbol='BTC', provider='BINANCE',
+                            provider_symbol='BTCUSDT', currency='USDT')
+    db.session.add_all([user, challenge, instrument])
+    db.session.flush()
+    uc = make_user_challenge(user.id, challenge.id)
+    db.session.add(uc)
+    db.session.commit()
+    return app.test_client(), user.id, auth_headers(user.id), uc.id, challenge.id, instrument.id
+
+
+def _requests(uc_id, challenge_id, instrument_id):
+    """(path, body, alternative body, model created by the endpoint) for each idempotent endpoint."""
+    return [
+        (f'/api/v1/challenges/{uc_id}/trade',
+         {'instrument_id': instrument_id, 'side': 'BUY', 'qty': 1},
+         {'instrument_id': instrument_id, 'side': 'BUY', 'qty': 2}, Trade),
+        (f'/api/v1/challenges/{uc_id}/orders',
+         {'instrument_id': instrument_id, 'side': 'BUY', 'order_type': 'LIMIT', 'qty': 1, 'limit_price': 90},
+         {'instrument_id': instrument_id, 'side': 'BUY', 'order_type': 'LIMIT', 'qty': 1, 'limit_price': 80}, Order),
+        ('/api/v1/challenges/start', {'challenge_id': challenge_id}, {'challenge_id': challenge_id + 1},
+         UserChallenge),
+    ]
+
+
+@pytest.mark.parametrize('endpoint', range(3), ids=['trade', 'orders', 'start'])
+def test_retry_replays_response(client, endpoint):
+    test_client, _, headers, uc_id, challenge_id, instrument_id = client
+    path, body, _, model = _requests(uc_id, challenge_id, instrument_id)[endpoint]
+    headers = {**headers, 'Idempotency-Key': 'k1'}
+    before = model.query.count()
+
+    first = test_client.post(path, json=body, headers=headers)
+    retry = test_client.post(path, json=body, headers=headers)
+
+    assert first.status_code in (200, 201), first.get_json()
+    assert retry.status_code == first.status_code
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+    assert retry.get_json() == first.get_json()
+    assert model.query.count() == before + 1
+
+
+@pytest.mark.parametrize('endpoint', range(3), ids=['trade', 'orders', 'start'])
+def test_key_reused_with_different_body(client, endpoint):
+    test_client, _, headers, uc_id, challenge_id, instrument_id = client
+    path, body, other, model = _requests(uc_id, challenge_id, instrument_id)[endpoint]
+    headers = {**headers, 'Idempotency-Key': 'k1'}
+    before = model.query.count()
+
+    test_client.post(path, json=body, headers=headers)
+    response = test_client.post(path, json=other, headers=headers)
+
+    assert response.status_code == 422
+    assert model.query.count() == before + 1
+
+
+@pytest.mark.parametrize('endpoint', range(3), ids=['trade', 'orders', 'start'])
+def test_duplicate_while_in_flight(client, endpoint):
+    test_client, user_id, headers, uc_id, challenge_id, instrument_id = client
+    path, body, _, model = _requests(uc_id, challenge_id, instrument_id)[endpoint]
+    before = model.query.count()
+    # The first request holds the key while it runs
+    assert idempotency_store.reserve(f'{user_id}:POST:{path}:k1') == (True, None)
+
+    response = test_client.post(path, json=body, headers={**headers, 'Idempotency-Key': 'k1'})
+
+    assert response.status_code == 409
+    assert model.query.count() == before
+
+
+@pytest.mark.parametrize('endpoint,target', [
+    (0, (ChallengeService, 'execute_trade')),
+    (1, (OrderService, 'place_order')),
+    (2, (ChallengeService, 'start_challenge')),
+], ids=['trade', 'orders', 'start'])
+def test_server_error_releases_key(client, endpoint, target):
+    test_client, _, headers, uc_id, challenge_id, instrument_id = client
+    path, body, _, model = _requests(uc_id, challenge_id, instrument_id)[endpoint]
+    headers = {**headers, 'Idempotency-Key': 'k1'}
+    before = model.query.count()
+
+    with patch.object(*target, side_effect=RuntimeError('database unavailable')):
+        failed = test_client.post(path, json=body, headers=headers)
+    retry = test_client.post(path, json=body, headers=headers)
+
+    assert failed.status_code == 500
+    assert retry.status_code in (200, 201), retry.get_json()
+    assert 'Idempotent-Replayed' not in retry.headers
+    assert model.query.count() == before + 1
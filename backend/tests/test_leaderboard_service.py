@@ -0,0 +1,125 @@
+from datetime import datetime, timedelta
+import pytest
+from app import db
+from app.models import User, Challenge, Instrument, Position, LeaderboardEntry
+from app.services.challenge_service import ChallengeService
+from app.services.leaderboard_service import (
+    LeaderboardService, compute_standings, months_between, next_month_start, previous_month_period, ALL_TIME
+)
+
+
+def test_months_follow_casablanca_calendar():
+    # 23:30 UTC on 31 Jan is already 1 Feb 00:30 in Casablanca (UTC+1)
+    assert months_between(datetime(2026, 1, 31, 23, 30), datetime(2026, 2, 2)) == ['2026-02']
+    assert months_between(datetime(2025, 11, 5), datetime(2026, 1, 3)) == ['2025-11', '2025-12', '2026-01']
+    assert next_month_start(datetime(2026, 1, 15)) == datetime(2026, 1, 31, 23, 0)
+    assert previous_month_period(datetime(2026, 1, 15)) == '2025-12'
+
+
+def test_best_challenge_per_user_and_period():
+    rows = [
+        (1, 7, 'amal@x.ma', 'FAILED', 10000.0, 9000.0, datetime(2026, 1, 10), datetime(2026, 2, 10)),
+        (2, 7, 'amal@x.ma', 'PASSED', 10000.0, 11200.0, datetime(2026, 2, 3), datetime(2026, 2, 20)),
+        (3, 8, 'omar@x.ma', 'PASSED', 5000.0, 5500.0, datetime(2026, 1, 3), datetime(2026, 1, 25)),
+        (4, 8, 'omar@x.ma', 'IN_PROGRESS', 5000.0, 9000.0, datetime(2026, 1, 3), None),
+    ]
+    standings = compute_standings(rows, now=datetime(2026, 3, 1))
+
+    assert set(standings) == {('2026-01', 7), ('2026-02', 7), ('2026-01', 8), (ALL_TIME, 7), (ALL_TIME, 8)}
+    assert standings[('2026-02', 7)]['user_challenge_id'] == 2
+    assert standings[('2026-01', 7)]['profit_pct'] == -0.1
+    assert standings[(ALL_TIME, 8)]['username'] == 'omar'
+
+
+def test_archived_month_pages_from_frozen_standings():
+    standings = [{'rank': rank, 'user_id': 10 + rank, 'profit_pct': 0.1 - rank / 100} for rank in range(1, 6)]
+    service = LeaderboardService()
+    LeaderboardService._archives['2020-01'] = (standings, {entry['user_id']: i for i, entry in enumerate(standings)})
+    try:
+        first, cursor = service.get_page('2020-01', limit=2)
+        second, cursor = service.get_page('2020-01', limit=2, cursor=cursor)
+        last, end = service.get_page('2020-01', limit=2, cursor=cursor)
+    finally:
+        LeaderboardService._archives.pop('2020-01')
+
+    assert [e['rank'] for e in first + second + last] == [1, 2, 3, 4, 5]
+    assert end is None
+
+
+@pytest.fixture
+def players(app, make_user_challenge):
+    """Five users with one finished challenge each, profits 1% to 5%."""
+    challenge = Challenge(name='Starter', start_balance=10000.0)
+    db.session.add(challenge)
+    db.session.flush()
+    start = datetime.utcnow() - timedelta(hours=1)
+    ucs = []
+    for i in range(1, 6):
+        user = User(email=f'player{i}@x.ma', password_hash='x')
+        db.session.add(user)
+        db.session.flush()
+        ucs.append(make_user_challenge(user.id, challenge.id, status='PASSED', current_equity=10000.0 + 100 * i,
+                                       start_time=start, end_time=start + timedelta(minutes=30)))
+    db.session.add_all(ucs)
+    db.session.commit()
+    return ucs
+
+
+def test_refresh_user_and_rebuild_write_the_same_rows(players):
+    for uc in players:
+        LeaderboardService.refresh_user(uc.user_id)
+    refreshed = sorted((e.period, e.user_id, e.profit_pct) for e in LeaderboardEntry.query.all())
+
+    assert LeaderboardService.rebuild() == len(refreshed)
+    assert sorted((e.period, e.user_id, e.profit_pct) for e in LeaderboardEntry.query.all()) == refreshed
+    # One month board and the all-time board per user
+    assert LeaderboardEntry.query.filter_by(period=ALL_TIME).count() == 5
+
+
+def test_keyset_pages_walk_the_board(players):
+    LeaderboardService.rebuild()
+    service = LeaderboardService()
+
+    first, cursor = service.get_page(ALL_TIME, limit=2)
+    second, cursor = service.get_page(ALL_TIME, limit=2, cursor=cursor)
+    last, end = service.get_page(ALL_TIME, limit=2, cursor=cursor)
+
+    entries = first + second + last
+    assert [e['rank'] for e in entries] == [1, 2, 3, 4, 5]
+    assert [e['user_id'] for e in entries] == [uc.user_id for uc in reversed(players)]
+    assert end is None
+
+
+def test_evaluation_that_fails_a_challenge_enters_the_board(app, make_user_challenge):
+    user = User(email='loser@x.ma', password_hash='x')
+    challenge = Challenge(name='Starter', start_balance=10000.0)
+    instrument = Instrument(asset_class='CRYPTO', display_symbol='BTC', provider='BINANCE',
+                            provider_symbol='BTCUSDT', currency='USDT')
+    db.session.add_all([user, challenge, instrument])
+    db.session.flush()
+    uc = make_user_challenge(user.id, challenge.id)
+    db.session.add(uc)
+    db.session.flush()
+    db.session.add(Position(user_challenge_id=uc.id, instrument_id=instrument.id, side='LONG',
+                            qty=10.0, avg_price=200.0, opened_at=datetime.utcnow()))
+    db.session.commit()
+    assert LeaderboardEntry.query.count() == 0
+
+    # Marked at 50 the position is down 1500, a 15% total drawdown
+    quote = {'bid': 49.9, 'ask': 50.1, 'last': 50.0, 'ts': 0}
+    ChallengeService().evaluate_challenge(uc, quotes={instrument.id: quote})
+
+    assert uc.status == 'FAILED'
+    entry = LeaderboardEntry.query.filter_by(user_id=user.id).one()
+    assert (entry.challenge_status, entry.profit_pct) == ('FAILED', pytest.approx(-0.15))
+
+
+def test_monthly_endpoints_reject_invalid_periods(app):
+    client = app.test_client()
+    for query in ('year=2026&month=0', 'year=2026&month=13', 'year=0&month=1', 'year=99999&month=1'):
+        assert client.get(f'/api/v1/leaderboard/monthly?{query}').status_code == 400, query
+        assert client.get(f'/api/v1/leaderboard/user-ranking?user_id=1&{query}').status_code == 400, query
+        assert client.get(f'/api/v1/leaderboard/percentile?profit_pct=0.05&{query}').status_code == 400, query
+
+    year, month = LeaderboardService.current_month()
+    assert client.get(f'/api/v1/leaderboard/monthly?year={year}&month={month}').status_code == 200
@@ -0,0 +1,70 @@
+import pytest
+from app.services.matching_engine import MatchingEngine, RestingOrder
+
+
+def make_order(order_id, side, order_type, qty=1.0, limit_price=None, stop_price=None):
+    return RestingOrder(
+        order_id=order_id,
+        user_challenge_id=1,
+        instrument_id=1,
+        side=side,
+        order_type=order_type,
+        qty=qty,
+        limit_price=limit_price,
+        stop_price=stop_price
+    )
+
+
+def test_limit_orders_fill_when_crossed():
+    """Test that limits fill at the quote once it crosses, best price first."""
+    engine = MatchingEngine()
+    engine.add(make_order(1, 'BUY', 'LIMIT', limit_price=99.0))
+    engine.add(make_order(2, 'BUY', 'LIMIT', limit_price=100.0))
+    engine.add(make_order(3, 'SELL', 'LIMIT', limit_price=105.0))
+
+    assert engine.on_quote(1, 101.0, 101.5) == []
+
+    events = engine.on_quote(1, 99.5, 99.8)
+    assert [(e.kind, e.order.order_id, e.price) for e in events] == [('FILL', 2, 99.8)]
+
+    events = engine.on_quote(1, 106.0, 106.2)
+    assert [(e.kind, e.order.order_id, e.price) for e in events] == [('FILL', 3, 106.0)]
+    assert len(engine) == 1
+
+
+def test_stop_and_stop_limit():
+    """Test that stops fill on trigger and stop-limits rest until their limit is reachable."""
+    engine = MatchingEngine()
+    engine.add(make_order(1, 'SELL', 'STOP', stop_price=95.0))
+    engine.add(make_order(2, 'SELL', 'STOP_LIMIT', stop_price=95.0, limit_price=94.0))
+
+    events = engine.on_quote(1, 93.0, 93.2)
+    assert [(e.kind, e.order.order_id) for e in events] == [('FILL', 1), ('TRIGGER', 2)]
+
+    # Triggered stop-limit now rests as a sell limit at 94
+    assert engine.on_quote(1, 93.5, 93.7) == []
+    events = engine.on_quote(1, 94.0, 94.2)
+    assert [(e.kind, e.order.order_id, e.price) for e in events] == [('FILL', 2, 94.0)]
+
+
+def test_cancel_is_skipped_on_match():
+    """Test that cancelled orders never fill."""
+    engine = MatchingEngine()
+    engine.add(make_order(1, 'BUY', 'LIMIT', limit_price=100.0))
+    engine.add(make_order(2, 'BUY', 'LIMIT', limit_price=100.0))
+
+    assert engine.cancel(1) is True
+    assert engine.cancel(1) is False
+
+    events = engine.on_quote(1, 99.0, 99.5)
+    assert [e.order.order_id for e in events] == [2]
+    assert len(engine) == 0
+
+
+def test_add_rejects_missing_prices():
+    """Test that orders without the prices their type needs are rejected."""
+    engine = MatchingEngine()
+    with pytest.raises(ValueError):
+        engine.add(make_order(1, 'BUY', 'LIMIT'))
+    with pytest.raises(ValueError):
+        engine.add(make_order(2, 'BUY', 'STOP_LIMIT', limit_price=100.0))
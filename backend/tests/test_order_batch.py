@@ -0,0 +1,110 @@
+"""
+/orders/batch: legs validated up front, one quote per instrument, all or
+nothing, and flatten_all.
+"""
+from datetime import datetime
+from unittest.mock import patch
+import pytest
+from app import db
+from app.models import User, Challenge, Instrument, Position, Trade
+from app.services.challenge_service import ChallengeService
+from app.services.trigger_index import trigger_index
+
+
+@pytest.fixture
+def client(app, quotes, auth_headers, make_user_challenge):
+    user = User(email='batch@x.ma', password_hash='x')
+    challenge = Challenge(name='Starter', start_balance=10000.0)
+    db.session.add_all([user, challenge])
+    db.session.flush()
+    uc = make_user_challenge(user.id, challenge.id)
+    db.session.add(uc)
+    instruments = []
+    for symbol in ('BTC', 'ETH', 'SOL'):
+        instrument = Instrument(asset_class='CRYPTO', display_symbol=symbol, provider='BINANCE',
+                                provider_symbol=f'{symbol}USDT', currency='USDT')
+        db.session.add(instrument)
+        instruments.append(instrument)
+    db.session.flush()
+    # One open long on BTC with a stop-loss armed
+    position = Position(user_challenge_id=uc.id, instrument_id=instruments[0].id, side='LONG', qty=2.0,
+                        avg_price=90.0, stop_loss=80.0, opened_at=datetime.utcnow())
+    db.session.add(position)
+    db.session.commit()
+    position_id = position.id
+    trigger_index.arm(position_id, uc.id, instruments[0].id, 'LONG', 80.0, None)
+
+    yield app.test_client(), auth_headers(user.id), uc.id, [i.id for i in instruments], position_id
+    trigger_index.disarm(position_id)
+
+
+def _batch(test_client, headers, uc_id, **body):
+    return test_client.post(f'/api/v1/challenges/{uc_id}/orders/batch', json=body, headers=headers)
+
+
+def test_batch_quotes_each_instrument_once(client, quotes):
+    test_client, headers, uc_id, (btc, eth, _), _ = client
+    response = _batch(test_client, headers, uc_id, orders=[
+        {'instrument_id': eth, 'side': 'BUY', 'qty': 1},
+        {'instrument_id': eth, 'side': 'BUY', 'qty': 2},
+        {'instrument_id': btc, 'side': 'SELL', 'qty': 1},
+    ])
+
+    assert response.status_code == 200, response.get_json()
+    assert len(response.get_json()['trades']) == 3
+    # Pricing and the evaluation share one snapshot (BTC is also the open position)
+    assert sorted(quotes.calls) == ['BTCUSDT', 'ETHUSDT']
+
+
+def test_batch_is_all_or_nothing(client):
+    test_client, headers, uc_id, (btc, eth, sol), position_id = client
+    apply_fill = ChallengeService._apply_fill
+    applied = []
+
+    def failing_apply_fill(self, *args):
+        applied.append(args)
+        if len(applied) == 3:
+            raise ValueError('leg 3 failed')
+        return apply_fill(self, *args)
+
+    with patch.object(ChallengeService, '_apply_fill', failing_apply_fill):
+        response = _batch(test_client, headers, uc_id, orders=[
+            {'instrument_id': btc, 'side': 'SELL', 'qty': 2},  # closes the protected long
+            {'instrument_id': eth, 'side': 'BUY', 'qty': 1},
+            {'instrument_id': sol, 'side': 'BUY', 'qty': 1},
+        ])
+
+    assert response.status_code == 400
+    db.session.remove()
+    assert Trade.query.count() == 0
+    assert [p.id for p in Position.query.all()] == [position_id]
+    # The close rolled back, so the stop-loss stays armed
+    assert position_id in trigger_index
+
+
+def test_committed_close_disarms(client):
+    test_client, headers, uc_id, (btc, _, _), position_id = client
+    response = _batch(test_client, headers, uc_id, orders=[{'instrument_id': btc, 'side': 'SELL', 'qty': 2}])
+
+    assert response.status_code == 200, response.get_json()
+    assert position_id not in trigger_index
+
+
+def test_flatten_all_closes_every_position(client):
+    test_client, headers, uc_id, (_, eth, _), _ = client
+    assert _batch(test_client, headers, uc_id, orders=[{'instrument_id': eth, 'side': 'BUY', 'qty': 1}]).status_code == 200
+
+    response = _batch(test_client, headers, uc_id, flatten_all=True)
+
+    assert response.status_code == 200, response.get_json()
+    assert sorted(trade['side'] for trade in response.get_json()['trades']) == ['SELL', 'SELL']
+    db.session.remove()
+    assert Position.query.count() == 0
+
+
+@pytest.mark.parametrize('orders', [['BUY'], [None], [{'instrument_id': 1, 'side': 'BUY', 'qty': [1]}]])
+def test_malformed_legs_are_rejected(client, orders):
+    test_client, headers, uc_id, _, _ = client
+    response = _batch(test_client, headers, uc_id, orders=orders)
+    assert response.status_code == 400
+    assert 'Order 0' in response.get_json()['error']
@@ -0,0 +1,88 @@
+"""
+Resting order persistence: events are acknowledged only once persisted,
+the engine is reconciled with the orders table by status, and requests do
+not drain the fill queue.
+"""
+import pytest
+from sqlalchemy import update
+from app import db
+from app.models import User, Challenge, Instrument, Order
+from app.services.matching_engine import MatchingEngine
+from app.services.order_service import OrderService
+
+
+@pytest.fixture
+def book(app, quotes, make_user_challenge):
+    user = User(email='orders@x.ma', password_hash='x')
+    challenge = Challenge(name='Starter', start_balance=10000.0)
+    instrument = Instrument(asset_class='CRYPTO', display_symbol='BTC', provider='BINANCE',
+                            provider_symbol='BTCUSDT', currency='USDT')
+    db.session.add_all([user, challenge, instrument])
+    db.session.flush()
+    uc = make_user_challenge(user.id, challenge.id)
+    db.session.add(uc)
+    db.session.commit()
+    service = OrderService(MatchingEngine())
+    return service, uc, instrument
+
+
+def _cross(service, price=95.0):
+    service.on_quote('BINANCE', 'BTCUSDT', {'bid': price, 'ask': price, 'last': price})
+
+
+def test_fill_is_acknowledged_after_it_is_persisted(book):
+    service, uc, instrument = book
+    order = service.place_order(uc, instrument.id, 'BUY', 'LIMIT', 1.0, limit_price=99.0)
+
+    _cross(service)
+    assert len(service._pending) == 1 and order.id not in service.engine
+
+    assert service.process_pending() == 1
+    assert not service._pending
+    assert db.session.get(Order, order.id).status == 'FILLED'
+
+
+def test_failed_persist_is_reloaded_by_status(book, monkeypatch):
+    service, uc, instrument = book
+    order = service.place_order(uc, instrument.id, 'BUY', 'LIMIT', 1.0, limit_price=99.0)
+    service.sync_open_orders(force=True)
+
+    def broken_fill(event):
+        raise RuntimeError('database went away')
+
+    monkeypatch.setattr(service, '_fill', broken_fill)
+    _cross(service)
+    # An in-flight order is not reloaded while its event is still queued
+    assert service.sync_open_orders(force=True) == 0
+
+    assert service.process_pending() == 0
+    assert not service._pending
+    assert db.session.get(Order, order.id).status == 'OPEN'
+
+    # The order is still open in the database, so the next sync puts it back
+    assert service.sync_open_orders(force=True) == 1
+    assert order.id in service.engine
+
+
+def test_sync_drops_orders_closed_elsewhere(book):
+    service, uc, instrument = book
+    order = service.place_order(uc, instrument.id, 'SELL', 'STOP', 1.0, stop_price=90.0)
+    service.sync_open_orders(force=True)
+
+    # Cancelled through another worker process
+    db.session.execute(update(Order).where(Order.id == order.id).values(status='CANCELLED'))
+    db.session.commit()
+
+    assert service.sync_open_orders(force=True) == 1
+    assert order.id not in service.engine
+
+
+def test_requests_do_not_drain_fills(app, book, auth_headers):
+    service, uc, instrument = book
+    service.init_app(app)
+    service.place_order(uc, instrument.id, 'BUY', 'LIMIT', 1.0, limit_price=99.0)
+    _cross(service)
+
+    app.test_client().get('/api/v1/challenges', headers=auth_headers(uc.user_id))
+
+    assert len(service._pending) == 1
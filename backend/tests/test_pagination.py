@@ -0,0 +1,189 @@
+import pytest
+from datetime import datetime
+from app.utils.pagination import encode_cursor, decode_cursor
+
+
+def test_cursor_round_trip():
+    """Test that a (created_at, id) cursor decodes to the same values."""
+    ts = datetime(2024, 3, 1, 12, 30, 15, 123456)
+
+    cursor = encode_cursor([ts, 42])
+
+    assert decode_cursor(cursor) == [ts, 42]
+
+
+def test_cursor_is_url_safe():
+    """Test that cursors can be passed as query parameters unescaped."""
+    cursor = encode_cursor([datetime(2024, 3, 1), 10 ** 12])
+
+    assert all(ch.isalnum() or ch in '-_' for ch in cursor)
+
+
+def test_invalid_cursor_raises_value_error():
+    """Test that garbage cursors surface as ValueError (HTTP 400)."""
+    with pytest.raises(ValueError):
+        decode_cursor('not-a-cursor')
+
+
+def test_keyset_pages_with_mixed_tiebreak_direction():
+    """Test best-first pages with ascending ids on ties walk every row once."""
+    from sqlalchemy import create_engine, Column, Integer, Float
+    from sqlalchemy.orm import declarative_base, Session
+    from app.utils.pagination import keyset_paginate
+
+    Base = declarative_base()
+
+    class Row(Base):
+        __tablename__ = 'rows'
+        id = Column(Integer, primary_key=True)
+        score = Column(Float)
+
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add_all([Row(id=i, score=float(i % 4)) for i in range(1, 12)])
+        session.commit()
+
+        seen, cursor = [], None
+        while True:
+            rows, cursor = keyset_paginate(session.query(Row), Row.score, Row.id, 3, cursor,
+                                           descending=True, id_descending=False)
+            seen.extend((row.score, row.id) for row in rows)
+            if cursor is None:
+                break
+
+    assert seen == sorted(((float(i % 4), i) for i in range(1, 12)), key=lambda r: (-r[0], r[1]))
+
+
+def _score_rows(count, score=lambda i: float(i % 4)):
+    from sqlalchemy import create_engine, Column, Integer, Float
+    from sqlalchemy.orm import declarative_base, Session
+
+    Base = declarative_base()
+
+    class Row(Base):
+        __tablename__ = 'rows'
+        id = Column(Integer, primary_key=True)
+        score = Column(Float)
+
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    session = Session(engine)
+    session.add_all([Row(id=i, score=score(i)) for i in range(1, count + 1)])
+    session.commit()
+    return session, Row
+
+
+def _walk(session, Row, limit):
+    from app.utils.pagination import keyset_paginate
+
+    pages, cursor = [], None
+    while True:
+        rows, cursor = keyset_paginate(session.query(Row), Row.score, Row.id, limit, cursor)
+        pages.append([row.id for row in rows])
+        if cursor is None:
+            return pages
+
+
+def test_exact_multiple_of_limit_has_no_empty_last_page():
+    """Test that the last full page already reports no next cursor."""
+    session, Row = _score_rows(6)
+
+    pages = _walk(session, Row, 3)
+
+    assert len(pages) == 2 and all(len(page) == 3 for page in pages)
+
+
+def test_empty_result_has_no_cursor():
+    """Test that an empty query returns no rows and no cursor."""
+    session, Row = _score_rows(0)
+
+    assert _walk(session, Row, 5) == [[]]
+
+
+def test_ties_across_page_boundary_are_not_skipped():
+    """Test that rows sharing a sort value split across pages are all returned once."""
+    session, Row = _score_rows(7, score=lambda i: 1.0)
+
+    pages = _walk(session, Row, 2)
+
+    assert [row for page in pages for row in page] == [7, 6, 5, 4, 3, 2, 1]
+
+
+def test_malformed_cursor_payloads_raise_value_error():
+    """Test that cursors of the wrong shape surface as ValueError (HTTP 400)."""
+    from app.utils.pagination import keyset_paginate
+
+    session, Row = _score_rows(3)
+    for cursor in (encode_cursor([1.0]), encode_cursor([1.0, 2, 3])):
+        with pytest.raises(ValueError):
+            keyset_paginate(session.query(Row), Row.score, Row.id, 2, cursor)
+
+    import base64
+    not_a_list = base64.urlsafe_b64encode(b'{"a":1}').decode('ascii')
+    with pytest.raises(ValueError):
+        decode_cursor(not_a_list)
+
+
+def test_page_args_are_validated_and_capped():
+    """Test limit parsing: non-positive or non-numeric is rejected, oversize is capped."""
+    from app.config import Config
+    from app.utils.pagination import parse_page_args
+
+    assert parse_page_args({}) == (Config.PAGE_SIZE_DEFAULT, None)
+    assert parse_page_args({'limit': str(Config.PAGE_SIZE_MAX + 1), 'cursor': 'abc'}) == (Config.PAGE_SIZE_MAX, 'abc')
+    for limit in ('0', '-5', 'ten'):
+        with pytest.raises(ValueError):
+            parse_page_args({'limit': limit})
+
+
+def test_trade_pages_report_the_full_total(app, auth_headers, make_user_challenge):
+    """Test that `total` counts every trade while `returned` is the page size."""
+    from app import db
+    from app.models import User, Challenge, Instrument, Trade
+
+    user = User(email='pages@x.ma', password_hash='x')
+    challenge = Challenge(name='Starter', start_balance=10000.0)
+    instrument = Instrument(asset_class='CRYPTO', display_symbol='BTC/USDT', provider='BINANCE',
+                            provider_symbol='BTCUSDT', currency='USDT')
+    db.session.add_all([user, challenge, instrument])
+    db.session.flush()
+    uc = make_user_challenge(user.id, challenge.id)
+    db.session.add(uc)
+    db.session.flush()
+    db.session.add_all([Trade(user_challenge_id=uc.id, instrument_id=instrument.id, side='BUY',
+                              qty=1.0, price=100.0) for _ in range(5)])
+    db.session.commit()
+
+    client = app.test_client()
+    path = f'/api/v1/challenges/{uc.id}/trades'
+    first = client.get(f'{path}?limit=3', headers=auth_headers(user.id)).get_json()
+    second = client.get(f"{path}?limit=3&cursor={first['next_cursor']}", headers=auth_headers(user.id)).get_json()
+
+    assert (first['total'], first['returned'], second['total'], second['returned']) == (5, 3, 5, 2)
+    assert second['next_cursor'] is None
+    assert client.get(f'{path}?cursor=garbage', headers=auth_headers(user.id)).status_code == 400
+
+
+def test_equity_history_range_is_bounded(app, auth_headers, make_user_challenge):
+    """Test that both equity history branches clamp a huge range and reject a negative one."""
+    from app import db
+    from app.config import Config
+    from app.models import User, Challenge
+
+    user = User(email='range@x.ma', password_hash='x')
+    challenge = Challenge(name='Starter', start_balance=10000.0)
+    db.session.add_all([user, challenge])
+    db.session.flush()
+    uc = make_user_challenge(user.id, challenge.id)
+    db.session.add(uc)
+    db.session.commit()
+
+    client = app.test_client()
+    path = f'/api/v1/challenges/{uc.id}/equity'
+    for query in ('range=20000000', 'range=20000000&limit=10'):
+        response = client.get(f'{path}?{query}', headers=auth_headers(user.id))
+        assert response.status_code == 200, response.get_json()
+        assert response.get_json()['range_hours'] == Config.EQUITY_RANGE_HOURS_MAX
+    for query in ('range=-1', 'range=-1&limit=10'):
+        assert client.get(f'{path}?{query}', headers=auth_headers(user.id)).status_code == 400
@@ -0,0 +1,135 @@
+import random
+from datetime import datetime, timedelta
+import pytest
+from app import db
+from app.models import User, Challenge, ProfitSketchBucket
+from app.services.leaderboard_service import ALL_TIME, months_between
+from app.services.percentile_service import PercentileService, ProfitSketch, challenge_periods
+
+
+def _sketch(values):
+    sketch = ProfitSketch()
+    for value in values:
+        sketch.add(value)
+    return sketch
+
+
+def test_quantiles_and_ranks_are_within_relative_accuracy():
+    rng = random.Random(7)
+    values = sorted(rng.uniform(-0.10, 0.25) for _ in range(5000))
+    sketch = _sketch(values)
+
+    for q in (0.1, 0.5, 0.9):
+        exact = values[int(q * (len(values) - 1))]
+        assert abs(sketch.quantile(q) - exact) <= abs(exact) * 0.03 + 1e-3
+    for value in (-0.05, 0.0, 0.08):
+        exact = sum(1 for v in values if v < value) / len(values)
+        assert abs(sketch.rank(value) - exact) < 0.01
+    assert len(sketch.buckets) < 500
+
+
+def test_removal_merge_and_round_trip():
+    tier_a = _sketch([0.01, 0.02, 0.05])
+    tier_b = _sketch([-0.03, 0.20])
+    tier_a.add(0.02, -1.0)  # the challenge moved from 2% to 12%
+    tier_a.add(0.12)
+
+    merged = ProfitSketch()
+    merged.merge(tier_a)
+    merged.merge(tier_b)
+    assert merged.count == 5
+    assert merged.rank(-0.5) == 0.0
+    assert merged.rank(1.0) == 1.0
+    assert merged.rank(0.05) == 0.5  # two below, one in its bucket
+
+    restored = ProfitSketch.from_dict(merged.to_dict())
+    assert restored.buckets == merged.buckets
+    assert abs(restored.quantile(0.5) - 0.05) < 0.001
+
+
+def test_challenge_periods():
+    assert challenge_periods(datetime(2026, 1, 20), datetime(2026, 3, 2)) == ['2026-01', '2026-02', '2026-03', 'all']
+    assert challenge_periods(None, None) == ['all']
+
+
+@pytest.fixture
+def uc(app, make_user_challenge):
+    """A challenge started 40 days ago, so it spans at least two months."""
+    user = User(email='sketch@x.ma', password_hash='x')
+    challenge = Challenge(name='Starter', start_balance=10000.0)
+    db.session.add_all([user, challenge])
+    db.session.flush()
+    uc = make_user_challenge(user.id, challenge.id, start_time=datetime.utcnow() - timedelta(days=40))
+    db.session.add(uc)
+    db.session.commit()
+    return uc
+
+
+def _counts(uc):
+    return {(row.period, (row.sign, row.bucket)): row.count
+            for row in ProfitSketchBucket.query.filter_by(challenge_id=uc.challenge_id) if row.count}
+
+
+def test_deltas_are_written_only_after_commit(uc):
+    service = PercentileService()
+    service.on_equity_change(uc, None, 10500.0)
+    db.session.rollback()
+    assert service.flush() == 0
+
+    service.on_equity_change(uc, None, 10500.0)
+    db.session.commit()
+    assert ProfitSketchBucket.query.count() == 0
+    service.flush()
+
+    key = ProfitSketch.key(0.05)
+    assert _counts(uc) == {(period, key): 1.0 for period in challenge_periods(uc.start_time, None)}
+
+
+def test_new_month_adds_without_removing(uc):
+    service = PercentileService()
+    months = months_between(uc.start_time, datetime.utcnow())
+    # Counted while only the first month was open
+    uc.sketch_period = months[0]
+    old, new = ProfitSketch.key(0.0), ProfitSketch.key(0.05)
+    db.session.add_all([ProfitSketchBucket(period=period, challenge_id=uc.challenge_id, sign=old[0],
+                                           bucket=old[1], count=1.0) for period in (months[0], ALL_TIME)])
+    db.session.commit()
+
+    service.on_equity_change(uc, 10000.0, 10500.0)
+    db.session.commit()
+    service.flush()
+
+    # Months the challenge was never counted in get the new value only, never a -1
+    assert _counts(uc) == {(period, new): 1.0 for period in months + [ALL_TIME]}
+    assert uc.sketch_period == months[-1]
+
+
+def test_rebuild_reconciles_buckets_in_place(uc):
+    service = PercentileService()
+    stale = ProfitSketch.key(-0.5)
+    db.session.add(ProfitSketchBucket(period=ALL_TIME, challenge_id=uc.challenge_id,
+                                      sign=stale[0], bucket=stale[1], count=3.0))
+    db.session.commit()
+
+    periods = challenge_periods(uc.start_time, None)
+    assert service.rebuild() == len(periods)
+
+    assert _counts(uc) == {(period, ProfitSketch.key(0.0)): 1.0 for period in periods}
+    # The stale bucket is zeroed, not deleted
+    assert ProfitSketchBucket.query.filter_by(sign=stale[0], bucket=stale[1]).one().count == 0.0
+    assert uc.sketch_period == periods[-2]
+
+
+def test_change_during_a_reload_is_kept():
+    service = PercentileService()
+    service.ttl = 0.0  # every read reloads
+    key = ProfitSketch.key(0.05)
+
+    def load(period):
+        # Another thread commits a challenge moving into the 5% bucket while this one reads the table
+        service._queue({(period, 1, key): 1.0})
+        return [(1, key[0], key[1], 2.0)]
+
+    service._load = load
+    assert service.percentile(0.05, ALL_TIME, 1)['count'] == 3
+    assert not service._journals
@@ -0,0 +1,98 @@
+import pytest
+from app import db
+from app.models import User, Challenge, Instrument
+from app.api.v1.challenge_bp import challenge_service
+from app.services.market_data_service import MarketDataService
+from app.services.pretrade_service import PortfolioState, apply_fill, simulate_order
+from app.services.rule_engine import RuleSet, TotalLossRule, TrailingDrawdownRule, ProfitTargetRule
+
+
+def _state(**overrides):
+    values = dict(user_challenge_id=1, user_id=1, status='IN_PROGRESS', start_balance=10000.0,
+                  daily_start_equity=10000.0, min_equity_today=10000.0, min_equity_all_time=10000.0,
+                  max_equity=10000.0, daily_max_loss=0.05, total_max_loss=0.10, profit_target=0.10,
+                  max_trade_quantity=None)
+    values.update(overrides)
+    return PortfolioState(**values)
+
+
+def test_apply_fill_add_reduce_reverse():
+    book, realized = apply_fill({}, 1, 'BUY', 2.0, 100.0)
+    book, realized = apply_fill(book, 1, 'BUY', 2.0, 110.0)
+    assert book[1] == ('LONG', 4.0, 105.0)
+
+    book, realized = apply_fill(book, 1, 'SELL', 1.0, 115.0)
+    assert book[1] == ('LONG', 3.0, 105.0) and realized == pytest.approx(10.0)
+
+    book, realized = apply_fill(book, 1, 'SELL', 5.0, 100.0)
+    assert book[1] == ('SHORT', 2.0, 100.0) and realized == pytest.approx(-15.0)
+
+    book, _ = apply_fill(book, 1, 'BUY', 2.0, 90.0)
+    assert 1 not in book
+
+
+def test_simulation_does_not_mutate_state():
+    state = _state(positions={1: ('LONG', 1.0, 100.0)})
+    result = simulate_order(state, 1, 'BUY', 1.0, 101.0, {1: 100.0})
+
+    assert state.positions == {1: ('LONG', 1.0, 100.0)}
+    assert result['decision'] == 'OK'
+    assert result['equity_after'] == pytest.approx(9999.0)
+    assert result['position_after'] == {'side': 'LONG', 'qty': 2.0, 'avg_price': 100.5}
+
+
+def test_rejects_breach_and_warns_near_limit():
+    state = _state(min_equity_today=9700.0)
+
+    # Buying 10 at 100 marked at 40 loses 600 -> 6% daily drawdown
+    rejected = simulate_order(state, 1, 'BUY', 10.0, 100.0, {1: 40.0})
+    assert rejected['decision'] == 'REJECT'
+    assert rejected['reasons'][0]['rule'] == 'daily_max_loss'
+
+    # 430 loss -> 4.3% of a 5% limit, 14% headroom
+    warned = simulate_order(state, 1, 'BUY', 10.0, 100.0, {1: 57.0})
+    assert warned['decision'] == 'WARN'
+
+    limited = simulate_order(_state(max_trade_quantity=5.0), 1, 'BUY', 10.0, 100.0, {1: 100.0})
+    assert limited['decision'] == 'REJECT'
+    assert limited['reasons'][0]['rule'] == 'max_trade_quantity'
+
+
+def test_verdict_comes_from_the_compiled_rules():
+    # Template rules (e.g. from rules_json) override the state's column limits
+    rule_set = RuleSet(fail=[TotalLossRule(0.10), TrailingDrawdownRule(0.03)], targets=[ProfitTargetRule(0.02)])
+    state = _state(max_equity=11000.0, rule_set=rule_set)
+
+    # Marked at 60, buying 10 at 100 leaves equity at 9600: 12.7% below the high-water mark
+    rejected = simulate_order(state, 1, 'BUY', 10.0, 100.0, {1: 60.0})
+    assert [r['rule'] for r in rejected['reasons']] == ['trailing_drawdown']
+    assert rejected['reasons'][0]['message'] == rule_set.fail[1].message(rejected['trailing_drawdown'])
+
+    passing = simulate_order(_state(rule_set=rule_set, positions={1: ('LONG', 10.0, 100.0)}), 2, 'BUY', 1.0,
+                             100.0, {1: 125.0, 2: 100.0})
+    assert passing['decision'] == 'OK' and passing['would_pass'] is True
+
+
+def test_what_if_does_not_notify_quote_listeners(app, make_user_challenge, auth_headers, monkeypatch):
+    user = User(email='whatif@x.ma', password_hash='x')
+    challenge = Challenge(name='Starter', start_balance=10000.0)
+    instrument = Instrument(asset_class='CRYPTO', display_symbol='BTC', provider='BINANCE',
+                            provider_symbol='BTCUSDT', currency='USDT')
+    db.session.add_all([user, challenge, instrument])
+    db.session.flush()
+    uc = make_user_challenge(user.id, challenge.id)
+    db.session.add(uc)
+    db.session.commit()
+
+    served = []
+    monkeypatch.setattr(MarketDataService, '_quote_listeners', [lambda *args: served.append(args)])
+    challenge_service.market_data_service.cache.set(
+        'quote_BINANCE_BTCUSDT', {'bid': 99.9, 'ask': 100.1, 'last': 100.0, 'ts': 0}, 60)
+
+    response = app.test_client().post(f'/api/v1/challenges/{uc.id}/what-if', headers=auth_headers(user.id),
+                                      json={'instrument_id': instrument.id, 'side': 'BUY', 'qty': 1.0})
+
+    assert response.status_code == 200
+    assert response.get_json()['fill_price'] == pytest.approx(100.1)
+    # A simulation must not trigger resting orders or SL/TP
+    assert served == []
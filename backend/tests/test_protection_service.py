@@ -0,0 +1,75 @@
+"""
+Stop-loss / take-profit closes: the claim stamps updated_at for other
+workers' syncs, and a close that rolls back re-arms the position.
+"""
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import pytest
+from app import db
+from app.models import User, Challenge, Instrument, Position
+from app.services.protection_service import ProtectionService
+from app.services.trigger_index import TriggerIndex
+
+
+@pytest.fixture
+def protected(app, make_user_challenge):
+    user = User(email='protect@x.ma', password_hash='x')
+    challenge = Challenge(name='Starter', start_balance=10000.0)
+    instrument = Instrument(asset_class='CRYPTO', display_symbol='BTC', provider='BINANCE',
+                            provider_symbol='BTCUSDT', currency='USDT')
+    db.session.add_all([user, challenge, instrument])
+    db.session.flush()
+    uc = make_user_challenge(user.id, challenge.id)
+    db.session.add(uc)
+    db.session.flush()
+    position = Position(user_challenge_id=uc.id, instrument_id=instrument.id, side='LONG', qty=1.0,
+                        avg_price=100.0, stop_loss=95.0, take_profit=120.0, opened_at=datetime.utcnow(),
+                        updated_at=datetime.utcnow() - timedelta(hours=1))
+    db.session.add(position)
+    db.session.commit()
+
+    service = ProtectionService(index=TriggerIndex())
+    service.index.register_instrument(instrument.id, 'BINANCE', 'BTCUSDT')
+    service.index.arm(position.id, uc.id, instrument.id, 'LONG', 95.0, 120.0)
+    return service, position.id
+
+
+def _trade_stub(service, execute_trade):
+    service._challenge_service = SimpleNamespace(execute_trade=execute_trade)
+
+
+def _cross(service, price=94.0):
+    service.on_quote('BINANCE', 'BTCUSDT', {'bid': price, 'ask': price, 'last': price})
+
+
+def test_claim_stamps_updated_at(protected):
+    service, position_id = protected
+    before = db.session.get(Position, position_id).updated_at
+    _trade_stub(service, lambda *args, **kwargs: None)
+
+    _cross(service)
+    assert service.process_pending() == 1
+
+    position = db.session.get(Position, position_id)
+    assert position.stop_loss is None and position.take_profit is None
+    assert position.updated_at > before
+
+
+def test_failed_close_rearms_the_position(protected):
+    service, position_id = protected
+
+    def broken_trade(*args, **kwargs):
+        raise ValueError('market closed')
+
+    _trade_stub(service, broken_trade)
+    _cross(service)
+    assert position_id not in service.index
+
+    assert service.process_pending() == 0
+    assert not service._pending
+    position = db.session.get(Position, position_id)
+    assert (position.stop_loss, position.take_profit) == (95.0, 120.0)
+    # Armed again, so the next crossing quote fires it
+    assert position_id in service.index
+    _cross(service)
+    assert len(service._pending) == 1
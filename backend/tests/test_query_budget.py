@@ -0,0 +1,63 @@
+"""
+Query-count budgets of the dashboard's challenge endpoints.
+
+The app runs against an in-memory SQLite database; each endpoint must run
+a fixed number of statements however many challenges or positions the
+user has (no N+1).
+"""
+import pytest
+from app import db
+from app.models import User, Instrument, Challenge, UserChallenge, Position
+from app.utils.query_budget import query_budget
+
+
+@pytest.fixture
+def client(app, quotes, auth_headers, make_user_challenge):
+    user = User(email='budget@x.ma', password_hash='x')
+    challenge = Challenge(name='Starter', start_balance=10000.0)
+    db.session.add_all([user, challenge])
+    db.session.flush()
+    for i in range(5):
+        db.session.add(make_user_challenge(user.id, challenge.id, 'IN_PROGRESS' if i % 2 == 0 else 'FAILED'))
+    db.session.flush()
+    uc = UserChallenge.query.order_by(UserChallenge.id.desc()).first()
+    # The last challenge holds a position in each of five instruments
+    for i in range(5):
+        instrument = Instrument(asset_class='CRYPTO', display_symbol=f'C{i}', provider='BINANCE',
+                                provider_symbol=f'C{i}USDT', currency='USDT')
+        db.session.add(instrument)
+        db.session.flush()
+        db.session.add(Position(user_challenge_id=uc.id, instrument_id=instrument.id, side='LONG',
+                                qty=1.0, avg_price=90.0, opened_at=uc.created_at))
+    db.session.commit()
+    return app.test_client(), auth_headers(user.id), uc.id
+
+
+def _count(client, path, headers):
+    # Warm up first: one-off loads (open orders, armed triggers) and the
+    # writes of a changed equity are not what the budget is about
+    client.get(path, headers=headers)
+    db.session.remove()
+    with query_budget.count_queries() as counter:
+        response = client.get(path, headers=headers)
+    assert response.status_code == 200, response.get_json()
+    return counter.count, response.get_json()
+
+
+def test_my_challenges_is_one_query(client):
+    test_client, headers, _ = client
+    count, body = _count(test_client, '/api/v1/challenges/my', headers)
+
+    assert count <= 1
+    assert len(body['all_challenges']) == 5 and len(body['active_challenges']) == 3
+    assert all(data['challenge']['name'] == 'Starter' for data in body['all_challenges'])
+
+
+def test_challenge_detail_budget(client):
+    test_client, headers, uc_id = client
+    count, body = _count(test_client, f'/api/v1/challenges/{uc_id}', headers)
+
+    # ownership + template, positions + instruments, the evaluation write, reload after commit;
+    # the positions' instruments are not loaded one by one
+    assert count <= 4
+    assert body['user_challenge']['challenge']['name'] == 'Starter'
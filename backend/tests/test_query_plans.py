@@ -0,0 +1,116 @@
+"""
+Query-plan checks for the hot list and leaderboard queries.
+
+Each query is compiled for the target database and EXPLAINed against an
+empty schema built from the models; the plan must name the index meant to
+serve it. SQLite always runs; set TEST_POSTGRES_URL to also check Postgres
+(the tables are created in a throwaway schema and sequential scans are
+disabled, since an empty table would otherwise never use an index).
+"""
+import os
+from datetime import datetime
+import pytest
+from sqlalchemy import create_engine, select, or_, text
+from app import db
+from app.models import UserChallenge, User, Payment, LeaderboardEntry, TradingLeaderboardEntry
+
+POSTGRES_URL = os.environ.get('TEST_POSTGRES_URL')
+
+HOT_QUERIES = {
+    'leaderboard window': (
+        select(UserChallenge.id).where(
+            UserChallenge.status.in_(['PASSED', 'STOPPED', 'FAILED']),
+            UserChallenge.start_time <= datetime(2026, 3, 31),
+            or_(UserChallenge.end_time.is_(None), UserChallenge.end_time >= datetime(2026, 3, 1))
+        ),
+        {'ix_user_challenges_status_window'}
+    ),
+    'my active challenges': (
+        select(UserChallenge.id).where(
+            UserChallenge.user_id == 7, UserChallenge.status.in_(['IN_PROGRESS', 'ACTIVE'])
+        ).order_by(UserChallenge.created_at.desc()),
+        {'ix_user_challenges_user_status_created', 'ix_user_challenges_user_created'}
+    ),
+    'user challenges by date': (
+        select(UserChallenge.id).where(UserChallenge.user_id == 7).order_by(UserChallenge.created_at.desc()),
+        {'ix_user_challenges_user_created', 'ix_user_challenges_user_status_created'}
+    ),
+    'risk book of a template': (
+        select(UserChallenge.id).where(
+            UserChallenge.challenge_id == 3, UserChallenge.status.in_(['IN_PROGRESS', 'ACTIVE'])
+        ),
+        {'ix_user_challenges_challenge_status'}
+    ),
+    'admin users by date': (
+        select(User.id).order_by(User.created_at.desc()).limit(50),
+        {'ix_users_created'}
+    ),
+    'user payments': (
+        select(Payment.id).where(Payment.user_id == 7).order_by(Payment.created_at.desc()),
+        {'ix_payments_user_created'}
+    ),
+    'leaderboard page': (
+        select(LeaderboardEntry.user_id).where(
+            LeaderboardEntry.period == '2026-03',
+            or_(LeaderboardEntry.profit_pct < 0.05,
+                (LeaderboardEntry.profit_pct == 0.05) & (LeaderboardEntry.user_id > 9))
+        ).order_by(LeaderboardEntry.profit_pct.desc(), LeaderboardEntry.user_id).limit(20),
+        {'ix_leaderboard_entries_rank'}
+    ),
+    'instrument board page': (
+        select(TradingLeaderboardEntry.user_id).where(
+            TradingLeaderboardEntry.period == '2026-03',
+            TradingLeaderboardEntry.scope == 'instrument',
+            TradingLeaderboardEntry.scope_key == '1'
+        ).order_by(TradingLeaderboardEntry.realized_pnl.desc(), TradingLeaderboardEntry.user_id).limit(20),
+        {'ix_trading_leaderboard_entries_rank'}
+    ),
+}
+
+
+def _plan(conn, statement) -> str:
+    compiled = statement.compile(dialect=conn.dialect, compile_kwargs={'literal_binds': True})
+    prefix = 'EXPLAIN QUERY PLAN ' if conn.dialect.name == 'sqlite' else 'EXPLAIN '
+    return '\n'.join(str(row[-1]) for row in conn.execute(text(prefix + str(compiled))))
+
+
+def _assert_plans(conn):
+    for name, (statement, indexes) in HOT_QUERIES.items():
+        plan = _plan(conn, statement)
+        assert any(index in plan for index in indexes), f'{name} does not use {indexes}:\n{plan}'
+
+
+def test_sqlite_plans_use_indexes():
+    engine = create_engine('sqlite://')
+    db.metadata.create_all(engine)
+    with engine.connect() as conn:
+        _assert_plans(conn)
+
+
+@pytest.mark.skipif(not POSTGRES_URL, reason='TEST_POSTGRES_URL not set')
+def test_postgres_plans_use_indexes():
+    engine = create_engine(POSTGRES_URL)
+    schema = f'plan_check_{os.getpid()}'
+    with engine.begin() as conn:
+        conn.execute(text(f'CREATE SCHEMA {schema}'))
+    try:
+        with engine.connect() as conn:
+            conn.execute(text(f'SET search_path TO {schema}'))
+            db.metadata.create_all(conn)
+            conn.execute(text('SET enable_seqscan = off'))
+            _assert_plans(conn)
+            conn.rollback()
+    finally:
+        with engine.begin() as conn:
+            conn.execute(text(f'DROP SCHEMA {schema} CASCADE'))
+
+
+def test_every_model_index_is_migrated():
+    # db.create_all() does not add indexes to existing tables, so each declared
+    # db.Index needs a migration (column index=True ones came with their table)
+    from migrate_db import MIGRATIONS
+    statements = ' '.join(statement for _, statement in MIGRATIONS)
+    missing = [index.name for table in db.metadata.sorted_tables for index in table.indexes
+               if not index._column_flag
+               and f'CREATE INDEX IF NOT EXISTS {index.name} ON {table.name}(' not in statements]
+    assert missing == []
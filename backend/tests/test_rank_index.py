@@ -0,0 +1,74 @@
+import random
+from app.services.rank_index import RankIndex, LeaderboardRanks, rank_key
+
+
+def test_matches_sorted_list_under_churn():
+    rng = random.Random(7)
+    index, reference = RankIndex(seed=1), []
+    for step in range(2000):
+        if reference and rng.random() < 0.4:
+            key = reference.pop(rng.randrange(len(reference)))
+            index.remove(key)
+        else:
+            key = rank_key(step, round(rng.uniform(-0.2, 0.3), 3))
+            reference.append(key)
+            index.insert(key)
+        reference.sort()
+
+    assert len(index) == len(reference)
+    for position in rng.sample(range(len(reference)), 50):
+        assert index.rank(reference[position]) == position
+        assert index.at(position) == reference[position]
+    assert index.slice(10, 5) == reference[10:15]
+
+
+def test_ranks_best_profit_first_with_user_id_tiebreak():
+    index = RankIndex()
+    for user_id, profit in [(3, 0.10), (1, 0.25), (2, 0.10), (4, -0.05)]:
+        index.insert(rank_key(user_id, profit))
+
+    assert [user_id for _, user_id in index.slice(0, 4)] == [1, 2, 3, 4]
+    assert index.rank(rank_key(3, 0.10)) == 2
+
+
+def test_refresh_during_a_reload_is_kept():
+    ranks = LeaderboardRanks()
+    ranks.ttl = 0.0  # every read reloads
+
+    def load(period):
+        # Another thread refreshes user 2 while this one is reading the table
+        ranks.on_standings(2, {'all': 0.50})
+        return [(1, 0.20), (2, 0.10)]
+
+    ranks._load = load
+    assert ranks.rank('all', 2) == 1
+    assert not ranks._journals
+
+
+def test_readers_use_the_previous_index_during_a_reload():
+    ranks = LeaderboardRanks()
+    ranks._load = lambda period: [(1, 0.20), (2, 0.10)]
+    assert ranks.rank('all', 2) == 2
+
+    ranks.ttl = 0.0
+    seen = []
+
+    def load(period):
+        # A reader arriving mid-reload answers from the old index
+        seen.append(ranks.count('all'))
+        return [(1, 0.20), (2, 0.10), (3, 0.30)]
+
+    ranks._load = load
+    assert ranks.rank('all', 3) == 1
+    assert seen == [2]
+
+
+def test_unused_periods_are_evicted():
+    ranks = LeaderboardRanks()
+    ranks._load = lambda period: [(1, 0.20)]
+    ranks.count('2026-01')
+    ranks.count('2026-02')
+
+    ranks.ttl = 0.0  # both have expired; reading one drops the other
+    assert ranks.count('2026-02') == 1
+    assert list(ranks._periods) == ['2026-02']
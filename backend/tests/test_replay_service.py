@@ -0,0 +1,120 @@
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+from app import db
+from app.models import User, Challenge, Instrument, QuoteTick
+from app.services.challenge_service import ChallengeService
+from app.services.replay_service import ReplayInput, ReplayService, replay_challenge, rebuild_positions
+
+# 2024-01-15 10:00:00 UTC (11:00 in Casablanca)
+T0 = 1705312800.0
+
+
+def make_input(trades, tape, start_balance=10000.0, hours=2):
+    """trades: list of (ts_offset, instrument, side, qty, price); tape: {instrument: [(ts_offset, last)]}"""
+    return ReplayInput(
+        user_challenge_id=1,
+        start_balance=start_balance,
+        start_time=T0,
+        end_time=T0 + hours * 3600,
+        daily_max_loss=0.05,
+        total_max_loss=0.10,
+        profit_target=0.10,
+        trade_ids=np.arange(1, len(trades) + 1),
+        trade_ts=np.array([T0 + t[0] for t in trades], dtype=float),
+        trade_instrument=np.array([t[1] for t in trades]),
+        trade_side=np.array([1 if t[2] == 'BUY' else -1 for t in trades]),
+        trade_qty=np.array([t[3] for t in trades], dtype=float),
+        trade_price=np.array([t[4] for t in trades], dtype=float),
+        tape={
+            instrument: (np.array([T0 + t for t, _ in ticks], dtype=float), np.array([p for _, p in ticks], dtype=float))
+            for instrument, ticks in tape.items()
+        }
+    )
+
+
+def test_rebuild_positions_partial_close_and_reverse():
+    """Test position bookkeeping matches ChallengeService: partial close, then reverse."""
+    qty, avg, realized = rebuild_positions(
+        np.array([1, 1, 1]),
+        np.array([1, -1, -1]),
+        np.array([2.0, 1.0, 3.0]),
+        np.array([100.0, 110.0, 120.0])
+    )
+
+    assert list(qty) == [2.0, 1.0, -2.0]
+    assert list(avg) == [100.0, 100.0, 120.0]
+    assert list(realized) == [0.0, 10.0, 20.0]
+
+
+def test_replay_detects_first_breach():
+    """Test that the replay fails the challenge at the first tick breaching daily loss."""
+    inputs = make_input(
+        trades=[(60, 1, 'BUY', 10.0, 1000.0)],
+        tape={1: [(120, 990.0), (180, 949.0), (240, 1100.0)]}
+    )
+
+    result = replay_challenge(inputs)
+
+    assert result['status'] == 'FAILED'
+    assert result['reasons'][0]['rule'] == 'daily_max_loss'
+    assert result['min_equity_all_time'] == 10000.0 + 10 * (949.0 - 1000.0)
+    assert result['max_equity'] == 11000.0
+    assert result['positions'] == {1: {'side': 'LONG', 'qty': 10.0, 'avg_price': 1000.0}}
+
+
+def test_replay_marks_equity_like_live_evaluation():
+    """Test that realized PnL is reported per trade but equity is start balance + unrealized, as live."""
+    inputs = make_input(
+        trades=[(60, 1, 'BUY', 10.0, 1000.0), (300, 1, 'SELL', 10.0, 1101.0)],
+        tape={1: [(120, 1050.0), (240, 1100.0), (600, 900.0)]}
+    )
+
+    result = replay_challenge(inputs)
+
+    # Marked at 1100 while the position was open: the profit target was hit then
+    assert result['status'] == 'PASSED'
+    assert result['max_equity'] == 11000.0
+    assert result['realized_pnl'] == 1010.0
+    assert result['current_equity'] == 10000.0
+    assert result['positions'] == {}
+    assert result['trade_realized_pnl'] == {1: 0.0, 2: 1010.0}
+
+
+def test_replay_is_deterministic():
+    """Test that replaying the same inputs twice gives identical results."""
+    inputs = make_input(
+        trades=[(60, 1, 'BUY', 1.0, 100.0), (90, 2, 'SELL', 2.0, 50.0)],
+        tape={1: [(t, 100.0 + t / 100.0) for t in range(0, 7200, 7)], 2: [(t, 50.0 - t / 1000.0) for t in range(0, 7200, 11)]}
+    )
+
+    assert replay_challenge(inputs) == replay_challenge(inputs)
+
+
+def test_replay_matches_live_evaluation(app, quotes, make_user_challenge):
+    """Test that replaying a challenge gives the equity evaluate_challenge computed from the same trades."""
+    user = User(email='replay@x.ma', password_hash='x')
+    challenge = Challenge(name='Starter', start_balance=10000.0)
+    instrument = Instrument(asset_class='CRYPTO', display_symbol='BTC', provider='BINANCE',
+                            provider_symbol='BTCUSDT', currency='USDT')
+    db.session.add_all([user, challenge, instrument])
+    db.session.flush()
+    uc = make_user_challenge(user.id, challenge.id, start_time=datetime.utcnow() - timedelta(minutes=5))
+    db.session.add(uc)
+    db.session.commit()
+
+    service = ChallengeService()
+    quotes.prices['BTCUSDT'] = 100.0
+    service.execute_trade(uc.id, instrument.id, 'BUY', 3.0)
+    quotes.prices['BTCUSDT'] = 110.0
+    service.execute_trade(uc.id, instrument.id, 'SELL', 1.0)  # realizes a profit
+    quotes.prices['BTCUSDT'] = 120.0
+    service.evaluate_challenge(uc)
+    live_equity = uc.current_equity
+
+    db.session.add(QuoteTick(instrument_id=instrument.id, ts=datetime.utcnow(), last=120.0))
+    db.session.commit()
+    result, = ReplayService.run([uc.id], workers=1, until=datetime.utcnow() + timedelta(seconds=1))
+
+    assert result['current_equity'] == pytest.approx(live_equity)
+    assert result['positions'] == {instrument.id: {'side': 'LONG', 'qty': 2.0, 'avg_price': pytest.approx(100.1)}}
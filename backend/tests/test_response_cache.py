@@ -0,0 +1,52 @@
+import threading
+import time
+from app.utils.response_cache import ResponseCache
+
+
+def test_renders_once_per_invalidation():
+    """Test that a key is re-rendered only after its tag is invalidated."""
+    cache = ResponseCache()
+    renders = []
+
+    def render():
+        renders.append(1)
+        return {'body': str(len(renders)).encode(), 'etag': str(len(renders))}
+
+    assert cache.get_or_render('/monthly?', ('leaderboard',), render)['etag'] == '1'
+    assert cache.get_or_render('/monthly?', ('leaderboard',), render)['etag'] == '1'
+
+    cache.invalidate('other')
+    assert cache.get_or_render('/monthly?', ('leaderboard',), render)['etag'] == '1'
+
+    cache.invalidate('leaderboard')
+    assert cache.get_or_render('/monthly?', ('leaderboard',), render)['etag'] == '2'
+    assert cache.get_or_render('/monthly?', ('leaderboard',), lambda: None)['etag'] == '2'
+
+
+def test_concurrent_misses_render_once():
+    """Test that concurrent misses for one key share a single render."""
+    cache = ResponseCache()
+    renders = []
+
+    def slow_render():
+        renders.append(1)
+        time.sleep(0.05)
+        return {'body': b'{}', 'etag': 'x'}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_render('k', ('t',), slow_render)))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(renders) == 1
+    assert all(result['etag'] == 'x' for result in results)
+
+
+def test_uncacheable_render_is_not_stored():
+    """Test that a render returning None is retried by the next request."""
+    cache = ResponseCache()
+    assert cache.get_or_render('k', ('t',), lambda: None) is None
+    assert cache.get_or_render('k', ('t',), lambda: {'etag': 'y'})['etag'] == 'y'
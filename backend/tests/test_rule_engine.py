@@ -0,0 +1,75 @@
+from datetime import datetime
+from types import SimpleNamespace
+import pytest
+from app.services.rule_engine import RuleEngine, RuleContext, ThresholdRule, compile_rules
+
+
+def _challenge(rules_json=None, **overrides):
+    values = dict(id=1, updated_at=datetime(2026, 1, 1), daily_max_loss=0.05, total_max_loss=0.10,
+                  profit_target=0.10, max_trade_quantity=None, rules_json=rules_json)
+    values.update(overrides)
+    return SimpleNamespace(**values)
+
+
+def _context(equity, max_equity=10000.0, days=(), **metrics):
+    values = dict(daily_drawdown=0.0, total_drawdown=0.0, current_equity=equity,
+                  profit_pct=(equity - 10000.0) / 10000.0,
+                  trailing_drawdown=(max_equity - equity) / max_equity)
+    values.update(metrics)
+    return RuleContext(10000.0, values, lambda: len(days), lambda: list(days))
+
+
+def test_columns_and_overrides_compile():
+    rules = compile_rules(_challenge([
+        {'type': 'daily_max_loss', 'limit': 0.04},
+        {'type': 'trailing_drawdown', 'limit': 0.06},
+        {'type': 'bogus'},
+        {'type': 'consistency', 'max_day_share': 5},
+    ], max_trade_quantity=2))
+
+    assert rules.threshold('daily_max_loss') == 0.04
+    assert rules.threshold('total_max_loss') == 0.10
+    assert [r.type for r in rules.fail] == ['daily_max_loss', 'total_max_loss', 'trailing_drawdown']
+    assert rules.gates == []
+    assert rules.check_order(3.0)[0]['action'] == 'fail'
+
+
+def test_trailing_drawdown_and_gates():
+    rules = compile_rules(_challenge({'trailing_drawdown': {'limit': 0.05},
+                                      'min_trading_days': {'days': 3},
+                                      'consistency': {'max_day_share': 0.5}}))
+
+    status, reasons, _ = rules.evaluate(_context(10400.0, max_equity=11000.0))
+    assert status == 'FAILED' and reasons[0]['rule'] == 'trailing_drawdown'
+
+    status, _, pending = rules.evaluate(_context(11000.0, max_equity=11000.0, days=(900.0, 100.0)))
+    assert status == 'IN_PROGRESS'
+    assert {p['rule'] for p in pending} == {'min_trading_days', 'consistency'}
+
+    status, reasons, _ = rules.evaluate(_context(11000.0, max_equity=11000.0, days=(400.0, 300.0, 300.0)))
+    assert status == 'PASSED' and reasons[0]['rule'] == 'profit_target'
+
+
+def test_news_blackout_and_cache():
+    rules = compile_rules(_challenge([{'type': 'news_blackout', 'timezone': 'UTC',
+                                       'daily': ['13:25-13:35'],
+                                       'windows': [{'start': '2026-03-06T08:00:00Z', 'end': '2026-03-06T08:30:00Z'}]}]))
+
+    assert rules.check_order(1.0, datetime(2026, 3, 6, 8, 10))[0]['action'] == 'reject'
+    assert rules.check_order(1.0, datetime(2026, 3, 9, 13, 30))[0]['rule'] == 'news_blackout'
+    assert rules.check_order(1.0, datetime(2026, 3, 9, 9, 0)) == []
+
+    engine = RuleEngine()
+    challenge = _challenge()
+    first = engine.rule_set_for(challenge)
+    assert engine.rule_set_for(challenge) is first
+    challenge.updated_at = datetime(2026, 2, 1)
+    assert engine.rule_set_for(challenge) is not first
+
+
+def test_threshold_rules_must_describe_their_breach():
+    class Unfinished(ThresholdRule):
+        type, kind, metric = 'unfinished', 'fail', 'daily_drawdown'
+
+    with pytest.raises(TypeError):
+        Unfinished(0.05)
@@ -0,0 +1,34 @@
+"""
+Job scheduler: due jobs run in the leader process only.
+"""
+from datetime import datetime, timedelta
+from app.utils.scheduler import JobScheduler, every
+
+
+def _scheduler(app, runs):
+    scheduler = JobScheduler()
+    scheduler.app = app
+    scheduler.add_job('count', lambda: runs.append(1), every(60), run_now=True)
+    return scheduler
+
+
+def test_leader_runs_due_jobs(app):
+    runs = []
+    scheduler = _scheduler(app, runs)
+
+    # SQLite deployments are single-process: always the leader
+    assert scheduler.is_leader()
+    assert scheduler.run_pending() == 1
+    assert runs == [1]
+    # Not due again until the interval has passed
+    assert scheduler.run_pending() == 0
+
+
+def test_follower_skips_jobs_but_keeps_the_schedule(app, monkeypatch):
+    runs = []
+    scheduler = _scheduler(app, runs)
+    monkeypatch.setattr(scheduler, 'is_leader', lambda: False)
+
+    assert scheduler.run_pending() == 0
+    assert runs == []
+    assert scheduler._jobs[0].due_at > datetime.utcnow() + timedelta(seconds=30)
@@ -0,0 +1,125 @@
+from datetime import datetime
+import pytest
+from sqlalchemy import Update
+from app import db
+from app.models import User, Challenge, Instrument, Trade, TradingLeaderboardEntry
+from app.services.leaderboard_service import LeaderboardService, ALL_TIME, month_period
+from app.services.trading_leaderboard_service import (
+    TradingLeaderboardService, aggregate_trades, month_starts, INSTRUMENT, ASSET_CLASS
+)
+
+
+def test_rows_fold_into_instrument_asset_class_and_all_time_boards():
+    boards = aggregate_trades([
+        (7, 1, 'CRYPTO', '2026-02', 120.0, 3, 2, 1),
+        (7, 2, 'CRYPTO', '2026-03', -20.0, 2, 1, 0),
+        (8, 5, 'FX', '2026-03', 40.0, 1, 1, 1),
+    ])
+
+    assert boards[('2026-02', 'instrument', '1', 7)]['realized_pnl'] == 120.0
+    crypto = boards[('all', 'asset_class', 'CRYPTO', 7)]
+    assert crypto == {'realized_pnl': 100.0, 'trade_count': 5, 'closed_count': 3, 'win_count': 1}
+    assert ('2026-03', 'asset_class', 'CRYPTO', 8) not in boards
+    assert len(boards) == 11
+
+
+def test_month_starts_follow_casablanca_time():
+    starts = month_starts(datetime(2026, 4, 30, 23, 30), datetime(2026, 6, 5))
+    # 23:30 UTC on Apr 30 is already May in Casablanca (UTC+1)
+    assert [period for period, _ in starts] == ['2026-05', '2026-06']
+    assert starts[1][1] == datetime(2026, 5, 31, 23, 0)
+
+
+@pytest.fixture
+def traders(app, make_user_challenge):
+    """Three users, each with a challenge, and one BTC instrument."""
+    challenge = Challenge(name='Starter', start_balance=10000.0)
+    instrument = Instrument(asset_class='CRYPTO', display_symbol='BTC', provider='BINANCE',
+                            provider_symbol='BTCUSDT', currency='USDT')
+    db.session.add_all([challenge, instrument])
+    db.session.flush()
+    ucs = []
+    for i in range(3):
+        user = User(email=f'trader{i}@x.ma', password_hash='x')
+        db.session.add(user)
+        db.session.flush()
+        ucs.append(make_user_challenge(user.id, challenge.id))
+    db.session.add_all(ucs)
+    db.session.commit()
+    return ucs, instrument
+
+
+def _entry(period, scope, scope_key, user_id):
+    return db.session.get(TradingLeaderboardEntry, (period, scope, str(scope_key), user_id))
+
+
+def test_first_fill_creates_the_rows_and_later_fills_add(traders):
+    (uc, *_), instrument = traders
+    TradingLeaderboardService.on_fill(uc.id, instrument.id, 50.0)
+    TradingLeaderboardService.on_fill(uc.id, instrument.id, -20.0)
+    TradingLeaderboardService.on_fill(uc.id, instrument.id, 0.0)
+    db.session.commit()
+
+    month = month_period(*LeaderboardService.current_month())
+    for period in (month, ALL_TIME):
+        entry = _entry(period, INSTRUMENT, instrument.id, uc.user_id)
+        assert (entry.realized_pnl, entry.trade_count, entry.closed_count, entry.win_count) == (30.0, 3, 2, 1)
+    assert _entry(ALL_TIME, ASSET_CLASS, 'CRYPTO', uc.user_id).trade_count == 3
+
+
+def test_fill_racing_the_first_insert_retries_the_update(traders, monkeypatch):
+    (uc, *_), instrument = traders
+    TradingLeaderboardService.on_fill(uc.id, instrument.id, 10.0)
+    db.session.commit()
+
+    # The rows exist, but the first UPDATE misses them as if another worker
+    # inserted them just after it ran: the insert conflicts and is retried
+    execute, missed = db.session.execute, []
+
+    def racing_execute(statement, *args, **kwargs):
+        if isinstance(statement, Update) and not missed:
+            missed.append(statement)
+            return type('Result', (), {'rowcount': 0})()
+        return execute(statement, *args, **kwargs)
+
+    monkeypatch.setattr(db.session, 'execute', racing_execute)
+    TradingLeaderboardService.on_fill(uc.id, instrument.id, 5.0)
+    monkeypatch.undo()
+    db.session.commit()
+
+    month = month_period(*LeaderboardService.current_month())
+    entry = _entry(month, INSTRUMENT, instrument.id, uc.user_id)
+    assert missed and (entry.realized_pnl, entry.trade_count) == (15.0, 2)
+
+
+def test_rebuild_buckets_trades_by_casablanca_month(traders):
+    (uc, *_), instrument = traders
+    # 23:30 UTC on Jan 31 is already February in Casablanca
+    for created_at, pnl in [(datetime(2026, 1, 10), 10.0), (datetime(2026, 1, 31, 23, 30), 20.0),
+                            (datetime(2026, 3, 5), -5.0)]:
+        db.session.add(Trade(user_challenge_id=uc.id, instrument_id=instrument.id, side='SELL',
+                             qty=1.0, price=100.0, realized_pnl=pnl, created_at=created_at))
+    db.session.commit()
+
+    TradingLeaderboardService.rebuild()
+
+    assert _entry('2026-01', INSTRUMENT, instrument.id, uc.user_id).realized_pnl == 10.0
+    assert _entry('2026-02', INSTRUMENT, instrument.id, uc.user_id).realized_pnl == 20.0
+    assert _entry('2026-03', INSTRUMENT, instrument.id, uc.user_id).realized_pnl == -5.0
+    assert _entry(ALL_TIME, ASSET_CLASS, 'CRYPTO', uc.user_id).trade_count == 3
+
+
+def test_pages_rank_by_realized_pnl(traders):
+    ucs, instrument = traders
+    for uc, pnl in zip(ucs, (5.0, 30.0, -10.0)):
+        TradingLeaderboardService.on_fill(uc.id, instrument.id, pnl)
+    db.session.commit()
+
+    first, cursor = TradingLeaderboardService.get_page(INSTRUMENT, str(instrument.id), ALL_TIME, limit=2)
+    rest, end = TradingLeaderboardService.get_page(INSTRUMENT, str(instrument.id), ALL_TIME, limit=2, cursor=cursor)
+
+    assert [(e['rank'], e['user_id'], e['realized_pnl']) for e in first + rest] == [
+        (1, ucs[1].user_id, 30.0), (2, ucs[0].user_id, 5.0), (3, ucs[2].user_id, -10.0)
+    ]
+    assert first[1]['win_rate'] == 1.0 and rest[0]['win_rate'] == 0.0
+    assert end is None
@@ -0,0 +1,44 @@
+from app.services.trigger_index import TriggerIndex
+
+
+def test_long_levels_fire_on_bid():
+    """Test that long SL fires when the bid falls and TP when it rises."""
+    index = TriggerIndex()
+    index.arm(1, 10, 1, 'LONG', stop_loss=95.0, take_profit=110.0)
+    index.arm(2, 10, 1, 'LONG', stop_loss=90.0)
+
+    assert index.on_quote(1, 100.0, 100.2) == []
+
+    events = index.on_quote(1, 94.0, 94.2)
+    assert [(e.position_id, e.kind, e.price) for e in events] == [(1, 'STOP_LOSS', 94.0)]
+
+    # Position 1 is fully disarmed, including its take-profit
+    assert 1 not in index
+    assert index.on_quote(1, 120.0, 120.2) == []
+    assert len(index) == 1
+
+
+def test_short_levels_fire_on_ask():
+    """Test that short SL fires when the ask rises and TP when it falls."""
+    index = TriggerIndex()
+    index.arm(1, 10, 1, 'SHORT', stop_loss=105.0, take_profit=90.0)
+    index.arm(2, 10, 1, 'SHORT', take_profit=95.0)
+
+    events = index.on_quote(1, 94.8, 95.0)
+    assert [(e.position_id, e.kind) for e in events] == [(2, 'TAKE_PROFIT')]
+
+    events = index.on_quote(1, 104.9, 105.1)
+    assert [(e.position_id, e.kind, e.level) for e in events] == [(1, 'STOP_LOSS', 105.0)]
+
+
+def test_rearm_and_disarm():
+    """Test that re-arming replaces levels and disarming removes them."""
+    index = TriggerIndex()
+    index.arm(1, 10, 1, 'LONG', stop_loss=95.0)
+    index.arm(1, 10, 1, 'LONG', stop_loss=80.0)
+
+    assert index.on_quote(1, 90.0, 90.2) == []
+
+    assert index.disarm(1) is True
+    assert index.disarm(1) is False
+    assert index.on_quote(1, 70.0, 70.2) == []
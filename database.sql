@@ -68,6 +68,7 @@ CREATE TABLE IF NOT EXISTS user_challenges (
     start_time TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
     end_time TIMESTAMP,
     daily_start_equity DECIMAL(15,2) NOT NULL,
+    daily_reset_at TIMESTAMP, -- Casablanca midnight (UTC) of the last day rollover
     current_equity DECIMAL(15,2) NOT NULL DEFAULT 0.00,
     max_equity DECIMAL(15,2) NOT NULL DEFAULT 0.00,
     min_equity DECIMAL(15,2) NOT NULL DEFAULT 999999999.00,
@@ -93,6 +94,8 @@ CREATE TABLE IF NOT EXISTS positions (
     qty DECIMAL(15,8) NOT NULL,
     avg_price DECIMAL(15,8) NOT NULL,
     opened_at TIMESTAMP NOT NULL,
+    stop_loss DECIMAL(15,8),
+    take_profit DECIMAL(15,8),
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
@@ -110,6 +113,25 @@ CREATE TABLE IF NOT EXISTS trades (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Orders table (resting limit / stop / stop-limit orders)
+CREATE TABLE IF NOT EXISTS orders (
+    id SERIAL PRIMARY KEY,
+    user_challenge_id INTEGER REFERENCES user_challenges(id) ON DELETE CASCADE,
+    instrument_id INTEGER REFERENCES instruments(id) ON DELETE CASCADE,
+    side VARCHAR(10) NOT NULL, -- BUY or SELL
+    order_type VARCHAR(20) NOT NULL, -- LIMIT, STOP, STOP_LIMIT
+    qty DECIMAL(15,8) NOT NULL,
+    limit_price DECIMAL(15,8),
+    stop_price DECIMAL(15,8),
+    status VARCHAR(20) NOT NULL DEFAULT 'OPEN', -- OPEN, TRIGGERED, FILLING, FILLED, CANCELLED, REJECTED
+    trade_id INTEGER REFERENCES trades(id) ON DELETE SET NULL,
+    triggered_at TIMESTAMP,
+    filled_at TIMESTAMP,
+    reject_reason VARCHAR(200),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
 -- Equity Snapshots table
 CREATE TABLE IF NOT EXISTS equity_snapshots (
     id SERIAL PRIMARY KEY,
@@ -122,6 +144,90 @@ CREATE TABLE IF NOT EXISTS equity_snapshots (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Equity Rollups table (OHLC equity per challenge per 1m/1h/1d bucket)
+CREATE TABLE IF NOT EXISTS equity_rollups (
+    id SERIAL PRIMARY KEY,
+    user_challenge_id INTEGER REFERENCES user_challenges(id) ON DELETE CASCADE,
+    resolution VARCHAR(4) NOT NULL, -- 1m, 1h, 1d
+    bucket_start TIMESTAMP NOT NULL,
+    open DECIMAL(15,2) NOT NULL,
+    high DECIMAL(15,2) NOT NULL,
+    low DECIMAL(15,2) NOT NULL,
+    close DECIMAL(15,2) NOT NULL,
+    samples INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT uq_equity_rollups_bucket UNIQUE (user_challenge_id, resolution, bucket_start)
+);
+
+-- Quote tape (recorded quotes used to replay challenges)
+CREATE TABLE IF NOT EXISTS quote_ticks (
+    id BIGSERIAL PRIMARY KEY,
+    instrument_id INTEGER REFERENCES instruments(id) ON DELETE CASCADE,
+    ts TIMESTAMP NOT NULL,
+    bid DECIMAL(15,8),
+    ask DECIMAL(15,8),
+    last DECIMAL(15,8) NOT NULL
+);
+
+-- Firm-wide exposure per instrument across active challenges (maintained on every fill)
+CREATE TABLE IF NOT EXISTS instrument_exposures (
+    instrument_id INTEGER PRIMARY KEY REFERENCES instruments(id) ON DELETE CASCADE,
+    long_qty DECIMAL(20,8) NOT NULL DEFAULT 0,
+    short_qty DECIMAL(20,8) NOT NULL DEFAULT 0,
+    long_cost DECIMAL(20,8) NOT NULL DEFAULT 0,
+    short_cost DECIMAL(20,8) NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Materialized leaderboards: best qualifying challenge per user and period ('YYYY-MM' or 'all')
+CREATE TABLE IF NOT EXISTS leaderboard_entries (
+    period VARCHAR(7) NOT NULL,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    user_challenge_id INTEGER NOT NULL REFERENCES user_challenges(id) ON DELETE CASCADE,
+    username VARCHAR(120) NOT NULL,
+    start_balance DECIMAL(15,2) NOT NULL,
+    equity DECIMAL(15,2) NOT NULL,
+    profit_pct DOUBLE PRECISION NOT NULL,
+    challenge_status VARCHAR(20) NOT NULL,
+    start_time TIMESTAMP,
+    end_time TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (period, user_id)
+);
+
+-- Frozen final standings of closed months (zlib-compressed JSON)
+CREATE TABLE IF NOT EXISTS leaderboard_archives (
+    period VARCHAR(7) PRIMARY KEY,
+    entry_count INTEGER NOT NULL,
+    standings BYTEA NOT NULL,
+    closed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Realized trading results per user, instrument / asset class and period
+CREATE TABLE IF NOT EXISTS trading_leaderboard_entries (
+    period VARCHAR(7) NOT NULL,
+    scope VARCHAR(12) NOT NULL,
+    scope_key VARCHAR(20) NOT NULL,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    realized_pnl DOUBLE PRECISION NOT NULL DEFAULT 0,
+    trade_count INTEGER NOT NULL DEFAULT 0,
+    closed_count INTEGER NOT NULL DEFAULT 0,
+    win_count INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (period, scope, scope_key, user_id)
+);
+
+-- Shared profit distribution sketches (bucket counts per period and challenge tier)
+CREATE TABLE IF NOT EXISTS profit_sketch_buckets (
+    period VARCHAR(7) NOT NULL,
+    challenge_id INTEGER NOT NULL REFERENCES challenges(id) ON DELETE CASCADE,
+    sign SMALLINT NOT NULL,
+    bucket INTEGER NOT NULL,
+    count DOUBLE PRECISION NOT NULL DEFAULT 0,
+    PRIMARY KEY (period, challenge_id, sign, bucket)
+);
+
 -- Watchlists table
 CREATE TABLE IF NOT EXISTS watchlists (
     id SERIAL PRIMARY KEY,
@@ -217,4 +323,19 @@ CREATE INDEX IF NOT EXISTS idx_users_email ON users(email);
 CREATE INDEX IF NOT EXISTS idx_instruments_symbol ON instruments(display_symbol);
 CREATE INDEX IF NOT EXISTS idx_user_challenges_user ON user_challenges(user_id);
 CREATE INDEX IF NOT EXISTS idx_user_challenges_status ON user_challenges(status);
-CREATE INDEX IF NOT EXISTS idx_payments_user ON payments(user_id);
\ No newline at end of file
+CREATE INDEX IF NOT EXISTS idx_payments_user ON payments(user_id);
+CREATE INDEX IF NOT EXISTS ix_equity_snapshots_challenge_ts ON equity_snapshots(user_challenge_id, ts);
+CREATE INDEX IF NOT EXISTS ix_trades_challenge_created ON trades(user_challenge_id, created_at, id);
+CREATE INDEX IF NOT EXISTS ix_positions_challenge_created ON positions(user_challenge_id, created_at, id);
+CREATE INDEX IF NOT EXISTS ix_positions_updated ON positions(updated_at);
+CREATE INDEX IF NOT EXISTS ix_quote_ticks_instrument_ts ON quote_ticks(instrument_id, ts);
+CREATE INDEX IF NOT EXISTS ix_orders_challenge_created ON orders(user_challenge_id, created_at, id);
+CREATE INDEX IF NOT EXISTS ix_orders_status_instrument ON orders(status, instrument_id);
+CREATE INDEX IF NOT EXISTS ix_leaderboard_entries_rank ON leaderboard_entries(period, profit_pct DESC, user_id);
+CREATE INDEX IF NOT EXISTS ix_trading_leaderboard_entries_rank ON trading_leaderboard_entries(period, scope, scope_key, realized_pnl DESC, user_id);
+CREATE INDEX IF NOT EXISTS ix_user_challenges_status_window ON user_challenges(status, start_time, end_time);
+CREATE INDEX IF NOT EXISTS ix_user_challenges_user_status_created ON user_challenges(user_id, status, created_at);
+CREATE INDEX IF NOT EXISTS ix_user_challenges_user_created ON user_challenges(user_id, created_at);
+CREATE INDEX IF NOT EXISTS ix_user_challenges_challenge_status ON user_challenges(challenge_id, status);
+CREATE INDEX IF NOT EXISTS ix_users_created ON users(created_at);
+CREATE INDEX IF NOT EXISTS ix_payments_user_created ON payments(user_id, created_at);
\ No newline at end of file
@@ -1,6 +1,6 @@
-﻿import React, { useState, useEffect } from 'react';
+﻿import React, { useState, useEffect, useRef } from 'react';
 import { Instrument, Quote, OHLCV, Signal, Position, Trade, UserChallenge } from '@/types';
-import { marketAPI, challengeAPI, featuresAPI } from '@/services/api';
+import { marketAPI, challengeAPI, featuresAPI, dashboardAPI } from '@/services/api';
 import dynamic from 'next/dynamic';
 
 // Dynamically import TradingView chart to avoid SSR issues
@@ -81,6 +81,8 @@ const TradingDashboard: React.FC<{ userChallenge: UserChallenge; user: any }> =
   const [positions, setPositions] = useState<Position[]>([]);
   const [trades, setTrades] = useState<Trade[]>([]);
   const [signals, setSignals] = useState<Signal[]>([]);
+  const [equityPoints, setEquityPoints] = useState<{ ts: string; equity: number }[]>([]);
+  const [currentEquity, setCurrentEquity] = useState<number | null>(userChallenge?.current_equity ?? null);
   const [events, setEvents] = useState<EventLog[]>([]);
   const [quantity, setQuantity] = useState<number>(0.1);
   const [isTradeLoading, setIsTradeLoading] = useState(false);
@@ -127,9 +129,79 @@ const TradingDashboard: React.FC<{ userChallenge: UserChallenge; user: any }> =
     }));
   };
 
-  // Fetch instruments
+  // Sections of the initial load already filled by the dashboard request,
+  // so the effects below skip their first fetch
+  const preloaded = useRef({ account: false, market: false, signals: false });
+
+  // Initial load: instruments, positions, trades, chart, quote, signals, the
+  // evaluated challenge and its equity history in one request (one ownership
+  // check and one quote snapshot server-side)
   useEffect(() => {
     const fetchInstruments = async () => {
+      try {
+        if (!userChallenge?.id) {
+          throw new Error('No challenge to load');
+        }
+        const response = await dashboardAPI.getDashboard(userChallenge.id, {
+          fields: 'instruments,positions,trades,quote,ohlcv,signals,challenge,evaluation,equity',
+          timeframe,
+          ohlcv_limit: 1000
+        });
+        const data = response.data;
+        const loadedInstruments: Instrument[] = data.instruments || [];
+        const instrument: Instrument | null = data.instrument || loadedInstruments[0] || null;
+
+        setPositions(data.positions || []);
+        setTrades(data.trades?.items || []);
+        addTradeEvents(data.trades?.items || [], loadedInstruments);
+        preloaded.current.account = true;
+
+        if (data.challenge) {
+          setCurrentStatus(data.challenge.status);
+          setViolatedRules(data.challenge.violated_rules || []);
+          setCurrentEquity(data.challenge.current_equity);
+        }
+        if (data.evaluation) {
+          addRiskEvaluationEvent(data.evaluation);
+        }
+        if (data.equity) {
+          setEquityPoints(data.equity.points || []);
+        }
+
+        if (instrument && data.quote && data.ohlcv?.bars?.length > 0) {
+          const q = data.quote;
+          // Fix for FX pairs where 'last' might be zero or missing
+          if (!q.last || q.last === 0) {
+            q.last = (q.bid + q.ask) / 2;
+          }
+          setQuote(q);
+          setQuotesMap({ [instrument.id]: q });
+          setOhlcvData(data.ohlcv.bars);
+          preloaded.current.market = true;
+
+          if (data.signals) {
+            setSignals([{
+              instrument: instrument.display_symbol,
+              direction: data.signals.bias,
+              confidence: data.signals.confidence,
+              indicators: {
+                rsi: data.signals.indicators?.rsi ?? undefined,
+                ema20: data.signals.indicators?.ema_20 ?? undefined,
+                ema50: data.signals.indicators?.ema_50 ?? undefined,
+                regime: data.signals.regime
+              },
+              notes: data.signals.notes || []
+            }]);
+            preloaded.current.signals = true;
+          }
+        }
+
+        setInstruments(loadedInstruments);
+        setSelectedInstrument(instrument);
+        return;
+      } catch (error) {
+        console.warn('Dashboard request failed, loading instruments on their own:', error);
+      }
       try {
         const response = await marketAPI.getInstruments();
         setInstruments(response.data.instruments);
@@ -307,6 +379,10 @@ const TradingDashboard: React.FC<{ userChallenge: UserChallenge; user: any }> =
   // Fetch positions and trades - depends on challenge AND instruments being ready
   useEffect(() => {
     if (userChallenge?.id && instruments.length > 0) {
+      if (preloaded.current.account) {
+        preloaded.current.account = false;
+        return;
+      }
       fetchPositions();
       fetchTrades();
     }
@@ -332,32 +408,7 @@ const TradingDashboard: React.FC<{ userChallenge: UserChallenge; user: any }> =
     try {
       const response = await challengeAPI.getTrades(userChallenge.id);
       setTrades(response.data.trades);
-
-      // Add recent trades to journal in a single update
-      const newTradeEvents: EventLog[] = response.data.trades.slice(0, 10).map((trade: Trade) => {
-        const inst = instruments.find(i => i.id === trade.instrument_id);
-        return {
-          id: trade.id,
-          instrument_id: trade.instrument_id,
-          type: 'trade_executed',
-          payload_json: {
-            symbol: inst?.display_symbol || 'Unknown',
-            side: trade.side,
-            qty: trade.qty,
-            price: trade.price,
-            status: 'filled'
-          },
-          created_at: trade.created_at
-        };
-      });
-
-      setEvents(prev => {
-        // Filter out any existing events with these IDs to avoid duplicates
-        const existingIds = new Set(newTradeEvents.map(e => e.id));
-        const filteredPrev = prev.filter(e => !existingIds.has(e.id));
-        const combined = [...newTradeEvents, ...filteredPrev];
-        return combined.sort((a, b) => new Date(b.created_at).getTime() - new Date(a.created_at).getTime()).slice(0, 50);
-      });
+      addTradeEvents(response.data.trades, instruments);
     } catch (error: any) {
       if (error.response?.status === 404) {
         console.warn('Trades endpoint not found, using empty array');
@@ -368,6 +419,50 @@ const TradingDashboard: React.FC<{ userChallenge: UserChallenge; user: any }> =
     }
   };
 
+  // Add recent trades to journal in a single update
+  const addTradeEvents = (recentTrades: Trade[], knownInstruments: Instrument[]) => {
+    const newTradeEvents: EventLog[] = recentTrades.slice(0, 10).map((trade: Trade) => {
+      const inst = knownInstruments.find(i => i.id === trade.instrument_id);
+      return {
+        id: trade.id,
+        instrument_id: trade.instrument_id,
+        type: 'trade_executed',
+        payload_json: {
+          symbol: inst?.display_symbol || 'Unknown',
+          side: trade.side,
+          qty: trade.qty,
+          price: trade.price,
+          status: 'filled'
+        },
+        created_at: trade.created_at
+      };
+    });
+
+    setEvents(prev => {
+      // Filter out any existing events with these IDs to avoid duplicates
+      const existingIds = new Set(newTradeEvents.map(e => e.id));
+      const filteredPrev = prev.filter(e => !existingIds.has(e.id));
+      const combined = [...newTradeEvents, ...filteredPrev];
+      return combined.sort((a, b) => new Date(b.created_at).getTime() - new Date(a.created_at).getTime()).slice(0, 50);
+    });
+  };
+
+  // Journal entry for a server-side risk evaluation, replacing the previous one
+  const addRiskEvaluationEvent = (evaluation: any) => {
+    const newEvent: EventLog = {
+      id: Date.now() + 2,
+      type: 'risk_evaluation',
+      payload_json: {
+        status: evaluation.status,
+        daily_drawdown: evaluation.metrics?.daily_drawdown,
+        total_drawdown: evaluation.metrics?.total_drawdown,
+        reasons: (evaluation.reasons || []).map((r: any) => r.message)
+      },
+      created_at: new Date().toISOString()
+    };
+    setEvents(prev => [newEvent, ...prev.filter(e => e.type !== 'risk_evaluation')].slice(0, 50));
+  };
+
   // Fetch events/journal
   useEffect(() => {
     // In a real app, we would fetch from the backend
@@ -412,6 +507,17 @@ const TradingDashboard: React.FC<{ userChallenge: UserChallenge; user: any }> =
 
     // Initial load: Sequence Chart -> Quote -> Signals
     const loadData = async () => {
+      // Chart and quote came with the dashboard request
+      if (preloaded.current.market) {
+        preloaded.current.market = false;
+        // Signals came with it too, computed from the same bars
+        if (preloaded.current.signals) {
+          preloaded.current.signals = false;
+          return;
+        }
+        await fetchSignals(quote || undefined);
+        return;
+      }
       setQuote(null); // Clear stale quote immediately
       await fetchChartData();
       if (!isMounted) return;
@@ -638,6 +744,21 @@ const TradingDashboard: React.FC<{ userChallenge: UserChallenge; user: any }> =
                 {currentStatus || 'Active'}
               </div>
 
+              {currentEquity !== null && (
+                <div className="text-right whitespace-nowrap">
+                  <div className="text-xs text-gray-400">{t('dash_equity')}</div>
+                  <div className="font-mono font-bold">
+                    ${currentEquity.toLocaleString(undefined, { maximumFractionDigits: 2 })}
+                    {equityPoints.length > 1 && (
+                      <span className={`ml-2 text-xs ${currentEquity >= equityPoints[0].equity ? 'text-green-400' : 'text-red-400'}`}>
+                        {currentEquity >= equityPoints[0].equity ? '+' : ''}
+                        {(currentEquity - equityPoints[0].equity).toLocaleString(undefined, { maximumFractionDigits: 2 })}
+                      </span>
+                    )}
+                  </div>
+                </div>
+              )}
+
               <div className="text-right min-w-[150px]">
                 <h2 className="text-xl font-bold truncate">
                   {selectedInstrument?.display_symbol || t('dash_select_instr')}
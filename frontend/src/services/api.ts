@@ -99,6 +99,19 @@ export const challengeAPI = {
     apiClient.post(`/challenges/${user_challenge_id}/evaluate`),
 };
 
+// Dashboard API
+export const dashboardAPI = {
+  // One request for the dashboard's initial load; `fields` selects sections (all by default)
+  getDashboard: (user_challenge_id: number, params?: {
+    fields?: string;
+    instrument_id?: number;
+    timeframe?: string;
+    ohlcv_limit?: number;
+    trades_limit?: number;
+    range?: number;
+  }) => apiClient.get(`/dashboard/${user_challenge_id}`, { params }),
+};
+
 // Leaderboard API
 export const leaderboardAPI = {
   getMonthlyLeaderboard: (year?: number, month?: number) => {